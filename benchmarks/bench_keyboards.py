@@ -0,0 +1,64 @@
+# benchmarks/bench_keyboards.py
+"""Замер стоимости построения inline-клавиатур: сборка с нуля против готовых экземпляров.
+
+Запуск из корня проекта (нужны переменные окружения, как для бота):
+    python benchmarks/bench_keyboards.py [--number 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import handlers  # noqa: E402,F401  (порядок импорта: database <-> handlers)
+import keyboards  # noqa: E402
+
+
+def _uncached(builder):
+    """Исходная функция без lru_cache - так клавиатура собиралась на каждый вызов."""
+    return getattr(builder, '__wrapped__', builder)
+
+
+def _cases():
+    """(имя, сборка с нуля, готовый экземпляр через публичную функцию)."""
+    run = asyncio.new_event_loop().run_until_complete
+    styles_items = list(keyboards.NEW_MALE_AVATAR_STYLES.items())
+    total_pages = len(keyboards.MALE_STYLE_PAGES)
+    return [
+        ("main_menu",
+         lambda: _uncached(keyboards._build_main_menu_keyboard)(None),
+         lambda: run(keyboards.create_main_menu_keyboard(0))),
+        ("video_styles",
+         keyboards._build_video_styles_keyboard,
+         lambda: run(keyboards.create_video_styles_keyboard())),
+        ("male_styles_page",
+         lambda: keyboards._build_style_page(styles_items, "style_new_male_", "male_styles_page_", 1, total_pages),
+         lambda: run(keyboards.create_new_male_avatar_styles_keyboard(1))),
+        ("aspect_ratio",
+         lambda: _uncached(keyboards._build_aspect_ratio_keyboard)("back_to_style_selection"),
+         lambda: run(keyboards.create_aspect_ratio_keyboard())),
+        ("subscription",
+         lambda: _uncached(keyboards._build_subscription_keyboard)(False),
+         lambda: run(keyboards.create_subscription_keyboard())),
+        ("rating",
+         lambda: _uncached(keyboards._build_rating_keyboard)(False),
+         lambda: run(keyboards.create_rating_keyboard())),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help="вызовов на замер")
+    args = parser.parse_args()
+
+    print(f"{'клавиатура':<20}{'с нуля, мкс':>14}{'готовая, мкс':>14}{'ускорение':>12}")
+    for name, build, cached in _cases():
+        build_us = min(timeit.repeat(build, number=args.number, repeat=3)) / args.number * 1e6
+        cached_us = min(timeit.repeat(cached, number=args.number, repeat=3)) / args.number * 1e6
+        print(f"{name:<20}{build_us:>14.2f}{cached_us:>14.2f}{build_us / cached_us:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
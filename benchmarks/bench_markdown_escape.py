@@ -0,0 +1,72 @@
+# benchmarks/bench_markdown_escape.py
+"""Замер экранирования MarkdownV2: прежние 18 проходов str.replace против текущих функций.
+
+Запуск из корня проекта:
+    python benchmarks/bench_markdown_escape.py [--number 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_escape import safe_escape_markdown, escape_message_parts, unescape_markdown  # noqa: E402
+
+_V2_SPECIAL_CHARS = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+
+
+def replace_escape(text: str) -> str:
+    """Прежняя реализация safe_escape_markdown (version=2, без исключений)."""
+    if not text:
+        return ""
+    text = str(text)
+    for char in _V2_SPECIAL_CHARS:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def replace_unescape(text: str) -> str:
+    """Прежняя реализация unescape_markdown."""
+    if not text:
+        return ""
+    for char in _V2_SPECIAL_CHARS:
+        text = text.replace(f'\\{char}', char)
+    return text
+
+
+SHORT_TEXT = "✅ Баланс пополнен: 10 печенек (тариф «мини»)."
+BROADCAST_TEXT = (
+    "🔥 Только сегодня! Скидка -30% на все пакеты.\n"
+    "Создайте аватар за 5 минут и получите 100+ фото в любом стиле: "
+    "портрет, бизнес, fashion_style, #новинки.\n"
+    "Подробнее: https://t.me/pixelpie_bot?start=promo_2024 [акция]\n"
+) * 6
+PARTS = ("👤 Имя: ", "Иван_Петров", "\nID: ", "123456789", "\nEmail: ", "ivan.petrov@example.com", "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help="вызовов на замер")
+    args = parser.parse_args()
+
+    escaped_broadcast = safe_escape_markdown(BROADCAST_TEXT)
+    cases = [
+        ("escape short", lambda: replace_escape(SHORT_TEXT), lambda: safe_escape_markdown(SHORT_TEXT)),
+        ("escape broadcast", lambda: replace_escape(BROADCAST_TEXT), lambda: safe_escape_markdown(BROADCAST_TEXT)),
+        ("escape parts",
+         lambda: "".join(replace_escape(part) for part in PARTS),
+         lambda: escape_message_parts(*PARTS)),
+        ("unescape broadcast", lambda: replace_unescape(escaped_broadcast), lambda: unescape_markdown(escaped_broadcast)),
+    ]
+
+    print(f"{'операция':<22}{'replace, мкс':>14}{'текущая, мкс':>18}{'ускорение':>12}")
+    for name, old, new in cases:
+        assert old() == new(), name
+        old_us = min(timeit.repeat(old, number=args.number, repeat=3)) / args.number * 1e6
+        new_us = min(timeit.repeat(new, number=args.number, repeat=3)) / args.number * 1e6
+        print(f"{name:<22}{old_us:>14.2f}{new_us:>18.2f}{old_us / new_us:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,693 @@
+# benchmarks/index_advisor.py
+"""Советник по индексам: EXPLAIN QUERY PLAN для SQL бота на сгенерированных данных.
+
+Запуск из корня проекта:
+    python benchmarks/index_advisor.py [--users 20000] [--schema-version 2]
+                                      [--emit-migration migrations/m003_workload_indexes.py]
+
+Что делает:
+1. Собирает SQL-литералы из database.py, report.py и handlers/ (ast), плюс
+   запросы, которые код собирает динамически (DYNAMIC_QUERIES).
+2. Создаёт временную базу через migrations/ (до --schema-version) и наполняет
+   её данными реалистичного объёма.
+3. Для каждого запроса строит план и отмечает полные сканы, поиск по
+   непокрывающему индексу и временные B-деревья для ORDER BY/GROUP BY.
+4. По условиям WHERE/ORDER BY предлагает составные (по возможности
+   покрывающие) индексы, оставляет те, что улучшают план, заметно
+   ускоряют хотя бы один свой запрос (MIN_GAIN) и суммарно все свои
+   запросы (MIN_NET_GAIN), и сравнивает время до и после. Каждый кандидат
+   сначала меряется без остальных, потом из прошедших убираются дублирующие.
+   Решение принимается по медиане GATE_ROUNDS попеременных замеров с индексом
+   и без него, чтобы выбор не менялся от запуска к запуску.
+   Индексы, отклонённые по времени, попадают в отчёт с замером.
+5. С --emit-migration записывает выбранные индексы как миграцию.
+
+Параметры запросов берутся из сгенерированных данных (ParamSampler): для
+равенства - значение столбца из середины таблицы, для нижней границы
+диапазона - 90-й перцентиль (свежие 10% строк), для верхней - максимум.
+С NULL поиск по индексу не находил бы ни одной строки, и замер не отличал
+бы полезный индекс от бесполезного.
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SOURCES = ('database.py', 'report.py', 'handlers/*.py')
+
+# Запросы, которые код склеивает из частей и которых нет целиком ни в одном литерале
+DYNAMIC_QUERIES = [
+    ('database.get_user_actions_stats(action)',
+     "SELECT * FROM user_actions WHERE action = ? ORDER BY created_at DESC"),
+    ('database.get_user_actions_stats(action, даты)',
+     "SELECT * FROM user_actions WHERE action = ? AND created_at >= ? AND created_at <= ? ORDER BY created_at DESC"),
+    ('database.get_user_actions_stats(user_id)',
+     "SELECT * FROM user_actions WHERE user_id = ? ORDER BY created_at DESC"),
+]
+
+_STATEMENT = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b', re.IGNORECASE)
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_PREDICATE = re.compile(
+    r'(?:\b(\w+)\.)?\b(\w+)\s*(==|=|>=|<=|>|<|\bIN\b|\bIS\b|\bBETWEEN\b|\bLIKE\b)', re.IGNORECASE
+)
+_ORDER_BY = re.compile(r'\b(?:ORDER|GROUP)\s+BY\s+(?:(\w+)\.)?(\w+)', re.IGNORECASE)
+_NAMED_PARAM = re.compile(r'(?<![:\w]):(\w+)')
+_PLACEHOLDER = re.compile(r'\?|(?<![:\w]):(\w+)')
+# Столбец перед плейсхолдером: "col = ?", "t.col >= ?", "col BETWEEN ?", "col BETWEEN ? AND ?", "col IN (?, ?"
+_PARAM_COLUMN = re.compile(
+    r'(?:\b(\w+)\.)?\b(\w+)\s*(?:(==|=|!=|<>|>=|<=|>|<|\bLIKE\b|\bBETWEEN\b)|\bBETWEEN\s+(?:\?|:\w+)\s+(AND)'
+    r'|(\bIN\b)\s*\((?:\s*(?:\?|:\w+)\s*,)*)\s*$',
+    re.IGNORECASE
+)
+_LIMIT_PARAM = re.compile(r'\b(?:LIMIT|OFFSET)\s*$', re.IGNORECASE)
+_SQL_KEYWORDS = {
+    'where', 'join', 'left', 'right', 'inner', 'outer', 'cross', 'on', 'group', 'order', 'limit', 'set',
+    'values', 'as', 'using', 'union', 'select', 'having', 'natural',
+}
+_EQUALITY_OPS = {'=', '==', 'in', 'is'}
+# Текстовые столбцы, которые не добавляем в индекс ради покрытия
+_PAYLOAD_TYPES = {'TEXT', ''}
+MAX_INDEX_COLUMNS = 4
+# Индекс остаётся, если хотя бы один его запрос без него медленнее на MIN_GAIN и MIN_GAIN_MS,
+# а все его запросы суммарно быстрее с ним хотя бы в 1 + MIN_NET_GAIN раз (медиана по раундам).
+# Суммарный выигрыш индексов, которые выбирались через раз, плавал между запусками от 5 до 70%,
+# поэтому порог взят с запасом: в миграцию попадает только то, что выбирается при каждом запуске
+MIN_GAIN = 0.2
+MIN_GAIN_MS = 0.2
+MIN_NET_GAIN = 1.0
+# Прогонов каждого запроса на один замер; берётся медиана
+TIMING_RUNS = 5
+# Раундов попеременных замеров с индексом и без него при решении по кандидату; берётся медиана.
+# Одиночный замер плавает на десятки процентов, и выбор менялся бы от запуска к запуску
+GATE_ROUNDS = 5
+
+
+class Query(NamedTuple):
+    source: str
+    sql: str
+
+
+class Candidate(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        return f"idx_{self.table}_{'_'.join(self.columns)}"
+
+    @property
+    def definition(self) -> str:
+        return f"{self.table}({', '.join(self.columns)})"
+
+
+# --- сбор запросов ---
+
+def _literal_sql(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        # f-строки: подставленные значения заменяем параметром
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(str(value.value))
+            else:
+                parts.append('?')
+        return ''.join(parts)
+    return None
+
+
+def collect_queries(patterns: Sequence[str]) -> List[Query]:
+    queries = []
+    seen = set()
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            with open(path, encoding='utf-8') as f:
+                tree = ast.parse(f.read(), filename=path)
+            relative = os.path.relpath(path, ROOT)
+            for node in ast.walk(tree):
+                sql = _literal_sql(node)
+                if not sql or not _STATEMENT.match(sql):
+                    continue
+                if sql.lstrip().upper().startswith('INSERT') and 'SELECT' not in sql.upper():
+                    continue
+                normalized = ' '.join(sql.split())
+                if normalized in seen:
+                    continue
+                seen.add(normalized)
+                queries.append(Query(f"{relative}:{node.lineno}", normalized))
+    queries.extend(Query(source, sql) for source, sql in DYNAMIC_QUERIES)
+    return queries
+
+
+def _params(sql: str, values: Optional[Sequence] = None):
+    """Параметры запроса: values по порядку плейсхолдеров, недостающие - NULL."""
+    values = list(values or [])
+    names = _NAMED_PARAM.findall(sql)
+    if names:
+        bound = {}
+        for index, name in enumerate(names):
+            bound.setdefault(name, values[index] if index < len(values) else None)
+        return bound
+    count = sql.count('?')
+    return tuple(values[:count]) + (None,) * (count - len(values[:count]))
+
+
+# --- данные ---
+
+def _timestamp(rng: random.Random, now: datetime, days: int = 365) -> str:
+    return (now - timedelta(seconds=rng.randint(0, days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate_dataset(conn: sqlite3.Connection, users: int, seed: int = 3) -> Dict[str, int]:
+    """Наполняет схему данными с пропорциями живого бота: действий и генераций много, платежей мало."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    base = 100_000_000
+    user_ids = [base + index for index in range(users)]
+    statuses = ('pending', 'succeeded', 'succeeded', 'succeeded', 'canceled')
+
+    conn.executemany(
+        "INSERT INTO users (user_id, username, first_name, generations_left, avatar_left, has_trained_model, "
+        "first_purchase, referrer_id, is_blocked, created_at, welcome_message_sent, last_reminder_type) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(user_id, f"user{user_id}", "Имя", rng.randint(0, 50), rng.randint(0, 1), int(rng.random() < 0.3),
+          int(rng.random() < 0.8), rng.choice(user_ids[:index]) if index and rng.random() < 0.2 else None,
+          int(rng.random() < 0.01), _timestamp(rng, now), 1, rng.choice((None, 'reminder_day2', 'reminder_day5')))
+         for index, user_id in enumerate(user_ids)]
+    )
+
+    actions = ('start_bot', 'start_bot', 'view_menu', 'generate_image', 'generate_image', 'generate_image',
+               'use_referral', 'payment_success', 'train_avatar', 'rate_generation')
+    action_rows = []
+    for user_id in user_ids:
+        for _ in range(rng.randint(5, 60)):
+            action = rng.choice(actions)
+            details = json.dumps({'referrer_id': rng.choice(user_ids)} if action == 'use_referral' else {'source': 'bot'})
+            action_rows.append((user_id, action, details, _timestamp(rng, now)))
+    conn.executemany("INSERT INTO user_actions (user_id, action, details, created_at) VALUES (?, ?, ?, ?)", action_rows)
+
+    gen_types = ('with_avatar', 'with_avatar', 'photo_to_photo', 'ai_video_v2_1', 'prompt_assist', 'train_flux')
+    conn.executemany(
+        "INSERT INTO generation_log (user_id, generation_type, replicate_model_id, units_generated, cost_per_unit, "
+        "total_cost, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(user_id, rng.choice(gen_types), 'black-forest-labs/flux-1.1-pro', rng.randint(1, 4), 0.04, 0.08,
+          _timestamp(rng, now)) for user_id in user_ids for _ in range(rng.randint(0, 25))]
+    )
+
+    payment_rows = [(f"pay-{user_id}-{n}", user_id, rng.choice(('мини', 'лайт', 'комфорт')), 399.0,
+                     rng.choice(statuses), _timestamp(rng, now))
+                    for user_id in user_ids if rng.random() < 0.35 for n in range(rng.randint(1, 4))]
+    conn.executemany("INSERT INTO payments (payment_id, user_id, plan, amount, status, created_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", payment_rows)
+    conn.executemany("INSERT INTO payment_logs (user_id, payment_id, amount, payment_info, created_at) "
+                     "VALUES (?, ?, ?, '{}', ?)",
+                     [(row[1], row[0], row[3], row[5]) for row in payment_rows if row[4] == 'succeeded'])
+
+    conn.executemany(
+        "INSERT INTO user_trainedmodels (user_id, model_id, model_version, status, prediction_id, trigger_word, "
+        "avatar_name, created_at) VALUES (?, 'owner/model', 'owner/model:v', ?, ?, 'TOK', 'Аватар', ?)",
+        [(user_id, rng.choice(('success', 'success', 'failed', 'training', 'pending')), f"train-{user_id}-{n}",
+          _timestamp(rng, now)) for user_id in user_ids if rng.random() < 0.3 for n in range(rng.randint(1, 2))]
+    )
+    conn.executemany(
+        "INSERT INTO video_tasks (user_id, video_path, status, created_at, prediction_id, model_key, style_name) "
+        "VALUES (?, 'generated/v.mp4', ?, ?, ?, 'kwaivgi/kling-v2.1', 'custom')",
+        [(user_id, rng.choice(('completed', 'completed', 'failed', 'pending', 'processing')), _timestamp(rng, now),
+          f"video-{user_id}-{n}") for user_id in user_ids if rng.random() < 0.1 for n in range(rng.randint(1, 3))]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO referrals (referrer_id, referred_id, status, created_at) VALUES (?, ?, ?, ?)",
+        [(rng.choice(user_ids), user_id, rng.choice(('pending', 'completed')), _timestamp(rng, now))
+         for user_id in user_ids if rng.random() < 0.2]
+    )
+    conn.executemany(
+        "INSERT INTO scheduled_broadcasts (scheduled_time, broadcast_data, status) VALUES (?, '{}', ?)",
+        [(_timestamp(rng, now), rng.choice(('completed', 'completed', 'pending', 'failed')))
+         for _ in range(max(100, users // 20))]
+    )
+    conn.commit()
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in (
+        'users', 'user_actions', 'generation_log', 'payments', 'user_trainedmodels', 'video_tasks',
+        'referrals', 'scheduled_broadcasts')}
+
+
+# --- планы и кандидаты ---
+
+def explain(conn: sqlite3.Connection, sql: str, values: Optional[Sequence] = None) -> List[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", _params(sql, values))]
+
+
+def plan_cost(plan: Sequence[str]) -> int:
+    """Грубая оценка: полный скан 3, поиск по индексу с чтением строк 1, покрывающий/по ключу 0, temp b-tree +1."""
+    cost = 0
+    for detail in plan:
+        if detail.startswith('SCAN') and 'INDEX' not in detail:
+            cost += 3
+        elif detail.startswith('SCAN'):
+            cost += 2 if 'COVERING' not in detail else 1
+        elif detail.startswith('SEARCH') and 'COVERING INDEX' not in detail and 'PRIMARY KEY' not in detail:
+            cost += 1
+        elif 'TEMP B-TREE' in detail:
+            cost += 1
+    return cost
+
+
+def _flags(plan: Sequence[str]) -> List[str]:
+    flags = []
+    for detail in plan:
+        if detail.startswith('SCAN') and 'INDEX' not in detail and 'CONSTANT' not in detail:
+            flags.append(detail)
+        elif 'TEMP B-TREE' in detail:
+            flags.append(detail)
+    return flags
+
+
+def _table_columns(conn: sqlite3.Connection) -> Dict[str, Dict[str, str]]:
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return {table: {row[1]: (row[2] or '').upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+            for table in tables}
+
+
+def _existing_indexes(conn: sqlite3.Connection) -> Dict[str, List[Tuple[str, ...]]]:
+    indexes: Dict[str, List[Tuple[str, ...]]] = {}
+    for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"):
+        columns = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})"))
+        indexes.setdefault(table, []).append(columns)
+    return indexes
+
+
+def _is_covered(candidate: Candidate, existing: Dict[str, List[Tuple[str, ...]]]) -> bool:
+    return any(columns[:len(candidate.columns)] == candidate.columns for columns in existing.get(candidate.table, []))
+
+
+def _column_owner(sql: str, schema: Dict[str, Dict[str, str]]):
+    """Таблицы запроса и функция owner(qualifier, column) -> таблица столбца или None."""
+    aliases: Dict[str, str] = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table not in schema:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    tables = set(aliases.values())
+
+    def owner(qualifier: str, column: str) -> Optional[str]:
+        if qualifier:
+            table = aliases.get(qualifier)
+            return table if table and column in schema[table] else None
+        owners = [table for table in tables if column in schema[table]]
+        return owners[0] if len(owners) == 1 else None
+    return tables, owner
+
+
+def candidates_for(sql: str, schema: Dict[str, Dict[str, str]]) -> List[Candidate]:
+    """Индекс на каждую таблицу запроса: равенства, затем диапазон/сортировка, затем столбцы для покрытия."""
+    tables, owner = _column_owner(sql, schema)
+    if not tables:
+        return []
+
+    equality: Dict[str, List[str]] = {table: [] for table in tables}
+    ranges: Dict[str, List[str]] = {table: [] for table in tables}
+    for qualifier, column, op in _PREDICATE.findall(sql):
+        table = owner(qualifier, column)
+        if table is None:
+            continue
+        target = equality if op.lower() in _EQUALITY_OPS else ranges
+        if column not in target[table]:
+            target[table].append(column)
+    for qualifier, column in _ORDER_BY.findall(sql):
+        table = owner(qualifier, column)
+        if table is not None and column not in ranges[table] and column not in equality[table]:
+            ranges[table].append(column)
+
+    candidates = []
+    for table in tables:
+        columns = list(equality[table])
+        for column in ranges[table]:
+            if column not in columns:
+                columns.append(column)
+                break
+        if not columns:
+            continue
+        key = Candidate(table, tuple(columns[:MAX_INDEX_COLUMNS]))
+        candidates.append(key)
+        # Покрывающий вариант: те же ключи плюс прочие нужные запросу нетекстовые столбцы
+        referenced = [column for column in schema[table] if re.search(rf'\b{column}\b', sql)]
+        extra = [column for column in referenced if column not in columns and schema[table][column] not in _PAYLOAD_TYPES]
+        if extra and len(columns) + len(extra) <= MAX_INDEX_COLUMNS and 'SELECT *' not in sql.upper():
+            candidates.append(Candidate(table, tuple(columns + extra)))
+    return candidates
+
+
+class ParamSampler:
+    """Значения параметров из сгенерированных данных; выборки по столбцу кэшируются."""
+    def __init__(self, conn: sqlite3.Connection, schema: Dict[str, Dict[str, str]]):
+        self.conn = conn
+        self.schema = schema
+        self._cache: Dict[Tuple[str, str, str], object] = {}
+
+    def value(self, table: str, column: str, kind: str):
+        key = (table, column, kind)
+        if key not in self._cache:
+            count = self.conn.execute(f"SELECT COUNT({column}) FROM {table}").fetchone()[0]
+            if not count:
+                self._cache[key] = None
+            elif kind == 'upper':
+                self._cache[key] = self.conn.execute(f"SELECT MAX({column}) FROM {table}").fetchone()[0]
+            else:
+                # eq - строка из середины таблицы, lower - 90-й перцентиль
+                order = 'rowid' if kind == 'eq' else column
+                offset = count // 2 if kind == 'eq' else count * 9 // 10
+                self._cache[key] = self.conn.execute(
+                    f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {order} LIMIT 1 OFFSET ?",
+                    (offset,)
+                ).fetchone()[0]
+        return self._cache[key]
+
+    def sample(self, sql: str) -> list:
+        """Значения для плейсхолдеров sql по порядку; столбец не определён - NULL."""
+        _, owner = _column_owner(sql, self.schema)
+        values = []
+        for match in _PLACEHOLDER.finditer(sql):
+            before = sql[:match.start()]
+            if _LIMIT_PARAM.search(before):
+                values.append(10)
+                continue
+            column_match = _PARAM_COLUMN.search(before)
+            table = column_match and owner(column_match.group(1), column_match.group(2))
+            if not table:
+                values.append(None)
+                continue
+            op = (column_match.group(3) or '').upper()
+            if column_match.group(4):
+                kind = 'upper'
+            elif op in ('>', '>=', 'BETWEEN'):
+                kind = 'lower'
+            elif op in ('<', '<='):
+                kind = 'upper'
+            else:
+                kind = 'eq'
+            values.append(self.value(table, column_match.group(2), kind))
+        return values
+
+
+def time_query(conn: sqlite3.Connection, sql: str, repeat: int = TIMING_RUNS,
+               values: Optional[Sequence] = None) -> Optional[float]:
+    """Медианное время из repeat после прогревочного прогона, мс.
+
+    Изменения UPDATE/DELETE откатываются, данные не меняются.
+    """
+    params = _params(sql, values)
+    timings = []
+    for attempt in range(repeat + 1):
+        started = time.perf_counter()
+        try:
+            conn.execute(sql, params).fetchall()
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.rollback()
+        if attempt:
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+# --- основной цикл ---
+
+def _prepare_database(path: str, schema_version: Optional[int]) -> None:
+    import asyncio
+    from migrations import apply_migrations, discover_migrations
+
+    migrations = [migration for migration in discover_migrations()
+                  if schema_version is None or migration.version <= schema_version]
+    asyncio.run(apply_migrations(path, migrations))
+
+
+def advise(conn: sqlite3.Connection, queries: List[Query]) -> Tuple[List[Candidate], List[dict], List[Tuple[Query, str]]]:
+    schema = _table_columns(conn)
+    existing = _existing_indexes(conn)
+    sampler = ParamSampler(conn, schema)
+    values: Dict[Query, list] = {}
+    plans: Dict[Query, List[str]] = {}
+    skipped = []
+    for query in queries:
+        try:
+            values[query] = sampler.sample(query.sql)
+            plans[query] = explain(conn, query.sql, values[query])
+        except sqlite3.Error as e:
+            skipped.append((query, str(e)))
+
+    def timed(query: Query) -> Optional[float]:
+        return time_query(conn, query.sql, values=values[query])
+
+    def times_ms(candidate_queries: Sequence[Query]) -> Dict[Query, float]:
+        return {query: timed(query) or 0.0 for query in candidate_queries}
+
+    def compare(candidate: Candidate) -> Tuple[Dict[Query, float], Dict[Query, float], float]:
+        """Медианы времени запросов кандидата с индексом и без и медианный суммарный выигрыш по раундам.
+
+        Индекс должен быть создан, на выходе удалён. Выигрыш считается внутри раунда, где замеры
+        с индексом и без идут подряд: так он не зависит от того, как скорость машины плывёт между
+        раундами. Порядок замеров в раундах чередуется: CREATE INDEX прогревает страницы таблицы,
+        и сторона, которую всегда меряют первой, получала бы преимущество.
+        """
+        runs: Dict[bool, Dict[Query, List[float]]] = {
+            exists: {query: [] for query in useful[candidate]} for exists in (True, False)
+        }
+        gains = []
+        exists = True
+
+        def measure() -> float:
+            elapsed_total = 0.0
+            for query, elapsed in times_ms(useful[candidate]).items():
+                runs[exists][query].append(elapsed)
+                elapsed_total += elapsed
+            return elapsed_total
+
+        # Индекс переключается один раз за раунд, поэтому раунды идут "с, без", "без, с", ...
+        for _ in range(GATE_ROUNDS):
+            first = measure()
+            if exists:
+                conn.execute(f"DROP INDEX {candidate.name}")
+            else:
+                conn.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+            exists = not exists
+            second = measure()
+            total_with, total_without = (first, second) if not exists else (second, first)
+            gains.append(total_without / total_with - 1 if total_with else 0.0)
+        if exists:
+            conn.execute(f"DROP INDEX {candidate.name}")
+        return ({query: statistics.median(elapsed) for query, elapsed in runs[True].items()},
+                {query: statistics.median(elapsed) for query, elapsed in runs[False].items()},
+                statistics.median(gains))
+
+    by_candidate: Dict[Candidate, List[Query]] = {}
+    for query, plan in plans.items():
+        if plan_cost(plan) == 0:
+            continue
+        for candidate in candidates_for(query.sql, schema):
+            if not _is_covered(candidate, existing):
+                by_candidate.setdefault(candidate, []).append(query)
+
+    # Шаг 1: кандидат полезен, если хотя бы одному запросу даёт план дешевле
+    useful: Dict[Candidate, List[Query]] = {}
+    for candidate, candidate_queries in by_candidate.items():
+        conn.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+        improved = [query for query in candidate_queries
+                    if plan_cost(explain(conn, query.sql, values[query])) < plan_cost(plans[query])]
+        conn.execute(f"DROP INDEX {candidate.name}")
+        if improved:
+            useful[candidate] = improved
+
+    improved_queries = sorted({query for candidate in useful for query in useful[candidate]}, key=lambda q: q.source)
+    rows = [{'query': query, 'before_plan': plans[query], 'before_ms': timed(query)} for query in improved_queries]
+
+    # Отклонённые: время каждого запроса без индекса и с ним, суммарное время запросов индекса,
+    # медианный суммарный выигрыш и ускорил ли он хоть один запрос (тогда отклонён за недостаточный
+    # суммарный выигрыш)
+    rejected: Dict[Candidate, Tuple[Dict[Query, Tuple[float, float]], float, float, float, bool]] = {}
+
+    def passes(candidate: Candidate) -> bool:
+        """Решение по кандидату, индекс которого создан; отклонённый записывается в rejected и остаётся удалённым."""
+        with_index, without_index, net_gain = compare(candidate)
+        faster = [query for query in useful[candidate]
+                  if without_index[query] > with_index[query] * (1 + MIN_GAIN) + MIN_GAIN_MS]
+        total_without, total_with = sum(without_index.values()), sum(with_index.values())
+        if faster and net_gain >= MIN_NET_GAIN:
+            return True
+        per_query = {query: (without_index[query], with_index[query]) for query in useful[candidate]}
+        rejected[candidate] = (per_query, total_without, total_with, net_gain, bool(faster))
+        return False
+
+    # Шаг 2: каждого полезного кандидата меряем отдельно, без остальных: иначе пересекающиеся
+    # кандидаты заслоняют друг друга, и результат зависит от порядка проверки.
+    # Решение по каждому запросу отдельно: иначе тяжёлый запрос без условий заглушает выигрыш узкого
+    chosen = []
+    for candidate in sorted(useful, key=lambda candidate: candidate.name):
+        conn.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+        if passes(candidate):
+            chosen.append(candidate)
+
+    # Шаг 3: из прошедших убираем лишние (от широких к узким): индекс, без которого при остальных
+    # выбранных его запросы не медленнее, дублирует соседа. Проходы повторяются, пока что-то убирается
+    chosen.sort(key=lambda candidate: (-len(candidate.columns), candidate.name))
+    for candidate in chosen:
+        conn.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+    removed = True
+    while removed:
+        removed = False
+        for candidate in list(chosen):
+            if passes(candidate):
+                conn.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+            else:
+                chosen.remove(candidate)
+                removed = True
+    chosen.sort(key=lambda candidate: candidate.name)
+
+    for row in rows:
+        row['after_plan'] = explain(conn, row['query'].sql, values[row['query']])
+        row['after_ms'] = timed(row['query'])
+        row['verdict'] = 'chosen'
+    for candidate in chosen:
+        conn.execute(f"DROP INDEX {candidate.name}")
+    # Изменённые выбранными индексами запросы, дальше - те, что остались без индекса, с причиной
+    rows = [row for row in rows if row['after_plan'] != row['before_plan']]
+    reported = {row['query'] for row in rows}
+    with_candidates = {query for candidate_queries in by_candidate.values() for query in candidate_queries}
+    for query, plan in sorted(plans.items(), key=lambda item: item[0].source):
+        if query in reported:
+            continue
+        query_rejected = [(candidate, *rejected[candidate][0][query], *rejected[candidate][1:])
+                          for candidate in sorted(rejected, key=lambda c: c.name) if query in rejected[candidate][0]]
+        if query_rejected:
+            verdict = 'rejected'
+        elif not _flags(plan):
+            continue
+        elif query in with_candidates:
+            verdict = 'no_plan_gain'
+        else:
+            verdict = 'no_conditions'
+        rows.append({'query': query, 'before_plan': plan, 'before_ms': timed(query),
+                     'after_plan': None, 'after_ms': None, 'verdict': verdict, 'rejected': query_rejected})
+    return chosen, rows, skipped
+
+
+MIGRATION_TEMPLATE = '''# migrations/{filename}
+"""Составные и покрывающие индексы под запросы бота.
+
+Подобраны benchmarks/index_advisor.py ({created}, {users} пользователей):
+{summary}
+"""
+import re
+
+import aiosqlite
+
+from logger import get_logger
+logger = get_logger('database')
+
+INDEXES = [
+{indexes}
+]
+
+
+async def upgrade(conn: aiosqlite.Connection) -> None:
+    for index_name, index_def in INDEXES:
+        table, columns = re.match(r'(\\w+)\\((.*)\\)', index_def).groups()
+        cursor = await conn.execute(f"PRAGMA table_info({{table}})")
+        existing = {{row[1] for row in await cursor.fetchall()}}
+        missing = [column for column in columns.split(', ') if column not in existing]
+        if missing:
+            # Очень старые базы без части столбцов: индекс не создаётся
+            logger.warning(f"Индекс {{index_name}} пропущен: в {{table}} нет столбцов {{', '.join(missing)}}")
+            continue
+        await conn.execute(f'CREATE INDEX IF NOT EXISTS {{index_name}} ON {{index_def}}')
+'''
+
+
+def emit_migration(path: str, chosen: List[Candidate], rows: List[dict], users: int) -> None:
+    improved = [row for row in rows if row['after_ms'] is not None and row['before_ms'] is not None]
+    before = sum(row['before_ms'] for row in improved)
+    after = sum(row['after_ms'] for row in improved)
+    summary = f"{len(improved)} запросов, суммарно {before:.1f} мс -> {after:.1f} мс (медиана из {TIMING_RUNS} прогонов)."
+    content = MIGRATION_TEMPLATE.format(
+        filename=os.path.basename(path), created=datetime.now().strftime('%Y-%m-%d'), users=users, summary=summary,
+        indexes='\n'.join(f"    ('{candidate.name}', '{candidate.definition}')," for candidate in chosen)
+    )
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    print(f"Миграция записана: {path}", file=sys.stderr)
+
+
+def format_report(chosen: List[Candidate], rows: List[dict], skipped: List[Tuple[Query, str]],
+                  counts: Dict[str, int]) -> str:
+    lines = ["Данные: " + ', '.join(f"{table}={count}" for table, count in counts.items()), '']
+    for row in rows:
+        query = row['query']
+        lines.append(f"{query.source}: {query.sql[:140]}")
+        lines.append(f"    до:    {' | '.join(row['before_plan'])}")
+        if row['verdict'] == 'rejected':
+            for candidate, without_ms, with_ms, total_without, total_with, net_gain, had_gain in row['rejected']:
+                line = f"    отклонён по времени: {candidate.name} - без него {without_ms:.2f} мс, с ним {with_ms:.2f} мс"
+                if had_gain:
+                    line += (f", но все его запросы суммарно быстрее только на {net_gain:.0%} (нужно {MIN_NET_GAIN:.0%}): "
+                             f"{total_without:.2f} мс -> {total_with:.2f} мс")
+                else:
+                    line += f", ни один его запрос не быстрее на {MIN_GAIN:.0%} и {MIN_GAIN_MS} мс"
+                lines.append(line)
+        elif row['verdict'] == 'no_plan_gain':
+            lines.append("    индексы-кандидаты не улучшают план")
+        elif row['verdict'] == 'no_conditions':
+            lines.append("    индекс не поможет (нет селективных условий)")
+        else:
+            lines.append(f"    после: {' | '.join(row['after_plan'])}")
+            if row['before_ms'] is not None and row['after_ms'] is not None:
+                lines.append(f"    время: {row['before_ms']:.2f} мс -> {row['after_ms']:.2f} мс")
+    lines.append('')
+    lines.append(f"Рекомендуемые индексы ({len(chosen)}):")
+    lines.extend(f"    CREATE INDEX {candidate.name} ON {candidate.definition};" for candidate in chosen)
+    if skipped:
+        lines.append('')
+        lines.append(f"Не разобрано ({len(skipped)}): " + ', '.join(f"{query.source} ({error})" for query, error in skipped))
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000, help="пользователей в сгенерированной базе")
+    parser.add_argument('--schema-version', type=int, help="применить миграции только до этой версии")
+    parser.add_argument('--source', action='append', help="glob файлов с SQL (по умолчанию database.py, report.py, handlers/)")
+    parser.add_argument('--emit-migration', help="записать рекомендованные индексы как миграцию")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='index_advisor_'), 'users.db')
+    _prepare_database(path, args.schema_version)
+    queries = collect_queries(args.source or DEFAULT_SOURCES)
+    conn = sqlite3.connect(path)
+    try:
+        started = time.perf_counter()
+        counts = generate_dataset(conn, args.users)
+        print(f"Данные сгенерированы за {time.perf_counter() - started:.1f} с, запросов: {len(queries)}", file=sys.stderr)
+        chosen, rows, skipped = advise(conn, queries)
+    finally:
+        conn.close()
+    print(format_report(chosen, rows, skipped, counts))
+    if args.emit_migration and chosen:
+        emit_migration(args.emit_migration, chosen, rows, args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+# benchmarks/suite.py
+"""Набор микробенчмарков горячих функций с JSON-базой и проверкой регрессий.
+
+Запуск из корня проекта (нужны переменные окружения, как для бота):
+    python benchmarks/suite.py run [--output benchmarks/baselines/local.json] [-k escape]
+    python benchmarks/suite.py compare benchmarks/baselines/local.json [current.json] [--threshold 0.2]
+
+run замеряет все случаи и сохраняет результат в JSON. compare сравнивает базу
+с сохранённым или свежим прогоном и завершается с кодом 1, если хотя бы один
+случай стал медленнее базы больше чем на threshold. Функции database.py
+работают с временной SQLite-базой, Redis отключён, перевод промпта подменён
+заглушкой, INFO-логи на время замера выключены.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'local.json')
+
+# Синтетические пользователи для замеров CRUD
+SEED_USERS = 1000
+USER_ID_BASE = 9_000_000_000
+
+
+class StubTranslator:
+    """Заглушка GoogleTranslator: замеряется обработка промпта, а не сеть."""
+    def __init__(self, source: str = 'auto', target: str = 'en'):
+        pass
+
+    def translate(self, text: str) -> str:
+        return text
+
+
+class Case:
+    """Замеряемый вызов: sync - обычная функция, иначе фабрика корутины."""
+    def __init__(self, name: str, func: Callable[[], Any], is_async: bool = False):
+        self.name = name
+        self.func = func
+        self.is_async = is_async
+
+
+def _prepare_environment(workdir: str) -> None:
+    """До импорта модулей бота: временная база и без Redis."""
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['REDIS_URL'] = ''
+
+
+def _pure_cases() -> List[Case]:
+    import generation.images as images
+    import keyboards
+    from generation.videos import get_video_progress_message
+    from generation_config import build_negative_prompt, choose_quality_params, get_optimal_lora_config
+    from markdown_escape import escape_message_parts, safe_escape_markdown
+
+    images.GoogleTranslator = StubTranslator
+    style_key = next(iter(keyboards.NEW_MALE_AVATAR_STYLES))
+    prompt = "portrait of a man in a business suit, city street at golden hour, shallow depth of field"
+    ru_prompt = "портрет мужчины в деловом костюме на улице города"
+    broadcast_text = (
+        "🔥 Только сегодня! Скидка -30% на все пакеты.\n"
+        "Создайте аватар за 5 минут и получите 100+ фото в любом стиле: портрет, бизнес, #новинки.\n"
+    ) * 6
+    parts = ("👤 Имя: ", "Иван_Петров", "\nID: ", "123456789", "\nEmail: ", "ivan.petrov@example.com", "\n")
+    user_data = {'came_from_custom_prompt': False}
+    custom_data = {'came_from_custom_prompt': True}
+
+    return [
+        Case('build_negative_prompt', lambda: build_negative_prompt(prompt, 'with_avatar', style_key)),
+        Case('get_optimal_lora_config', lambda: get_optimal_lora_config(prompt, 'with_avatar', style_key)),
+        Case('choose_quality_params', lambda: choose_quality_params('with_avatar', '1:1', style_key)),
+        Case('process_prompt_async', lambda: images.process_prompt_async(
+            prompt, 'flux-trained', 'with_avatar', trigger_word='TOK', selected_gender='man', user_data=user_data
+        ), is_async=True),
+        Case('process_prompt_async_ru', lambda: images.process_prompt_async(
+            ru_prompt, 'flux-trained', 'with_avatar', trigger_word='TOK', user_input=ru_prompt, user_data=custom_data
+        ), is_async=True),
+        Case('safe_escape_markdown', lambda: safe_escape_markdown(broadcast_text)),
+        Case('escape_message_parts', lambda: escape_message_parts(*parts)),
+        Case('kb_main_menu', lambda: keyboards.create_main_menu_keyboard(0), is_async=True),
+        Case('kb_male_styles_page', lambda: keyboards.create_new_male_avatar_styles_keyboard(1), is_async=True),
+        Case('kb_aspect_ratio', lambda: keyboards.create_aspect_ratio_keyboard(), is_async=True),
+        Case('kb_subscription', lambda: keyboards.create_subscription_keyboard(), is_async=True),
+        Case('kb_admin_user_actions', lambda: keyboards.create_admin_user_actions_keyboard(USER_ID_BASE, False),
+             is_async=True),
+        Case('get_video_progress_message', lambda: get_video_progress_message(3, 'Kling', 'custom'), is_async=True),
+    ]
+
+
+async def _seed_database() -> None:
+    import aiosqlite
+    from config import DATABASE_PATH
+    from database import init_db
+
+    await init_db()
+    async with aiosqlite.connect(DATABASE_PATH) as conn:
+        await conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, username, first_name, generations_left, avatar_left) "
+            "VALUES (?, ?, ?, 1000000, 0)",
+            [(USER_ID_BASE + index, f"bench{index}", "Bench") for index in range(SEED_USERS)]
+        )
+        await conn.commit()
+
+
+def _database_cases() -> List[Case]:
+    import database
+
+    existing = itertools.cycle(range(USER_ID_BASE, USER_ID_BASE + SEED_USERS))
+    new_ids = itertools.count(USER_ID_BASE + SEED_USERS)
+    return [
+        Case('db_check_database_user', lambda: database.check_database_user(next(existing)), is_async=True),
+        Case('db_get_user_info', lambda: database.get_user_info(next(existing)), is_async=True),
+        Case('db_add_user_without_subscription',
+             lambda: database.add_user_without_subscription(next(new_ids), 'bench', 'Bench'), is_async=True),
+        Case('db_update_user_credits',
+             lambda: database.update_user_credits(next(existing), 'decrement_photo', 1), is_async=True),
+        Case('db_update_user_balance', lambda: database.update_user_balance(next(existing), 1, 0), is_async=True),
+        Case('db_log_generation',
+             lambda: database.log_generation(next(existing), 'with_avatar', 'black-forest-labs/flux-1.1-pro', 1),
+             is_async=True),
+        Case('db_get_user_trainedmodels', lambda: database.get_user_trainedmodels(next(existing)), is_async=True),
+        Case('db_is_user_blocked', lambda: database.is_user_blocked(next(existing)), is_async=True),
+    ]
+
+
+def _timer(case: Case, loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    """Функция: выполнить case number раз подряд и вернуть затраченное время."""
+    if not case.is_async:
+        def run_sync(number: int) -> float:
+            func = case.func
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            return time.perf_counter() - started
+        return run_sync
+
+    async def batch(number: int) -> float:
+        factory: Callable[[], Awaitable[Any]] = case.func
+        started = time.perf_counter()
+        for _ in range(number):
+            await factory()
+        return time.perf_counter() - started
+
+    return lambda number: loop.run_until_complete(batch(number))
+
+
+def measure(case: Case, loop: asyncio.AbstractEventLoop, repeat: int, min_time: float) -> Dict[str, Any]:
+    """Подбирает число вызовов на повтор (не короче min_time) и возвращает мкс на вызов."""
+    run = _timer(case, loop)
+    number = 1
+    while True:
+        elapsed = run(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    per_call = [run(number) / number * 1e6 for _ in range(repeat)]
+    return {
+        'min_us': round(min(per_call), 3),
+        'median_us': round(statistics.median(per_call), 3),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(pattern: Optional[str], repeat: int, min_time: float) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    _prepare_environment(workdir)
+    sys.path.insert(0, ROOT)
+    import handlers  # noqa: F401  (порядок импорта: database <-> handlers)
+    logging.disable(logging.INFO)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        cases = [case for case in _pure_cases() + _database_cases() if not pattern or pattern in case.name]
+        if any(case.name.startswith('db_') for case in cases):
+            loop.run_until_complete(_seed_database())
+        results = {}
+        for case in cases:
+            results[case.name] = measure(case, loop, repeat, min_time)
+            print(f"{case.name:<36}{results[case.name]['min_us']:>12.2f} мкс", file=sys.stderr)
+    finally:
+        loop.close()
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            min_delta_us: float, pattern: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """Строки отчёта и имена регрессий: min_us вырос больше чем на threshold и на min_delta_us."""
+    lines = [f"{'случай':<36}{'база, мкс':>12}{'сейчас, мкс':>14}{'изменение':>12}"]
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            lines.append(f"{name:<36}{'-':>12}{result['min_us']:>14.2f}{'новый':>12}")
+            continue
+        ratio = result['min_us'] / base['min_us'] if base['min_us'] else 1.0
+        regressed = ratio > 1 + threshold and result['min_us'] - base['min_us'] > min_delta_us
+        mark = ' ✗' if regressed else ''
+        lines.append(f"{name:<36}{base['min_us']:>12.2f}{result['min_us']:>14.2f}{(ratio - 1) * 100:>+11.1f}%{mark}")
+        if regressed:
+            regressions.append(name)
+    for name in sorted(baseline['results'].keys() - current['results'].keys()):
+        if pattern and pattern not in name:
+            continue
+        lines.append(f"{name:<36}{baseline['results'][name]['min_us']:>12.2f}{'-':>14}{'нет':>12}")
+    return lines, regressions
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены: {path}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="замерить и сохранить JSON")
+    run_parser.add_argument('--output', default=DEFAULT_BASELINE, help="куда сохранить результат")
+
+    compare_parser = sub.add_parser('compare', help="сравнить с базой, код 1 при регрессии")
+    compare_parser.add_argument('baseline', help="JSON базы")
+    compare_parser.add_argument('current', nargs='?', help="JSON для сравнения (по умолчанию - свежий прогон)")
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help="допустимое замедление, доля")
+    compare_parser.add_argument('--min-delta-us', type=float, default=0.5,
+                                help="разница меньше этого (мкс) - шум, не регрессия")
+    compare_parser.add_argument('--output', help="сохранить свежий прогон в JSON")
+
+    for sub_parser in (run_parser, compare_parser):
+        sub_parser.add_argument('-k', dest='pattern', help="только случаи, в имени которых есть подстрока")
+        sub_parser.add_argument('--repeat', type=int, default=5, help="повторов на случай")
+        sub_parser.add_argument('--min-time', type=float, default=0.2, help="минимальная длительность повтора, с")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        _save(args.output, run_suite(args.pattern, args.repeat, args.min_time))
+        return
+
+    baseline = _load(args.baseline)
+    if args.current:
+        current = _load(args.current)
+    else:
+        current = run_suite(args.pattern, args.repeat, args.min_time)
+        if args.output:
+            _save(args.output, current)
+    lines, regressions = compare(baseline, current, args.threshold, args.min_delta_us, args.pattern)
+    print('\n'.join(lines))
+    if regressions:
+        print(f"Регрессии (> {args.threshold:.0%}): {', '.join(regressions)}")
+        sys.exit(1)
+    print("Регрессий нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -22,14 +22,6 @@ class BotCounter:
         """Загружает настройки из БД."""
         try:
             async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS bot_counter_settings (
-                        key TEXT PRIMARY KEY,
-                        value TEXT
-                    )
-                """)
-                await db.commit()
-                
                 cursor = await db.execute(
                     "SELECT value FROM bot_counter_settings WHERE key = 'additional_users'"
                 )
@@ -44,13 +36,6 @@ class BotCounter:
         """Сохраняет настройки в БД."""
         try:
             async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS bot_counter_settings (
-                        key TEXT PRIMARY KEY,
-                        value TEXT
-                    )
-                """)
-                
                 await db.execute("""
                     INSERT OR REPLACE INTO bot_counter_settings (key, value)
                     VALUES ('additional_users', ?)
@@ -0,0 +1,37 @@
+# bot_identity.py
+"""Данные о самом боте (id, username), полученные один раз при старте.
+
+id бота - числовая часть токена (Bot.id), запрос к API для него не нужен.
+username берётся из get_me при старте и дальше отдаётся из памяти.
+"""
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import User
+
+from logger import get_logger
+logger = get_logger('main')
+
+_bot_user: Optional[User] = None
+
+
+async def load_bot_identity(bot: Bot) -> User:
+    """Запрашивает get_me и запоминает результат. Вызывается при старте бота."""
+    global _bot_user
+    _bot_user = await bot.get_me()
+    logger.info(f"Данные бота закэшированы: id={_bot_user.id}, username=@{_bot_user.username}")
+    return _bot_user
+
+
+async def get_bot_user(bot: Bot) -> User:
+    if _bot_user is None:
+        return await load_bot_identity(bot)
+    return _bot_user
+
+
+def get_bot_id(bot: Bot) -> int:
+    return bot.id
+
+
+async def get_bot_username(bot: Bot) -> str:
+    return (await get_bot_user(bot)).username or ""
@@ -34,12 +34,50 @@ MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 # === НАСТРОЙКИ ПРОИЗВОДИТЕЛЬНОСТИ ===
 CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '300'))
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'users.db')
+# Хранилище разовых задач планировщика (приветствия онбординга)
+SCHEDULER_DATABASE_PATH = os.getenv('SCHEDULER_DATABASE_PATH', 'scheduler_jobs.db')
+# Как часто основной инстанс перечитывает хранилище: задачи туда пишут и вспомогательные инстансы
+SCHEDULER_POLL_SECONDS = int(os.getenv('SCHEDULER_POLL_SECONDS', '30'))
 BACKUP_ENABLED = os.getenv('BACKUP_ENABLED', 'True').lower() == 'true'
 BACKUP_INTERVAL_HOURS = int(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
 
 # Webhook настройки
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'https://axidiphoto.ru/webhook')
 
+# === ПРИЁМ ОБНОВЛЕНИЙ TELEGRAM ===
+# polling - один процесс с long polling, webhook - приём через HTTP и пул воркеров
+TELEGRAM_UPDATES_MODE = os.getenv('TELEGRAM_UPDATES_MODE', 'polling').lower()
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram/webhook')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+TELEGRAM_WEBHOOK_HOST = os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0')
+TELEGRAM_WEBHOOK_PORT = int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8081'))
+# Только один инстанс регистрирует вебхук и запускает фоновые задачи (планировщик, Flask YooKassa)
+BOT_PRIMARY_INSTANCE = os.getenv('BOT_PRIMARY_INSTANCE', 'True').lower() == 'true'
+UPDATE_QUEUE_MAXSIZE = int(os.getenv('UPDATE_QUEUE_MAXSIZE', '1000'))
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '32'))
+UPDATE_DEDUP_TTL_SECONDS = int(os.getenv('UPDATE_DEDUP_TTL_SECONDS', '3600'))
+# Сколько живут брошенные состояния FSM в Redis (0 - без ограничения)
+FSM_STATE_TTL_SECONDS = int(os.getenv('FSM_STATE_TTL_SECONDS', str(3 * 24 * 3600)))
+
+# === ИСХОДЯЩИЕ СООБЩЕНИЯ TELEGRAM ===
+# Лимиты Bot API: ~30 сообщений в секунду на бота и ~1 в секунду на чат (с небольшим всплеском)
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+# Рассылкам достаётся не больше этой доли глобального лимита
+OUTBOUND_BROADCAST_SHARE = float(os.getenv('OUTBOUND_BROADCAST_SHARE', '0.6'))
+
+# === ТРАССИРОВКА ===
+# Апдейт дольше порога пишется в лог с разбивкой по спанам (БД, Redis, FSM, Replicate, Telegram)
+TRACE_SLOW_UPDATE_MS = float(os.getenv('TRACE_SLOW_UPDATE_MS', '2000'))
+# Порог для предупреждения о медленной функции database.py
+TRACE_SLOW_QUERY_MS = float(os.getenv('TRACE_SLOW_QUERY_MS', '500'))
+
+# === БАЛАНС ПОЛЬЗОВАТЕЛЕЙ ===
+# Резерв ресурсов под генерацию возвращается на баланс, если задача не подтвердила его за это время
+CREDIT_RESERVATION_TTL_SECONDS = int(os.getenv('CREDIT_RESERVATION_TTL_SECONDS', '1800'))
+
 # Ограничение на количество одновременных задач
 MAX_CONCURRENT_TASKS = 200
 MAX_CONCURRENT_GENERATIONS = 10
@@ -91,6 +129,13 @@ def validate_config():
         if not value:
             errors.append(f"Missing {description} ({var_name})")
 
+    # Вспомогательный инстанс только принимает вебхук; с polling два процесса забирали бы одни и те же обновления
+    if not BOT_PRIMARY_INSTANCE and TELEGRAM_UPDATES_MODE != 'webhook':
+        errors.append(
+            f"BOT_PRIMARY_INSTANCE=False работает только с TELEGRAM_UPDATES_MODE=webhook "
+            f"(текущее значение: '{TELEGRAM_UPDATES_MODE}')"
+        )
+
     if not REPLICATE_USERNAME_OR_ORG_NAME or REPLICATE_USERNAME_OR_ORG_NAME == 'your-replicate-username':
         warnings.append(
             f"REPLICATE_USERNAME_OR_ORG_NAME не установлен корректно (текущее значение: '{REPLICATE_USERNAME_OR_ORG_NAME}'). "
@@ -318,7 +363,7 @@ ERROR_MESSAGES = {
 
 # === ЭКСПОРТ КОНСТАНТ ===
 __all__ = [
-    'TOKEN', 'ADMIN_IDS', 'DATABASE_PATH', 'BOT_URL', 'WEBHOOK_URL',
+    'TOKEN', 'ADMIN_IDS', 'DATABASE_PATH', 'SCHEDULER_DATABASE_PATH', 'SCHEDULER_POLL_SECONDS', 'BOT_URL', 'WEBHOOK_URL',
     'YOOKASSA_SHOP_ID', 'YOOKASSA_SECRET_KEY', 'YOOKASSA_RETURN_URL', 'YOOKASSA_ENABLED',
     'REPLICATE_API_TOKEN', 'REPLICATE_USERNAME_OR_ORG_NAME',
     'TARIFFS', 'MAX_FILE_SIZE_BYTES', 'CACHE_TTL_SECONDS', 'BACKUP_ENABLED',
@@ -328,7 +373,13 @@ __all__ = [
     'TIMEZONE', 'ANTISPAM_MESSAGE_LIMIT', 'ANTISPAM_GENERATION_LIMIT',
     'ERROR_MESSAGES', 'STATS_UPDATE_INTERVAL', 'METRICS_RETENTION_DAYS',
     'METRICS_CONFIG', 'RATE_LIMIT_MAX_REQUESTS', 'RATE_LIMIT_WINDOW_MINUTES',
-    'MAX_CONCURRENT_TASKS', 'AWAITING_BROADCAST_MESSAGE', 'AWAITING_BROADCAST_CONFIRM',
+    'MAX_CONCURRENT_TASKS', 'TELEGRAM_UPDATES_MODE', 'TELEGRAM_WEBHOOK_URL',
+    'TELEGRAM_WEBHOOK_PATH', 'TELEGRAM_WEBHOOK_SECRET', 'TELEGRAM_WEBHOOK_HOST',
+    'TELEGRAM_WEBHOOK_PORT', 'BOT_PRIMARY_INSTANCE', 'UPDATE_QUEUE_MAXSIZE',
+    'UPDATE_WORKERS', 'UPDATE_DEDUP_TTL_SECONDS', 'FSM_STATE_TTL_SECONDS',
+    'OUTBOUND_GLOBAL_RATE', 'OUTBOUND_CHAT_RATE', 'OUTBOUND_CHAT_BURST', 'OUTBOUND_BROADCAST_SHARE',
+    'TRACE_SLOW_UPDATE_MS', 'TRACE_SLOW_QUERY_MS', 'CREDIT_RESERVATION_TTL_SECONDS',
+    'AWAITING_BROADCAST_MESSAGE', 'AWAITING_BROADCAST_CONFIRM',
     'AWAITING_PAYMENT_DATES', 'AWAITING_USER_SEARCH', 'AWAITING_BALANCE_CHANGE',
     'AWAITING_BROADCAST_SCHEDULE', 'AWAITING_ACTIVITY_DATES', 'AWAITING_ADMIN_PROMPT',
     'AWAITING_BLOCK_REASON', 'AWAITING_CONFIRM_QUALITY', 'AWAITING_STYLE_SELECTION',
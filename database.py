@@ -13,10 +13,12 @@ from decimal import Decimal
 from typing import List, Tuple, Optional, Dict, Any
 from functools import wraps
 import asyncio
-from config import REDIS, ADMIN_IDS, TARIFFS, CACHE_TTL_SECONDS, DATABASE_PATH, BACKUP_ENABLED, BACKUP_INTERVAL_HOURS
+from config import REDIS, ADMIN_IDS, TARIFFS, CACHE_TTL_SECONDS, DATABASE_PATH, BACKUP_ENABLED, BACKUP_INTERVAL_HOURS, CREDIT_RESERVATION_TTL_SECONDS
 from generation_config import REPLICATE_COSTS
 from handlers.utils import safe_escape_markdown, send_message_with_fallback
 from redis_caсhe import RedisUserCache, RedisActiveModelCache, RedisGenParamsCache
+from metrics import DB_QUERY_LATENCY, DB_QUERY_ERRORS, instrument_module_coroutines
+from migrations import apply_migrations
 
 
 from logger import get_logger
@@ -80,305 +82,47 @@ def retry_on_locked(max_attempts: int = 10, initial_delay: float = 0.5):
         return wrapper
     return decorator
 
-async def migrate_referral_stats_table(bot: Bot = None):
-    """Миграция таблицы referral_stats для добавления столбца total_reward_photos."""
-    try:
-        async with aiosqlite.connect(DATABASE_PATH, timeout=15) as conn:
-            await conn.execute("PRAGMA busy_timeout = 30000")
-            c = await conn.cursor()
+def to_epoch(value: Any) -> Optional[int]:
+    """Секунды эпохи в той же шкале, что и столбцы *_ts (миграция 004).
 
-            # Проверяем текущую схему таблицы
-            await c.execute("PRAGMA table_info(referral_stats)")
-            columns = {col[1]: {'notnull': col[3]} for col in await c.fetchall()}
-            logger.debug(f"Текущая схема referral_stats: {columns}")
-
-            if 'total_reward_photos' not in columns:
-                logger.info("Столбец total_reward_photos отсутствует, добавляем его")
-                try:
-                    await c.execute("ALTER TABLE referral_stats ADD COLUMN total_reward_photos INTEGER DEFAULT 0")
-                    await conn.commit()
-                    logger.info("Столбец total_reward_photos добавлен в таблицу referral_stats")
-                except Exception as e:
-                    logger.error(f"Ошибка при добавлении total_reward_photos: {e}", exc_info=True)
-                    await conn.rollback()
-                    raise
-            else:
-                logger.info("Столбец total_reward_photos уже существует, миграция не требуется")
+    Строки и наивные datetime берутся как время стены без сдвига часового
+    пояса - так же, как триггеры переводят TEXT-даты; aware datetime
+    приводится к UTC. Нераспознанное значение - None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace(' UTC', '').strip())
+        except ValueError:
+            return None
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+def from_epoch(ts: Optional[int]) -> Optional[datetime]:
+    """Наивный datetime из значения *_ts (обратное к to_epoch)."""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
 
-            # Проверяем наличие индексов
-            await c.execute("CREATE INDEX IF NOT EXISTS idx_referral_stats_user ON referral_stats(user_id)")
-            await conn.commit()
-            logger.info("Индексы для referral_stats созданы или подтверждены")
-
-    except Exception as e:
-        logger.error(f"Критическая ошибка миграции таблицы referral_stats: {e}", exc_info=True)
-        if bot:
-            for admin_id in ADMIN_IDS:
-                try:
-                    await send_message_with_fallback(
-                        bot, admin_id,
-                        safe_escape_markdown(f"🚨 Ошибка миграции таблицы referral_stats: {str(e)}", version=2),
-                        parse_mode=ParseMode.MARKDOWN_V2
-                    )
-                except Exception as e_notify:
-                    logger.error(f"Не удалось уведомить админа {admin_id}: {e_notify}")
-        raise
+def day_range(start_date: Any, end_date: Any = None) -> Tuple[int, int]:
+    """Полуинтервал [start_ts, end_ts) для дней start_date..end_date включительно."""
+    start_ts = to_epoch(start_date)
+    end_ts = to_epoch(end_date if end_date is not None else start_date)
+    if start_ts is None or end_ts is None:
+        raise ValueError(f"Некорректный период: {start_date} - {end_date}")
+    return start_ts - start_ts % 86400, end_ts - end_ts % 86400 + 86400
 
 async def init_db(bot: Bot = None) -> None:
-    """Инициализирует базу данных, создавая все необходимые таблицы с индексами и выполняя миграции."""
+    """Приводит схему базы к последней версии миграций (migrations/) и делает резервную копию."""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as conn:
-            await conn.execute('PRAGMA foreign_keys = ON')
-            c = await conn.cursor()
-
-            # Выполняем миграции таблиц
-            await migrate_referral_stats_table(bot)
-
-            # Таблица пользователей
-            await c.execute('''CREATE TABLE IF NOT EXISTS users (
-                                user_id INTEGER PRIMARY KEY,
-                                username TEXT,
-                                first_name TEXT,
-                                generations_left INTEGER DEFAULT 0,
-                                avatar_left INTEGER DEFAULT 0,
-                                has_trained_model INTEGER DEFAULT 0,
-                                is_notified INTEGER DEFAULT 0,
-                                first_purchase INTEGER DEFAULT 1,
-                                email TEXT,
-                                active_avatar_id INTEGER DEFAULT NULL,
-                                referrer_id INTEGER DEFAULT NULL,
-                                is_blocked INTEGER DEFAULT 0,
-                                block_reason TEXT DEFAULT NULL,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                welcome_message_sent INTEGER DEFAULT 0,
-                                last_reminder_type TEXT DEFAULT NULL,
-                                last_reminder_sent TEXT DEFAULT NULL,
-                                FOREIGN KEY (active_avatar_id) REFERENCES user_trainedmodels(avatar_id) ON DELETE SET NULL,
-                                FOREIGN KEY (referrer_id) REFERENCES users(user_id) ON DELETE SET NULL
-                             )''')
-
-            # Проверка наличия столбцов в users
-            await c.execute("PRAGMA table_info(users)")
-            columns = [col[1] for col in await c.fetchall()]
-            if 'welcome_message_sent' not in columns:
-                await c.execute("ALTER TABLE users ADD COLUMN welcome_message_sent INTEGER DEFAULT 0")
-                logger.info("Добавлен столбец welcome_message_sent в таблицу users")
-            if 'block_reason' not in columns:
-                await c.execute("ALTER TABLE users ADD COLUMN block_reason TEXT DEFAULT NULL")
-                logger.info("Добавлен столбец block_reason в таблицу users")
-            if 'last_reminder_type' not in columns:
-                await c.execute("ALTER TABLE users ADD COLUMN last_reminder_type TEXT DEFAULT NULL")
-                logger.info("Добавлен столбец last_reminder_type в таблицу users")
-            if 'last_reminder_sent' not in columns:
-                await c.execute("ALTER TABLE users ADD COLUMN last_reminder_sent TEXT DEFAULT NULL")
-                logger.info("Добавлен столбец last_reminder_sent в таблицу users")
-
-            # Таблица referrals
-            await c.execute('''CREATE TABLE IF NOT EXISTS referrals (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                referrer_id INTEGER NOT NULL,
-                                referred_id INTEGER NOT NULL UNIQUE,
-                                status TEXT DEFAULT 'pending',
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                completed_at TIMESTAMP DEFAULT NULL,
-                                FOREIGN KEY (referrer_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                                FOREIGN KEY (referred_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            # Миграция для добавления столбца completed_at, если он отсутствует
-            await c.execute("PRAGMA table_info(referrals)")
-            referral_columns = {col[1]: {'notnull': col[3]} for col in await c.fetchall()}
-            logger.debug(f"Текущая схема таблицы referrals: {referral_columns}")
-            if 'completed_at' not in referral_columns:
-                logger.info("Столбец completed_at отсутствует в таблице referrals, добавляем его")
-                try:
-                    await c.execute("ALTER TABLE referrals ADD COLUMN completed_at TIMESTAMP DEFAULT NULL")
-                    await conn.commit()
-                    logger.info("Столбец completed_at успешно добавлен в таблицу referrals")
-                except Exception as e:
-                    logger.error(f"Ошибка при добавлении столбца completed_at в таблицу referrals: {e}", exc_info=True)
-                    await conn.rollback()
-                    raise
-
-            # Остальные таблицы (без изменений)
-            await c.execute('''CREATE TABLE IF NOT EXISTS referral_rewards (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                referrer_id INTEGER NOT NULL,
-                                referred_user_id INTEGER NOT NULL,
-                                reward_photos INTEGER NOT NULL,
-                                created_at TEXT NOT NULL,
-                                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                                FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS referral_stats (
-                                user_id INTEGER PRIMARY KEY,
-                                total_referrals INTEGER DEFAULT 0,
-                                total_reward_photos INTEGER DEFAULT 0,
-                                updated_at TEXT,
-                                FOREIGN KEY (user_id) REFERENCES users (user_id)
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS user_trainedmodels (
-                                avatar_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER,
-                                model_id TEXT,
-                                model_version TEXT,
-                                status TEXT,
-                                prediction_id TEXT UNIQUE,
-                                trigger_word TEXT,
-                                photo_paths TEXT,
-                                training_step TEXT,
-                                avatar_name TEXT,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS user_ratings (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER,
-                                generation_type TEXT,
-                                model_key TEXT,
-                                rating INTEGER,
-                                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS video_tasks (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER,
-                                video_path TEXT,
-                                status TEXT DEFAULT 'pending',
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                prediction_id TEXT UNIQUE,
-                                model_key TEXT,
-                                style_name TEXT,
-                                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            # Проверка наличия столбца style_name
-            await c.execute("PRAGMA table_info(video_tasks)")
-            columns = [col[1] for col in await c.fetchall()]
-            if 'style_name' not in columns:
-                await c.execute("ALTER TABLE video_tasks ADD COLUMN style_name TEXT")
-                logger.info("Добавлен столбец style_name в таблицу video_tasks")
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS payments (
-                                payment_id TEXT PRIMARY KEY,
-                                user_id INTEGER,
-                                plan TEXT,
-                                amount REAL,
-                                status TEXT DEFAULT 'pending',
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS generation_log (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER,
-                                generation_type TEXT,
-                                replicate_model_id TEXT,
-                                units_generated INTEGER,
-                                cost_per_unit REAL,
-                                total_cost REAL,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS user_actions (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER,
-                                action TEXT,
-                                details TEXT,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                scheduled_time TEXT NOT NULL,
-                                broadcast_data TEXT NOT NULL,
-                                status TEXT DEFAULT 'pending',
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS broadcast_buttons (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                broadcast_id INTEGER NOT NULL,
-                                button_text TEXT NOT NULL,
-                                callback_data TEXT NOT NULL,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                FOREIGN KEY (broadcast_id) REFERENCES scheduled_broadcasts(id) ON DELETE CASCADE
-                             )''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS fixes (
-                                fix_name TEXT PRIMARY KEY,
-                                applied INTEGER DEFAULT 0,
-                                applied_at TIMESTAMP
-                             )''')
-
-            # Индексы
-            indices = [
-                ('idx_users_active_avatar', 'users(active_avatar_id)'),
-                ('idx_users_referrer', 'users(referrer_id)'),
-                ('idx_users_blocked', 'users(is_blocked)'),
-                ('idx_trainedmodels_user', 'user_trainedmodels(user_id)'),
-                ('idx_trainedmodels_status', 'user_trainedmodels(status)'),
-                ('idx_trainedmodels_prediction', 'user_trainedmodels(prediction_id)'),
-                ('idx_payments_user', 'payments(user_id)'),
-                ('idx_payments_created', 'payments(created_at)'),
-                ('idx_generation_log_user', 'generation_log(user_id)'),
-                ('idx_generation_log_created', 'generation_log(created_at)'),
-                ('idx_generation_log_type', 'generation_log(generation_type)'),
-                ('idx_video_tasks_user', 'video_tasks(user_id)'),
-                ('idx_video_tasks_status', 'video_tasks(status)'),
-                ('idx_referrals_referrer', 'referrals(referrer_id)'),
-                ('idx_referrals_referred', 'referrals(referred_id)'),
-                ('idx_referrals_status', 'referrals(status)'),
-                ('idx_user_actions_user', 'user_actions(user_id)'),
-                ('idx_user_actions_action', 'user_actions(action)'),
-                ('idx_user_actions_created', 'user_actions(created_at)'),
-                ('idx_scheduled_broadcasts_schedule', 'scheduled_broadcasts(scheduled_time)'),
-                ('idx_referral_rewards_referrer', 'referral_rewards(referrer_id)'),
-                ('idx_referral_rewards_referred', 'referral_rewards(referred_user_id)'),
-                ('idx_referral_stats_user', 'referral_stats(user_id)'),
-                ('idx_broadcast_buttons_broadcast', 'broadcast_buttons(broadcast_id)')
-            ]
-
-            for index_name, index_def in indices:
-                await c.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_def}')
-
-            # Триггеры
-            await c.execute('''CREATE TRIGGER IF NOT EXISTS update_users_updated_at
-                              AFTER UPDATE ON users
-                              FOR EACH ROW
-                              BEGIN
-                                  UPDATE users
-                                  SET updated_at = CURRENT_TIMESTAMP
-                                  WHERE user_id = NEW.user_id;
-                              END;''')
-
-            await c.execute('''CREATE TRIGGER IF NOT EXISTS update_trainedmodels_updated_at
-                              AFTER UPDATE ON user_trainedmodels
-                              FOR EACH ROW
-                              BEGIN
-                                  UPDATE user_trainedmodels
-                                  SET updated_at = CURRENT_TIMESTAMP
-                                  WHERE avatar_id = NEW.avatar_id;
-                              END;''')
-
-            await c.execute('''CREATE TABLE IF NOT EXISTS bot_config (
-                                key TEXT PRIMARY KEY,
-                                value TEXT,
-                                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                             )''')
-            await c.execute('''CREATE INDEX IF NOT EXISTS idx_bot_config_key ON bot_config(key)''')
-
-            await conn.commit()
-            logger.info("База данных успешно инициализирована с индексами, триггерами и миграцией referrals")
-            await backup_database()
+        applied = await apply_migrations(DATABASE_PATH)
+        if applied:
+            logger.info(f"База данных обновлена, применены миграции: {applied}")
+        await backup_database()
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {e}", exc_info=True)
         if bot:
@@ -598,12 +342,12 @@ async def get_users_for_welcome_message() -> List[Dict[str, Any]]:
                 FROM users
                 WHERE welcome_message_sent = 0
                 AND first_purchase = 1
-                AND created_at <= datetime('now', '-1 hour')
+                AND created_ts <= ?
                 AND is_blocked = 0
                 AND user_id NOT IN (
                     SELECT user_id FROM payments WHERE status = 'succeeded'
                 )
-            """)
+            """, (to_epoch(datetime.now(timezone.utc)) - 3600,))
 
             users = await c.fetchall()
             return [
@@ -629,13 +373,13 @@ async def get_users_for_reminders() -> List[Dict[str, Any]]:
 
             # Получаем пользователей без покупок для напоминаний
             await c.execute("""
-                SELECT user_id, first_name, username, created_at, last_reminder_type
+                SELECT user_id, first_name, username, created_at, created_ts, last_reminder_type
                 FROM users
                 WHERE is_blocked = 0
                 AND user_id NOT IN (
                     SELECT user_id FROM payments WHERE status = 'succeeded'
                 )
-                AND created_at IS NOT NULL
+                AND created_ts IS NOT NULL
             """)
 
             users = await c.fetchall()
@@ -645,6 +389,7 @@ async def get_users_for_reminders() -> List[Dict[str, Any]]:
                     'first_name': row['first_name'],
                     'username': row['username'],
                     'created_at': row['created_at'],
+                    'created_ts': row['created_ts'],
                     'last_reminder_type': row['last_reminder_type']
                 }
                 for row in users
@@ -680,6 +425,32 @@ async def mark_welcome_message_sent(user_id: int) -> bool:
         logger.error(f"Ошибка отметки отправки приветственного сообщения для user_id={user_id}: {e}", exc_info=True)
         return False
 
+async def get_bot_config_value(key: str) -> Optional[str]:
+    """Возвращает значение из bot_config или None, если ключа нет."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            c = await conn.cursor()
+            await c.execute("SELECT value FROM bot_config WHERE key = ?", (key,))
+            row = await c.fetchone()
+            return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Ошибка чтения bot_config key={key}: {e}", exc_info=True)
+        return None
+
+async def set_bot_config_value(key: str, value: str) -> bool:
+    """Сохраняет значение в bot_config."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO bot_config (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                (key, value)
+            )
+            await conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка записи bot_config key={key}: {e}", exc_info=True)
+        return False
+
 async def add_user_resources(user_id: int, photos: int, avatars: int) -> bool:
     """Добавляет ресурсы пользователю (фото и аватары)"""
     try:
@@ -742,18 +513,6 @@ async def add_payment_log(user_id: int, payment_id: str, amount: float, payment_
         async with aiosqlite.connect(DATABASE_PATH) as conn:
             c = await conn.cursor()
 
-            await c.execute("""
-                CREATE TABLE IF NOT EXISTS payment_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    payment_id TEXT NOT NULL UNIQUE,
-                    amount REAL NOT NULL,
-                    payment_info TEXT,
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-
             current_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
             payment_info_json = json.dumps(payment_info, ensure_ascii=False)
 
@@ -781,17 +540,6 @@ async def update_user_payment_stats(user_id: int, payment_amount: float) -> bool
         async with aiosqlite.connect(DATABASE_PATH) as conn:
             c = await conn.cursor()
 
-            await c.execute("""
-                CREATE TABLE IF NOT EXISTS user_payment_stats (
-                    user_id INTEGER PRIMARY KEY,
-                    total_payments INTEGER DEFAULT 0,
-                    total_amount REAL DEFAULT 0.0,
-                    first_payment_date TEXT,
-                    last_payment_date TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-
             current_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
 
             await c.execute("""
@@ -884,6 +632,18 @@ async def get_referrer_info(user_id: int) -> Optional[Dict[str, Any]]:
         logger.error(f"Ошибка получения информации о реферере для user_id={user_id}: {e}", exc_info=True)
         return None
 
+async def get_referral_count(referrer_id: int) -> int:
+    """Число приглашённых пользователем: одна строка referral_counts по первичному ключу."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            c = await conn.cursor()
+            await c.execute("SELECT referral_count FROM referral_counts WHERE referrer_id = ?", (referrer_id,))
+            row = await c.fetchone()
+            return row[0] if row else 0
+    except Exception as e:
+        logger.error(f"Ошибка получения числа рефералов для referrer_id={referrer_id}: {e}", exc_info=True)
+        return 0
+
 @retry_on_locked(max_attempts=10, initial_delay=0.5)
 @invalidate_cache()
 async def add_referral_reward(referrer_id: int, referred_user_id: int, reward_amount: float) -> bool:
@@ -893,22 +653,6 @@ async def add_referral_reward(referrer_id: int, referred_user_id: int, reward_am
             await conn.execute("PRAGMA busy_timeout = 30000")
             c = await conn.cursor()
 
-            await c.execute('''CREATE TABLE IF NOT EXISTS referral_rewards (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                referrer_id INTEGER NOT NULL,
-                                referred_user_id INTEGER NOT NULL,
-                                reward_photos INTEGER NOT NULL,
-                                created_at TEXT NOT NULL,
-                                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                                FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
-                             )''')
-
-            await c.execute("PRAGMA table_info(referral_rewards)")
-            columns = [col[1] for col in await c.fetchall()]
-            if 'reward_photos' not in columns:
-                await c.execute("ALTER TABLE referral_rewards ADD COLUMN reward_photos INTEGER NOT NULL DEFAULT 0")
-                logger.info("Добавлен столбец reward_photos в таблицу referral_rewards")
-
             current_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
 
             await c.execute("SELECT id FROM referrals WHERE referrer_id = ? AND referred_id = ?", (referrer_id, referred_user_id))
@@ -924,14 +668,6 @@ async def add_referral_reward(referrer_id: int, referred_user_id: int, reward_am
                               VALUES (?, ?, ?, ?)''',
                            (referrer_id, referred_user_id, int(reward_amount), current_timestamp))
 
-            await c.execute('''CREATE TABLE IF NOT EXISTS referral_stats (
-                                user_id INTEGER PRIMARY KEY,
-                                total_referrals INTEGER DEFAULT 0,
-                                total_reward_photos INTEGER DEFAULT 0,
-                                updated_at TEXT,
-                                FOREIGN KEY (user_id) REFERENCES users (user_id)
-                             )''')
-
             await c.execute('''INSERT OR REPLACE INTO referral_stats (user_id, total_referrals, total_reward_photos, updated_at)
                               VALUES (
                                   ?,
@@ -1206,55 +942,167 @@ async def check_database_user(user_id: int) -> Tuple[int, int, int, Optional[str
         await user_cache.set(user_id, data)
         return data
 
+# Столбец баланса в users для каждого вида ресурса
+_CREDIT_COLUMNS = {'photo': 'generations_left', 'avatar': 'avatar_left'}
+
+# Действия update_user_credits, меняющие баланс: (ресурс, знак)
+_CREDIT_ACTIONS = {
+    'decrement_photo': ('photo', -1),
+    'increment_photo': ('photo', 1),
+    'decrement_avatar': ('avatar', -1),
+    'increment_avatar': ('avatar', 1),
+}
+
+async def _change_credits(c: aiosqlite.Cursor, user_id: int, resource: str, delta: int,
+                          reason: str, ref: Optional[str] = None) -> Optional[int]:
+    """Меняет баланс одним UPDATE и пишет строку в credit_ledger в текущей транзакции.
+
+    Списание проверяет остаток в том же UPDATE (WHERE ... >= ?), поэтому
+    параллельные генерации не уводят баланс в минус. Возвращает остаток после
+    изменения или None, если пользователя нет или ресурсов не хватает.
+    """
+    column = _CREDIT_COLUMNS[resource]
+    await c.execute(f'''UPDATE users
+                        SET {column} = {column} + ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE user_id = ? AND (? >= 0 OR {column} >= ?)
+                        RETURNING {column}''',
+                    (delta, user_id, delta, -delta))
+    row = await c.fetchone()
+    if row is None:
+        return None
+    if delta:
+        await c.execute('''INSERT INTO credit_ledger (user_id, resource, delta, balance_after, reason, ref)
+                          VALUES (?, ?, ?, ?, ?, ?)''',
+                        (user_id, resource, delta, row[0], reason, ref))
+    return row[0]
+
 @invalidate_cache()
-async def update_user_credits(user_id: int, action: str, amount: int = 1, email: Optional[str] = None) -> bool:
-    """Обновляет ресурсы пользователя"""
+async def reserve_credits(user_id: int, amount: int, job_id: str, resource: str = 'photo',
+                          ttl_seconds: int = CREDIT_RESERVATION_TTL_SECONDS) -> bool:
+    """Списывает ресурсы под задачу job_id.
+
+    Задача подтверждает резерв через commit_credit_reservation после успеха или
+    возвращает через release_credit_reservation; неподтверждённый резерв
+    возвращает release_expired_credit_reservations по истечении ttl_seconds.
+    """
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as conn:
+        async with aiosqlite.connect(DATABASE_PATH, timeout=15) as conn:
+            await conn.execute("PRAGMA busy_timeout = 30000")
             c = await conn.cursor()
+            balance = await _change_credits(c, user_id, resource, -amount, 'reserve', job_id)
+            if balance is None:
+                await conn.rollback()
+                logger.warning(f"Недостаточно ресурсов ({resource}) для резерва {job_id} у user_id={user_id}: нужно {amount}")
+                return False
+            await c.execute('''INSERT INTO credit_reservations (job_id, user_id, resource, amount, expires_ts)
+                              VALUES (?, ?, ?, ?, ?)''',
+                            (job_id, user_id, resource, amount, int(time.time()) + ttl_seconds))
+            await conn.commit()
+            logger.info(f"Резерв {job_id}: user_id={user_id}, {resource}={amount}, остаток {balance}")
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка резервирования ресурсов {job_id} для user_id={user_id}: {e}", exc_info=True)
+        return False
 
-            await c.execute("SELECT generations_left, avatar_left FROM users WHERE user_id = ?", (user_id,))
-            current_resources = await c.fetchone()
-
-            if not current_resources:
-                logger.warning(f"Попытка обновить ресурсы для несуществующего user_id={user_id}")
+async def commit_credit_reservation(job_id: str) -> bool:
+    """Подтверждает резерв: ресурсы остаются списанными. False, если резерв уже закрыт."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH, timeout=15) as conn:
+            await conn.execute("PRAGMA busy_timeout = 30000")
+            c = await conn.cursor()
+            await c.execute('''UPDATE credit_reservations
+                              SET status = 'committed', settled_at = CURRENT_TIMESTAMP
+                              WHERE job_id = ? AND status = 'held'
+                              RETURNING user_id''', (job_id,))
+            row = await c.fetchone()
+            await conn.commit()
+            if row is None:
+                logger.warning(f"Резерв {job_id} не найден или уже закрыт")
                 return False
+            logger.debug(f"Резерв {job_id} подтверждён для user_id={row[0]}")
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка подтверждения резерва {job_id}: {e}", exc_info=True)
+        return False
 
-            generations_left, avatar_left = current_resources
+async def _release_reservation(c: aiosqlite.Cursor, job_id: str, reason: str) -> Optional[int]:
+    """Возвращает ресурсы открытого резерва на баланс; user_id или None, если резерв уже закрыт."""
+    await c.execute('''UPDATE credit_reservations
+                      SET status = 'released', settled_at = CURRENT_TIMESTAMP
+                      WHERE job_id = ? AND status = 'held'
+                      RETURNING user_id, resource, amount''', (job_id,))
+    row = await c.fetchone()
+    if row is None:
+        return None
+    user_id, resource, amount = row
+    await _change_credits(c, user_id, resource, amount, reason, job_id)
+    return user_id
 
-            if action == "decrement_photo":
-                if generations_left >= amount:
-                    await c.execute('''UPDATE users
-                                      SET generations_left = generations_left - ?, updated_at = CURRENT_TIMESTAMP
-                                      WHERE user_id = ?''',
-                                    (amount, user_id))
-                else:
-                    logger.warning(f"Недостаточно фото для списания у user_id={user_id}: есть {generations_left}, нужно {amount}")
-                    return False
+async def release_credit_reservation(job_id: str, reason: str = 'release') -> bool:
+    """Возвращает зарезервированные ресурсы. Для уже подтверждённого резерва ничего не делает."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH, timeout=15) as conn:
+            await conn.execute("PRAGMA busy_timeout = 30000")
+            c = await conn.cursor()
+            user_id = await _release_reservation(c, job_id, reason)
+            await conn.commit()
+        if user_id is None:
+            return False
+        await user_cache.delete(user_id)
+        logger.info(f"Резерв {job_id} возвращён user_id={user_id} ({reason})")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка возврата резерва {job_id}: {e}", exc_info=True)
+        return False
 
-            elif action == "increment_photo":
-                await c.execute('''UPDATE users
-                                  SET generations_left = generations_left + ?, updated_at = CURRENT_TIMESTAMP
-                                  WHERE user_id = ?''',
-                                (amount, user_id))
+async def release_expired_credit_reservations() -> int:
+    """Возвращает резервы, которые задачи не подтвердили вовремя (упавший процесс, зависшая задача)."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH, timeout=15) as conn:
+            await conn.execute("PRAGMA busy_timeout = 30000")
+            c = await conn.cursor()
+            await c.execute("SELECT job_id FROM credit_reservations WHERE status = 'held' AND expires_ts < ?",
+                            (int(time.time()),))
+            job_ids = [row[0] for row in await c.fetchall()]
+            released = []
+            for job_id in job_ids:
+                user_id = await _release_reservation(c, job_id, 'expired')
+                if user_id is not None:
+                    released.append(user_id)
+            await conn.commit()
+        for user_id in set(released):
+            await user_cache.delete(user_id)
+        if released:
+            logger.warning(f"Возвращено {len(released)} просроченных резервов: {job_ids}")
+        return len(released)
+    except Exception as e:
+        logger.error(f"Ошибка возврата просроченных резервов: {e}", exc_info=True)
+        return 0
 
-            elif action == "decrement_avatar":
-                if avatar_left >= amount:
-                    await c.execute('''UPDATE users
-                                      SET avatar_left = avatar_left - ?, updated_at = CURRENT_TIMESTAMP
-                                      WHERE user_id = ?''',
-                                    (amount, user_id))
-                else:
-                    logger.warning(f"Недостаточно аватаров для списания у user_id={user_id}: есть {avatar_left}, нужно {amount}")
+@invalidate_cache()
+async def update_user_credits(user_id: int, action: str, amount: int = 1, email: Optional[str] = None) -> bool:
+    """Обновляет ресурсы пользователя"""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            c = await conn.cursor()
+
+            if action in _CREDIT_ACTIONS:
+                resource, sign = _CREDIT_ACTIONS[action]
+                balance = await _change_credits(c, user_id, resource, sign * amount, action)
+                if balance is None:
+                    logger.warning(f"Не удалось выполнить {action} на {amount} для user_id={user_id}: "
+                                   f"пользователь не найден или ресурсов недостаточно")
                     return False
+                await conn.commit()
+                logger.info(f"Ресурсы обновлены для user_id={user_id}, action={action}, amount={amount}, остаток={balance}")
+                return True
 
-            elif action == "increment_avatar":
-                await c.execute('''UPDATE users
-                                  SET avatar_left = avatar_left + ?, updated_at = CURRENT_TIMESTAMP
-                                  WHERE user_id = ?''',
-                                (amount, user_id))
+            await c.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
+            if not await c.fetchone():
+                logger.warning(f"Попытка обновить ресурсы для несуществующего user_id={user_id}")
+                return False
 
-            elif action == "set_trained_model":
+            if action == "set_trained_model":
                 await c.execute('''UPDATE users
                                   SET has_trained_model = ?, updated_at = CURRENT_TIMESTAMP
                                   WHERE user_id = ?''',
@@ -1313,31 +1161,15 @@ async def update_user_balance(user_id: int, photos: int, avatars: int, operation
         async with aiosqlite.connect(DATABASE_PATH) as conn:
             c = await conn.cursor()
 
-            await c.execute("SELECT generations_left, avatar_left FROM users WHERE user_id = ?", (user_id,))
-            current_resources = await c.fetchone()
-
-            if not current_resources:
-                logger.warning(f"Попытка обновить баланс для несуществующего user_id={user_id}")
+            sign = 1 if operation == 'add' else -1
+            new_photos = await _change_credits(c, user_id, 'photo', sign * photos, f'admin_{operation}')
+            new_avatars = await _change_credits(c, user_id, 'avatar', sign * avatars, f'admin_{operation}')
+            if new_photos is None or new_avatars is None:
+                await conn.rollback()
+                logger.warning(f"Не удалось изменить баланс user_id={user_id} (фото={photos}, аватары={avatars}, "
+                               f"операция={operation}): пользователь не найден или ресурсов недостаточно")
                 return False
 
-            generations_left, avatar_left = current_resources
-
-            if operation == 'add':
-                new_photos = generations_left + photos
-                new_avatars = avatar_left + avatars
-            else:  # subtract
-                new_photos = max(0, generations_left - photos)
-                new_avatars = max(0, avatar_left - avatars)
-                if photos > generations_left or avatars > avatar_left:
-                    logger.warning(f"Недостаточно ресурсов для списания у user_id={user_id}: "
-                                   f"фото={generations_left}/{photos}, аватары={avatar_left}/{avatars}")
-                    return False
-
-            await c.execute('''UPDATE users
-                              SET generations_left = ?, avatar_left = ?, updated_at = CURRENT_TIMESTAMP
-                              WHERE user_id = ?''',
-                            (new_photos, new_avatars, user_id))
-
             await conn.commit()
             logger.info(f"Баланс обновлен для user_id={user_id}: "
                         f"фото={new_photos}, аватары={new_avatars}, операция={operation}")
@@ -1354,29 +1186,29 @@ async def get_user_activity_metrics(start_date: str, end_date: str) -> List[Tupl
             conn.row_factory = aiosqlite.Row
             c = await conn.cursor()
 
+            start_ts, end_ts = day_range(start_date, end_date)
             await c.execute('''SELECT
                                  u.user_id,
                                  u.username,
                                  (SELECT COUNT(*) FROM user_actions ua WHERE ua.user_id = u.user_id
                                   AND ua.action = 'send_message'
-                                  AND ua.created_at BETWEEN ? AND ?) as messages_count,
+                                  AND ua.created_ts >= ? AND ua.created_ts < ?) as messages_count,
                                  (SELECT SUM(units_generated) FROM generation_log gl
                                   WHERE gl.user_id = u.user_id AND gl.generation_type = 'with_avatar'
-                                  AND gl.created_at BETWEEN ? AND ?) as photo_generations,
+                                  AND gl.created_ts >= ? AND gl.created_ts < ?) as photo_generations,
                                  (SELECT SUM(units_generated) FROM generation_log gl
                                   WHERE gl.user_id = u.user_id AND gl.generation_type = 'ai_video_v2_1'
-                                  AND gl.created_at BETWEEN ? AND ?) as video_generations,
+                                  AND gl.created_ts >= ? AND gl.created_ts < ?) as video_generations,
                                  (SELECT COUNT(*) FROM payments p WHERE p.user_id = u.user_id
-                                  AND p.status = 'succeeded' AND p.created_at BETWEEN ? AND ?) as purchases_count
+                                  AND p.status = 'succeeded' AND p.created_ts >= ? AND p.created_ts < ?) as purchases_count
                               FROM users u
-                              WHERE EXISTS (
-                                  SELECT 1 FROM user_actions ua WHERE ua.user_id = u.user_id
-                                  AND ua.created_at BETWEEN ? AND ?
+                              WHERE u.user_id IN (
+                                  SELECT user_id FROM user_actions
+                                  WHERE created_ts >= ? AND created_ts < ?
                               )
                               ORDER BY messages_count DESC, photo_generations DESC
                               LIMIT 100''',
-                           (start_date, end_date, start_date, end_date, start_date, end_date,
-                            start_date, end_date, start_date, end_date))
+                           (start_ts, end_ts) * 5)
 
             results = await c.fetchall()
             return [
@@ -1451,21 +1283,37 @@ async def get_scheduled_broadcasts(bot: Bot = None) -> List[Dict]:
             conn.row_factory = aiosqlite.Row
             c = await conn.cursor()
             msk_tz = pytz.timezone('Europe/Moscow')
-            current_time = (datetime.now(msk_tz) + timedelta(seconds=30)).strftime('%Y-%m-%d %H:%M:%S')
-            logger.debug(f"Fetching broadcasts with scheduled_time <= {current_time} (MSK)")
-
-            await c.execute('SELECT id, scheduled_time, status, broadcast_data FROM scheduled_broadcasts')
-            all_rows = await c.fetchall()
-            logger.debug(f"Все записи в scheduled_broadcasts: {[dict(row) for row in all_rows]}")
+            # scheduled_time хранится по МСК без пояса, scheduled_ts - в той же шкале
+            minute_start = to_epoch(datetime.now(msk_tz).replace(tzinfo=None))
+            minute_start -= minute_start % 60
+            current_time = from_epoch(minute_start + 60).strftime('%Y-%m-%d %H:%M:%S')
+            logger.debug(f"Fetching broadcasts with scheduled_time < {current_time} (MSK)")
 
             await c.execute('''
-                SELECT id, scheduled_time, broadcast_data, status
+                SELECT id, scheduled_time, scheduled_ts, broadcast_data, status
                 FROM scheduled_broadcasts
-                WHERE status = 'pending' AND scheduled_time <= ?
-                ORDER BY scheduled_time ASC
-            ''', (current_time,))
+                WHERE status = 'pending' AND scheduled_ts < ?
+                ORDER BY scheduled_ts ASC
+            ''', (minute_start + 60,))
             rows = await c.fetchall()
 
+            await c.execute('''
+                SELECT id, scheduled_time FROM scheduled_broadcasts
+                WHERE status = 'pending' AND scheduled_ts IS NULL
+            ''')
+            for row in await c.fetchall():
+                logger.warning(f"Некорректный формат scheduled_time для ID {row['id']}: {row['scheduled_time']}")
+                if bot:
+                    for admin_id in ADMIN_IDS:
+                        try:
+                            await send_message_with_fallback(
+                                bot, admin_id,
+                                safe_escape_markdown(f"🚨 Некорректный формат scheduled_time для рассылки ID {row['id']}: {row['scheduled_time']}", version=2),
+                                parse_mode=ParseMode.MARKDOWN_V2
+                            )
+                        except Exception as e_notify:
+                            logger.error(f"Не удалось уведомить админа {admin_id}: {e_notify}")
+
             broadcasts = []
             skipped_broadcasts = []
             for row in rows:
@@ -1474,26 +1322,9 @@ async def get_scheduled_broadcasts(bot: Bot = None) -> List[Dict]:
                         logger.error(f"Некорректный ID рассылки: {row['id']}")
                         continue
 
-                    try:
-                        scheduled_dt = datetime.strptime(row['scheduled_time'], '%Y-%m-%d %H:%M:%S')
-                        scheduled_dt = msk_tz.localize(scheduled_dt)
-                        current_dt = datetime.now(msk_tz)
-                        if not (current_dt.replace(second=0, microsecond=0) <= scheduled_dt < (current_dt + timedelta(minutes=1)).replace(second=0, microsecond=0)):
-                            logger.debug(f"Рассылка ID {row['id']} пропущена: scheduled_time {row['scheduled_time']} вне текущей минуты")
-                            skipped_broadcasts.append((row['id'], row['scheduled_time']))
-                            continue
-                    except ValueError as e:
-                        logger.warning(f"Некорректный формат scheduled_time для ID {row['id']}: {row['scheduled_time']}")
-                        if bot:
-                            for admin_id in ADMIN_IDS:
-                                try:
-                                    await send_message_with_fallback(
-                                        bot, admin_id,
-                                        safe_escape_markdown(f"🚨 Некорректный формат scheduled_time для рассылки ID {row['id']}: {row['scheduled_time']}", version=2),
-                                        parse_mode=ParseMode.MARKDOWN_V2
-                                    )
-                                except Exception as e_notify:
-                                    logger.error(f"Не удалось уведомить админа {admin_id}: {e_notify}")
+                    if row['scheduled_ts'] < minute_start:
+                        logger.debug(f"Рассылка ID {row['id']} пропущена: scheduled_time {row['scheduled_time']} вне текущей минуты")
+                        skipped_broadcasts.append((row['id'], row['scheduled_time']))
                         continue
 
                     broadcast_data = json.loads(row['broadcast_data'])
@@ -1532,14 +1363,18 @@ async def get_scheduled_broadcasts(bot: Bot = None) -> List[Dict]:
             if skipped_broadcasts:
                 logger.info(f"Пропущено {len(skipped_broadcasts)} рассылок из-за времени: {skipped_broadcasts}")
 
-            if not broadcasts and any(row['status'] == 'pending' for row in all_rows) and bot:
+            pending_rows = []
+            if not broadcasts and bot:
+                await c.execute("SELECT id, scheduled_time FROM scheduled_broadcasts WHERE status = 'pending'")
+                pending_rows = await c.fetchall()
+            if pending_rows:
                 await c.execute("SELECT value FROM bot_config WHERE key = 'last_broadcast_warning_time'")
                 last_warning_row = await c.fetchone()
                 last_warning = datetime.strptime(last_warning_row[0], '%Y-%m-%d %H:%M:%S').replace(tzinfo=msk_tz) if last_warning_row else None
 
                 current_time_dt = datetime.now(msk_tz)
                 if not last_warning or (current_time_dt - last_warning).total_seconds() >= 1200:
-                    logger.warning(f"Запланированные рассылки есть, но не найдены из-за времени: {[(row['id'], row['scheduled_time']) for row in all_rows if row['status'] == 'pending']}")
+                    logger.warning(f"Запланированные рассылки есть, но не найдены из-за времени: {[(row['id'], row['scheduled_time']) for row in pending_rows]}")
                     await c.execute(
                         "INSERT OR REPLACE INTO bot_config (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
                         ('last_broadcast_warning_time', current_time_dt.strftime('%Y-%m-%d %H:%M:%S'))
@@ -1550,7 +1385,7 @@ async def get_scheduled_broadcasts(bot: Bot = None) -> List[Dict]:
                         try:
                             message_text = safe_escape_markdown(
                                 f"⚠️ Запланированные рассылки есть, но не найдены (scheduled_time > {current_time}). "
-                                f"Ожидают выполнения в будущем: {[(row['id'], row['scheduled_time']) for row in all_rows if row['status'] == 'pending']}",
+                                f"Ожидают выполнения в будущем: {[(row['id'], row['scheduled_time']) for row in pending_rows]}",
                                 version=2
                             )
                             await send_message_with_fallback(
@@ -1586,14 +1421,6 @@ async def add_resources_on_payment(user_id: int, plan_key: str, payment_amount:
             await conn.execute("PRAGMA busy_timeout = 30000")
             c = await conn.cursor()
 
-            user_data = await check_database_user(user_id)
-            if not user_data:
-                logger.error(f"Пользователь user_id={user_id} не найден")
-                return False
-
-            generations_left = user_data[0]
-            avatar_left = user_data[1]
-
             # Если is_first_purchase не передан явно, определяем его
             if is_first_purchase is None:
                 # Проверяем реальное количество платежей
@@ -1623,30 +1450,37 @@ async def add_resources_on_payment(user_id: int, plan_key: str, payment_amount:
             else:
                 logger.info(f"Бонусный аватар НЕ добавлен для user_id={user_id}: is_first_purchase={is_first_purchase}, plan_key={plan_key}")
 
-            new_generations = generations_left + photos_to_add
-            new_avatars = avatar_left + avatars_to_add
-
-            await c.execute('''UPDATE users
-                              SET generations_left = ?, avatar_left = ?, first_purchase = 0, updated_at = CURRENT_TIMESTAMP
-                              WHERE user_id = ?''',
-                           (new_generations, new_avatars, user_id))
-
+            # Платёж и начисление коммитятся вместе: уже записанный платёж повторно не начисляется
             await c.execute('''INSERT INTO payments (payment_id, user_id, plan, amount, status, created_at)
                               VALUES (?, ?, ?, ?, 'succeeded', CURRENT_TIMESTAMP)
                               ON CONFLICT(payment_id) DO NOTHING''',
                            (payment_id_yookassa, user_id, plan_key, payment_amount))
+            if c.rowcount == 0:
+                await conn.rollback()
+                logger.warning(f"Платёж {payment_id_yookassa} для user_id={user_id} уже учтён, ресурсы не начисляются повторно")
+                return True
+
+            # Начисление относительное (+N к текущему остатку), а не запись значения из кэша
+            new_generations = await _change_credits(c, user_id, 'photo', photos_to_add, 'payment', payment_id_yookassa)
+            new_avatars = await _change_credits(c, user_id, 'avatar', avatars_to_add, 'payment', payment_id_yookassa)
+            if new_generations is None or new_avatars is None:
+                await conn.rollback()
+                logger.error(f"Пользователь user_id={user_id} не найден")
+                return False
+            generations_left = new_generations - photos_to_add
+            avatar_left = new_avatars - avatars_to_add
+            await c.execute("UPDATE users SET first_purchase = 0 WHERE user_id = ?", (user_id,))
 
             # Реферальный бонус для реферера (не для самого пользователя)
             referral_photos = 0
+            referrer_balance = None
             if is_first_purchase and referrer_id:
                 await c.execute("SELECT user_id FROM users WHERE user_id = ?", (referrer_id,))
                 if await c.fetchone():
                     referral_photos = await convert_amount_to_photos(payment_amount, plan_key)
                     if referral_photos > 0:
-                        await c.execute('''UPDATE users
-                                          SET generations_left = generations_left + ?, updated_at = CURRENT_TIMESTAMP
-                                          WHERE user_id = ?''',
-                                       (referral_photos, referrer_id))
+                        referrer_balance = await _change_credits(c, referrer_id, 'photo', referral_photos,
+                                                                 'referral_bonus', payment_id_yookassa)
                         current_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
                         await c.execute('''INSERT INTO referral_rewards (referrer_id, referred_user_id, reward_photos, created_at)
                                           VALUES (?, ?, ?, ?)''',
@@ -1678,9 +1512,11 @@ async def add_resources_on_payment(user_id: int, plan_key: str, payment_amount:
                 'referral_photos': referral_photos
             }, conn=conn)
 
-            await update_user_payment_stats(user_id, payment_amount)
-
             await conn.commit()
+            if referral_photos > 0:
+                await user_cache.delete(referrer_id)
+            # Своё соединение: вызов до commit ждал бы блокировку записи, которую держит conn
+            await update_user_payment_stats(user_id, payment_amount)
 
             logger.info(
                 f"Ресурсы добавлены для user_id={user_id} по плану '{plan_key}'. "
@@ -1724,18 +1560,16 @@ async def add_resources_on_payment(user_id: int, plan_key: str, payment_amount:
                 # Уведомление рефереру
                 if referral_photos > 0 and referrer_id:
                     try:
-                        referrer_data = await get_user_info(referrer_id)
-                        if referrer_data:
-                            message_text = safe_escape_markdown(
-                                f"🎁 Ваш друг оплатил подписку! Вам начислено {referral_photos} печенек за реферала!\n"
-                                f"💎 Текущий баланс: {referrer_data['generations_left'] + referral_photos} печенек",
-                                version=2
-                            )
-                            await send_message_with_fallback(
-                                bot, referrer_id,
-                                message_text,
-                                parse_mode=ParseMode.MARKDOWN_V2
-                            )
+                        message_text = safe_escape_markdown(
+                            f"🎁 Ваш друг оплатил подписку! Вам начислено {referral_photos} печенек за реферала!\n"
+                            f"💎 Текущий баланс: {referrer_balance} печенек",
+                            version=2
+                        )
+                        await send_message_with_fallback(
+                            bot, referrer_id,
+                            message_text,
+                            parse_mode=ParseMode.MARKDOWN_V2
+                        )
                     except Exception as e:
                         logger.error(f"Ошибка отправки уведомления рефереру {referrer_id}: {e}")
 
@@ -2104,23 +1938,11 @@ async def save_video_task(user_id: int, prediction_id: str, model_key: str, vide
     try:
         async with aiosqlite.connect(DATABASE_PATH) as conn:
             c = await conn.cursor()
-            # Проверяем наличие столбца style_name
-            await c.execute("PRAGMA table_info(video_tasks)")
-            columns = [col[1] for col in await c.fetchall()]
-            if 'style_name' in columns:
-                await c.execute(
-                    "INSERT INTO video_tasks (user_id, prediction_id, model_key, video_path, status, style_name) "
-                    "VALUES (?, ?, ?, ?, ?, ?)",
-                    (user_id, prediction_id, model_key, video_path, status, style_name)
-                )
-            else:
-                # Если столбец style_name отсутствует, сохраняем без него
-                await c.execute(
-                    "INSERT INTO video_tasks (user_id, prediction_id, model_key, video_path, status) "
-                    "VALUES (?, ?, ?, ?, ?)",
-                    (user_id, prediction_id, model_key, video_path, status)
-                )
-                logger.warning(f"Столбец style_name отсутствует в таблице video_tasks, сохранено без style_name для user_id={user_id}")
+            await c.execute(
+                "INSERT INTO video_tasks (user_id, prediction_id, model_key, video_path, status, style_name) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, prediction_id, model_key, video_path, status, style_name)
+            )
             await conn.commit()
             await c.execute("SELECT last_insert_rowid()")
             task_id = (await c.fetchone())[0]
@@ -2628,7 +2450,7 @@ async def get_payments_by_date(start_date: Optional[str] = None, end_date: Optio
             c = await conn.cursor()
 
             query = """
-                SELECT p.user_id, p.plan, p.amount, p.payment_id, p.created_at,
+                SELECT p.user_id, p.plan, p.amount, p.payment_id, p.created_ts,
                        u.username, u.first_name
                 FROM payments p
                 JOIN users u ON p.user_id = u.user_id
@@ -2637,13 +2459,13 @@ async def get_payments_by_date(start_date: Optional[str] = None, end_date: Optio
             params = []
 
             if start_date:
-                query += " AND DATE(p.created_at) >= ?"
-                params.append(start_date)
+                query += " AND p.created_ts >= ?"
+                params.append(day_range(start_date)[0])
             if end_date:
-                query += " AND DATE(p.created_at) <= ?"
-                params.append(end_date)
+                query += " AND p.created_ts < ?"
+                params.append(day_range(end_date)[1])
 
-            query += " ORDER BY p.created_at DESC"
+            query += " ORDER BY p.created_ts DESC"
 
             await c.execute(query, params)
             payments = await c.fetchall()
@@ -2652,17 +2474,11 @@ async def get_payments_by_date(start_date: Optional[str] = None, end_date: Optio
             moscow_tz = pytz.timezone('Europe/Moscow')
             result = []
             for p in payments:
-                try:
-                    # Предполагаем, что created_at в базе хранится в UTC
-                    utc_dt = datetime.strptime(p['created_at'], '%Y-%m-%d %H:%M:%S') if p['created_at'] else None
-                    if utc_dt:
-                        utc_dt = pytz.utc.localize(utc_dt)
-                        msk_dt = utc_dt.astimezone(moscow_tz)
-                        created_at_msk = msk_dt  # Сохраняем объект datetime для передачи
-                    else:
-                        created_at_msk = None
-                except ValueError as e:
-                    logger.error(f"Ошибка формата времени для payment_id={p['payment_id']}: {e}")
+                # Предполагаем, что created_at в базе хранится в UTC
+                if p['created_ts'] is not None:
+                    created_at_msk = datetime.fromtimestamp(p['created_ts'], tz=pytz.utc).astimezone(moscow_tz)
+                else:
+                    logger.error(f"Некорректное время платежа payment_id={p['payment_id']}")
                     created_at_msk = None
 
                 result.append((
@@ -2681,6 +2497,45 @@ async def get_payments_by_date(start_date: Optional[str] = None, end_date: Optio
         logger.error(f"Ошибка получения платежей за период {start_date} - {end_date}: {e}", exc_info=True)
         return []
 
+async def get_payments_in_range(start_ts: int, end_ts: int, status: Optional[str] = 'succeeded') -> List[Dict[str, Any]]:
+    """Платежи с created_ts в [start_ts, end_ts) (см. day_range), по умолчанию только успешные."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            conn.row_factory = aiosqlite.Row
+            c = await conn.cursor()
+            query = """
+                SELECT user_id, plan, amount, payment_id, created_at, created_ts
+                FROM payments
+                WHERE created_ts >= ? AND created_ts < ?
+            """
+            params = [start_ts, end_ts]
+            if status is not None:
+                query += " AND status = ?"
+                params.append(status)
+            await c.execute(query + " ORDER BY created_ts", params)
+            return [dict(row) for row in await c.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка получения платежей за {from_epoch(start_ts)} - {from_epoch(end_ts)}: {e}", exc_info=True)
+        return []
+
+async def get_registrations_per_day(start_ts: int, end_ts: int) -> List[Tuple[str, int]]:
+    """Число регистраций по дням (YYYY-MM-DD) для created_ts в [start_ts, end_ts)."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            c = await conn.cursor()
+            # День считается из created_ts, а не DATE(created_at): фильтр идёт по индексу
+            await c.execute("""
+                SELECT date(created_ts, 'unixepoch') AS reg_date, COUNT(*)
+                FROM users
+                WHERE created_ts >= ? AND created_ts < ?
+                GROUP BY created_ts / 86400
+                ORDER BY reg_date
+            """, (start_ts, end_ts))
+            return [(row[0], row[1]) for row in await c.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка получения регистраций по дням за {from_epoch(start_ts)} - {from_epoch(end_ts)}: {e}", exc_info=True)
+        return []
+
 async def check_referral_integrity(user_id: int) -> bool:
     """Проверяет целостность реферальной связи для пользователя."""
     try:
@@ -2724,23 +2579,12 @@ async def get_registrations_by_date(start_date: str, end_date: str = None) -> Li
             c = await conn.cursor()
 
             query = """
-                SELECT user_id, username, first_name, created_at, referrer_id
+                SELECT user_id, username, first_name, created_ts, referrer_id
                 FROM users
-                WHERE 1=1
+                WHERE created_ts >= ? AND created_ts < ?
+                ORDER BY created_ts DESC
             """
-            params = []
-
-            if start_date:
-                query += " AND DATE(created_at) >= ?"
-                params.append(start_date)
-            if end_date:
-                query += " AND DATE(created_at) <= ?"
-                params.append(end_date)
-            else:
-                query += " AND DATE(created_at) = ?"
-                params.append(start_date)
-
-            query += " ORDER BY created_at DESC"
+            params = day_range(start_date, end_date)
 
             await c.execute(query, params)
             registrations = await c.fetchall()
@@ -2750,7 +2594,7 @@ async def get_registrations_by_date(start_date: str, end_date: str = None) -> Li
                     r['user_id'],
                     r['username'],
                     r['first_name'],
-                    datetime.strptime(r['created_at'], '%Y-%m-%d %H:%M:%S') if r['created_at'] else None,
+                    from_epoch(r['created_ts']),
                     r['referrer_id']
                 )
                 for r in registrations
@@ -2901,16 +2745,14 @@ async def is_old_user(user_id: int, cutoff_date: str = "2025-07-11") -> bool:
         async with aiosqlite.connect(DATABASE_PATH) as conn:
             conn.row_factory = aiosqlite.Row
             c = await conn.cursor()
-            await c.execute("SELECT created_at FROM users WHERE user_id = ?", (user_id,))
+            await c.execute("SELECT created_ts FROM users WHERE user_id = ?", (user_id,))
             result = await c.fetchone()
-            if not result or not result['created_at']:
+            if not result or result['created_ts'] is None:
                 logger.warning(f"Дата регистрации не найдена для user_id={user_id}")
                 return False
             try:
-                registration_date = datetime.strptime(result['created_at'], '%Y-%m-%d %H:%M:%S')
-                cutoff = datetime.strptime(cutoff_date, '%Y-%m-%d')
-                is_old = registration_date.date() < cutoff.date()
-                logger.debug(f"Проверка is_old_user для user_id={user_id}: created_at={result['created_at']}, cutoff_date={cutoff_date}, is_old={is_old}")
+                is_old = result['created_ts'] < day_range(cutoff_date)[0]
+                logger.debug(f"Проверка is_old_user для user_id={user_id}: created_ts={result['created_ts']}, cutoff_date={cutoff_date}, is_old={is_old}")
                 return is_old
             except ValueError as e:
                 logger.error(f"Ошибка формата даты для user_id={user_id}: {e}")
@@ -2918,3 +2760,44 @@ async def is_old_user(user_id: int, cutoff_date: str = "2025-07-11") -> bool:
     except Exception as e:
         logger.error(f"Ошибка проверки статуса старого пользователя для user_id={user_id}: {e}", exc_info=True)
         return False
+
+async def get_media_asset_file_id(path: str, content_hash: str) -> Optional[str]:
+    """Возвращает сохранённый file_id Telegram для статического файла с данным содержимым."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            c = await conn.cursor()
+            await c.execute(
+                "SELECT file_id FROM media_assets WHERE path = ? AND content_hash = ?",
+                (path, content_hash)
+            )
+            row = await c.fetchone()
+            return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Ошибка получения file_id для {path}: {e}", exc_info=True)
+        return None
+
+@retry_on_locked(max_attempts=5, initial_delay=0.2)
+async def save_media_asset_file_id(path: str, content_hash: str, file_id: str) -> None:
+    """Сохраняет file_id Telegram для статического файла, старые версии файла удаляются."""
+    async with aiosqlite.connect(DATABASE_PATH, timeout=10) as conn:
+        c = await conn.cursor()
+        await c.execute("DELETE FROM media_assets WHERE path = ? AND content_hash != ?", (path, content_hash))
+        await c.execute(
+            "INSERT OR REPLACE INTO media_assets (path, content_hash, file_id, updated_at) "
+            "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            (path, content_hash, file_id)
+        )
+        await conn.commit()
+
+async def delete_media_asset_file_id(path: str) -> None:
+    """Забывает file_id статического файла (Telegram его отклонил)."""
+    try:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            await conn.execute("DELETE FROM media_assets WHERE path = ?", (path,))
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка удаления file_id для {path}: {e}", exc_info=True)
+
+# Время и ошибки каждой публичной функции модуля - в метриках bot_db_query_*.
+# Должно оставаться последней строкой модуля: оборачиваются уже объявленные функции.
+instrument_module_coroutines(globals(), DB_QUERY_LATENCY, DB_QUERY_ERRORS, 'function', span_kind='db')
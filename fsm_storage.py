@@ -0,0 +1,197 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import TelegramObject
+
+from config import REDIS, FSM_STATE_TTL_SECONDS
+from redis_caсhe import create_redis_client
+from tracing import span
+
+from logger import get_logger
+logger = get_logger('main')
+
+# Через сколько секунд изменения данных FSM уходят в хранилище, если апдейт ещё обрабатывается
+WRITE_BACK_DELAY_SECONDS = 0.5
+
+_UNSET = object()
+
+
+def _encode_extra(value: Any) -> Any:
+    """Сериализация типов, которые хендлеры кладут в FSM, но которых нет в JSON."""
+    if isinstance(value, (set, frozenset)):
+        return {'$set': list(value)}
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в FSM")
+
+
+def _decode_extra(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if '$set' in obj:
+            return set(obj['$set'])
+        if '$dt' in obj:
+            return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def compact_dumps(data: Any) -> str:
+    """Компактный JSON: без пробелов и без \\uXXXX для кириллицы."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_encode_extra)
+
+
+def compact_loads(raw: str) -> Any:
+    return json.loads(raw, object_hook=_decode_extra)
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Redis-хранилище FSM с TTL, если задан REDIS_URL, иначе хранилище в памяти."""
+    redis_client = create_redis_client(REDIS)
+    if redis_client is None:
+        logger.warning("REDIS_URL не задан: состояния FSM хранятся в памяти и теряются при рестарте")
+        return MemoryStorage()
+    ttl = FSM_STATE_TTL_SECONDS or None
+    logger.info(f"FSM хранится в Redis (TTL {ttl} с)")
+    return RedisStorage(
+        redis_client,
+        key_builder=DefaultKeyBuilder(prefix='fsm'),
+        state_ttl=ttl,
+        data_ttl=ttl,
+        json_loads=compact_loads,
+        json_dumps=compact_dumps
+    )
+
+
+class SnapshotFSMContext(FSMContext):
+    """FSMContext с одним чтением данных на апдейт и отложенной записью.
+
+    Данные читаются из хранилища при первом обращении, дальше отдаются из снимка.
+    Изменения данных копятся и записываются одним set_data (через WRITE_BACK_DELAY_SECONDS
+    или по завершении апдейта). update_data записывает только изменённые ключи поверх
+    свежих данных хранилища, чтобы параллельные апдейты того же пользователя (фото
+    альбома, повторное нажатие) не затирали друг друга; set_data заменяет данные целиком,
+    как и в обычном FSMContext. Смена состояния пишется сразу - от неё зависит роутинг
+    следующих апдейтов. После flush() контекст работает напрямую с хранилищем, чтобы
+    фоновые задачи, пережившие апдейт, видели свежие данные.
+    """
+    def __init__(self, storage: BaseStorage, key: StorageKey, raw_state: Any = _UNSET):
+        super().__init__(storage=storage, key=key)
+        self._state = raw_state
+        self._data: Optional[Dict[str, Any]] = None
+        self._changed_keys: Set[str] = set()
+        self._replaced = False
+        self._flushed = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+    async def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            with span('fsm', 'get_data'):
+                self._data = dict(await self.storage.get_data(key=self.key))
+        return self._data
+
+    def _mark_dirty(self) -> None:
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(
+                WRITE_BACK_DELAY_SECONDS, lambda: asyncio.create_task(self._write_back())
+            )
+
+    async def _write_back(self) -> None:
+        async with self._lock:
+            self._flush_handle = None
+            if not self._replaced and not self._changed_keys:
+                return
+            snapshot = dict(self._data or {})
+            if self._replaced:
+                data = snapshot
+            else:
+                with span('fsm', 'get_data'):
+                    data = dict(await self.storage.get_data(key=self.key))
+                data.update({key: snapshot[key] for key in self._changed_keys})
+            self._replaced = False
+            self._changed_keys.clear()
+            with span('fsm', 'set_data'):
+                await self.storage.set_data(key=self.key, data=data)
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения и переключает контекст в прямой режим."""
+        if self._flushed:
+            return
+        self._flushed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self._write_back()
+
+    async def set_state(self, state: StateType = None) -> None:
+        with span('fsm', 'set_state'):
+            await super().set_state(state)
+        if not self._flushed:
+            self._state = state.state if isinstance(state, State) else state
+
+    async def get_state(self) -> Optional[str]:
+        if self._flushed or self._state is _UNSET:
+            self._state = await super().get_state()
+        return self._state
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        if self._flushed:
+            return await super().set_data(data)
+        self._data = dict(data)
+        self._replaced = True
+        self._changed_keys.clear()
+        self._mark_dirty()
+
+    async def get_data(self) -> Dict[str, Any]:
+        if self._flushed:
+            return await super().get_data()
+        return (await self._load()).copy()
+
+    async def get_value(self, key: str, default: Any = None) -> Any:
+        if self._flushed:
+            return await super().get_value(key, default)
+        return (await self._load()).get(key, default)
+
+    async def update_data(self, data: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        if self._flushed:
+            return await super().update_data(data, **kwargs)
+        if data:
+            kwargs.update(data)
+        current = await self._load()
+        current.update(kwargs)
+        self._changed_keys.update(kwargs)
+        self._mark_dirty()
+        return current.copy()
+
+
+class FSMSnapshotMiddleware(BaseMiddleware):
+    """Подменяет FSMContext апдейта на SnapshotFSMContext и записывает данные один раз в конце.
+
+    Регистрируется как outer-middleware на dp.update после встроенного FSMContextMiddleware.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        context = data.get('state')
+        if context is None:
+            return await handler(event, data)
+        snapshot = SnapshotFSMContext(context.storage, context.key, raw_state=data.get('raw_state', _UNSET))
+        data['state'] = snapshot
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                await snapshot.flush()
+            except Exception as e:
+                logger.error(f"Не удалось записать данные FSM для {context.key.user_id}: {e}", exc_info=True)
@@ -26,8 +26,6 @@ from .videos import (
 
 from .training import (
     start_training,
-    send_training_progress,
-    send_training_progress_with_delay,
     check_training_status,
     check_training_status_with_delay,
     check_pending_trainings
@@ -56,8 +54,6 @@ __all__ = [
     
     # Training
     'start_training',
-    'send_training_progress',
-    'send_training_progress_with_delay',
     'check_training_status',
     'check_training_status_with_delay',
     'check_pending_trainings'
@@ -38,7 +38,8 @@ from generation_config import (
 )
 from config import MAX_FILE_SIZE_BYTES, REPLICATE_API_TOKEN, REPLICATE_USERNAME_OR_ORG_NAME, ADMIN_IDS
 from database import (
-    check_database_user, update_user_credits, get_active_trainedmodel, log_generation, check_user_resources
+    check_database_user, get_active_trainedmodel, log_generation, check_user_resources,
+    reserve_credits, commit_credit_reservation, release_credit_reservation
 )
 from keyboards import (
     create_main_menu_keyboard, create_rating_keyboard,
@@ -48,11 +49,20 @@ from generation.utils import (
     TempFileManager, reset_generation_context,
     send_message_with_fallback, send_photo_with_retry, send_media_group_with_retry
 )
+from bot_identity import get_bot_id
+from generation.upload_cache import upload_cache, sha256_file, parse_expires_at
 from llama_helper import generate_assisted_prompt
-from handlers.utils import clean_admin_context, safe_escape_markdown as escape_md
+from handlers.utils import clean_admin_context, safe_escape_markdown as escape_md, send_upload_photo_action
+from logger import log_event
+from metrics import GENERATION_QUEUE_DEPTH, REPLICATE_LATENCY
+from tracing import record_span
 
 user_last_generation_lock = asyncio.Lock()
 
+# Типичная длительность для chat action: генерация в Replicate и загрузка одного фото результата, с
+IMAGE_GENERATION_EXPECTED_SECONDS = 20
+RESULT_UPLOAD_EXPECTED_SECONDS_PER_PHOTO = 1.5
+
 logger = logging.getLogger(__name__)
 
 # СТАНДАРТНЫЕ ЛИМИТЫ
@@ -72,6 +82,7 @@ user_generation_lock = {}
 
 # Очередь генераций
 generation_queue = asyncio.Queue(maxsize=800)
+GENERATION_QUEUE_DEPTH.set_function(generation_queue.qsize)
 queue_processor_running = False
 
 # СУПЕР КОНФИГУРАЦИЯ (ИЗ 22 ПРОФ МОДЕЛЕЙ)
@@ -490,7 +501,7 @@ async def generate_image(message: Message, state: FSMContext, num_outputs: int =
     """Основная функция генерации изображения с 22 моделями"""
     user_data = await state.get_data()
     bot = message.bot
-    bot_id = (await bot.get_me()).id
+    bot_id = get_bot_id(bot)
     user_id = user_id or message.from_user.id
 
     logger.info(f"=== ГЕНЕРАЦИЯ НАЧАЛАСЬ (22 модели) ===")
@@ -654,7 +665,7 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
         admin_user_id = user_data.get('original_admin_user', message.from_user.id)
         is_admin_generation = user_data.get('is_admin_generation', False)
         bot = message.bot
-        bot_id = (await bot.get_me()).id
+        bot_id = get_bot_id(bot)
 
         preserved_data = {}
 
@@ -726,10 +737,6 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
 
                 required_photos = user_data.get('photos_to_deduct', num_outputs)
 
-                if not is_admin_generation:
-                    logger.info(f"Списание ресурсов для user_id={target_user_id}, требуется фото: {required_photos}")
-                    await update_user_credits(target_user_id, "decrement_photo", amount=required_photos)
-
                 selected_gender = user_data.get('selected_gender')
                 user_input_for_helper = user_data.get('user_input_for_llama')
 
@@ -815,13 +822,32 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
                         logger.info(f"Using Multi-LoRA model (Модели): {replicate_model_id_to_run}")
                         await state.update_data(old_model_id=model_id, old_model_version=model_version)
 
-                generation_message = await send_message_with_fallback(
-                    bot, message_recipient,
-                    escape_md(f"📸 Создаю {num_outputs} фото с помощью профессиональных ИИ моделей! Подготовка...", version=2),
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
+                # Печеньки резервируются под задачу: подтверждаются после отправки результата,
+                # при любой ошибке возвращаются в finally, при падении процесса - по таймауту
+                credit_job_id = None
+                if not is_admin_generation:
+                    credit_job_id = f"image:{target_user_id}:{uuid.uuid4().hex}"
+                    logger.info(f"Списание ресурсов для user_id={target_user_id}, требуется фото: {required_photos}")
+                    if not await reserve_credits(target_user_id, required_photos, credit_job_id):
+                        await send_message_with_fallback(
+                            bot, message_recipient,
+                            escape_md("❌ Недостаточно печенек на балансе! Пополни баланс в /menu.", version=2),
+                            reply_markup=await create_main_menu_keyboard(message_recipient),
+                            parse_mode=ParseMode.MARKDOWN_V2
+                        )
+                        await reset_generation_context(state, generation_type)
+                        return
 
+                # Сообщение о старте отправляется внутри try: если Telegram ответит ошибкой,
+                # резерв вернётся в finally, а не будет ждать таймаута
+                generation_message = None
                 try:
+                    generation_message = await send_message_with_fallback(
+                        bot, message_recipient,
+                        escape_md(f"📸 Создаю {num_outputs} фото с помощью профессиональных ИИ моделей! Подготовка...", version=2),
+                        parse_mode=ParseMode.MARKDOWN_V2
+                    )
+
                     user_data = await state.get_data()
                     processed_prompt = await process_prompt_async(
                         prompt, model_key, generation_type,
@@ -866,6 +892,7 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
                             parse_mode=ParseMode.MARKDOWN_V2
                         )
 
+                    await send_upload_photo_action(bot, message_recipient, IMAGE_GENERATION_EXPECTED_SECONDS)
                     async with replicate_semaphore:
                         image_urls = await run_replicate_model_async(replicate_model_id_to_run, input_params)
 
@@ -896,12 +923,12 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
                                 reply_markup=await create_main_menu_keyboard(message_recipient),
                                 parse_mode=ParseMode.MARKDOWN_V2
                             )
-                        if not is_admin_generation:
-                            await update_user_credits(target_user_id, "increment_photo", amount=required_photos)
                         await reset_generation_context(state, generation_type)
                         return
 
                     duration = time.time() - start_time
+                    log_event(logger, 'generation_done', "Генерация для user_id=%s завершена за %.1f с", target_user_id, duration,
+                              user_id=target_user_id, model=replicate_model_id_to_run, duration_ms=round(duration * 1000, 1))
 
                     try:
                         if isinstance(generation_message, Message):
@@ -941,6 +968,8 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
                             bot, message_recipient, target_user_id, image_paths, duration, aspect_ratio_key,
                             generation_type, model_key, state, admin_user_id if is_admin_generation else None
                         )
+                    if credit_job_id:
+                        await commit_credit_reservation(credit_job_id)
 
                     logger.info(f"🎯 PixelPie_AI генерация завершена для user_id={target_user_id}: "
                                f"{len(image_paths)} фото за {duration:.1f} сек (22 модели)")
@@ -964,10 +993,11 @@ async def _generate_image_internal(message: Message, state: FSMContext, num_outp
                                 reply_markup=await create_main_menu_keyboard(message_recipient),
                                 parse_mode=ParseMode.MARKDOWN_V2
                             )
-                    if not is_admin_generation:
-                        await update_user_credits(target_user_id, "increment_photo", amount=required_photos)
                     await reset_generation_context(state, generation_type)
                 finally:
+                    if credit_job_id:
+                        # Для подтверждённого резерва ничего не делает
+                        await release_credit_reservation(credit_job_id, reason='generation_failed')
                     if preserved_data:
                         await state.update_data(**preserved_data)
                     await clean_admin_context(state)
@@ -980,6 +1010,7 @@ async def send_generation_results(bot: Bot, message_recipient: int, target_user_
     """Отправляет результаты генерации пользователю"""
     user_data = await state.get_data()
     state_value = user_data.get('state')
+    await send_upload_photo_action(bot, message_recipient, RESULT_UPLOAD_EXPECTED_SECONDS_PER_PHOTO * len(image_paths))
 
     try:
         if len(image_paths) == 1:
@@ -1070,12 +1101,20 @@ async def run_replicate_model_async(model_id: str, input_params: dict) -> List[s
         loop = asyncio.get_event_loop()
         replicate_client = replicate.Client(api_token=REPLICATE_API_TOKEN)
         logger.info(f"🚀 Запуск ультра-реалистичной модели {model_id}")
-        logger.debug(f"📸 Параметры: {input_params}")
+        logger.debug("📸 Параметры: %s", input_params)
 
-        output = await loop.run_in_executor(
-            None,
-            lambda: replicate_client.run(model_id, input=input_params)
-        )
+        started = time.perf_counter()
+        try:
+            output = await loop.run_in_executor(
+                None,
+                lambda: replicate_client.run(model_id, input=input_params)
+            )
+        except Exception:
+            REPLICATE_LATENCY.observe(time.perf_counter() - started, model=model_id, status='failed')
+            raise
+        finally:
+            record_span('replicate', model_id, time.perf_counter() - started, started)
+        REPLICATE_LATENCY.observe(time.perf_counter() - started, model=model_id, status='succeeded')
 
         image_urls = []
         if isinstance(output, list):
@@ -1091,31 +1130,38 @@ async def run_replicate_model_async(model_id: str, input_params: dict) -> List[s
     return await _run()
 
 async def upload_image_to_replicate(photo_path: str) -> str:
-    """Загружает изображение возвращает URL"""
-    async with replicate_semaphore:
-        loop = asyncio.get_event_loop()
+    """Загружает изображение возвращает URL.
 
-        if not os.path.exists(photo_path):
-            raise FileNotFoundError(f"Файл не найден: {photo_path}")
+    Одинаковое содержимое не загружается повторно, пока URL Replicate действителен.
+    """
+    if not os.path.exists(photo_path):
+        raise FileNotFoundError(f"Файл не найден: {photo_path}")
 
-        file_size = os.path.getsize(photo_path)
-        if file_size > MAX_FILE_SIZE_BYTES:
-            raise ValueError(f"Файл слишком большой: {file_size / 1024 / 1024:.2f} MB")
+    file_size = os.path.getsize(photo_path)
+    if file_size > MAX_FILE_SIZE_BYTES:
+        raise ValueError(f"Файл слишком большой: {file_size / 1024 / 1024:.2f} MB")
 
-        replicate_client = replicate.Client(api_token=REPLICATE_API_TOKEN)
+    digest = await asyncio.to_thread(sha256_file, photo_path)
+
+    async def upload() -> Tuple[str, float]:
+        async with replicate_semaphore:
+            loop = asyncio.get_event_loop()
+            replicate_client = replicate.Client(api_token=REPLICATE_API_TOKEN)
+
+            def upload_sync():
+                with open(photo_path, 'rb') as f:
+                    return replicate_client.files.create(file=f)
 
-        def upload_sync():
-            with open(photo_path, 'rb') as f:
-                return replicate_client.files.create(file=f)
+            file_response = await loop.run_in_executor(None, upload_sync)
+            image_url = file_response.urls.get('get')
 
-        file_response = await loop.run_in_executor(None, upload_sync)
-        image_url = file_response.urls.get('get')
+            if not image_url:
+                raise ValueError("Replicate не вернул URL")
 
-        if not image_url:
-            raise ValueError("Replicate не вернул URL")
+            logger.info(f"Изображение загружено: {image_url}")
+            return image_url, parse_expires_at(getattr(file_response, 'expires_at', None))
 
-        logger.info(f"Изображение загружено: {image_url}")
-        return image_url
+    return await upload_cache.get_or_upload(digest, file_size, upload)
 
 def is_new_fast_flux_model(model_id: str, model_version: str = None) -> bool:
     """Проверяет, является ли модель новой быстрой Flux моделью"""
@@ -9,16 +9,27 @@ import asyncio
 import aiohttp
 import os
 import logging
-import base64
-from typing import Optional, Dict, Any, Union, List
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Union, List, Tuple
 from datetime import datetime
-from PIL import Image
 import io
 import re
 
+from image_prep import prepare_reference_image, run_in_image_pool
+from generation.upload_cache import upload_cache, sha256_bytes, parse_expires_at
+from metrics import REPLICATE_LATENCY
+from tracing import record_span
 from logger import get_logger
 logger = get_logger('generation')
 
+# gen4-image выдаёт максимум 1080p: референс больше этого только увеличивает загрузку
+REFERENCE_MAX_SIDE = 1536
+# Сколько живёт подготовленный и загруженный референс (повторы с fallback-промптом, ретраи)
+REFERENCE_CACHE_TTL = 3600
+REFERENCE_CACHE_SIZE = 256
+
 class PhotoTransformGenerator:
     """Класс для генерации изображений по одному фото через Replicate"""
 
@@ -127,6 +138,9 @@ class PhotoTransformGenerator:
         # Счетчик попыток для каждого пользователя
         self.user_attempts = {}
 
+        # sha256 исходного фото -> (URL загруженного референса, момент истечения)
+        self._reference_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
     def _sanitize_prompt(self, prompt: str) -> str:
         """
         Очистка промпта от потенциально проблемных слов
@@ -203,33 +217,21 @@ class PhotoTransformGenerator:
             # Дополнительная санитизация промпта
             prompt = self._sanitize_prompt(prompt)
 
-            # Предобработка изображения: конвертация в JPG
-            logger.info(f"Предобработка изображения: конвертация в JPG")
-            try:
-                img = Image.open(io.BytesIO(image_bytes))
-            except Exception as pil_err:
-                raise ValueError(f"Невозможно открыть изображение: {str(pil_err)}")
-
-            buffer = io.BytesIO()
-            img.convert('RGB').save(buffer, format="JPEG", quality=95)
-            buffer.seek(0)
-            processed_image_bytes = buffer.read()
-
-            # Создаем data URI
-            data_uri = self._create_data_uri(processed_image_bytes)
+            reference_url = await self._get_reference_url(image_bytes)
 
             # Параметры для модели
             input_params = {
                 "prompt": prompt,
                 "aspect_ratio": aspect_ratio,
                 "reference_tags": ["person"],
-                "reference_images": [data_uri],
+                "reference_images": [reference_url],
                 "output_resolution": resolution
             }
 
             # Создаем prediction
             logger.info(f"Создание prediction для модели {style_config['model']}")
 
+            started = time.perf_counter()
             prediction = await asyncio.to_thread(
                 self.client.predictions.create,
                 model=style_config['model'],
@@ -246,6 +248,9 @@ class PhotoTransformGenerator:
                     prediction.id
                 )
                 logger.info(f"Статус: {prediction.status}")
+            REPLICATE_LATENCY.observe(time.perf_counter() - started,
+                                      model=style_config['model'], status=prediction.status)
+            record_span('replicate', style_config['model'], time.perf_counter() - started, started)
 
             if prediction.status == "succeeded":
                 output_url = prediction.output
@@ -312,18 +317,51 @@ class PhotoTransformGenerator:
                 "timestamp": datetime.now().isoformat()
             }
 
-    def _create_data_uri(self, image_bytes: bytes) -> str:
+    async def _get_reference_url(self, image_bytes: bytes) -> str:
         """
-        Создает data URI для изображения.
+        Подготавливает фото в пуле процессов и загружает его через files API.
+
+        Результат кэшируется по хэшу содержимого, поэтому повтор с альтернативным
+        промптом не декодирует и не загружает фото заново.
 
         Args:
-            image_bytes: Байты изображения
+            image_bytes: Байты исходного изображения
 
         Returns:
-            str: data:image/jpeg;base64,BASE64STRING
+            str: URL загруженного референса
         """
-        b64_string = base64.b64encode(image_bytes).decode('utf-8')
-        return f"data:image/jpeg;base64,{b64_string}"
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        cached = self._reference_cache.get(content_hash)
+        if cached and cached[1] > time.monotonic():
+            self._reference_cache.move_to_end(content_hash)
+            logger.info(f"Референс {content_hash[:12]} взят из кэша")
+            return cached[0]
+
+        try:
+            prepared = await run_in_image_pool(prepare_reference_image, image_bytes, REFERENCE_MAX_SIDE)
+        except Exception as pil_err:
+            raise ValueError(f"Невозможно открыть изображение: {str(pil_err)}")
+        logger.info(f"Референс подготовлен: {len(image_bytes)} -> {len(prepared)} байт")
+
+        async def upload() -> Tuple[str, float]:
+            file_response = await asyncio.to_thread(
+                self.client.files.create,
+                io.BytesIO(prepared),
+                filename=f"{content_hash[:16]}.jpg",
+                content_type="image/jpeg"
+            )
+            url = file_response.urls.get('get')
+            if not url:
+                raise ValueError("Replicate не вернул URL референса")
+            return url, parse_expires_at(getattr(file_response, 'expires_at', None))
+
+        # Общий кэш загрузок: тот же референс мог быть загружен другим процессом
+        reference_url = await upload_cache.get_or_upload(sha256_bytes(prepared), len(prepared), upload)
+
+        self._reference_cache[content_hash] = (reference_url, time.monotonic() + REFERENCE_CACHE_TTL)
+        while len(self._reference_cache) > REFERENCE_CACHE_SIZE:
+            self._reference_cache.popitem(last=False)
+        return reference_url
 
     async def download_generated_image(self, url: str) -> bytes:
         """
@@ -6,7 +6,6 @@ import logging
 import os
 import uuid
 import random
-import zipfile
 from typing import Dict, Optional, List
 from aiogram import Bot, Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, ContentType
@@ -24,9 +23,12 @@ from database import check_database_user, update_user_credits, save_user_trained
 from keyboards import create_main_menu_keyboard, create_training_keyboard, create_user_profile_keyboard, create_subscription_keyboard, create_confirmation_keyboard
 from generation.utils import TempFileManager, reset_generation_context, send_message_with_fallback
 from generation.images import upload_image_to_replicate
-from handlers.utils import clean_admin_context, safe_escape_markdown as escape_md
+from generation.training_ingest import album_collector, ingest_training_photos, build_training_zip
+from handlers.utils import clean_admin_context, safe_escape_markdown as escape_md, send_typing_action
 from utils import get_cookie_progress_bar
+from progress_service import progress_service
 
+from bot_identity import get_bot_id
 from logger import get_logger
 logger = get_logger('generation')
 
@@ -117,30 +119,34 @@ async def get_training_progress_message(elapsed_minutes: int, avatar_name: str,
 
     return final_message
 
-async def send_training_progress(bot: Bot, user_id: int, elapsed_minutes: int, avatar_name: str, total_minutes: int = 5) -> None:
-    """Отправляет улучшенное сообщение о прогрессе обучения."""
-    try:
-        message = await get_training_progress_message(elapsed_minutes, avatar_name, total_minutes)
-        await send_message_with_fallback(bot, user_id, message, parse_mode=ParseMode.MARKDOWN)
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения о прогрессе обучения пользователю {user_id}: {e}")
+# Длительность одного этапа прогресса обучения в секундах
+TRAINING_PROGRESS_STAGE_SECONDS = 60
+# Типичная длительность загрузки архива фото и запуска обучения (для chat action), с
+TRAINING_UPLOAD_EXPECTED_SECONDS = 15
 
-async def send_training_progress_with_delay(bot: Bot, user_id: int, elapsed_minutes: int, avatar_name: str, total_minutes: int, delay: int) -> None:
-    """Отправляет сообщение о прогрессе обучения с задержкой."""
-    await asyncio.sleep(delay)
-    await send_training_progress(bot, user_id, elapsed_minutes, avatar_name, total_minutes)
+def training_progress_key(avatar_id: int) -> tuple:
+    return ('training', avatar_id)
 
 async def schedule_training_notifications(bot: Bot, user_id: int, avatar_name: str, avatar_id: int, training_id: str, model_name: str, total_minutes: int = 5):
-    """Планирует серию уведомлений о прогрессе обучения."""
-    notification_schedule = [1, 2, 3, 4]
-    for minutes in notification_schedule:
-        if minutes < total_minutes:
-            asyncio.create_task(send_training_progress_with_delay(
-                bot, user_id, minutes, avatar_name, total_minutes, delay=minutes * 60
-            ))
-    asyncio.create_task(check_training_status_with_delay(
-        bot, {'user_id': user_id, 'prediction_id': training_id, 'model_name': model_name, 'avatar_id': avatar_id}, delay=total_minutes * 60
-    ))
+    """Регистрирует прогресс обучения: одно обновляемое сообщение и проверку статуса по истечении total_minutes."""
+    stages = [minutes for minutes in [1, 2, 3, 4] if minutes < total_minutes]
+
+    async def render(elapsed: float) -> str:
+        elapsed_minutes = max(1, int(elapsed // TRAINING_PROGRESS_STAGE_SECONDS))
+        return await get_training_progress_message(elapsed_minutes, avatar_name, total_minutes)
+
+    async def on_expire() -> None:
+        await check_training_status(
+            bot, {'user_id': user_id, 'prediction_id': training_id, 'model_name': model_name, 'avatar_id': avatar_id}
+        )
+
+    progress_service.start(
+        training_progress_key(avatar_id), bot, user_id, render,
+        parse_mode=ParseMode.MARKDOWN,
+        offsets=[minutes * TRAINING_PROGRESS_STAGE_SECONDS for minutes in stages],
+        expire_after=total_minutes * TRAINING_PROGRESS_STAGE_SECONDS,
+        on_expire=on_expire
+    )
 
 async def start_training(message: Message, state: FSMContext) -> None:
     """Запускает обучение аватара с использованием Replicate trainings API."""
@@ -151,8 +157,7 @@ async def start_training(message: Message, state: FSMContext) -> None:
 
     # Проверяем, не является ли user_id ID бота
     bot = message.bot
-    bot_info = await bot.get_me()
-    bot_id = bot_info.id
+    bot_id = get_bot_id(bot)
     if user_id == bot_id:
         logger.error(f"Попытка запуска обучения от бота с ID {bot_id}")
         if stored_user_id and stored_user_id != bot_id:
@@ -212,14 +217,10 @@ async def start_training(message: Message, state: FSMContext) -> None:
             temp_manager.add(zip_path)
 
             try:
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for photo_path_item in training_photos:
-                        if os.path.exists(photo_path_item):
-                            zipf.write(photo_path_item, os.path.basename(photo_path_item))
-                            temp_manager.add(photo_path_item)
-                        else:
-                            logger.warning(f"Файл фото {photo_path_item} не найден при создании ZIP для user_id={user_id}")
-                logger.info(f"ZIP-архив создан: {zip_path} с {len(training_photos)} файлами.")
+                zipped_photos = await build_training_zip(training_photos, zip_path)
+                for photo_path_item in zipped_photos:
+                    temp_manager.add(photo_path_item)
+                logger.info(f"ZIP-архив создан: {zip_path} с {len(zipped_photos)} файлами.")
             except Exception as e_zip:
                 logger.error(f"Ошибка создания ZIP для user_id={user_id}: {e_zip}", exc_info=True)
                 raise RuntimeError(f"Ошибка создания ZIP-архива: {e_zip}")
@@ -231,6 +232,7 @@ async def start_training(message: Message, state: FSMContext) -> None:
                 parse_mode=ParseMode.MARKDOWN_V2
             )
 
+            await send_typing_action(bot, user_id, TRAINING_UPLOAD_EXPECTED_SECONDS)
             zip_url = await upload_image_to_replicate(zip_path)
 
             await status_message.edit_text(
@@ -240,11 +242,12 @@ async def start_training(message: Message, state: FSMContext) -> None:
 
             training_params = {"lora_type": "subject", "input_images": zip_url, "training_steps": 1000}
 
-            logger.info(f"Запуск обучения. Destination: {model_name_for_db}, Version: {TRAINER_VERSION}, Params: {training_params}")
+            logger.info("Запуск обучения. Destination: %s, Version: %s, Params: %s", model_name_for_db, TRAINER_VERSION, training_params)
 
             training_id = None
             try:
-                training = replicate_client.trainings.create(
+                training = await asyncio.to_thread(
+                    replicate_client.trainings.create,
                     destination=model_name_for_db, version=TRAINER_VERSION, input=training_params
                 )
                 training_id = training.id
@@ -254,7 +257,8 @@ async def start_training(message: Message, state: FSMContext) -> None:
             except Exception as e:
                 logger.warning(f"Не удалось создать обучение через trainings API: {e}")
                 try:
-                    prediction = replicate_client.run(
+                    prediction = await asyncio.to_thread(
+                        replicate_client.run,
                         TRAINER_VERSION, input={**training_params, "trigger_word": trigger_word}
                     )
                     training_id = prediction.id if hasattr(prediction, 'id') else f"training_{uuid.uuid4().hex[:8]}"
@@ -458,6 +462,7 @@ async def check_training_status(bot: Bot, data: Dict[str, any]) -> None:
             await update_trainedmodel_status(
                 avatar_id, model_base_name, model_version, 'success', training_id
             )
+            progress_service.cancel(training_progress_key(avatar_id))
 
             await update_user_credits(user_id, "set_trained_model", amount=1)
             await update_user_credits(user_id, "set_active_avatar", amount=avatar_id)
@@ -504,6 +509,7 @@ async def check_training_status(bot: Bot, data: Dict[str, any]) -> None:
         elif training_status in ['failed', 'canceled']:
             logger.error(f"Обучение провалилось со статусом: {training_status}")
             await update_trainedmodel_status(avatar_id, status='failed')
+            progress_service.cancel(training_progress_key(avatar_id))
             safe_avatar_name = escape_md(avatar_name, version=2)
             error_message = (
                 escape_md(f"😔 К сожалению, обучение аватара '{safe_avatar_name}' не удалось.\n\n", version=2) +
@@ -627,7 +633,7 @@ async def handle_avatar_name(message: Message, state: FSMContext):
     photo_count = len(training_photos)
 
     # Сохраняем имя аватара
-    await state.update_data(avatar_name=avatar_name, training_photos=training_photos, processed_media_groups=set())
+    await state.update_data(avatar_name=avatar_name, training_photos=training_photos)
 
     if photo_count >= 10:
         # Если загружено достаточно фотографий, переходим к подтверждению
@@ -706,15 +712,6 @@ async def handle_training_photos(message: Message, state: FSMContext):
     bot = message.bot
     media_group_id = message.media_group_id
 
-    user_data = await state.get_data()
-    training_photos = user_data.get('training_photos', [])
-    processed_media_groups = user_data.get('processed_media_groups', set())
-
-    # Пропускаем, если медиагруппа уже обработана
-    if media_group_id and media_group_id in processed_media_groups:
-        logger.debug(f"Медиагруппа {media_group_id} уже обработана для user_id={user_id}")
-        return
-
     # Берем только фото с максимальным разрешением (последний элемент в message.photo)
     photos = message.photo
     if not photos:
@@ -725,31 +722,24 @@ async def handle_training_photos(message: Message, state: FSMContext):
         )
         return
 
-    # Используем фото с наивысшим разрешением
-    photo = photos[-1]  # Последний элемент имеет максимальное разрешение
-    try:
-        file = await bot.get_file(photo.file_id)
-        photo_path = f"temp/{user_id}_{uuid.uuid4()}.jpg"
-        os.makedirs(os.path.dirname(photo_path), exist_ok=True)
-        await bot.download_file(file.file_path, photo_path)
-        if photo_path not in training_photos:
-            training_photos.append(photo_path)
-            logger.debug(f"Добавлено фото {photo_path} для user_id={user_id}")
-        else:
-            logger.debug(f"Фото {photo_path} уже было добавлено для user_id={user_id}")
-    except Exception as e:
-        logger.error(f"Ошибка обработки фото для user_id={user_id}: {e}")
+    file_ids = [photos[-1].file_id]
+    if media_group_id:
+        # Альбом обрабатывается одной пачкой в хендлере первого фото
+        file_ids = await album_collector.collect(user_id, media_group_id, photos[-1].file_id)
+        if file_ids is None:
+            return
+
+    new_paths, failed = await ingest_training_photos(bot, user_id, file_ids)
+    if failed:
         await message.reply(
-            escape_md("❌ Ошибка при обработке фото. Попробуй загрузить другое.", version=2),
+            escape_md(f"❌ Не удалось обработать фото: {failed} шт. Попробуй загрузить другие.", version=2),
             parse_mode=ParseMode.MARKDOWN_V2
         )
+    if not new_paths:
         return
 
-    # Обновляем список обработанных медиагрупп
-    if media_group_id:
-        processed_media_groups.add(media_group_id)
-        await state.update_data(processed_media_groups=processed_media_groups)
-
+    user_data = await state.get_data()
+    training_photos = user_data.get('training_photos', []) + new_paths
     await state.update_data(training_photos=training_photos)
     count = len(training_photos)
 
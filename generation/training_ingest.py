@@ -0,0 +1,107 @@
+# generation/training_ingest.py
+"""Приём фото для обучения аватара: сбор альбомов, параллельная загрузка, нормализация и ZIP."""
+import asyncio
+import io
+import os
+import uuid
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+from image_prep import normalize_to_file, run_in_image_pool
+
+from logger import get_logger
+logger = get_logger('generation')
+
+# Альбом считается полностью полученным, если новых фото не было столько секунд
+ALBUM_COLLECT_DELAY = 1.0
+# Одновременные загрузки с серверов Telegram на одного пользователя
+DOWNLOAD_CONCURRENCY = 8
+# Тренеру не нужно больше: он сам режет до 1024, лишние пиксели только раздувают архив
+TRAINING_PHOTO_MAX_SIDE = 1536
+TRAINING_PHOTO_DIR = "temp"
+
+
+class AlbumCollector:
+    """Собирает сообщения одной медиагруппы в пачку.
+
+    Первый хендлер альбома становится ведущим: ждёт, пока поток фото не затихнет,
+    и забирает всю пачку. Остальные хендлеры только добавляют своё фото и выходят.
+    """
+    def __init__(self, delay: float = ALBUM_COLLECT_DELAY):
+        self.delay = delay
+        self._albums: Dict[Tuple[int, str], Dict] = {}
+
+    async def collect(self, user_id: int, media_group_id: str, item: str) -> Optional[List[str]]:
+        loop = asyncio.get_running_loop()
+        key = (user_id, media_group_id)
+        album = self._albums.get(key)
+        if album is not None:
+            album['items'].append(item)
+            album['last'] = loop.time()
+            return None
+
+        album = {'items': [item], 'last': loop.time()}
+        self._albums[key] = album
+        try:
+            while True:
+                remaining = album['last'] + self.delay - loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+        finally:
+            self._albums.pop(key, None)
+        return album['items']
+
+
+album_collector = AlbumCollector()
+
+
+async def _download_and_normalize(bot: Bot, user_id: int, file_id: str, semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        buffer = io.BytesIO()
+        await bot.download(file_id, destination=buffer)
+    photo_path = os.path.join(TRAINING_PHOTO_DIR, f"{user_id}_{uuid.uuid4()}.jpg")
+    return await run_in_image_pool(normalize_to_file, buffer.getvalue(), photo_path, TRAINING_PHOTO_MAX_SIDE)
+
+
+async def ingest_training_photos(bot: Bot, user_id: int, file_ids: List[str]) -> Tuple[List[str], int]:
+    """Параллельно скачивает фото и нормализует их в пуле процессов.
+
+    Возвращает пути сохранённых JPEG (в исходном порядке) и число фото, которые не удалось обработать.
+    """
+    os.makedirs(TRAINING_PHOTO_DIR, exist_ok=True)
+    semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_download_and_normalize(bot, user_id, file_id, semaphore) for file_id in file_ids),
+        return_exceptions=True
+    )
+    paths = []
+    failed = 0
+    for file_id, result in zip(file_ids, results):
+        if isinstance(result, BaseException):
+            failed += 1
+            logger.error(f"Ошибка обработки фото {file_id} для user_id={user_id}: {result}")
+        else:
+            paths.append(result)
+    logger.info(f"Обработано {len(paths)}/{len(file_ids)} фото для обучения user_id={user_id}")
+    return paths, failed
+
+
+def _write_training_zip(photo_paths: List[str], zip_path: str) -> List[str]:
+    written = []
+    # JPEG уже сжат: STORED экономит CPU и почти не увеличивает архив
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+        for photo_path in photo_paths:
+            if os.path.exists(photo_path):
+                zipf.write(photo_path, os.path.basename(photo_path))
+                written.append(photo_path)
+            else:
+                logger.warning(f"Файл фото {photo_path} не найден при создании ZIP")
+    return written
+
+
+async def build_training_zip(photo_paths: List[str], zip_path: str) -> List[str]:
+    """Собирает ZIP для тренера вне event loop. Возвращает пути файлов, попавших в архив."""
+    return await asyncio.to_thread(_write_training_zip, photo_paths, zip_path)
@@ -0,0 +1,158 @@
+# generation/upload_cache.py
+"""Кэш загрузок в Replicate по содержимому файла.
+
+Ключ - sha256 байтов, значение - URL из files.create и срок его жизни.
+Одинаковые файлы (референсы p2p, стартовые кадры видео, повторы photo-transform)
+загружаются один раз, пока URL действителен. Кэш двухуровневый: LRU в процессе
+и Redis, общий для инстансов.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import REDIS
+from redis_caсhe import RedisUploadCache
+
+from logger import get_logger
+logger = get_logger('generation')
+
+# Если Replicate не вернул expires_at, считаем URL живым столько секунд
+DEFAULT_UPLOAD_TTL = 3600
+# Запас до истечения URL: модель должна успеть скачать файл после старта предсказания
+EXPIRY_SAFETY_MARGIN = 300
+LOCAL_CACHE_SIZE = 1024
+_HASH_CHUNK = 1024 * 1024
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_expires_at(value: Any) -> float:
+    """Срок жизни URL из ответа files.create в epoch-секундах."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            logger.warning(f"Не удалось разобрать expires_at={value!r}")
+    return time.time() + DEFAULT_UPLOAD_TTL
+
+
+# Загрузчик возвращает (url, expires_at в epoch-секундах)
+Uploader = Callable[[], Awaitable[Tuple[str, float]]]
+
+
+class UploadCache:
+    """sha256 -> URL Replicate: LRU в процессе, Redis между инстансами, одна загрузка на ключ."""
+    def __init__(self, redis_cache: Optional[RedisUploadCache] = None, max_local: int = LOCAL_CACHE_SIZE,
+                 safety_margin: int = EXPIRY_SAFETY_MARGIN):
+        self.redis_cache = redis_cache
+        self.max_local = max_local
+        self.safety_margin = safety_margin
+        self._local: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {'hits_local': 0, 'hits_redis': 0, 'misses': 0, 'bytes_uploaded': 0, 'bytes_saved': 0}
+
+    def _remember(self, digest: str, url: str, expires_at: float) -> None:
+        self._local[digest] = (url, expires_at)
+        self._local.move_to_end(digest)
+        while len(self._local) > self.max_local:
+            self._local.popitem(last=False)
+
+    async def _lookup(self, digest: str) -> Optional[str]:
+        deadline = time.time() + self.safety_margin
+        entry = self._local.get(digest)
+        if entry is not None:
+            if entry[1] > deadline:
+                self._local.move_to_end(digest)
+                self.stats['hits_local'] += 1
+                return entry[0]
+            self._local.pop(digest, None)
+
+        if self.redis_cache is None:
+            return None
+        try:
+            cached = await self.redis_cache.get(digest)
+        except Exception as e:
+            logger.warning(f"Redis недоступен для кэша загрузок: {e}")
+            return None
+        if cached and cached.get('expires_at', 0) > deadline:
+            self._remember(digest, cached['url'], cached['expires_at'])
+            self.stats['hits_redis'] += 1
+            return cached['url']
+        return None
+
+    async def _store(self, digest: str, url: str, expires_at: float) -> None:
+        self._remember(digest, url, expires_at)
+        if self.redis_cache is None:
+            return
+        ttl = int(expires_at - time.time() - self.safety_margin)
+        if ttl <= 0:
+            return
+        try:
+            await self.redis_cache.set(digest, {'url': url, 'expires_at': expires_at}, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить загрузку {digest[:12]} в Redis: {e}")
+
+    async def get_or_upload(self, digest: str, size: int, uploader: Uploader) -> str:
+        """Возвращает URL из кэша или загружает файл; параллельные запросы одного ключа ждут одну загрузку."""
+        url = await self._lookup(digest)
+        if url is not None:
+            self.stats['bytes_saved'] += size
+            logger.debug(f"Загрузка {digest[:12]} взята из кэша, сэкономлено {size} байт "
+                         f"(всего {self.stats['bytes_saved']})")
+            return url
+
+        inflight = self._inflight.get(digest)
+        if inflight is not None:
+            try:
+                url = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Загрузку отменили вместе с её владельцем - грузим сами
+                return await self.get_or_upload(digest, size, uploader)
+            self.stats['bytes_saved'] += size
+            return url
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            url, expires_at = await uploader()
+            self.stats['misses'] += 1
+            self.stats['bytes_uploaded'] += size
+            await self._store(digest, url, expires_at)
+            future.set_result(url)
+            return url
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже получил вызывающий; ожидающих может не быть
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(digest, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, 'local_size': len(self._local)}
+
+
+upload_cache = UploadCache(RedisUploadCache(REDIS))
+
+
+def get_upload_cache_stats() -> Dict[str, int]:
+    return upload_cache.get_stats()
@@ -1,7 +1,10 @@
 import asyncio
 import logging
 import os
+import time
 import tenacity
+from datetime import datetime
+from typing import Optional
 import traceback
 from aiogram import Bot
 from aiogram.types import Message, InputMediaPhoto, InputMediaVideo, FSInputFile
@@ -13,6 +16,10 @@ from replicate.exceptions import ReplicateError
 from config import REPLICATE_API_TOKEN
 from handlers.utils import safe_escape_markdown as escape_md
 
+from bot_identity import get_bot_id
+from telegram_gateway import in_lane, Lane
+from metrics import REPLICATE_LATENCY
+from tracing import record_span
 from logger import get_logger
 logger = get_logger('generation')
 
@@ -126,19 +133,19 @@ async def reset_generation_context(state: 'aiogram.fsm.context.FSMContext' = Non
 
     if removed_keys:
         await state.update_data({k: None for k in removed_keys})
-        logger.debug(f"Удалены ключи: {removed_keys}")
+        logger.debug("Удалены ключи: %s", removed_keys)
 
     if protected_data:
         await state.update_data(protected_data)
-        logger.debug(f"Восстановлены защищённые данные: {protected_data}")
+        logger.debug("Восстановлены защищённые данные: %s", protected_data)
 
     # Сохраняем user_id в состоянии, если он был передан
     if user_id is not None:
         await state.update_data(user_id=user_id)
-        logger.debug(f"Сохранен user_id={user_id} в состоянии FSM")
+        logger.debug("Сохранен user_id=%s в состоянии FSM", user_id)
 
-    updated_data = await state.get_data()
-    logger.info(f"После очистки: user_data={updated_data}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("После очистки: user_data=%s", await state.get_data())
 
 retry_telegram_send = tenacity.retry(
     retry=tenacity.retry_if_exception_type((TelegramRetryAfter, TelegramBadRequest, TelegramNetworkError)),
@@ -153,8 +160,7 @@ retry_telegram_send = tenacity.retry(
 async def send_message_with_fallback(bot: Bot, chat_id: int, text: str, reply_markup=None, parse_mode=None, is_escaped: bool = False) -> Message:
 
     # Проверка, не является ли chat_id ID бота
-    bot_info = await bot.get_me()
-    bot_id = bot_info.id
+    bot_id = get_bot_id(bot)
     if chat_id == bot_id:
         logger.error(f"Попытка отправить сообщение боту с chat_id={chat_id}. Отправка отменена.")
         raise TelegramForbiddenError(message="Cannot send message to bot itself")
@@ -198,6 +204,7 @@ async def send_message_with_fallback(bot: Bot, chat_id: int, text: str, reply_ma
         logger.error(f"Ошибка отправки сообщения для chat_id={chat_id}: {e}", exc_info=True)
         raise
 
+@in_lane(Lane.RESULTS)
 @retry_telegram_send
 async def send_photo_with_retry(bot: Bot, chat_id: int, photo: FSInputFile, caption: str = None, reply_markup=None, parse_mode=None) -> Message:
     """Отправка фото с повторными попытками."""
@@ -236,11 +243,13 @@ async def send_photo_with_retry(bot: Bot, chat_id: int, photo: FSInputFile, capt
         logger.error(f"Ошибка отправки фото для chat_id={chat_id}: {e}", exc_info=True)
         raise
 
+@in_lane(Lane.RESULTS)
 @retry_telegram_send
 async def send_media_group_with_retry(bot: Bot, chat_id: int, media: list):
     """Отправка группы медиа с повторными попытками"""
     return await bot.send_media_group(chat_id=chat_id, media=media)
 
+@in_lane(Lane.RESULTS)
 @retry_telegram_send
 async def send_video_with_retry(bot: Bot, chat_id: int, video, caption: str = None, reply_markup=None, parse_mode=None):
     """Отправка видео с повторными попытками"""
@@ -264,10 +273,34 @@ async def run_replicate_async(model_id: str, input_params: dict):
 
     logger.info(f"Запуск Replicate model: {model_id} с параметрами (промпт): {prompt_preview}...")
 
+    started = time.perf_counter()
     try:
         output = await loop.run_in_executor(None, lambda: replicate_client.run(model_id, input=input_params))
+        REPLICATE_LATENCY.observe(time.perf_counter() - started, model=model_id, status='succeeded')
         logger.info(f"Replicate model {model_id} успешно завершен.")
         return output
     except Exception as e:
+        REPLICATE_LATENCY.observe(time.perf_counter() - started, model=model_id, status='failed')
         logger.error(f"Ошибка выполнения Replicate model {model_id}: {e}")
         raise
+    finally:
+        record_span('replicate', model_id, time.perf_counter() - started, started)
+
+def _parse_replicate_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def observe_replicate_prediction(prediction, model: str) -> None:
+    """Записывает в метрику время завершённого предсказания (created_at -> completed_at по данным Replicate)."""
+    created = _parse_replicate_time(getattr(prediction, 'created_at', None))
+    completed = _parse_replicate_time(getattr(prediction, 'completed_at', None))
+    if created is None or completed is None:
+        return
+    REPLICATE_LATENCY.observe(max((completed - created).total_seconds(), 0.0),
+                              model=model, status=getattr(prediction, 'status', 'unknown'))
@@ -21,9 +21,13 @@ from generation_config import IMAGE_GENERATION_MODELS, GENERATION_TYPE_TO_MODEL_
 from database import check_database_user, update_user_credits, save_video_task, update_video_task_status, log_generation, check_user_resources
 from keyboards import create_main_menu_keyboard, create_rating_keyboard, create_video_generate_menu_keyboard, create_subscription_keyboard, create_back_keyboard, create_confirmation_keyboard
 from generation.images import upload_image_to_replicate
-from generation.utils import TempFileManager, reset_generation_context, send_message_with_fallback, send_video_with_retry
-from handlers.utils import clean_admin_context, escape_message_parts, safe_escape_markdown as escape_md
+from generation.utils import (
+    TempFileManager, reset_generation_context, send_message_with_fallback, send_video_with_retry,
+    observe_replicate_prediction
+)
+from handlers.utils import clean_admin_context, escape_message_parts, safe_escape_markdown as escape_md, send_upload_video_action
 from utils import get_cookie_progress_bar
+from progress_service import progress_service
 
 from logger import get_logger
 logger = get_logger('generation')
@@ -35,6 +39,10 @@ class VideoStates(StatesGroup):
 
 video_router = Router()
 
+# Типичная длительность для chat action: генерация видео в Replicate и отправка готового файла, с
+VIDEO_GENERATION_EXPECTED_SECONDS = 300
+VIDEO_UPLOAD_EXPECTED_SECONDS = 5
+
 async def get_video_progress_message(elapsed_minutes: int, model_name: str, style_name: str = "custom", total_minutes: int = 5) -> str:
     """Генерирует сообщение о прогрессе генерации видео."""
     VIDEO_PROGRESS_MESSAGES = {
@@ -97,27 +105,25 @@ async def get_video_progress_message(elapsed_minutes: int, model_name: str, styl
 
     return final_message
 
-async def send_video_progress(bot: Bot, user_id: int, elapsed_minutes: int, model_name: str, style_name: str = "custom", total_minutes: int = 5) -> None:
-    """Отправляет сообщение о прогрессе генерации видео."""
-    try:
-        message = await get_video_progress_message(elapsed_minutes, model_name, style_name, total_minutes)
-        await send_message_with_fallback(bot, user_id, message, parse_mode=ParseMode.MARKDOWN)
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения о прогрессе видео пользователю {user_id}: {e}")
+# Длительность одного этапа прогресса видео в секундах
+VIDEO_PROGRESS_STAGE_SECONDS = 30
 
-async def send_video_progress_with_delay(bot: Bot, user_id: int, elapsed_minutes: int, model_name: str, style_name: str = "custom", total_minutes: int = 5, delay: int = 0) -> None:
-    """Отправляет сообщение о прогрессе с задержкой."""
-    await asyncio.sleep(delay)
-    await send_video_progress(bot, user_id, elapsed_minutes, model_name, style_name, total_minutes)
+def video_progress_key(task_id: int) -> tuple:
+    return ('video', task_id)
 
 async def schedule_video_notifications(bot: Bot, user_id: int, model_name: str, style_name: str, task_id: int, prediction_id: str, total_minutes: int = 5):
-    """Планирует уведомления о прогрессе генерации видео."""
-    notification_schedule = [1, 2, 3, 4]
-    for minutes in notification_schedule:
-        if minutes < total_minutes:
-            asyncio.create_task(send_video_progress_with_delay(
-                bot, user_id, minutes, model_name, style_name, total_minutes, delay=minutes * 30
-            ))
+    """Регистрирует прогресс генерации видео: одно сообщение, обновляемое на каждом этапе."""
+    stages = [minutes for minutes in [1, 2, 3, 4] if minutes < total_minutes]
+
+    async def render(elapsed: float) -> str:
+        elapsed_minutes = max(1, int(elapsed // VIDEO_PROGRESS_STAGE_SECONDS))
+        return await get_video_progress_message(elapsed_minutes, model_name, style_name, total_minutes)
+
+    progress_service.start(
+        video_progress_key(task_id), bot, user_id, render,
+        parse_mode=ParseMode.MARKDOWN,
+        offsets=[minutes * VIDEO_PROGRESS_STAGE_SECONDS for minutes in stages]
+    )
 
 async def generate_video(message: Message, state: FSMContext, task_id: int = None, prediction_id: str = None):
     """Генерация видео."""
@@ -293,6 +299,7 @@ async def generate_video(message: Message, state: FSMContext, task_id: int = Non
 
             if not prediction_id:
                 logger.info(f"Создание нового предсказания Replicate для видео task_id={task_id}")
+                await send_upload_video_action(bot, user_id, VIDEO_GENERATION_EXPECTED_SECONDS)
 
                 prediction_instance = replicate_client.predictions.create(
                     version=replicate_video_model_id,
@@ -341,6 +348,7 @@ async def generate_video(message: Message, state: FSMContext, task_id: int = Non
 
             if task_id:
                 await update_video_task_status(task_id, status='failed')
+                progress_service.cancel(video_progress_key(task_id))
 
             try:
                 await update_user_credits(user_id, "increment_photo", amount=required_photos)
@@ -641,7 +649,9 @@ async def handle_video_photo(message: Message, state: FSMContext) -> None:
     """Обработка загруженного фото для видеогенерации."""
     user_id = message.from_user.id
     bot = message.bot
-    logger.info(f"handle_video_photo: user_id={user_id}, data={await state.get_data()}")
+    logger.info("handle_video_photo: user_id=%s", user_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_video_photo: data=%s", await state.get_data())
 
     try:
         if not message.photo:
@@ -828,6 +838,8 @@ async def check_video_status(bot: Bot, data: dict):
         current_replicate_status = prediction.status
 
         logger.info(f"Статус видео на Replicate для prediction_id={prediction_id}: {current_replicate_status}")
+        if current_replicate_status in ('succeeded', 'failed', 'canceled'):
+            observe_replicate_prediction(prediction, getattr(prediction, 'model', None) or 'video')
 
         if current_replicate_status == 'succeeded':
             video_url = None
@@ -851,6 +863,7 @@ async def check_video_status(bot: Bot, data: dict):
                     logger.info(f"Видео сохранено локально: {video_path}")
 
                     await update_video_task_status(task_id, status='completed', video_path=video_path)
+                    progress_service.cancel(video_progress_key(task_id))
 
                     if model_key:
                         await log_generation(user_id, generation_type, model_key, units_generated=1)
@@ -866,6 +879,7 @@ async def check_video_status(bot: Bot, data: dict):
 
                     video_file = FSInputFile(path=video_path)
                     logger.debug(f"Отправка видео: path={video_path}, user_id={user_id}")
+                    await send_upload_video_action(bot, user_id, VIDEO_UPLOAD_EXPECTED_SECONDS)
                     await send_video_with_retry(
                         bot,
                         user_id,
@@ -892,6 +906,7 @@ async def check_video_status(bot: Bot, data: dict):
                 except Exception as e_download:
                     logger.error(f"Ошибка скачивания/отправки видео для task_id={task_id}: {e_download}", exc_info=True)
                     await update_video_task_status(task_id, status='failed')
+                    progress_service.cancel(video_progress_key(task_id))
 
                     text = escape_message_parts(
                         f"❌ Ошибка при скачивании видео.",
@@ -918,6 +933,7 @@ async def check_video_status(bot: Bot, data: dict):
             else:
                 logger.error(f"Видео URL не найден в output для prediction_id={prediction_id}")
                 await update_video_task_status(task_id, status='failed')
+                progress_service.cancel(video_progress_key(task_id))
 
                 text = escape_message_parts(
                     "❌ Ошибка: видео сгенерировано, но ссылка не получена.",
@@ -947,6 +963,7 @@ async def check_video_status(bot: Bot, data: dict):
             logger.error(f"Генерация видео не удалась для prediction_id={prediction_id}: {error_details}")
 
             await update_video_task_status(task_id, status='failed')
+            progress_service.cancel(video_progress_key(task_id))
 
             video_cost = get_video_generation_cost(generation_type)
             logger.debug(f"Возвращаем {video_cost} фото для user_id={user_id}")
@@ -983,6 +1000,7 @@ async def check_video_status(bot: Bot, data: dict):
             if attempt >= max_attempts:
                 logger.error(f"Превышено максимальное количество попыток проверки для task_id={task_id}")
                 await update_video_task_status(task_id, status='timeout')
+                progress_service.cancel(video_progress_key(task_id))
 
                 video_cost = get_video_generation_cost(generation_type)
                 logger.debug(f"Возвращаем {video_cost} фото для user_id={user_id} из-за таймаута")
@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 import pytz
 from typing import List, Dict, Optional
 from aiogram import Bot
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, FSInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, FSInputFile, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ParseMode
 from database import (
@@ -19,10 +19,15 @@ from handlers.utils import (
 )
 import aiosqlite
 from excel_utils import create_payments_excel, create_registrations_excel
+from profiler import profile_for, is_profiling
 import os
 
 logger = logging.getLogger(__name__)
 
+# Длительности профилирования в меню (секунды)
+PROFILE_DURATIONS = (15, 30, 60, 120)
+_profile_task: Optional[asyncio.Task] = None
+
 async def admin_panel(message: Message, state: FSMContext, user_id: Optional[int] = None) -> None:
     """Показывает главное меню админ-панели."""
     user_id = user_id or message.from_user.id
@@ -500,4 +505,75 @@ async def cancel(message: Message, state: FSMContext) -> None:
         reply_markup=reply_markup,
         parse_mode=ParseMode.MARKDOWN_V2
     )
-    logger.debug(f"Действия отменены для user_id={user_id}")
\ No newline at end of file
+    logger.debug(f"Действия отменены для user_id={user_id}")
+
+async def admin_profiler_menu(callback_query: CallbackQuery, state: FSMContext) -> None:
+    """Меню сэмплирующего профилировщика: выбор длительности."""
+    user_id = callback_query.from_user.id
+    if user_id not in ADMIN_IDS:
+        await callback_query.answer("⛔ Недостаточно прав", show_alert=True)
+        return
+
+    status = "⏳ Сейчас идёт профилирование." if is_profiling() else "Профилировщик свободен."
+    text = escape_md(
+        "🔬 Профилирование бота под реальной нагрузкой\n\n"
+        "Стеки всех потоков снимаются каждые 10 мс, бот продолжает работать. "
+        "По окончании придут два файла: свёрнутые стеки для flamegraph/speedscope "
+        "и сводка самых затратных функций.\n\n"
+        f"{status}\nВыберите длительность:",
+        version=2
+    )
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=f"{seconds} с", callback_data=f"admin_profile_{seconds}")
+            for seconds in PROFILE_DURATIONS
+        ],
+        [InlineKeyboardButton(text="🔙 В админ-панель", callback_data="admin_panel")]
+    ])
+    await safe_edit_message(
+        message=callback_query.message,
+        text=text,
+        reply_markup=keyboard,
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+
+async def admin_start_profiler(callback_query: CallbackQuery, state: FSMContext, seconds: int) -> None:
+    """Запускает профилирование в фоне; результат приходит админу документами."""
+    global _profile_task
+    user_id = callback_query.from_user.id
+    if user_id not in ADMIN_IDS:
+        await callback_query.answer("⛔ Недостаточно прав", show_alert=True)
+        return
+    if seconds not in PROFILE_DURATIONS:
+        await callback_query.answer("❌ Неизвестная длительность", show_alert=True)
+        return
+    if is_profiling():
+        await callback_query.answer("⏳ Профилирование уже идёт", show_alert=True)
+        return
+
+    await callback_query.answer(f"🔬 Профилирование запущено на {seconds} с")
+    _profile_task = asyncio.create_task(_send_profile(callback_query.bot, user_id, seconds))
+    logger.info(f"Админ user_id={user_id} запустил профилирование на {seconds} с")
+
+async def _send_profile(bot: Bot, user_id: int, seconds: int) -> None:
+    try:
+        result = await profile_for(seconds)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Если бот всё время простаивал, стеков нет - а пустой документ Telegram не принимает
+        if result.stacks:
+            await bot.send_document(
+                chat_id=user_id,
+                document=BufferedInputFile(result.collapsed().encode('utf-8'), filename=f"profile_{stamp}.folded"),
+                caption="Свёрнутые стеки: flamegraph.pl, speedscope.app или inferno"
+            )
+        await bot.send_document(
+            chat_id=user_id,
+            document=BufferedInputFile(result.summary().encode('utf-8'), filename=f"profile_{stamp}_top.txt"),
+            caption=f"Топ функций за {seconds} с ({result.samples} сэмплов)"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка профилирования для user_id={user_id}: {e}", exc_info=True)
+        try:
+            await bot.send_message(chat_id=user_id, text=f"❌ Ошибка профилирования: {e}")
+        except Exception as send_error:
+            logger.error(f"Не удалось сообщить об ошибке профилирования user_id={user_id}: {send_error}")
@@ -3,22 +3,24 @@
 import asyncio
 import json
 import logging
-import pytz
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from aiogram import Router, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, StateFilter
 from database import get_all_users_stats, get_broadcasts_with_buttons, get_broadcast_buttons, get_paid_users, get_non_paid_users, save_broadcast_button
 from config import ADMIN_IDS, DATABASE_PATH, ALLOWED_BROADCAST_CALLBACKS, BROADCAST_CALLBACK_ALIASES
 from keyboards import create_admin_keyboard, create_dynamic_broadcast_keyboard, create_admin_user_actions_keyboard, create_broadcast_with_payment_audience_keyboard
 from handlers.utils import escape_message_parts, send_message_with_fallback, unescape_markdown
+from telegram_gateway import outbound_lane, Lane
 import aiosqlite
 from states import BotStates
 
-from logger import get_logger
+from metrics import BROADCAST_MESSAGES
+from logger import get_logger, log_event
 logger = get_logger('main')
 
 # Создание роутера для рассылок
@@ -130,7 +132,8 @@ async def handle_broadcast_audience_selection(query: CallbackQuery, state: FSMCo
 
     user_data = await state.get_data()
     current_state = await state.get_state()
-    logger.debug(f"handle_broadcast_audience_selection: user_id={user_id}, callback_data={callback_data}, current_state={current_state}, user_data={user_data}")
+    logger.debug("handle_broadcast_audience_selection: user_id=%s, callback_data=%s, current_state=%s, user_data=%s",
+                 user_id, callback_data, current_state, user_data)
 
     if not user_data.get('awaiting_broadcast_audience') or current_state != BotStates.AWAITING_BROADCAST_AUDIENCE:
         logger.warning(f"handle_broadcast_audience_selection invoked without awaiting_broadcast_audience or incorrect state for user_id={user_id}, state={current_state}")
@@ -681,245 +684,6 @@ async def handle_broadcast_schedule_time(message: Message, state: FSMContext) ->
             except Exception as e_notify:
                 logger.error(f"Не удалось уведомить админа {admin_id}: {e_notify}")
 
-async def migrate_scheduled_broadcasts_table(conn) -> None:
-    """Выполняет миграцию таблицы scheduled_broadcasts, добавляя столбец scheduled_time."""
-    try:
-        c = await conn.execute("PRAGMA table_info(scheduled_broadcasts)")
-        columns = [row[1] for row in await c.fetchall()]
-        if 'scheduled_time' not in columns:
-            logger.info("Столбец scheduled_time отсутствует в таблице scheduled_broadcasts. Выполняется миграция.")
-            await conn.execute("ALTER TABLE scheduled_broadcasts RENAME TO scheduled_broadcasts_old")
-            await conn.execute("""
-                CREATE TABLE scheduled_broadcasts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    scheduled_time TEXT NOT NULL,
-                    broadcast_data TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            await conn.execute("""
-                INSERT INTO scheduled_broadcasts (id, broadcast_data, status, created_at)
-                SELECT id, broadcast_data, status, created_at
-                FROM scheduled_broadcasts_old
-            """)
-            await conn.execute("DROP TABLE scheduled_broadcasts_old")
-            await conn.commit()
-            logger.info("Миграция таблицы scheduled_broadcasts завершена успешно.")
-        else:
-            logger.debug("Столбец scheduled_time уже существует в таблице scheduled_broadcasts.")
-    except Exception as e:
-        logger.error(f"Ошибка при миграции таблицы scheduled_broadcasts: {e}", exc_info=True)
-        raise
-
-async def migrate_scheduled_time_format(conn):
-    """Миграция формата scheduled_time в scheduled_broadcasts."""
-    try:
-        conn.row_factory = aiosqlite.Row
-        c = await conn.cursor()
-        await c.execute("SELECT id, scheduled_time FROM scheduled_broadcasts WHERE scheduled_time LIKE '%T%'")
-        rows = await c.fetchall()
-        logger.debug(f"Найдено записей для миграции: {len(rows)}")
-        for row in rows:
-            try:
-                if not row['scheduled_time'] or not isinstance(row['scheduled_time'], str):
-                    logger.warning(f"Пропущена запись ID {row['id']}: scheduled_time пустое или некорректное")
-                    continue
-                old_time = datetime.fromisoformat(row['scheduled_time'].replace('Z', '+00:00'))
-                new_time = old_time.strftime('%Y-%m-%d %H:%M:%S')
-                logger.debug(f"Миграция записи ID {row['id']}: {row['scheduled_time']} -> {new_time}")
-                await c.execute(
-                    "UPDATE scheduled_broadcasts SET scheduled_time = ? WHERE id = ?",
-                    (new_time, row['id'])
-                )
-            except ValueError as ve:
-                logger.warning(f"Некорректный формат scheduled_time для ID {row['id']}: {ve}")
-                continue
-        await conn.commit()
-        logger.info("Миграция формата scheduled_time завершена")
-    except Exception as e:
-        logger.error(f"Ошибка миграции формата scheduled_time: {e}", exc_info=True)
-        raise
-
-async def migrate_broadcast_data(conn) -> None:
-    """Миграция таблицы scheduled_broadcasts для исправления некорректных или пустых broadcast_data."""
-    try:
-        conn.row_factory = aiosqlite.Row
-        c = await conn.cursor()
-        await c.execute("SELECT id, broadcast_data FROM scheduled_broadcasts")
-        rows = await c.fetchall()
-        logger.debug(f"Найдено записей для миграции broadcast_data: {len(rows)}")
-        updated_count = 0
-        for row in rows:
-            broadcast_id = row['id']
-            try:
-                # Проверяем на None, пустую строку или строку "null"
-                if row['broadcast_data'] is None or row['broadcast_data'].strip() == '' or row['broadcast_data'].lower() == 'null':
-                    logger.warning(f"Пустое, None или 'null' broadcast_data для broadcast_id={broadcast_id}")
-                    new_broadcast_data = json.dumps({
-                        'message': '',
-                        'media': None,
-                        'broadcast_type': 'all',
-                        'admin_user_id': ADMIN_IDS[0],
-                        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'with_payment_button': False,
-                        'buttons': []
-                    }, ensure_ascii=False)
-                    await c.execute(
-                        "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
-                        (new_broadcast_data, broadcast_id)
-                    )
-                    updated_count += 1
-                    continue
-                # Проверяем JSON
-                broadcast_data = json.loads(row['broadcast_data'])
-                if not isinstance(broadcast_data, dict):
-                    logger.error(f"Некорректный формат broadcast_data (не словарь) для broadcast_id={broadcast_id}: {row['broadcast_data']}")
-                    new_broadcast_data = json.dumps({
-                        'message': '',
-                        'media': None,
-                        'broadcast_type': 'all',
-                        'admin_user_id': ADMIN_IDS[0],
-                        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'with_payment_button': False,
-                        'buttons': []
-                    }, ensure_ascii=False)
-                    await c.execute(
-                        "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
-                        (new_broadcast_data, broadcast_id)
-                    )
-                    updated_count += 1
-                    continue
-                # Проверяем наличие обязательных полей
-                required_fields = ['message', 'media', 'broadcast_type', 'admin_user_id', 'with_payment_button', 'buttons']
-                updated = False
-                for field in required_fields:
-                    if field not in broadcast_data:
-                        logger.warning(f"Отсутствует поле {field} в broadcast_data для broadcast_id={broadcast_id}")
-                        broadcast_data[field] = '' if field == 'message' else None if field == 'media' else 'all' if field == 'broadcast_type' else ADMIN_IDS[0] if field == 'admin_user_id' else False if field == 'with_payment_button' else []
-                        updated = True
-                if updated:
-                    new_broadcast_data = json.dumps(broadcast_data, ensure_ascii=False)
-                    await c.execute(
-                        "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
-                        (new_broadcast_data, broadcast_id)
-                    )
-                    updated_count += 1
-            except json.JSONDecodeError as je:
-                logger.error(f"Ошибка парсинга broadcast_data для broadcast_id={broadcast_id}: {je}, данные: {row['broadcast_data']}")
-                new_broadcast_data = json.dumps({
-                    'message': '',
-                    'media': None,
-                    'broadcast_type': 'all',
-                    'admin_user_id': ADMIN_IDS[0],
-                    'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'with_payment_button': False,
-                    'buttons': []
-                }, ensure_ascii=False)
-                await c.execute(
-                    "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
-                    (new_broadcast_data, broadcast_id)
-                )
-                updated_count += 1
-        await conn.commit()
-        logger.info(f"Миграция broadcast_data завершена, обновлено записей: {updated_count}")
-    except Exception as e:
-        logger.error(f"Ошибка миграции broadcast_data: {e}", exc_info=True)
-        raise
-
-async def migrate_broadcast_message_escaping(conn) -> None:
-    """Миграция broadcast_data для очистки экранированных символов в поле message."""
-    try:
-        conn.row_factory = aiosqlite.Row
-        c = await conn.cursor()
-        await c.execute("SELECT id, broadcast_data FROM scheduled_broadcasts WHERE status = 'pending'")
-        rows = await c.fetchall()
-        logger.debug(f"Найдено записей для миграции экранирования: {len(rows)}")
-        for row in rows:
-            try:
-                broadcast_data = json.loads(row['broadcast_data'])
-                if 'message' not in broadcast_data:
-                    logger.debug(f"Пропущена запись ID {row['id']}: отсутствует поле message")
-                    continue
-                # Очищаем текст от экранирования
-                raw_message = unescape_markdown(broadcast_data['message'])
-                broadcast_data['message'] = raw_message
-                new_broadcast_data = json.dumps(broadcast_data, ensure_ascii=False)
-                await c.execute(
-                    "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
-                    (new_broadcast_data, row['id'])
-                )
-                logger.debug(f"Очищено экранирование для записи ID {row['id']}")
-            except json.JSONDecodeError as je:
-                logger.warning(f"Ошибка парсинга broadcast_data для ID {row['id']}: {je}")
-                continue
-        await conn.commit()
-        logger.info("Миграция экранирования сообщений в broadcast_data завершена")
-    except Exception as e:
-        logger.error(f"Ошибка миграции экранирования broadcast_data: {e}", exc_info=True)
-        raise
-
-async def migrate_scheduled_timezone(conn):
-    """Корректирует scheduled_time, если оно записано в UTC, добавляя 3 часа для MSK."""
-    try:
-        conn.row_factory = aiosqlite.Row
-        c = await conn.cursor()
-        await c.execute("SELECT id, scheduled_time FROM scheduled_broadcasts WHERE status = 'pending'")
-        rows = await c.fetchall()
-        logger.debug(f"Проверка часового пояса: найдено записей {len(rows)}")
-        msk_tz = pytz.timezone('Europe/Moscow')
-        utc_tz = pytz.timezone('UTC')
-        for row in rows:
-            try:
-                if not row['scheduled_time'] or not isinstance(row['scheduled_time'], str):
-                    logger.warning(f"Пропущена запись ID {row['id']}: scheduled_time пустое или некорректное")
-                    continue
-                utc_time = datetime.strptime(row['scheduled_time'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=utc_tz)
-                msk_time = utc_time.astimezone(msk_tz)
-                new_time = msk_time.strftime('%Y-%m-%d %H:%M:%S')
-                if new_time != row['scheduled_time']:
-                    logger.debug(f"Корректировка часового пояса для ID {row['id']}: {row['scheduled_time']} -> {new_time}")
-                    await c.execute(
-                        "UPDATE scheduled_broadcasts SET scheduled_time = ? WHERE id = ?",
-                        (new_time, row['id'])
-                    )
-            except ValueError as ve:
-                logger.warning(f"Некорректный формат scheduled_time для ID {row['id']}: {ve}")
-                continue
-        await conn.commit()
-        logger.info("Миграция часового пояса scheduled_time завершена")
-    except Exception as e:
-        logger.error(f"Ошибка миграции часового пояса scheduled_time: {e}", exc_info=True)
-        raise
-
-async def migrate_broadcast_admin_user_id(conn):
-    """Добавляет admin_user_id в broadcast_data для существующих записей."""
-    try:
-        conn.row_factory = aiosqlite.Row
-        c = await conn.cursor()
-        await c.execute("SELECT id, broadcast_data FROM scheduled_broadcasts WHERE status = 'pending'")
-        rows = await c.fetchall()
-        logger.debug(f"Найдено записей для миграции admin_user_id: {len(rows)}")
-        for row in rows:
-            try:
-                broadcast_data = json.loads(row['broadcast_data'])
-                if 'admin_user_id' not in broadcast_data:
-                    broadcast_data['admin_user_id'] = ADMIN_IDS[0]  # Fallback на первого админа
-                    new_broadcast_data = json.dumps(broadcast_data, ensure_ascii=False)
-                    await c.execute(
-                        "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
-                        (new_broadcast_data, row['id'])
-                    )
-                    logger.debug(f"Добавлен admin_user_id для записи ID {row['id']}")
-            except json.JSONDecodeError as je:
-                logger.warning(f"Ошибка парсинга broadcast_data для ID {row['id']}: {je}")
-                continue
-        await conn.commit()
-        logger.info("Миграция admin_user_id в broadcast_data завершена")
-    except Exception as e:
-        logger.error(f"Ошибка миграции admin_user_id: {e}", exc_info=True)
-        raise
-
 async def schedule_broadcast(schedule_time: datetime, message_text: str, media: Optional[Dict], broadcast_type: str, admin_user_id: int, buttons: List[Dict[str, str]]) -> None:
     """Сохраняет запланированную рассылку в базу данных."""
     try:
@@ -935,11 +699,6 @@ async def schedule_broadcast(schedule_time: datetime, message_text: str, media:
         }
         async with aiosqlite.connect(DATABASE_PATH, timeout=15) as conn:
             await conn.execute("PRAGMA busy_timeout = 30000")
-            await migrate_scheduled_broadcasts_table(conn)
-            await migrate_scheduled_time_format(conn)
-            await migrate_scheduled_timezone(conn)
-            await migrate_broadcast_admin_user_id(conn)
-            await migrate_broadcast_message_escaping(conn)
             c = await conn.cursor()
             scheduled_time_str = schedule_time.strftime('%Y-%m-%d %H:%M:%S')
             await c.execute(
@@ -977,55 +736,62 @@ async def broadcast_message_admin(bot: Bot, message_text: str, admin_user_id: in
         ),
         parse_mode=ParseMode.MARKDOWN_V2
     )
-    for target_user_id in target_users:
-        try:
-            reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
+    # Текст без разметки для получателей, у которых MarkdownV2 не принят; считается один раз на рассылку
+    raw_text = None
+    # Очерёдность и темп задаёт шлюз исходящих сообщений: рассылка не мешает ответам пользователям
+    with outbound_lane(Lane.BROADCAST):
+        for target_user_id in target_users:
             try:
-                # Пытаемся отправить с MarkdownV2
-                if media_type == 'photo' and media_id:
-                    await bot.send_photo(
-                        chat_id=target_user_id, photo=media_id,
-                        caption=message_text, parse_mode=ParseMode.MARKDOWN_V2,
-                        reply_markup=reply_markup
-                    )
-                elif media_type == 'video' and media_id:
-                    await bot.send_video(
-                        chat_id=target_user_id, video=media_id,
-                        caption=message_text, parse_mode=ParseMode.MARKDOWN_V2,
-                        reply_markup=reply_markup
-                    )
-                else:
-                    await bot.send_message(
-                        chat_id=target_user_id, text=message_text, parse_mode=ParseMode.MARKDOWN_V2,
-                        reply_markup=reply_markup
-                    )
-            except TelegramBadRequest as e:
-                # Fallback: отправка без Markdown
-                logger.warning(f"Ошибка Markdown для user_id={target_user_id}: {e}. Пробуем без парсинга.")
-                raw_text = unescape_markdown(message_text)
-                if media_type == 'photo' and media_id:
-                    await bot.send_photo(
-                        chat_id=target_user_id, photo=media_id,
-                        caption=raw_text, parse_mode=None,
-                        reply_markup=reply_markup
-                    )
-                elif media_type == 'video' and media_id:
-                    await bot.send_video(
-                        chat_id=target_user_id, video=media_id,
-                        caption=raw_text, parse_mode=None,
-                        reply_markup=reply_markup
-                    )
-                else:
-                    await bot.send_message(
-                        chat_id=target_user_id, text=raw_text, parse_mode=None,
-                        reply_markup=reply_markup
-                    )
-            sent_count += 1
-            if sent_count % 20 == 0:
-                await asyncio.sleep(1)
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения пользователю {target_user_id}: {e}", exc_info=True)
-            failed_count += 1
+                reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
+                try:
+                    # Пытаемся отправить с MarkdownV2
+                    if media_type == 'photo' and media_id:
+                        await bot.send_photo(
+                            chat_id=target_user_id, photo=media_id,
+                            caption=message_text, parse_mode=ParseMode.MARKDOWN_V2,
+                            reply_markup=reply_markup
+                        )
+                    elif media_type == 'video' and media_id:
+                        await bot.send_video(
+                            chat_id=target_user_id, video=media_id,
+                            caption=message_text, parse_mode=ParseMode.MARKDOWN_V2,
+                            reply_markup=reply_markup
+                        )
+                    else:
+                        await bot.send_message(
+                            chat_id=target_user_id, text=message_text, parse_mode=ParseMode.MARKDOWN_V2,
+                            reply_markup=reply_markup
+                        )
+                except TelegramBadRequest as e:
+                    # Fallback: отправка без Markdown
+                    logger.warning(f"Ошибка Markdown для user_id={target_user_id}: {e}. Пробуем без парсинга.")
+                    if raw_text is None:
+                        raw_text = unescape_markdown(message_text)
+                    if media_type == 'photo' and media_id:
+                        await bot.send_photo(
+                            chat_id=target_user_id, photo=media_id,
+                            caption=raw_text, parse_mode=None,
+                            reply_markup=reply_markup
+                        )
+                    elif media_type == 'video' and media_id:
+                        await bot.send_video(
+                            chat_id=target_user_id, video=media_id,
+                            caption=raw_text, parse_mode=None,
+                            reply_markup=reply_markup
+                        )
+                    else:
+                        await bot.send_message(
+                            chat_id=target_user_id, text=raw_text, parse_mode=None,
+                            reply_markup=reply_markup
+                        )
+                sent_count += 1
+                BROADCAST_MESSAGES.inc(result='sent')
+                log_event(logger, 'broadcast_sent', "Сообщение рассылки доставлено user_id=%s", target_user_id, user_id=target_user_id)
+            except Exception as e:
+                BROADCAST_MESSAGES.inc(result='failed')
+                log_event(logger, 'broadcast_failed', "Ошибка отправки сообщения пользователю %s: %s", target_user_id, e,
+                          level=logging.ERROR, exc_info=True, user_id=target_user_id)
+                failed_count += 1
     summary_text = escape_message_parts(
         f"🏁 Рассылка завершена!\n",
         f"✅ Отправлено: `{sent_count}`\n",
@@ -1057,32 +823,35 @@ async def broadcast_to_paid_users(bot: Bot, message_text: str, admin_user_id: in
     signature = "🍪 PixelPie"
     caption = message_text + ("\n\n" + signature if message_text.strip() else "\n" + signature)
     escaped_caption = escape_message_parts(caption, version=2)
-    for target_user_id in target_users:
-        try:
-            reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
-            if media_type == 'photo' and media_id:
-                await bot.send_photo(
-                    chat_id=target_user_id, photo=media_id,
-                    caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            elif media_type == 'video' and media_id:
-                await bot.send_video(
-                    chat_id=target_user_id, video=media_id,
-                    caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            else:
-                await bot.send_message(
-                    chat_id=target_user_id, text=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            sent_count += 1
-            if sent_count % 20 == 0:
-                await asyncio.sleep(1)
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения пользователю {target_user_id}: {e}", exc_info=True)
-            failed_count += 1
+    with outbound_lane(Lane.BROADCAST):
+        for target_user_id in target_users:
+            try:
+                reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
+                if media_type == 'photo' and media_id:
+                    await bot.send_photo(
+                        chat_id=target_user_id, photo=media_id,
+                        caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                elif media_type == 'video' and media_id:
+                    await bot.send_video(
+                        chat_id=target_user_id, video=media_id,
+                        caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                else:
+                    await bot.send_message(
+                        chat_id=target_user_id, text=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                sent_count += 1
+                BROADCAST_MESSAGES.inc(result='sent')
+                log_event(logger, 'broadcast_sent', "Сообщение рассылки доставлено user_id=%s", target_user_id, user_id=target_user_id)
+            except Exception as e:
+                BROADCAST_MESSAGES.inc(result='failed')
+                log_event(logger, 'broadcast_failed', "Ошибка отправки сообщения пользователю %s: %s", target_user_id, e,
+                          level=logging.ERROR, exc_info=True, user_id=target_user_id)
+                failed_count += 1
     summary_text = escape_message_parts(
         f"🏁 Рассылка для оплативших завершена!\n",
         f"✅ Отправлено: `{sent_count}`\n",
@@ -1114,32 +883,35 @@ async def broadcast_to_non_paid_users(bot: Bot, message_text: str, admin_user_id
     signature = "🍪 PixelPie"
     caption = message_text + ("\n\n" + signature if message_text.strip() else "\n" + signature)
     escaped_caption = escape_message_parts(caption, version=2)
-    for target_user_id in target_users:
-        try:
-            reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
-            if media_type == 'photo' and media_id:
-                await bot.send_photo(
-                    chat_id=target_user_id, photo=media_id,
-                    caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            elif media_type == 'video' and media_id:
-                await bot.send_video(
-                    chat_id=target_user_id, video=media_id,
-                    caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            else:
-                await bot.send_message(
-                    chat_id=target_user_id, text=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            sent_count += 1
-            if sent_count % 20 == 0:
-                await asyncio.sleep(1)
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения пользователю {target_user_id}: {e}", exc_info=True)
-            failed_count += 1
+    with outbound_lane(Lane.BROADCAST):
+        for target_user_id in target_users:
+            try:
+                reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
+                if media_type == 'photo' and media_id:
+                    await bot.send_photo(
+                        chat_id=target_user_id, photo=media_id,
+                        caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                elif media_type == 'video' and media_id:
+                    await bot.send_video(
+                        chat_id=target_user_id, video=media_id,
+                        caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                else:
+                    await bot.send_message(
+                        chat_id=target_user_id, text=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                sent_count += 1
+                BROADCAST_MESSAGES.inc(result='sent')
+                log_event(logger, 'broadcast_sent', "Сообщение рассылки доставлено user_id=%s", target_user_id, user_id=target_user_id)
+            except Exception as e:
+                BROADCAST_MESSAGES.inc(result='failed')
+                log_event(logger, 'broadcast_failed', "Ошибка отправки сообщения пользователю %s: %s", target_user_id, e,
+                          level=logging.ERROR, exc_info=True, user_id=target_user_id)
+                failed_count += 1
     summary_text = escape_message_parts(
         f"🏁 Рассылка для не оплативших завершена!\n",
         f"✅ Отправлено: `{sent_count}`\n",
@@ -1179,32 +951,35 @@ async def broadcast_with_payment(
     signature = "🍪 PixelPie"
     caption = message_text + ("\n\n" + signature if message_text.strip() else "\n" + signature)
     escaped_caption = escape_message_parts(caption, version=2)
-    for target_user_id in target_users:
-        try:
-            reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
-            if media_type == 'photo' and media_id:
-                await bot.send_photo(
-                    chat_id=target_user_id, photo=media_id,
-                    caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            elif media_type == 'video' and media_id:
-                await bot.send_video(
-                    chat_id=target_user_id, video=media_id,
-                    caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                    reply_markup=reply_markup
-                )
-            else:
-                await bot.send_message(
-                    chat_id=target_user_id, text=escaped_caption,
-                    parse_mode=ParseMode.MARKDOWN_V2, reply_markup=reply_markup
-                )
-            sent_count += 1
-            if sent_count % 20 == 0:
-                await asyncio.sleep(1)
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения пользователю {target_user_id}: {e}", exc_info=True)
-            failed_count += 1
+    with outbound_lane(Lane.BROADCAST):
+        for target_user_id in target_users:
+            try:
+                reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
+                if media_type == 'photo' and media_id:
+                    await bot.send_photo(
+                        chat_id=target_user_id, photo=media_id,
+                        caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                elif media_type == 'video' and media_id:
+                    await bot.send_video(
+                        chat_id=target_user_id, video=media_id,
+                        caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=reply_markup
+                    )
+                else:
+                    await bot.send_message(
+                        chat_id=target_user_id, text=escaped_caption,
+                        parse_mode=ParseMode.MARKDOWN_V2, reply_markup=reply_markup
+                    )
+                sent_count += 1
+                BROADCAST_MESSAGES.inc(result='sent')
+                log_event(logger, 'broadcast_sent', "Сообщение рассылки доставлено user_id=%s", target_user_id, user_id=target_user_id)
+            except Exception as e:
+                BROADCAST_MESSAGES.inc(result='failed')
+                log_event(logger, 'broadcast_failed', "Ошибка отправки сообщения пользователю %s: %s", target_user_id, e,
+                          level=logging.ERROR, exc_info=True, user_id=target_user_id)
+                failed_count += 1
     summary_text = escape_message_parts(
         f"🏁 Рассылка с оплатой завершена!\n",
         f"✅ Отправлено: `{sent_count}`\n",
@@ -1308,32 +1083,35 @@ async def handle_broadcast_schedule_input(query: CallbackQuery, state: FSMContex
             # Выполняем рассылку
             success_count = 0
             error_count = 0
-            for target_user_id in target_users:
-                try:
-                    reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
-                    if media_type == 'photo' and media_id:
-                        await query.bot.send_photo(
-                            chat_id=target_user_id, photo=media_id,
-                            caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                            reply_markup=reply_markup
-                        )
-                    elif media_type == 'video' and media_id:
-                        await query.bot.send_video(
-                            chat_id=target_user_id, video=media_id,
-                            caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                            reply_markup=reply_markup
-                        )
-                    else:
-                        await query.bot.send_message(
-                            chat_id=target_user_id, text=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
-                            reply_markup=reply_markup
-                        )
-                    success_count += 1
-                    if success_count % 20 == 0:
-                        await asyncio.sleep(1)
-                except Exception as e:
-                    logger.error(f"Ошибка отправки сообщения пользователю {target_user_id}: {e}")
-                    error_count += 1
+            with outbound_lane(Lane.BROADCAST):
+                for target_user_id in target_users:
+                    try:
+                        reply_markup = await create_dynamic_broadcast_keyboard(buttons, target_user_id) if buttons else None
+                        if media_type == 'photo' and media_id:
+                            await query.bot.send_photo(
+                                chat_id=target_user_id, photo=media_id,
+                                caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                                reply_markup=reply_markup
+                            )
+                        elif media_type == 'video' and media_id:
+                            await query.bot.send_video(
+                                chat_id=target_user_id, video=media_id,
+                                caption=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                                reply_markup=reply_markup
+                            )
+                        else:
+                            await query.bot.send_message(
+                                chat_id=target_user_id, text=escaped_caption, parse_mode=ParseMode.MARKDOWN_V2,
+                                reply_markup=reply_markup
+                            )
+                        success_count += 1
+                        BROADCAST_MESSAGES.inc(result='sent')
+                        log_event(logger, 'broadcast_sent', "Сообщение рассылки доставлено user_id=%s", target_user_id, user_id=target_user_id)
+                    except Exception as e:
+                        BROADCAST_MESSAGES.inc(result='failed')
+                        log_event(logger, 'broadcast_failed', "Ошибка отправки сообщения пользователю %s: %s", target_user_id, e,
+                                  level=logging.ERROR, user_id=target_user_id)
+                        error_count += 1
 
             # Формируем итоговое сообщение
             text = escape_message_parts(
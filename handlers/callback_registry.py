@@ -0,0 +1,166 @@
+# handlers/callback_registry.py
+"""Реестр маршрутов callback-запросов.
+
+Точные значения callback_data ищутся в словаре, префиксные (style_, aspect_, pay_, ...)
+- в префиксном дереве по самому длинному совпадению, так что время поиска не зависит
+от числа маршрутов. Общие шаги (проверка блокировки, сброс FSM, запоминание администратора)
+объявляются middleware один раз - на весь реестр или на отдельный маршрут.
+По каждому маршруту копятся вызовы, ошибки и время обработки.
+"""
+import inspect
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from aiogram.enums import ParseMode
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+
+from database import is_user_blocked
+from handlers.utils import safe_escape_markdown as escape_md
+
+from logger import get_logger
+logger = get_logger('main')
+
+# Middleware получает запрос, состояние и контекст вызова; False - обработка останавливается
+Middleware = Callable[[CallbackQuery, FSMContext, Dict[str, Any]], Awaitable[bool]]
+
+# Значения контекста, которые реестр передаёт обработчику, если у него есть параметр с таким именем
+_CONTEXT_ARGS = ('user_id', 'callback_data')
+# Ключ конца префикса в узле дерева (символ callback_data не бывает пустой строкой)
+_END = ''
+
+_registries: List['CallbackRegistry'] = []
+
+
+class CallbackRoute:
+    """Маршрут: обработчик, его middleware и счётчики."""
+    __slots__ = ('name', 'handler', 'middlewares', 'context_args', 'calls', 'errors', 'total_seconds', 'max_seconds')
+
+    def __init__(self, name: str, handler: Callable[..., Awaitable[Any]], middlewares: Sequence[Middleware]):
+        self.name = name
+        self.handler = handler
+        self.middlewares = tuple(middlewares)
+        parameters = inspect.signature(handler).parameters
+        self.context_args = tuple(arg for arg in _CONTEXT_ARGS if arg in parameters)
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': round(self.total_seconds / self.calls * 1000, 2) if self.calls else 0.0,
+            'max_ms': round(self.max_seconds * 1000, 2),
+        }
+
+
+class CallbackRegistry:
+    """Маршрутизатор callback_data: словарь точных значений + префиксное дерево."""
+    def __init__(self, name: str, middlewares: Sequence[Middleware] = ()):
+        self.name = name
+        self.middlewares = tuple(middlewares)
+        self._exact: Dict[str, CallbackRoute] = {}
+        self._prefixes: Dict[str, Any] = {}
+        _registries.append(self)
+
+    def add_exact(self, value: str, handler: Callable[..., Awaitable[Any]],
+                  middlewares: Optional[Sequence[Middleware]] = None) -> CallbackRoute:
+        route = CallbackRoute(value, handler, self.middlewares if middlewares is None else middlewares)
+        self._exact[value] = route
+        return route
+
+    def add_prefix(self, prefix: str, handler: Callable[..., Awaitable[Any]],
+                   middlewares: Optional[Sequence[Middleware]] = None) -> CallbackRoute:
+        route = CallbackRoute(f"{prefix}*", handler, self.middlewares if middlewares is None else middlewares)
+        node = self._prefixes
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_END] = route
+        return route
+
+    def resolve(self, callback_data: str) -> Optional[CallbackRoute]:
+        """Точное совпадение, иначе самый длинный зарегистрированный префикс."""
+        route = self._exact.get(callback_data)
+        if route is not None:
+            return route
+        node = self._prefixes
+        for char in callback_data:
+            node = node.get(char)
+            if node is None:
+                break
+            route = node.get(_END, route)
+        return route
+
+    async def dispatch(self, query: CallbackQuery, state: FSMContext, context: Optional[Dict[str, Any]] = None) -> bool:
+        """Выполняет маршрут для query.data. False - маршрут не найден.
+
+        Исключения обработчика пробрасываются вызывающему (после учёта в счётчиках).
+        """
+        callback_data = query.data or ""
+        route = self.resolve(callback_data)
+        if route is None:
+            return False
+        if context is None:
+            context = {}
+        context.setdefault('user_id', query.from_user.id)
+        context['callback_data'] = callback_data
+        context['route'] = route.name
+
+        for middleware in route.middlewares:
+            if not await middleware(query, state, context):
+                return True
+
+        started = time.perf_counter()
+        try:
+            await route.handler(query, state, **{arg: context[arg] for arg in route.context_args})
+        except Exception:
+            route.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            route.calls += 1
+            route.total_seconds += elapsed
+            if elapsed > route.max_seconds:
+                route.max_seconds = elapsed
+        return True
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        routes = list(self._exact.values())
+        stack = [self._prefixes]
+        while stack:
+            node = stack.pop()
+            for key, value in node.items():
+                if key == _END:
+                    routes.append(value)
+                else:
+                    stack.append(value)
+        return {route.name: route.get_stats() for route in routes if route.calls}
+
+
+def get_callback_route_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Счётчики маршрутов всех реестров: {реестр: {маршрут: {...}}}."""
+    return {registry.name: registry.get_stats() for registry in _registries}
+
+
+# --- общие middleware ---
+
+async def reject_blocked_user(query: CallbackQuery, state: FSMContext, context: Dict[str, Any]) -> bool:
+    """Останавливает обработку для заблокированного пользователя."""
+    user_id = context['user_id']
+    if not await is_user_blocked(user_id):
+        return True
+    logger.info(f"Заблокированный пользователь user_id={user_id} пытался выполнить callback: {context['callback_data']}")
+    await query.answer("🚫 Ваш аккаунт заблокирован.", show_alert=True)
+    await query.message.answer(
+        escape_md("🚫 Ваш аккаунт заблокирован. Обратитесь в поддержку: @AXIDI_Help", version=2),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+    return False
+
+
+async def remember_admin_id(query: CallbackQuery, state: FSMContext, context: Dict[str, Any]) -> bool:
+    """Сохраняет id администратора в FSM перед действием админ-панели."""
+    await state.update_data(user_id=context['user_id'])
+    return True
@@ -3,17 +3,17 @@
 import asyncio
 import logging
 from typing import Optional
-from datetime import datetime, timedelta
 from aiogram import Router, Bot
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ParseMode
 from config import ADMIN_IDS, TARIFFS
 from generation.images import generate_image
-from database import check_database_user, update_user_balance
+from database import check_database_user, update_user_credits
 from handlers.admin_panel import (
     admin_panel, show_admin_stats, admin_show_failed_avatars,
-    admin_confirm_delete_all_failed, admin_execute_delete_all_failed
+    admin_confirm_delete_all_failed, admin_execute_delete_all_failed,
+    admin_profiler_menu, admin_start_profiler
 )
 from handlers.user_management import (
     show_user_actions, show_user_profile_admin, show_user_avatars_admin,
@@ -28,7 +28,8 @@ from handlers.visualization import (
     show_visualization, visualize_payments, visualize_registrations, visualize_generations, show_activity_stats
 )
 from handlers.generation import generate_photo_for_user
-from handlers.utils import escape_message_parts, send_typing_action
+from handlers.utils import escape_message_parts
+from handlers.callback_registry import CallbackRegistry, remember_admin_id
 from keyboards import create_admin_keyboard
 from report import report_generator, send_report_to_admin, delete_report_file
 
@@ -38,10 +39,12 @@ logger = get_logger('main')
 # Создание роутера для callback'ов админ-панели
 admin_callbacks_router = Router()
 
+# Большинство действий админ-панели сначала сохраняют id администратора в FSM
+admin_callbacks = CallbackRegistry('admin', middlewares=(remember_admin_id,))
+
 async def handle_admin_callback(query: CallbackQuery, state: FSMContext) -> Optional[int]:
     """Обрабатывает callback-запросы админ-панели."""
     user_id = query.from_user.id
-    bot = query.bot
 
     if user_id not in ADMIN_IDS:
         await query.answer("⛔ Недостаточно прав", show_alert=True)
@@ -51,191 +54,7 @@ async def handle_admin_callback(query: CallbackQuery, state: FSMContext) -> Opti
     logger.info(f"Callback от user_id={user_id}: {callback_data}")
 
     try:
-        if callback_data == "admin_panel":
-            await state.clear()
-            await state.update_data(user_id=user_id)
-            await admin_panel(query.message, state, user_id=user_id)
-        elif callback_data == "admin_stats":
-            await state.update_data(user_id=user_id)
-            await handle_admin_report_users(query, state)
-        elif callback_data.startswith("admin_stats_page_"):
-            await state.update_data(user_id=user_id)
-            await handle_admin_report_users(query, state)
-        elif callback_data == "admin_replicate_costs":
-            await state.update_data(user_id=user_id)
-            await show_replicate_costs(query, state)
-        elif callback_data == "admin_payments":
-            await state.update_data(user_id=user_id)
-            await handle_admin_report_payments(query, state)
-        elif callback_data.startswith("payments_date_"):
-            dates = callback_data.replace("payments_date_", "").split("_")
-            start_date, end_date = dates[0], dates[1]
-            await state.update_data(user_id=user_id)
-            await handle_payments_date(query, state, start_date, end_date)
-        elif callback_data == "payments_manual_date":
-            await state.update_data(user_id=user_id)
-            await handle_manual_date_input(query, state)
-        elif callback_data == "admin_activity_stats":
-            await state.update_data(user_id=user_id)
-            await handle_admin_report_activity(query, state)
-        elif callback_data.startswith("activity_"):
-            parts = callback_data.split("_")
-            if len(parts) == 3:
-                days = int(parts[2])
-                end_date = datetime.now().strftime('%Y-%m-%d')
-                start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-                await state.update_data(user_id=user_id)
-                await show_activity_stats(query, state)
-        elif callback_data == "admin_referral_stats":
-            await state.update_data(user_id=user_id)
-            await handle_admin_report_referrals(query, state)
-        elif callback_data == "admin_visualization":
-            await state.update_data(user_id=user_id)
-            await show_visualization(query, state)
-        elif callback_data.startswith("delete_report_"):
-            filename = callback_data.replace("delete_report_", "")
-            await handle_delete_report(query, state, filename)
-        elif callback_data.startswith("user_actions_"):
-            await state.update_data(user_id=user_id)
-            await show_user_actions(query, state)
-        elif callback_data.startswith("view_user_profile_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await show_user_profile_admin(query, state, target_user_id)
-        elif callback_data.startswith("user_avatars_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await show_user_avatars_admin(query, state, target_user_id)
-        elif callback_data.startswith("change_balance_"):
-            await state.update_data(user_id=user_id)
-            await change_balance_admin(query, state)
-        elif callback_data.startswith("user_logs_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await show_user_logs(query, state, target_user_id)
-        elif callback_data.startswith("admin_generate:"):
-            target_user_id = int(callback_data.split(":")[1])
-            await state.update_data(user_id=user_id)
-            await generate_photo_for_user(query, state, target_user_id)
-        elif callback_data.startswith("admin_send_gen:"):
-            target_user_id = int(callback_data.split(":")[1])
-            user_data = await state.get_data()
-            generation_data = user_data.get(f'last_admin_generation_{target_user_id}')
-            if generation_data and generation_data.get('image_urls'):
-                try:
-                    await query.bot.send_photo(
-                        chat_id=target_user_id,
-                        photo=generation_data['image_urls'][0],
-                        caption=escape_message_parts(
-                            "🎁 Для вас создано новое изображение!",
-                            version=2
-                        ),
-                        parse_mode=ParseMode.MARKDOWN_V2
-                    )
-                    await query.answer("✅ Изображение отправлено пользователю!", show_alert=True)
-                except Exception as e:
-                    await query.answer(f"❌ Ошибка: {str(e)}.", show_alert=True)
-            else:
-                await query.answer("❌ Данные генерации не найдены.", show_alert=True)
-        elif callback_data.startswith("admin_video:"):
-            target_user_id = int(callback_data.split(":")[1])
-            await state.update_data(user_id=user_id)
-            await generate_video_for_user(query, state, target_user_id)
-        elif callback_data.startswith("delete_user_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await delete_user_admin(query, state, target_user_id)
-        elif callback_data.startswith("confirm_delete_user_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await confirm_delete_user(query, state, target_user_id)
-        elif callback_data.startswith("block_user_"):
-            await state.update_data(user_id=user_id)
-            await block_user_admin(query, state)
-        elif callback_data.startswith("confirm_block_user_"):
-            await state.update_data(user_id=user_id)
-            await confirm_block_user(query, state, bot)
-        elif callback_data.startswith("reset_avatar_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await confirm_reset_avatar(query, state, target_user_id)
-        elif callback_data == "admin_failed_avatars":
-            await state.update_data(user_id=user_id)
-            await admin_show_failed_avatars(query, state)
-        elif callback_data == "admin_delete_all_failed":
-            await state.update_data(user_id=user_id)
-            await admin_confirm_delete_all_failed(query, state)
-        elif callback_data == "admin_confirm_delete_all":
-            await state.update_data(user_id=user_id)
-            await admin_execute_delete_all_failed(query, state)
-        elif callback_data == "send_broadcast_no_text":
-            user_data = await state.get_data()
-            broadcast_type = user_data.get('broadcast_type')
-            media_type = user_data.get('admin_media_type')
-            media_id = user_data.get('admin_media_id')
-            if not broadcast_type:
-                await query.answer("❌ Тип рассылки не определён.", show_alert=True)
-                text = escape_message_parts(
-                    "❌ Ошибка: тип рассылки не определён.",
-                    version=2
-                )
-                await query.message.edit_text(
-                    text,
-                    reply_markup=await create_admin_keyboard(user_id),
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-                return
-            await query.answer("📢 Запускаю рассылку без текста...")
-            if broadcast_type == 'all':
-                asyncio.create_task(broadcast_message_admin(bot, "", user_id, media_type, media_id))
-            elif broadcast_type == 'paid':
-                asyncio.create_task(broadcast_to_paid_users(bot, "", user_id, media_type, media_id))
-            elif broadcast_type == 'non_paid':
-                asyncio.create_task(broadcast_to_non_paid_users(bot, "", user_id, media_type, media_id))
-            elif broadcast_type.startswith('with_payment_'):
-                audience_type = broadcast_type.replace('with_payment_', '')
-                reply_markup = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="Да, хочу! 💳", callback_data="subscribe")]
-                ])
-                if audience_type == 'all':
-                    asyncio.create_task(broadcast_message_admin(bot, "", user_id, media_type, media_id, reply_markup))
-                elif audience_type == 'paid':
-                    asyncio.create_task(broadcast_to_paid_users(bot, "", user_id, media_type, media_id, reply_markup))
-                elif audience_type == 'non_paid':
-                    asyncio.create_task(broadcast_to_non_paid_users(bot, "", user_id, media_type, media_id, reply_markup))
-            await state.clear()
-            text = escape_message_parts(
-                "📢 Рассылка запущена!",
-                version=2
-            )
-            await query.message.edit_text(
-                text,
-                reply_markup=await create_admin_keyboard(user_id),
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-        elif callback_data == "admin_give_subscription":
-            await state.update_data(user_id=user_id)
-            await handle_admin_give_subscription_callback(query, state, user_id)
-        elif callback_data.startswith("give_subscription_for_user_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await handle_admin_give_sub_to_user_callback(query, state, user_id, target_user_id)
-        elif callback_data.startswith("add_photos_to_user_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await handle_admin_add_resources_callback(query, state, user_id, target_user_id, "photo", 20)
-        elif callback_data.startswith("add_avatar_to_user_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await handle_admin_add_resources_callback(query, state, user_id, target_user_id, "avatar", 1)
-        elif callback_data.startswith("chat_with_user_"):
-            target_user_id = int(callback_data.split("_")[-1])
-            await state.update_data(user_id=user_id)
-            await handle_admin_chat_with_user_callback(query, state, user_id, target_user_id)
-        elif callback_data == "admin_search_user":
-            await state.update_data(user_id=user_id)
-            await search_users_admin(query, state)
-        else:
+        if not await admin_callbacks.dispatch(query, state, {'user_id': user_id}):
             logger.error(f"Неизвестный admin callback_data: {callback_data} для user_id={user_id}")
             text = escape_message_parts(
                 "❌ Неизвестное административное действие.",
@@ -260,10 +79,140 @@ async def handle_admin_callback(query: CallbackQuery, state: FSMContext) -> Opti
             parse_mode=ParseMode.MARKDOWN_V2
         )
 
+def _target_user_id(callback_data: str, separator: str = "_") -> int:
+    """id пользователя из callback_data вида 'действие_<id>' или 'действие:<id>'."""
+    if separator == ":":
+        return int(callback_data.split(":")[1])
+    return int(callback_data.split("_")[-1])
+
+async def _handle_admin_panel_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
+    await state.clear()
+    await state.update_data(user_id=user_id)
+    await admin_panel(query.message, state, user_id=user_id)
+
+async def _handle_payments_date_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    dates = callback_data.replace("payments_date_", "").split("_")
+    start_date, end_date = dates[0], dates[1]
+    await handle_payments_date(query, state, start_date, end_date)
+
+async def _handle_activity_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    if len(callback_data.split("_")) == 3:
+        await show_activity_stats(query, state)
+
+async def _handle_delete_report_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await handle_delete_report(query, state, callback_data.replace("delete_report_", ""))
+
+async def _handle_view_user_profile_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await show_user_profile_admin(query, state, _target_user_id(callback_data))
+
+async def _handle_user_avatars_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await show_user_avatars_admin(query, state, _target_user_id(callback_data))
+
+async def _handle_user_logs_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await show_user_logs(query, state, _target_user_id(callback_data))
+
+async def _handle_admin_generate_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await generate_photo_for_user(query, state, _target_user_id(callback_data, ":"))
+
+async def _handle_admin_profile_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    seconds = callback_data.replace("admin_profile_", "")
+    await admin_start_profiler(query, state, int(seconds) if seconds.isdigit() else 0)
+
+async def _handle_admin_send_gen_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    target_user_id = _target_user_id(callback_data, ":")
+    user_data = await state.get_data()
+    generation_data = user_data.get(f'last_admin_generation_{target_user_id}')
+    if generation_data and generation_data.get('image_urls'):
+        try:
+            await query.bot.send_photo(
+                chat_id=target_user_id,
+                photo=generation_data['image_urls'][0],
+                caption=escape_message_parts(
+                    "🎁 Для вас создано новое изображение!",
+                    version=2
+                ),
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+            await query.answer("✅ Изображение отправлено пользователю!", show_alert=True)
+        except Exception as e:
+            await query.answer(f"❌ Ошибка: {str(e)}.", show_alert=True)
+    else:
+        await query.answer("❌ Данные генерации не найдены.", show_alert=True)
+
+async def _handle_delete_user_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await delete_user_admin(query, state, _target_user_id(callback_data))
+
+async def _handle_confirm_delete_user_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await confirm_delete_user(query, state, _target_user_id(callback_data))
+
+async def _handle_confirm_block_user_callback(query: CallbackQuery, state: FSMContext) -> None:
+    await confirm_block_user(query, state, query.bot)
+
+async def _handle_reset_avatar_callback(query: CallbackQuery, state: FSMContext, callback_data: str) -> None:
+    await confirm_reset_avatar(query, state, _target_user_id(callback_data))
+
+async def _handle_send_broadcast_no_text_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
+    bot = query.bot
+    user_data = await state.get_data()
+    broadcast_type = user_data.get('broadcast_type')
+    media_type = user_data.get('admin_media_type')
+    media_id = user_data.get('admin_media_id')
+    if not broadcast_type:
+        await query.answer("❌ Тип рассылки не определён.", show_alert=True)
+        text = escape_message_parts(
+            "❌ Ошибка: тип рассылки не определён.",
+            version=2
+        )
+        await query.message.edit_text(
+            text,
+            reply_markup=await create_admin_keyboard(user_id),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        return
+    await query.answer("📢 Запускаю рассылку без текста...")
+    if broadcast_type == 'all':
+        asyncio.create_task(broadcast_message_admin(bot, "", user_id, media_type, media_id))
+    elif broadcast_type == 'paid':
+        asyncio.create_task(broadcast_to_paid_users(bot, "", user_id, media_type, media_id))
+    elif broadcast_type == 'non_paid':
+        asyncio.create_task(broadcast_to_non_paid_users(bot, "", user_id, media_type, media_id))
+    elif broadcast_type.startswith('with_payment_'):
+        audience_type = broadcast_type.replace('with_payment_', '')
+        reply_markup = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="Да, хочу! 💳", callback_data="subscribe")]
+        ])
+        if audience_type == 'all':
+            asyncio.create_task(broadcast_message_admin(bot, "", user_id, media_type, media_id, reply_markup))
+        elif audience_type == 'paid':
+            asyncio.create_task(broadcast_to_paid_users(bot, "", user_id, media_type, media_id, reply_markup))
+        elif audience_type == 'non_paid':
+            asyncio.create_task(broadcast_to_non_paid_users(bot, "", user_id, media_type, media_id, reply_markup))
+    await state.clear()
+    text = escape_message_parts(
+        "📢 Рассылка запущена!",
+        version=2
+    )
+    await query.message.edit_text(
+        text,
+        reply_markup=await create_admin_keyboard(user_id),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+
+async def _handle_give_subscription_for_user_callback(query: CallbackQuery, state: FSMContext, user_id: int, callback_data: str) -> None:
+    await handle_admin_give_sub_to_user_callback(query, state, user_id, _target_user_id(callback_data))
+
+async def _handle_add_photos_to_user_callback(query: CallbackQuery, state: FSMContext, user_id: int, callback_data: str) -> None:
+    await handle_admin_add_resources_callback(query, state, user_id, _target_user_id(callback_data), "photo", 20)
+
+async def _handle_add_avatar_to_user_callback(query: CallbackQuery, state: FSMContext, user_id: int, callback_data: str) -> None:
+    await handle_admin_add_resources_callback(query, state, user_id, _target_user_id(callback_data), "avatar", 1)
+
+async def _handle_chat_with_user_callback(query: CallbackQuery, state: FSMContext, user_id: int, callback_data: str) -> None:
+    await handle_admin_chat_with_user_callback(query, state, user_id, _target_user_id(callback_data))
+
 async def handle_admin_add_resources_callback(query: CallbackQuery, state: FSMContext, user_id: int, target_user_id: int, resource_type: str, amount: int) -> None:
     """Обработчик добавления ресурсов (фото или аватары) для указанного пользователя."""
     logger.debug(f"Добавление {amount} {resource_type} для target_user_id={target_user_id} администратором user_id={user_id}")
-    await send_typing_action(query.bot, user_id)
     target_user_info = await check_database_user(target_user_id)
     if not target_user_info or (target_user_info[3] is None and target_user_info[8] is None):
         text = escape_message_parts(
@@ -279,8 +228,8 @@ async def handle_admin_add_resources_callback(query: CallbackQuery, state: FSMCo
     action = "increment_photo" if resource_type == "photo" else "increment_avatar"
     resource_name = "фото" if resource_type == "photo" else "аватар"
     try:
-        success = await update_user_balance(target_user_id, action, amount=amount)
-        logger.debug(f"update_user_balance для user_id={target_user_id}, action={action}, amount={amount}, результат={success}")
+        success = await update_user_credits(target_user_id, action, amount=amount)
+        logger.debug(f"update_user_credits для user_id={target_user_id}, action={action}, amount={amount}, результат={success}")
         if not success:
             raise Exception("Не удалось обновить ресурсы в базе данных")
         text = escape_message_parts(
@@ -684,6 +633,53 @@ async def handle_delete_report(query: CallbackQuery, state: FSMContext, filename
         logger.error(f"Ошибка удаления файла отчета: {e}")
         await query.answer(f"❌ Ошибка удаления файла: {str(e)}")
 
+# Маршруты админ-панели
+for _data, _handler in {
+    "admin_stats": handle_admin_report_users,
+    "admin_replicate_costs": show_replicate_costs,
+    "admin_payments": handle_admin_report_payments,
+    "payments_manual_date": handle_manual_date_input,
+    "admin_activity_stats": handle_admin_report_activity,
+    "admin_referral_stats": handle_admin_report_referrals,
+    "admin_visualization": show_visualization,
+    "admin_failed_avatars": admin_show_failed_avatars,
+    "admin_delete_all_failed": admin_confirm_delete_all_failed,
+    "admin_confirm_delete_all": admin_execute_delete_all_failed,
+    "admin_give_subscription": handle_admin_give_subscription_callback,
+    "admin_search_user": search_users_admin,
+    "admin_profiler": admin_profiler_menu,
+}.items():
+    admin_callbacks.add_exact(_data, _handler)
+
+for _prefix, _handler in {
+    "admin_stats_page_": handle_admin_report_users,
+    "payments_date_": _handle_payments_date_callback,
+    "activity_": _handle_activity_callback,
+    "user_actions_": show_user_actions,
+    "view_user_profile_": _handle_view_user_profile_callback,
+    "user_avatars_": _handle_user_avatars_callback,
+    "change_balance_": change_balance_admin,
+    "user_logs_": _handle_user_logs_callback,
+    "admin_generate:": _handle_admin_generate_callback,
+    "delete_user_": _handle_delete_user_callback,
+    "confirm_delete_user_": _handle_confirm_delete_user_callback,
+    "block_user_": block_user_admin,
+    "confirm_block_user_": _handle_confirm_block_user_callback,
+    "reset_avatar_": _handle_reset_avatar_callback,
+    "give_subscription_for_user_": _handle_give_subscription_for_user_callback,
+    "add_photos_to_user_": _handle_add_photos_to_user_callback,
+    "add_avatar_to_user_": _handle_add_avatar_to_user_callback,
+    "chat_with_user_": _handle_chat_with_user_callback,
+    "admin_profile_": _handle_admin_profile_callback,
+}.items():
+    admin_callbacks.add_prefix(_prefix, _handler)
+
+# Эти действия сами управляют состоянием FSM
+admin_callbacks.add_exact("admin_panel", _handle_admin_panel_callback, middlewares=())
+admin_callbacks.add_exact("send_broadcast_no_text", _handle_send_broadcast_no_text_callback, middlewares=())
+admin_callbacks.add_prefix("delete_report_", _handle_delete_report_callback, middlewares=())
+admin_callbacks.add_prefix("admin_send_gen:", _handle_admin_send_gen_callback, middlewares=())
+
 # Регистрация обработчиков
 @admin_callbacks_router.callback_query(
     lambda c: c.data and c.data.startswith((
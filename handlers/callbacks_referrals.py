@@ -11,6 +11,7 @@ from config import ADMIN_IDS, DATABASE_PATH
 from database import check_database_user, is_user_blocked
 from handlers.utils import safe_escape_markdown as escape_md, send_message_with_fallback, safe_answer_callback
 from keyboards import create_main_menu_keyboard, create_referral_keyboard, create_admin_keyboard
+from bot_identity import get_bot_username
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +81,7 @@ async def handle_referrals_menu_callback(query: CallbackQuery, state: FSMContext
         paid_referrals = 0
         bonus_photos = 0
     
-    bot_username = (await query.bot.get_me()).username.lstrip('@')
+    bot_username = (await get_bot_username(query.bot)).lstrip('@')
     referral_link = f"t.me/{bot_username}?start=ref_{user_id}"
     text = (
         escape_md("👥 Реферальная программа", version=2) + "\n\n" +
@@ -123,7 +124,7 @@ async def handle_referral_info_callback(query: CallbackQuery, state: FSMContext,
 
 async def handle_copy_referral_link_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
     """Копирование реферальной ссылки."""
-    bot_username = (await query.bot.get_me()).username.lstrip('@')
+    bot_username = (await get_bot_username(query.bot)).lstrip('@')
     referral_link = f"t.me/{bot_username}?start=ref_{user_id}"
     text = (
         escape_md("🔗 Ваша реферальная ссылка:", version=2) + "\n\n" +
@@ -182,7 +183,7 @@ async def handle_my_referrals_callback(query: CallbackQuery, state: FSMContext,
         my_referrals = []
         total_bonuses = 0
     
-    bot_username = (await query.bot.get_me()).username.lstrip('@')
+    bot_username = (await get_bot_username(query.bot)).lstrip('@')
     referral_link = f"t.me/{bot_username}?start=ref_{user_id}"
     text = (
         escape_md("👥 Твои рефералы:", version=2) + "\n\n"
@@ -21,7 +21,7 @@ from database import (
     check_database_user, update_user_balance, add_rating, get_user_trainedmodels,
     get_active_trainedmodel, delete_trained_model, get_user_video_tasks,
     get_user_rating_and_registration, get_user_generation_stats, get_user_payments,
-    is_user_blocked, user_cache, update_user_credits, check_user_resources, is_old_user
+    user_cache, update_user_credits, check_user_resources, is_old_user
 )
 from keyboards import (
     create_main_menu_keyboard, create_photo_generate_menu_keyboard,
@@ -36,9 +36,11 @@ from generation import reset_generation_context, generate_image, start_training,
 from handlers.utils import (
     safe_escape_markdown as escape_md, safe_answer_callback,
     check_resources, check_active_avatar, check_style_config, create_payment_link,
-    get_tariff_text, send_typing_action, clean_admin_context, escape_message_parts, safe_escape_markdown
+    get_tariff_text, clean_admin_context, escape_message_parts, safe_escape_markdown
 )
 from handlers.onboarding import send_onboarding_message
+from handlers.callback_registry import CallbackRegistry, reject_blocked_user
+from bot_identity import get_bot_username
 
 logger = logging.getLogger(__name__)
 
@@ -89,153 +91,44 @@ async def handle_proceed_to_payment_callback(query: CallbackQuery, state: FSMCon
         logger.error(f"Ошибка в handle_proceed_to_payment_callback для user_id={user_id}: {e}", exc_info=True)
         await query.answer("❌ Произошла ошибка. Попробуйте позже.", show_alert=True)
 
-async def handle_user_callback(query: CallbackQuery, state: FSMContext) -> None:
-    """Обработчик пользовательских callback-запросов."""
-    user_id = query.from_user.id
-    callback_data = query.data
-    logger.info(f"handle_user_callback: user_id={user_id}, callback_data={callback_data}")
-
-    # Проверка блокировки
-    if await is_user_blocked(user_id):
-        logger.info(f"Заблокированный пользователь user_id={user_id} пытался выполнить callback: {callback_data}")
-        await query.answer("🚫 Ваш аккаунт заблокирован.", show_alert=True)
-        await query.message.answer(
-            escape_md("🚫 Ваш аккаунт заблокирован. Обратитесь в поддержку: @AXIDI_Help", version=2),
-            parse_mode=ParseMode.MARKDOWN_V2
-        )
-        return
+# Флаги админских сценариев в FSM, которые сбрасываются при любом пользовательском callback
+_ADMIN_FSM_FLAGS = (
+    'awaiting_broadcast_message', 'awaiting_broadcast_schedule',
+    'awaiting_balance_change', 'awaiting_block_reason', 'awaiting_user_search'
+)
 
-    # Проверка и сброс состояния FSM
+async def _reset_admin_fsm_flags(query: CallbackQuery, state: FSMContext, context: dict) -> bool:
+    """Сбрасывает FSM, если пользователь застрял в админском сценарии."""
     user_data = await state.get_data()
-    if any(key in user_data for key in [
-        'awaiting_broadcast_message', 'awaiting_broadcast_schedule',
-        'awaiting_balance_change', 'awaiting_block_reason', 'awaiting_user_search'
-    ]):
-        logger.warning(f"User {user_id} in FSM state, clearing FSM data: {user_data}")
+    context['user_data'] = user_data
+    if any(key in user_data for key in _ADMIN_FSM_FLAGS):
+        logger.warning(f"User {context['user_id']} in FSM state, clearing FSM data: {user_data}")
         await state.clear()
+    return True
 
-    # Проверка админского контекста
+async def _clear_admin_generation_context(query: CallbackQuery, state: FSMContext, context: dict) -> bool:
+    """Очищает контекст генерации админом для пользователя, если callback не относится к этой генерации."""
+    user_data = context.get('user_data', {})
     if user_data.get('admin_generation_for_user') or user_data.get('admin_target_user_id'):
-        admin_callbacks = [
-            'select_new_male_avatar_styles', 'select_new_female_avatar_styles',
-            'confirm_generation', 'back_to_style_selection', 'back_to_aspect_selection',
-            'enter_custom_prompt_manual', 'enter_custom_prompt_llama',
-            'confirm_assisted_prompt', 'edit_assisted_prompt', 'video_style_'
-        ]
-        if (callback_data in admin_callbacks or
-            callback_data.startswith(('style_', 'male_styles_page_', 'female_styles_page_', 'aspect_', 'video_style_'))):
-            logger.info(f"User {user_id} in admin generation state, preserving context for callback: {callback_data}")
-        else:
-            logger.warning(f"User {user_id} in admin generation state, clearing admin context")
-            await clean_admin_context(state)
+        logger.warning(f"User {context['user_id']} in admin generation state, clearing admin context")
+        await clean_admin_context(state)
+    return True
+
+# Маршруты генерации сохраняют админский контекст (админ генерирует за пользователя)
+_ADMIN_CONTEXT_MIDDLEWARES = (reject_blocked_user, _reset_admin_fsm_flags)
+
+user_callbacks = CallbackRegistry(
+    'user', middlewares=(reject_blocked_user, _reset_admin_fsm_flags, _clear_admin_generation_context)
+)
+
+async def handle_user_callback(query: CallbackQuery, state: FSMContext) -> None:
+    """Обработчик пользовательских callback-запросов."""
+    user_id = query.from_user.id
+    callback_data = query.data
+    logger.info("handle_user_callback: user_id=%s, callback_data=%s", user_id, callback_data)
 
     try:
-        if callback_data == "proceed_to_payment":
-            logger.info(f"Обрабатываем proceed_to_payment для user_id={user_id}")
-            await handle_proceed_to_payment_callback(query, state, user_id)
-        elif callback_data == "photo_generate_menu":
-            await handle_photo_generate_menu_callback(query, state, user_id)
-        elif callback_data == "photo_transform":
-            from handlers.photo_transform import start_photo_transform
-            await start_photo_transform(query, state)
-        elif callback_data == "video_generate_menu":
-            await handle_video_generate_menu_callback(query, state, user_id)
-        elif callback_data == "generate_menu":  # Добавляем обработку
-            await handle_photo_generate_menu_callback(query, state, user_id)
-        elif callback_data == "photo_to_photo":
-            await handle_photo_to_photo_callback(query, state, user_id)
-        elif callback_data == "ai_video_v2_1":
-            await handle_ai_video_callback(query, state, user_id)
-        elif callback_data == "repeat_last_generation":
-            await handle_repeat_last_generation_callback(query, state, user_id)
-        elif callback_data == "generate_with_avatar":
-            await handle_style_selection_callback(query, state)
-        elif callback_data == "select_new_male_avatar_styles":
-            await handle_style_selection_callback(query, state)
-        elif callback_data == "select_new_female_avatar_styles":
-            await handle_style_selection_callback(query, state)
-        elif callback_data.startswith("style_"):
-            await handle_style_choice_callback(query, state)
-        elif callback_data.startswith("video_style_"):
-            await handle_video_style_choice_callback(query, state)
-        elif callback_data.startswith("male_styles_page_"):
-            await handle_male_styles_page_callback(query, state)
-        elif callback_data.startswith("female_styles_page_"):
-            await handle_female_styles_page_callback(query, state)
-        elif callback_data == "page_info":
-            await query.answer("ℹ️ Это текущая страница стилей.", show_alert=True)
-        elif callback_data == "enter_custom_prompt_manual":
-            await handle_custom_prompt_manual_callback(query, state)
-        elif callback_data == "confirm_video_generation":
-            await handle_confirm_video_generation_callback(query, state, user_id)
-        elif callback_data == "enter_custom_prompt_llama":
-            await handle_custom_prompt_llama_callback(query, state,)
-        elif callback_data == "confirm_assisted_prompt":
-            await handle_confirm_assisted_prompt_callback(query, state,)
-        elif callback_data == "edit_assisted_prompt":
-            await handle_edit_assisted_prompt_callback(query, state, user_id)
-        elif callback_data == "skip_prompt":
-            await handle_skip_prompt_callback(query, state)
-        elif callback_data.startswith("aspect_"):
-            await handle_aspect_ratio_callback(query, state)
-        elif callback_data == "aspect_ratio_info":
-            from handlers.callbacks_utils import handle_aspect_ratio_info_callback
-            await handle_aspect_ratio_info_callback(query, state, user_id)
-        elif callback_data == "back_to_aspect_selection":
-            await handle_back_to_aspect_selection_callback(query, state)
-        elif callback_data == "back_to_style_selection":
-            await handle_back_to_style_selection_callback(query, state, user_id)
-        elif callback_data == "confirm_generation":
-            await handle_confirm_generation_callback(query, state, user_id)
-        elif callback_data == "confirm_photo_quality":
-            await handle_confirm_photo_quality_callback(query, state, user_id)
-        elif callback_data == "skip_mask":
-            await handle_skip_mask_callback(query, state, user_id)
-        elif callback_data.startswith("rate_"):
-            await handle_rating_callback(query, state)
-        elif callback_data == "user_profile":
-            await handle_user_profile_callback(query, state, user_id)
-        elif callback_data == "check_subscription":
-            await handle_check_subscription_callback(query, state, user_id)
-        elif callback_data == "user_stats":
-            await handle_user_stats_callback(query, state, user_id)
-        elif callback_data == "subscribe":
-            await handle_subscribe_callback(query, state, user_id)
-        elif callback_data.startswith("pay_"):
-            await handle_payment_callback(query, state, user_id, callback_data)
-        elif callback_data == "change_email":
-            await handle_change_email_callback(query, state, user_id)
-        elif callback_data == "confirm_change_email":
-            await handle_confirm_change_email_callback(query, state, user_id)
-        elif callback_data == "my_avatars":
-            await handle_my_avatars_callback(query, state, user_id)
-        elif callback_data.startswith("select_avatar_"):
-            await handle_select_avatar_callback(query, state, user_id, callback_data)
-        elif callback_data == "train_flux":
-            await handle_train_flux_callback(query, state, user_id)
-        elif callback_data == "continue_upload":
-            await handle_continue_upload_callback(query, state, user_id)
-        elif callback_data == "start_training":
-            await start_training(query.message, state, user_id)
-        elif callback_data == "confirm_start_training":
-            await handle_confirm_start_training_callback(query, state, user_id)
-        elif callback_data == "back_to_avatar_name_input":
-            await handle_back_to_avatar_name_input_callback(query, state, user_id)
-        elif callback_data.startswith("use_suggested_trigger_"):
-            await handle_use_suggested_trigger_callback(query, state, user_id, callback_data)
-        elif callback_data == "check_training":
-            user_data = await state.get_data()
-            target_user_id = user_data.get('admin_generation_for_user', user_id)
-            from handlers.commands import check_training
-            await check_training(query.message, state, target_user_id)
-        elif callback_data == "terms_of_service":
-            from handlers.callbacks_utils import handle_terms_of_service_callback
-            await handle_terms_of_service_callback(query, state, user_id)
-        elif callback_data == "tariff_info":
-            await handle_tariff_info_callback(query, state, user_id)
-        elif callback_data == "back_to_menu":
-            await handle_back_to_menu_callback(query, state, user_id)
-        else:
+        if not await user_callbacks.dispatch(query, state, {'user_id': user_id}):
             logger.warning(f"Неизвестный callback_data: {callback_data} для user_id={user_id}")
             await query.answer("⚠️ Неизвестное действие", show_alert=True)
             await query.message.answer(
@@ -669,7 +562,7 @@ async def handle_style_selection_callback(query: CallbackQuery, state: FSMContex
     """Обработка выбора категории стилей."""
     user_id = query.from_user.id
     callback_data = query.data
-    logger.debug(f"handle_style_selection_callback вызван: user_id={user_id}, callback_data={callback_data}")
+    logger.debug("handle_style_selection_callback вызван: user_id=%s, callback_data=%s", user_id, callback_data)
 
     try:
         # Сохраняем важные данные
@@ -766,7 +659,7 @@ async def handle_style_choice_callback(query: CallbackQuery, state: FSMContext)
     """Обработка выбора конкретного стиля."""
     user_id = query.from_user.id
     callback_data = query.data
-    logger.info(f"handle_style_choice_callback: user_id={user_id}, callback_data={callback_data}")
+    logger.info("handle_style_choice_callback: user_id=%s, callback_data=%s", user_id, callback_data)
 
     try:
         user_data = await state.get_data()
@@ -1162,7 +1055,8 @@ async def handle_video_style_choice_callback(query: CallbackQuery, state: FSMCon
 
 async def handle_custom_prompt_manual_callback(query: CallbackQuery, state: FSMContext) -> None:
     user_id = query.from_user.id
-    logger.debug(f"handle_custom_prompt_manual_callback: user_id={user_id}, data={await state.get_data()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_custom_prompt_manual_callback: user_id=%s, data=%s", user_id, await state.get_data())
 
     try:
         # Удаляем предыдущее сообщение с кнопками
@@ -1269,7 +1163,9 @@ async def handle_custom_prompt_manual_callback(query: CallbackQuery, state: FSMC
 async def handle_custom_prompt_llama_callback(query: CallbackQuery, state: FSMContext) -> None:
     """Ввод идеи для AI-помощника."""
     user_id = query.from_user.id
-    logger.info(f"handle_custom_prompt_llama_callback: user_id={user_id}, data={await state.get_data()}")
+    logger.info("handle_custom_prompt_llama_callback: user_id=%s", user_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_custom_prompt_llama_callback: data=%s", await state.get_data())
     try:
         # Удаляем предыдущее сообщение с кнопками
         try:
@@ -1356,7 +1252,8 @@ async def handle_custom_prompt_llama_callback(query: CallbackQuery, state: FSMCo
 
 async def handle_confirm_video_generation_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
     """Подтверждение параметров генерации видео."""
-    logger.debug(f"handle_confirm_video_generation_callback: user_id={user_id}, data={await state.get_data()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_confirm_video_generation_callback: user_id=%s, data=%s", user_id, await state.get_data())
     try:
         user_data = await state.get_data()
         is_admin_generation = user_data.get('is_admin_generation', False)
@@ -1424,7 +1321,9 @@ async def handle_confirm_video_generation_callback(query: CallbackQuery, state:
 async def handle_confirm_assisted_prompt_callback(query: CallbackQuery, state: FSMContext) -> None:
     """Подтверждение AI-промпта."""
     user_id = query.from_user.id
-    logger.info(f"handle_confirm_assisted_prompt_callback: user_id={user_id}, data={await state.get_data()}")
+    logger.info("handle_confirm_assisted_prompt_callback: user_id=%s", user_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_confirm_assisted_prompt_callback: data=%s", await state.get_data())
     try:
         user_data = await state.get_data()
         prompt = user_data.get('prompt')
@@ -1595,7 +1494,7 @@ async def handle_aspect_ratio_callback(query: CallbackQuery, state: FSMContext)
     """Обработка выбора соотношения сторон."""
     user_id = query.from_user.id
     callback_data = query.data
-    logger.debug(f"handle_aspect_ratio_callback вызван: user_id={user_id}, callback_data={callback_data}")
+    logger.debug("handle_aspect_ratio_callback вызван: user_id=%s, callback_data=%s", user_id, callback_data)
 
     try:
         aspect_ratio = callback_data.replace("aspect_", "")
@@ -1887,7 +1786,7 @@ async def handle_rating_callback(query: CallbackQuery, state: FSMContext) -> Non
     """Обработка оценки генерации."""
     user_id = query.from_user.id
     callback_data = query.data
-    logger.debug(f"handle_rating_callback вызван: user_id={user_id}, callback_data={callback_data}")
+    logger.debug("handle_rating_callback вызван: user_id=%s, callback_data=%s", user_id, callback_data)
 
     try:
         rating = int(callback_data.split('_')[1])
@@ -2049,7 +1948,7 @@ async def handle_user_stats_callback(query: CallbackQuery, state: FSMContext, us
             active_referrals += 1
             total_bonuses += 5
 
-    bot_username = (await query.bot.get_me()).username
+    bot_username = await get_bot_username(query.bot)
     text_parts = [
         "📊 Твоя статистика:\n\n"
     ]
@@ -2406,7 +2305,7 @@ async def handle_payment_callback(query: CallbackQuery, state: FSMContext, user_
                 return
 
             try:
-                bot_username = (await query.bot.get_me()).username
+                bot_username = await get_bot_username(query.bot)
                 payment_url = await create_payment_link(user_id, email, amount, description, bot_username)
                 is_first_purchase = bool(subscription_data[5]) if len(subscription_data) > 5 else True
                 bonus_text = " (+ 1 аватар в подарок!)" if is_first_purchase and tariff.get("photos", 0) > 0 else ""
@@ -2668,7 +2567,8 @@ async def handle_continue_upload_callback(query: CallbackQuery, state: FSMContex
 
 async def handle_confirm_start_training_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
     """Запуск обучения аватара."""
-    logger.debug(f"handle_confirm_start_training_callback вызван для user_id={user_id}, user_data={await state.get_data()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_confirm_start_training_callback вызван для user_id=%s, user_data=%s", user_id, await state.get_data())
     try:
         user_data = await state.get_data()
         avatar_name = user_data.get('avatar_name')
@@ -2769,7 +2669,8 @@ async def handle_use_suggested_trigger_callback(query: CallbackQuery, state: FSM
 
 async def handle_confirm_photo_quality_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
     """Подтверждение качества фото перед обучением."""
-    logger.debug(f"handle_confirm_photo_quality_callback вызван для user_id={user_id}, user_data={await state.get_data()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("handle_confirm_photo_quality_callback вызван для user_id=%s, user_data=%s", user_id, await state.get_data())
     user_data = await state.get_data()
     avatar_name = user_data.get('avatar_name', 'Без имени')
     training_photos = user_data.get('training_photos', [])
@@ -3117,20 +3018,117 @@ async def cancel(message: Message, state: FSMContext) -> None:
     )
     await state.update_data(user_id=user_id)
 
+async def _handle_photo_transform_callback(query: CallbackQuery, state: FSMContext) -> None:
+    from handlers.photo_transform import start_photo_transform
+    await start_photo_transform(query, state)
+
+async def _handle_page_info_callback(query: CallbackQuery, state: FSMContext) -> None:
+    await query.answer("ℹ️ Это текущая страница стилей.", show_alert=True)
+
+async def _handle_aspect_ratio_info_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
+    from handlers.callbacks_utils import handle_aspect_ratio_info_callback
+    await handle_aspect_ratio_info_callback(query, state, user_id)
+
+async def _handle_start_training_callback(query: CallbackQuery, state: FSMContext) -> None:
+    await start_training(query.message, state)
+
+async def _handle_check_training_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
+    user_data = await state.get_data()
+    target_user_id = user_data.get('admin_generation_for_user', user_id)
+    from handlers.commands import check_training
+    await check_training(query.message, state, target_user_id)
+
+async def _handle_terms_of_service_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
+    from handlers.callbacks_utils import handle_terms_of_service_callback
+    await handle_terms_of_service_callback(query, state, user_id)
+
+# Маршруты пользовательских callback'ов
+for _data, _handler in {
+    "proceed_to_payment": handle_proceed_to_payment_callback,
+    "photo_generate_menu": handle_photo_generate_menu_callback,
+    "generate_menu": handle_photo_generate_menu_callback,
+    "photo_transform": _handle_photo_transform_callback,
+    "video_generate_menu": handle_video_generate_menu_callback,
+    "photo_to_photo": handle_photo_to_photo_callback,
+    "ai_video_v2_1": handle_ai_video_callback,
+    "repeat_last_generation": handle_repeat_last_generation_callback,
+    "generate_with_avatar": handle_style_selection_callback,
+    "page_info": _handle_page_info_callback,
+    "confirm_video_generation": handle_confirm_video_generation_callback,
+    "skip_prompt": handle_skip_prompt_callback,
+    "confirm_photo_quality": handle_confirm_photo_quality_callback,
+    "skip_mask": handle_skip_mask_callback,
+    "user_profile": handle_user_profile_callback,
+    "check_subscription": handle_check_subscription_callback,
+    "user_stats": handle_user_stats_callback,
+    "subscribe": handle_subscribe_callback,
+    "change_email": handle_change_email_callback,
+    "confirm_change_email": handle_confirm_change_email_callback,
+    "my_avatars": handle_my_avatars_callback,
+    "train_flux": handle_train_flux_callback,
+    "continue_upload": handle_continue_upload_callback,
+    "start_training": _handle_start_training_callback,
+    "confirm_start_training": handle_confirm_start_training_callback,
+    "back_to_avatar_name_input": handle_back_to_avatar_name_input_callback,
+    "check_training": _handle_check_training_callback,
+    "terms_of_service": _handle_terms_of_service_callback,
+    "tariff_info": handle_tariff_info_callback,
+    "back_to_menu": handle_back_to_menu_callback,
+}.items():
+    user_callbacks.add_exact(_data, _handler)
+
+for _data, _handler in {
+    "select_new_male_avatar_styles": handle_style_selection_callback,
+    "select_new_female_avatar_styles": handle_style_selection_callback,
+    "enter_custom_prompt_manual": handle_custom_prompt_manual_callback,
+    "enter_custom_prompt_llama": handle_custom_prompt_llama_callback,
+    "confirm_assisted_prompt": handle_confirm_assisted_prompt_callback,
+    "edit_assisted_prompt": handle_edit_assisted_prompt_callback,
+    "aspect_ratio_info": _handle_aspect_ratio_info_callback,
+    "back_to_aspect_selection": handle_back_to_aspect_selection_callback,
+    "back_to_style_selection": handle_back_to_style_selection_callback,
+    "confirm_generation": handle_confirm_generation_callback,
+}.items():
+    user_callbacks.add_exact(_data, _handler, middlewares=_ADMIN_CONTEXT_MIDDLEWARES)
+
+for _prefix, _handler in {
+    "style_": handle_style_choice_callback,
+    "video_style_": handle_video_style_choice_callback,
+    "male_styles_page_": handle_male_styles_page_callback,
+    "female_styles_page_": handle_female_styles_page_callback,
+    "aspect_": handle_aspect_ratio_callback,
+}.items():
+    user_callbacks.add_prefix(_prefix, _handler, middlewares=_ADMIN_CONTEXT_MIDDLEWARES)
+
+for _prefix, _handler in {
+    "rate_": handle_rating_callback,
+    "pay_": handle_payment_callback,
+    "select_avatar_": handle_select_avatar_callback,
+    "use_suggested_trigger_": handle_use_suggested_trigger_callback,
+}.items():
+    user_callbacks.add_prefix(_prefix, _handler)
+
+# Какие callback'и роутер забирает себе (остальные достаются другим роутерам)
+USER_CALLBACK_DATA = frozenset([
+    "proceed_to_payment", "photo_generate_menu", "video_generate_menu", "generate_menu", "photo_to_photo", "ai_video_v2_1",
+    "repeat_last_generation", "select_generic_avatar_styles", "select_new_male_avatar_styles",
+    "select_new_female_avatar_styles", "page_info", "enter_custom_prompt_manual",
+    "enter_custom_prompt_llama", "confirm_assisted_prompt", "edit_assisted_prompt",
+    "skip_prompt", "aspect_ratio_info", "back_to_aspect_selection", "back_to_style_selection",
+    "confirm_generation", "confirm_photo_quality", "skip_mask", "user_profile",
+    "check_subscription", "user_stats", "subscribe", "change_email", "confirm_change_email",
+    "my_avatars", "train_flux", "continue_upload", "start_training", "confirm_start_training",
+    "back_to_avatar_name_input", "check_training", "terms_of_service", "tariff_info", "back_to_menu"
+])
+USER_CALLBACK_PREFIXES = (
+    "style_", "video_style_", "male_styles_page_", "female_styles_page_", "aspect_", "confirm_video_generation",
+    "rate_", "select_avatar_", "use_suggested_trigger_", "pay_"
+)
+
 # Регистрация обработчиков
 @user_callbacks_router.callback_query(
-    lambda c: c.data in [
-        "proceed_to_payment", "photo_generate_menu", "video_generate_menu", "generate_menu", "photo_to_photo", "ai_video_v2_1",
-        "repeat_last_generation", "select_generic_avatar_styles", "select_new_male_avatar_styles",
-        "select_new_female_avatar_styles", "page_info", "enter_custom_prompt_manual",
-        "enter_custom_prompt_llama", "confirm_assisted_prompt", "edit_assisted_prompt",
-        "skip_prompt", "aspect_ratio_info", "back_to_aspect_selection", "back_to_style_selection",
-        "confirm_generation", "confirm_photo_quality", "skip_mask", "user_profile",
-        "check_subscription", "user_stats", "subscribe", "change_email", "confirm_change_email",
-        "my_avatars", "train_flux", "continue_upload", "start_training", "confirm_start_training",
-        "back_to_avatar_name_input", "check_training", "terms_of_service", "tariff_info", "back_to_menu"
-    ] or c.data.startswith(("style_", "video_style_", "male_styles_page_", "female_styles_page_", "aspect_", "confirm_video_generation", "rate_", "select_avatar_", "use_suggested_trigger_", "pay_"))
+    lambda c: c.data in USER_CALLBACK_DATA or c.data.startswith(USER_CALLBACK_PREFIXES)
 )
 async def user_callback_handler(query: CallbackQuery, state: FSMContext) -> None:
-    logger.debug(f"Callback_query получен: id={query.id}, data={query.data}")
+    logger.debug("Callback_query получен: id=%s, data=%s", query.id, query.data)
     await handle_user_callback(query, state)
@@ -9,64 +9,31 @@ from aiogram.enums import ParseMode
 from datetime import datetime
 from config import ADMIN_IDS
 from handlers.utils import safe_escape_markdown as escape_md, send_message_with_fallback, safe_answer_callback
-from database import is_user_blocked, get_user_payments
+from database import get_user_payments
 from keyboards import create_main_menu_keyboard, create_admin_keyboard
 from bot_counter import bot_counter
+from media_assets import send_video_asset, MENU_VIDEO
 import os
+from bot_identity import get_bot_username
+from handlers.callback_registry import CallbackRegistry, reject_blocked_user
 from logger import get_logger
 logger = get_logger('main')
 
 # Создание роутера для утилитарных callback'ов
 utils_callbacks_router = Router()
 
+utils_callbacks = CallbackRegistry('utils', middlewares=(reject_blocked_user,))
+
 async def handle_utils_callback(query: CallbackQuery, state: FSMContext) -> None:
     """Обрабатывает общие и вспомогательные callback-запросы."""
     user_id = query.from_user.id
     await query.answer()
 
-    if await is_user_blocked(user_id):
-        await query.answer("🚫 Ваш аккаунт заблокирован.", show_alert=True)
-        await query.message.answer(
-            escape_md("🚫 Ваш аккаунт заблокирован. Обратитесь в поддержку: @AXIDI_Help", version=2),
-            parse_mode=ParseMode.MARKDOWN_V2
-        )
-        logger.info(f"Заблокированный пользователь user_id={user_id} пытался выполнить callback: {query.data}")
-        return
-
     callback_data = query.data
     logger.info(f"Callback от user_id={user_id}: {callback_data}")
 
     try:
-        if callback_data == "back_to_menu":
-            await handle_back_to_menu_callback(query, state, user_id)
-        elif callback_data == "support":
-            await handle_support_callback(query, state, user_id)
-        elif callback_data == "faq":
-            await handle_faq_callback(query, state, user_id)
-        elif callback_data.startswith("faq_"):
-            topic = callback_data.replace("faq_", "")
-            await handle_faq_topic_callback(query, state, user_id, topic)
-        elif callback_data == "help":
-            from handlers.commands import help_command
-            await help_command(query.message, state)
-        elif callback_data == "user_guide":
-            await handle_user_guide_callback(query, state, user_id)
-        elif callback_data == "share_result":
-            await handle_share_result_callback(query, state, user_id)
-        elif callback_data == "payment_history":
-            await handle_payment_history_callback(query, state, user_id)
-        elif callback_data == "tariff_info":
-            await handle_tariff_info_callback(query, state, user_id)
-        elif callback_data == "category_info":
-            await handle_category_info_callback(query, state, user_id)
-        elif callback_data == "compare_tariffs":
-            await handle_compare_tariffs_callback(query, state, user_id)
-        elif callback_data == "aspect_ratio_info":
-            await handle_aspect_ratio_info_callback(query, state, user_id)
-        elif callback_data == "check_training":
-            from handlers.commands import check_training
-            await check_training(query.message, state, user_id)  # Исправлено: добавлен user_id
-        else:
+        if not await utils_callbacks.dispatch(query, state, {'user_id': user_id}):
             logger.error(f"Неизвестный callback_data: {callback_data} для user_id={user_id}")
             await query.message.answer(
                 escape_md("❌ Неизвестное действие. Попробуйте снова или обратитесь в поддержку.", version=2),
@@ -124,14 +91,11 @@ async def handle_back_to_menu_callback(query: CallbackQuery, state: FSMContext,
 
         # Отправляем видео с меню
         if generations_left > 0 or avatar_left > 0 or user_id in ADMIN_IDS:
-            menu_video_path = "images/welcome1.mp4"
+            menu_video_path = MENU_VIDEO
             try:
                 if os.path.exists(menu_video_path):
-                    from aiogram.types import FSInputFile
-                    video_file = FSInputFile(menu_video_path)
-                    video_message = await query.bot.send_video(
-                        chat_id=user_id,
-                        video=video_file,
+                    video_message = await send_video_asset(
+                        query.bot, user_id, menu_video_path,
                         caption=escape_md(menu_text, version=2),
                         reply_markup=main_menu_keyboard,
                         parse_mode=ParseMode.MARKDOWN_V2
@@ -354,7 +318,7 @@ async def handle_user_guide_callback(query: CallbackQuery, state: FSMContext, us
 
 async def handle_share_result_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
     """Обработчик поделиться результатом."""
-    bot_username = (await query.bot.get_me()).username.lstrip('@')
+    bot_username = (await get_bot_username(query.bot)).lstrip('@')
     share_text = escape_md("Посмотри, какие крутые фото я создал с помощью AI! 🤖✨", version=2)
     share_url = f"https://t.me/share/url?url=t.me/{bot_username}&text={share_text}"
     text = (
@@ -509,13 +473,44 @@ async def cancel(message: Message, state: FSMContext) -> None:
     )
     logger.debug(f"Действия отменены для user_id={user_id}: {text}")
 
+async def _handle_faq_topic_callback(query: CallbackQuery, state: FSMContext, user_id: int, callback_data: str) -> None:
+    await handle_faq_topic_callback(query, state, user_id, callback_data.replace("faq_", ""))
+
+async def _handle_help_callback(query: CallbackQuery, state: FSMContext) -> None:
+    from handlers.commands import help_command
+    await help_command(query.message, state)
+
+async def _handle_check_training_callback(query: CallbackQuery, state: FSMContext, user_id: int) -> None:
+    from handlers.commands import check_training
+    await check_training(query.message, state, user_id)
+
+# Маршруты утилитарных callback'ов
+for _data, _handler in {
+    "back_to_menu": handle_back_to_menu_callback,
+    "support": handle_support_callback,
+    "faq": handle_faq_callback,
+    "help": _handle_help_callback,
+    "user_guide": handle_user_guide_callback,
+    "share_result": handle_share_result_callback,
+    "payment_history": handle_payment_history_callback,
+    "tariff_info": handle_tariff_info_callback,
+    "category_info": handle_category_info_callback,
+    "compare_tariffs": handle_compare_tariffs_callback,
+    "aspect_ratio_info": handle_aspect_ratio_info_callback,
+    "check_training": _handle_check_training_callback,
+}.items():
+    utils_callbacks.add_exact(_data, _handler)
+utils_callbacks.add_prefix("faq_", _handle_faq_topic_callback)
+
+UTILS_CALLBACK_DATA = frozenset([
+    "back_to_menu", "support", "faq", "help", "user_guide", "share_result",
+    "payment_history", "tariff_info", "category_info", "compare_tariffs",
+    "aspect_ratio_info", "check_training"
+])
+
 # Регистрация обработчиков
 @utils_callbacks_router.callback_query(
-    lambda c: c.data in [
-        "back_to_menu", "support", "faq", "help", "user_guide", "share_result",
-        "payment_history", "tariff_info", "category_info", "compare_tariffs",
-        "aspect_ratio_info", "check_training"
-    ] or c.data.startswith("faq_")
+    lambda c: c.data in UTILS_CALLBACK_DATA or c.data.startswith("faq_")
 )
 async def utils_callback_handler(query: CallbackQuery, state: FSMContext) -> None:
     await handle_utils_callback(query, state)
@@ -5,7 +5,8 @@ import pytz
 import aiosqlite
 from aiogram import Bot
 from datetime import datetime
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from typing import Optional, Set
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ParseMode
 from config import ADMIN_IDS, REPLICATE_USERNAME_OR_ORG_NAME
@@ -14,7 +15,7 @@ from database import (
     check_user_resources,
     update_user_balance,
     is_old_user,
-    get_user_actions_stats,
+    get_referral_count,
     is_user_blocked,
     get_user_trainedmodels,
     get_active_trainedmodel,
@@ -25,12 +26,36 @@ from database import (
 from keyboards import create_main_menu_keyboard, create_subscription_keyboard, create_user_profile_keyboard, create_payment_only_keyboard
 from generation import reset_generation_context, check_training_status
 from handlers.utils import safe_escape_markdown as escape_md, get_tariff_text, send_message_with_fallback
+from media_assets import send_video_asset, WELCOME_VIDEO, MENU_VIDEO
 from handlers.onboarding import send_onboarding_message, schedule_welcome_message, schedule_daily_reminders
 from bot_counter import bot_counter
+from tracing import SLOW_STATS
+from telegram_gateway import in_lane, Lane
 
 from logger import get_logger
 logger = get_logger('main')
 
+# Ссылки на фоновые уведомления админов, чтобы задачи не собрал сборщик мусора
+_admin_notify_tasks: Set[asyncio.Task] = set()
+
+@in_lane(Lane.BROADCAST)
+async def notify_admins_new_user(bot: Bot, user_id: int, username: str, first_name: str, referrer_id: Optional[int]) -> None:
+    """Уведомляет админов о новом пользователе (в полосе рассылок, не мешая ответам пользователям)."""
+    display_name = f"@{username}" if username != "Без имени" else f"{first_name} (ID {user_id})"
+    admin_text = (
+        escape_md(f"✨ Новая Печенька🍪: {display_name}", version=2) +
+        (escape_md(f" (приглашен ID {referrer_id})", version=2) if referrer_id else "")
+    )
+    for admin_id_notify in ADMIN_IDS:
+        try:
+            await bot.send_message(
+                chat_id=admin_id_notify,
+                text=admin_text,
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+        except Exception as e_admin:
+            logger.error(f"Не удалось уведомить админа {admin_id_notify}: {e_admin}")
+
 async def debug_avatars(message: Message, state: FSMContext) -> None:
     """Отладочная команда для проверки аватаров (только для админов)."""
     user_id = message.from_user.id
@@ -151,9 +176,7 @@ async def start(message: Message, state: FSMContext) -> None:
                         logger.warning(f"Referrer ID {referrer_id} is blocked.")
                         referrer_id = None
                     else:
-                        referral_actions = await get_user_actions_stats(action='use_referral')
-                        referrer_referrals = [action for action in referral_actions if action['details'].get('referrer_id') == referrer_id]
-                        if len(referrer_referrals) >= 100:
+                        if await get_referral_count(referrer_id) >= 100:
                             logger.warning(f"Referrer ID {referrer_id} has reached maximum referrals (100).")
                             referrer_id = None
                         else:
@@ -186,21 +209,11 @@ async def start(message: Message, state: FSMContext) -> None:
         return
 
     if not is_notified and user_id not in ADMIN_IDS:
-        for admin_id_notify in ADMIN_IDS:
-            try:
-                display_name = f"@{username}" if username != "Без имени" else f"{first_name} (ID {user_id})"
-                admin_text = (
-                    escape_md(f"✨ Новая Печенька🍪: {display_name}", version=2) +
-                    (escape_md(f" (приглашен ID {referrer_id})", version=2) if referrer_id else "")
-                )
-                await bot.send_message(
-                    chat_id=admin_id_notify,
-                    text=admin_text,
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-            except Exception as e_admin:
-                logger.error(f"Не удалось уведомить админа {admin_id_notify}: {e_admin}")
         await update_user_credits(user_id, "set_notified", amount=1)
+        # Чаты админов ограничены лимитом ~1 сообщение/с, поэтому уведомления уходят в фоне
+        task = asyncio.create_task(notify_admins_new_user(bot, user_id, username, first_name, referrer_id))
+        _admin_notify_tasks.add(task)
+        task.add_done_callback(_admin_notify_tasks.discard)
 
     # Проверяем, является ли пользователь старым
     is_old_user_flag = await is_old_user(user_id, cutoff_date="2025-07-11")
@@ -264,13 +277,11 @@ async def start(message: Message, state: FSMContext) -> None:
         )
 
     # Отправляем приветственное сообщение
-    video_path = "images/welcome.mp4"
+    video_path = WELCOME_VIDEO
     try:
         if os.path.exists(video_path):
-            video_file = FSInputFile(path=video_path)
-            video_message = await bot.send_video(
-                chat_id=user_id,
-                video=video_file,
+            video_message = await send_video_asset(
+                bot, user_id, video_path,
                 caption=welcome_text,
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.MARKDOWN_V2
@@ -486,14 +497,12 @@ async def menu(message: Message, state: FSMContext) -> None:
     # Логика отображения меню
     if generations_left > 0 or avatar_left > 0 or user_id in ADMIN_IDS:
         # Для оплативших пользователей или админов: полное меню с видео
-        menu_video_path = "images/welcome1.mp4"
+        menu_video_path = MENU_VIDEO
         main_menu_keyboard = await create_main_menu_keyboard(user_id)
         try:
             if os.path.exists(menu_video_path):
-                video_file = FSInputFile(path=menu_video_path)
-                video_message = await bot.send_video(
-                    chat_id=user_id,
-                    video=video_file,
+                video_message = await send_video_asset(
+                    bot, user_id, menu_video_path,
                     caption=menu_text,
                     reply_markup=main_menu_keyboard,
                     parse_mode=ParseMode.MARKDOWN_V2
@@ -723,3 +732,44 @@ async def check_training(message: Message, state: FSMContext, user_id: int) -> N
             parse_mode=ParseMode.MARKDOWN_V2
         )
     await state.update_data(user_id=user_id)
+
+# Строк в каждом списке /slow: 20 строк с длинными именами функций укладываются в 4096 символов
+SLOW_REPORT_MAX_ROWS = 20
+
+def _format_slow_rows(title: str, rows: list) -> str:
+    lines = [title]
+    if not rows:
+        lines.append("   нет данных")
+    for index, row in enumerate(rows, 1):
+        lines.append(
+            f"{index}. {row['name']} - макс {row['max_ms']:.0f} мс, "
+            f"сред {row['avg_ms']:.0f} мс, вызовов {row['count']}"
+        )
+    return "\n".join(lines)
+
+async def slow_report(message: Message) -> None:
+    """Самые медленные обработчики и запросы к БД за последний час (только для админов).
+
+    /slow [N] - N строк в каждом списке (по умолчанию 10, не больше SLOW_REPORT_MAX_ROWS).
+    Каждый список уходит отдельным сообщением, чтобы не упереться в лимит длины.
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer(
+            escape_md("❌ У вас нет прав для этой команды.", version=2),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        return
+
+    parts = (message.text or "").split()
+    limit = 10
+    if len(parts) > 1 and parts[1].isdigit():
+        limit = max(1, min(int(parts[1]), SLOW_REPORT_MAX_ROWS))
+
+    sections = [
+        "🐢 Самые медленные за последний час (по максимальному времени)\n\n"
+        + _format_slow_rows("⚙️ Обработчики:", SLOW_STATS.top('handler', limit)),
+        _format_slow_rows("🗄 Запросы к БД:", SLOW_STATS.top('db', limit)),
+        _format_slow_rows("🎨 Replicate:", SLOW_STATS.top('replicate', limit)),
+    ]
+    for text in sections:
+        await message.answer(escape_md(text, version=2), parse_mode=ParseMode.MARKDOWN_V2)
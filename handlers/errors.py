@@ -1,6 +1,6 @@
 import logging
 from aiogram import Bot
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ErrorEvent
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.enums import ParseMode
 from handlers.utils import safe_escape_markdown as escape_md, send_message_with_fallback
@@ -8,8 +8,10 @@ from handlers.utils import safe_escape_markdown as escape_md, send_message_with_
 from logger import get_logger
 logger = get_logger('errors')
 
-async def error_handler(update: Message | CallbackQuery, bot: Bot, error: Exception) -> None:
+async def error_handler(event: ErrorEvent, bot: Bot) -> None:
     """Логирует ошибки, вызванные обновлениями."""
+    update = event.update.message or event.update.callback_query
+    error = event.exception
     logger.error(msg="Exception while handling an update:", exc_info=error)
 
     user_id = None
@@ -20,6 +20,7 @@ from keyboards import (
 from generation.images import generate_image, process_prompt_async, prepare_model_params
 from generation.utils import reset_generation_context
 
+from bot_identity import get_bot_id
 from logger import get_logger
 logger = get_logger('generation')
 
@@ -29,7 +30,7 @@ generation_router = Router()
 async def generate_photo_for_user(query: CallbackQuery, state: FSMContext, target_user_id: int) -> None:
 
     admin_id = query.from_user.id
-    bot_id = (await query.bot.get_me()).id
+    bot_id = get_bot_id(query.bot)
     logger.debug(f"Инициирована генерация фото для target_user_id={target_user_id} администратором user_id={admin_id}")
 
     # Проверка прав администратора
@@ -405,7 +406,7 @@ async def process_image_generation(
 
     try:
         user_data = await state.get_data()
-        logger.debug(f"Данные состояния: {user_data}")
+        logger.debug("Данные состояния: %s", user_data)
 
         is_admin_generation = user_data.get('is_admin_generation', False) or (admin_user_id and user_id != admin_user_id)
         style_name = user_data.get('style_name', 'Кастомный стиль')
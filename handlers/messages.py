@@ -21,7 +21,8 @@ from config import ADMIN_IDS, TARIFFS, DATABASE_PATH
 from generation_config import IMAGE_GENERATION_MODELS
 from database import (
     check_database_user, update_user_credits, add_resources_on_payment,
-    log_generation, search_users_by_query, is_user_blocked, delete_user_activity
+    log_generation, search_users_by_query, is_user_blocked, delete_user_activity,
+    get_payments_in_range, day_range
 )
 from keyboards import (
     create_main_menu_keyboard, create_subscription_keyboard,
@@ -32,6 +33,7 @@ from keyboards import (
 )
 from generation.training import start_training
 from generation.videos import generate_video, create_video_photo_keyboard
+from bot_identity import get_bot_username
 from llama_helper import generate_assisted_prompt
 from handlers.commands import menu
 from handlers.broadcast import broadcast_message_admin, broadcast_to_paid_users, broadcast_to_non_paid_users
@@ -57,16 +59,8 @@ async def notify_startup() -> None:
 async def send_daily_payments_report(bot: Bot) -> None:
     """Отправляет ежедневный отчет о платежах админам."""
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as conn:
-            conn.row_factory = aiosqlite.Row
-            c = await conn.cursor()
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            await c.execute("""
-                SELECT user_id, plan, amount, created_at
-                FROM payments
-                WHERE DATE(created_at) = ? AND status = 'succeeded'
-            """, (yesterday,))
-            payments = await c.fetchall()
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        payments = await get_payments_in_range(*day_range(yesterday))
 
         if not payments:
             report_text = escape_md(f"📊 Отчет за `{yesterday}`: Платежей не было.", version=2)
@@ -217,7 +211,7 @@ async def handle_photo(message: Message, state: FSMContext) -> None:
     logger.info(f"Получено фото от user_id={user_id}, file_id={photo_file_id}")
     user_data = await state.get_data()
     current_state = await state.get_state()
-    logger.debug(f"handle_photo: user_id={user_id}, state={current_state}, user_data={user_data}")
+    logger.debug("handle_photo: user_id=%s, state=%s, user_data=%s", user_id, current_state, user_data)
 
     if current_state == PhotoTransformStates.waiting_for_photo:
         from handlers.photo_transform import handle_photo as handle_transform_photo
@@ -296,7 +290,7 @@ async def handle_video(message: Message, state: FSMContext) -> None:
 
     user_data = await state.get_data()
     current_state = await state.get_state()
-    logger.debug(f"handle_video: user_id={user_id}, state={current_state}, user_data={user_data}")
+    logger.debug("handle_video: user_id=%s, state=%s, user_data=%s", user_id, current_state, user_data)
 
     if user_id in ADMIN_IDS and (user_data.get('awaiting_broadcast_media_confirm') or current_state == BotStates.AWAITING_BROADCAST_MEDIA_CONFIRM):
         from handlers.broadcast import handle_broadcast_media
@@ -485,7 +479,7 @@ async def handle_text(message: Message, state: FSMContext) -> None:
 
     user_data = await state.get_data()
     current_state = await state.get_state()
-    logger.debug(f"handle_text: user_id={user_id}, state={current_state}, user_data={user_data}")
+    logger.debug("handle_text: user_id=%s, state=%s, user_data=%s", user_id, current_state, user_data)
 
     # Проверяем состояния FSM в порядке приоритета
     if user_data.get('waiting_for_custom_prompt_manual'):
@@ -620,7 +614,7 @@ async def handle_email_input(message: Message, state: FSMContext, email: str = N
         logger.info(f"Email `{email}` сохранен для user_id={user_id}")
 
         # Проверяем конфигурацию YooKassa
-        bot_username = (await bot.get_me()).username
+        bot_username = await get_bot_username(bot)
         payment_url = await create_payment_link(user_id, email, payment_amount, payment_description, bot_username)
         subscription_data = await check_database_user(user_id)
         is_first_purchase = bool(subscription_data[5]) if subscription_data and len(subscription_data) > 5 else True
@@ -7,23 +7,31 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 import pytz
 from aiogram import Bot, Router
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, Message, CallbackQuery, InputMediaPhoto
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 import aiosqlite
 from config import DATABASE_PATH, TARIFFS, ADMIN_IDS, ERROR_LOG_ADMIN
 from handlers.utils import safe_escape_markdown as escape_md, get_tariff_text
-from database import check_database_user, get_user_payments, is_old_user, mark_welcome_message_sent, get_users_for_reminders, is_user_blocked
+from database import check_database_user, get_user_payments, is_old_user, mark_welcome_message_sent, get_users_for_reminders, get_users_for_welcome_message, is_user_blocked, to_epoch, day_range, get_bot_config_value, set_bot_config_value
 from keyboards import create_subscription_keyboard, create_main_menu_keyboard
 from onboarding_config import get_day_config, get_message_text, has_user_purchases
+from job_scheduler import schedule_persistent_job, persistent_job_exists, get_scheduler_bot
+from media_assets import send_photo_group_asset
+from telegram_gateway import outbound_lane, Lane
 
 from logger import get_logger
 logger = get_logger('main')
 
 onboarding_router = Router()
 
+# Ссылка на задачу для хранилища планировщика (задачи сериализуются по имени функции)
+WELCOME_JOB_REF = 'handlers.onboarding:deliver_welcome_message'
+# Интервал между приветствиями, которые добираются при старте, чтобы не отправлять их пачкой
+WELCOME_BACKFILL_INTERVAL_SECONDS = 1
+# Ключ в bot_config: добор приветствий уже выполнен, при следующих запусках он не нужен
+WELCOME_BACKFILL_DONE_KEY = 'welcome_jobs_backfilled'
+
 # Примеры изображений для приветственного сообщения
 EXAMPLE_IMAGES = [
     "images/example1.jpg",
@@ -105,18 +113,9 @@ async def send_onboarding_message(bot: Bot, user_id: int, message_type: str, sub
 
         try:
             if with_images:
-                # Формируем медиагруппу для изображений
-                media_group = []
-                for img_path in EXAMPLE_IMAGES:
-                    if os.path.exists(img_path):
-                        media_group.append(InputMediaPhoto(media=FSInputFile(path=img_path)))
-                    else:
-                        logger.warning(f"Изображение не найдено: {img_path}")
+                # Медиагруппа примеров: после первой отправки уходит по file_id
+                media_group = await send_photo_group_asset(bot, user_id, EXAMPLE_IMAGES)
                 if media_group:
-                    await bot.send_media_group(
-                        chat_id=user_id,
-                        media=media_group
-                    )
                     logger.info(f"Медиагруппа с {len(media_group)} изображениями отправлена пользователю {user_id}")
                 else:
                     logger.warning(f"Нет доступных изображений для медиагруппы для user_id={user_id}")
@@ -264,24 +263,66 @@ async def schedule_welcome_message(bot: Bot, user_id: int) -> None:
             await send_onboarding_message(bot, user_id, "welcome", subscription_data)
             return
 
-        scheduler = AsyncIOScheduler(timezone=moscow_tz)
+        # Общий планировщик с хранилищем в SQLite: задача переживёт перезапуск,
+        # повторный /start заменит её по id, а не создаст вторую
         job_id = f"welcome_{user_id}"
-
         logger.info(f"Планируем приветственное сообщение для user_id={user_id} на {schedule_time}")
-        scheduler.add_job(
-            send_onboarding_message,
-            trigger='date',
-            run_date=schedule_time,
-            args=[bot, user_id, "welcome", subscription_data],
-            id=job_id,
-            misfire_grace_time=300
-        )
-        scheduler.start()
-        logger.info(f"Приветственное сообщение запланировано для user_id={user_id}")
+        if schedule_persistent_job(WELCOME_JOB_REF, job_id, schedule_time, args=[user_id]):
+            logger.info(f"Приветственное сообщение запланировано для user_id={user_id}")
 
     except Exception as e:
         logger.error(f"Ошибка планирования приветственного сообщения для user_id={user_id}: {e}", exc_info=True)
 
+async def deliver_welcome_message(user_id: int) -> None:
+    """Задача планировщика: отправляет приветственное сообщение, запланированное schedule_welcome_message."""
+    bot = get_scheduler_bot()
+    if bot is None:
+        logger.error(f"Бот не привязан к планировщику, приветствие для user_id={user_id} не отправлено")
+        return
+    if await is_user_blocked(user_id):
+        logger.info(f"Пользователь user_id={user_id} заблокирован, приветствие не отправляется")
+        return
+    # Данные пользователя берём на момент отправки: за час он мог оплатить или уже получить приветствие
+    subscription_data = await check_database_user(user_id)
+    await send_onboarding_message(bot, user_id, "welcome", subscription_data)
+    # Приветствие отправляется один раз: если отправка не удалась (бот заблокирован и т.п.),
+    # пользователь не должен снова попадать в добор
+    await mark_welcome_message_sent(user_id)
+
+async def backfill_welcome_jobs() -> int:
+    """Планирует приветствия, которым пора уйти, но задачи для которых в хранилище нет.
+
+    Нужна один раз после деплоя, в котором приветствия переехали в persistent-хранилище:
+    задачи, запланированные старым планировщиком в памяти, потеряны. После успешного
+    добора в bot_config ставится флаг, и следующие запуски ничего не сканируют.
+    """
+    try:
+        if await get_bot_config_value(WELCOME_BACKFILL_DONE_KEY):
+            logger.debug("Добор приветствий уже выполнен, пропускаем")
+            return 0
+        users = await get_users_for_welcome_message()
+        moscow_tz = pytz.timezone('Europe/Moscow')
+        current_time = datetime.now(moscow_tz)
+        scheduled = 0
+        for user in users:
+            user_id = user['user_id']
+            job_id = f"welcome_{user_id}"
+            if persistent_job_exists(job_id):
+                continue
+            if await is_old_user(user_id, cutoff_date="2025-07-11"):
+                logger.info(f"Пользователь user_id={user_id} старый, приветствие не планируется")
+                await mark_welcome_message_sent(user_id)
+                continue
+            run_date = current_time + timedelta(seconds=scheduled * WELCOME_BACKFILL_INTERVAL_SECONDS)
+            if schedule_persistent_job(WELCOME_JOB_REF, job_id, run_date, args=[user_id]):
+                scheduled += 1
+        logger.info(f"Добор приветствий: найдено {len(users)} пользователей, запланировано {scheduled}")
+        await set_bot_config_value(WELCOME_BACKFILL_DONE_KEY, datetime.now(moscow_tz).strftime('%Y-%m-%d %H:%M:%S'))
+        return scheduled
+    except Exception as e:
+        logger.error(f"Ошибка добора приветственных сообщений: {e}", exc_info=True)
+        return 0
+
 async def schedule_daily_reminders(bot: Bot) -> None:
     """Планирует ежедневные напоминания в 11:15 по МСК."""
     try:
@@ -298,58 +339,56 @@ async def send_daily_reminders(bot: Bot) -> None:
 
         moscow_tz = pytz.timezone('Europe/Moscow')
         current_time = datetime.now(moscow_tz)
+        # Дни считаем по created_ts: created_at хранится по МСК без пояса, как и today_ts
+        today_ts = to_epoch(current_time.replace(tzinfo=None))
+        old_user_cutoff_ts = day_range("2025-07-11")[0]
+
+        # Массовая отправка: полоса рассылок не отнимает лимит у ответов пользователям
+        with outbound_lane(Lane.BROADCAST):
+            for user in users:
+                user_id = user['user_id']
+                first_name = user['first_name']
+                username = user['username']
+                created_ts = user['created_ts']
+                last_reminder_type = user['last_reminder_type']
+
+                # Проверяем, заблокирован ли пользователь
+                if await is_user_blocked(user_id):
+                    logger.info(f"Пользователь user_id={user_id} заблокирован, пропускаем напоминание")
+                    continue
+
+                # Проверяем, является ли пользователь старым
+                if created_ts < old_user_cutoff_ts:
+                    logger.info(f"Пользователь user_id={user_id} старый, пропускаем напоминание")
+                    continue
+
+                # Проверяем, есть ли у пользователя покупки
+                has_purchases = await has_user_purchases(user_id, DATABASE_PATH)
+                if has_purchases:
+                    logger.info(f"Пользователь user_id={user_id} уже имеет покупки, пропускаем напоминание")
+                    continue
+
+                days_since_registration = today_ts // 86400 - created_ts // 86400
+
+                # Определяем, какое напоминание нужно отправить
+                if days_since_registration == 1 and last_reminder_type != "reminder_day2":
+                    message_type = "reminder_day2"
+                elif days_since_registration == 2 and last_reminder_type != "reminder_day3":
+                    message_type = "reminder_day3"
+                elif days_since_registration == 3 and last_reminder_type != "reminder_day4":
+                    message_type = "reminder_day4"
+                elif days_since_registration >= 4 and last_reminder_type != "reminder_day5":
+                    message_type = "reminder_day5"
+                else:
+                    continue
 
-        for user in users:
-            user_id = user['user_id']
-            first_name = user['first_name']
-            username = user['username']
-            created_at = user['created_at']
-            last_reminder_type = user['last_reminder_type']
-
-            # Проверяем, заблокирован ли пользователь
-            if await is_user_blocked(user_id):
-                logger.info(f"Пользователь user_id={user_id} заблокирован, пропускаем напоминание")
-                continue
-
-            # Проверяем, является ли пользователь старым
-            is_old_user_flag = await is_old_user(user_id, cutoff_date="2025-07-11")
-            if is_old_user_flag:
-                logger.info(f"Пользователь user_id={user_id} старый, пропускаем напоминание")
-                continue
-
-            # Проверяем, есть ли у пользователя покупки
-            has_purchases = await has_user_purchases(user_id, DATABASE_PATH)
-            if has_purchases:
-                logger.info(f"Пользователь user_id={user_id} уже имеет покупки, пропускаем напоминание")
-                continue
-
-            try:
-                registration_date = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=moscow_tz)
-            except ValueError as e:
-                logger.warning(f"Невалидный формат даты для user_id={user_id}: {created_at}. Пропускаем. Ошибка: {e}")
-                continue
-
-            days_since_registration = (current_time.date() - registration_date.date()).days
-
-            # Определяем, какое напоминание нужно отправить
-            if days_since_registration == 1 and last_reminder_type != "reminder_day2":
-                message_type = "reminder_day2"
-            elif days_since_registration == 2 and last_reminder_type != "reminder_day3":
-                message_type = "reminder_day3"
-            elif days_since_registration == 3 and last_reminder_type != "reminder_day4":
-                message_type = "reminder_day4"
-            elif days_since_registration >= 4 and last_reminder_type != "reminder_day5":
-                message_type = "reminder_day5"
-            else:
-                continue
-
-            subscription_data = await check_database_user(user_id)
-            if not subscription_data or len(subscription_data) < 14:
-                logger.error(f"Неполные данные подписки для user_id={user_id}, пропускаем")
-                continue
+                subscription_data = await check_database_user(user_id)
+                if not subscription_data or len(subscription_data) < 14:
+                    logger.error(f"Неполные данные подписки для user_id={user_id}, пропускаем")
+                    continue
 
-            logger.info(f"Отправка напоминания {message_type} для user_id={user_id}")
-            await send_onboarding_message(bot, user_id, message_type, subscription_data)
+                logger.info(f"Отправка напоминания {message_type} для user_id={user_id}")
+                await send_onboarding_message(bot, user_id, message_type, subscription_data)
 
         logger.info("Ежедневные напоминания отправлены")
 
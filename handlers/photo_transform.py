@@ -20,7 +20,8 @@ import io
 from generation.photo_transform import PhotoTransformGenerator
 from database import check_database_user, update_user_credits, is_user_blocked
 from config import ADMIN_IDS
-from handlers.utils import escape_message_parts
+from handlers.utils import escape_message_parts, send_upload_photo_action
+from progress_service import progress_service
 
 from logger import get_logger
 logger = get_logger('generation')
@@ -57,38 +58,36 @@ def get_progress_bar(percent: int) -> str:
     """
     return get_cookie_progress_bar(percent)
 
-async def update_progress(progress_message: Message, state: FSMContext, expected_duration: int = 67):
-    """
-    Фоновая задача для динамического обновления прогресс-бара.
+# Прогресс-бар преображения: ожидаемая длительность, период обновления и страховочный таймаут, сек
+TRANSFORM_EXPECTED_DURATION = 67
+TRANSFORM_PROGRESS_INTERVAL = 5
+TRANSFORM_PROGRESS_TIMEOUT = 600
 
-    Args:
-        progress_message: Сообщение для редактирования.
-        state: FSMContext для проверки состояния.
-        expected_duration: Ожидаемое время в секундах.
+def render_transform_progress(elapsed: float, expected_duration: int = TRANSFORM_EXPECTED_DURATION) -> str:
     """
-    start_time = time.time()
-    while True:
-        elapsed = time.time() - start_time
-        percent = min(int((elapsed / expected_duration) * 100), 99)
-        current_state = await state.get_state()
-        if current_state != PhotoTransformStates.processing:
-            break
-
-        progress_text = (
-            f"⏳ Генерация в процессе...\n"
-            f"{get_progress_bar(percent)} – Обработка фото нашей нейросетью...\n"
-            f"Это займет около 1 минуты. Пожалуйста, подождите 😊"
-        )
-        try:
-            await progress_message.edit_text(
-                escape_message_parts(progress_text, version=2),
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-        except Exception as e:
-            logger.debug(f"Не удалось обновить прогресс: {e}")
-            break
+    Текст прогресс-сообщения преображения на момент elapsed секунд от старта.
+    """
+    percent = min(int((elapsed / expected_duration) * 100), 99)
+    progress_text = (
+        f"⏳ Генерация в процессе...\n"
+        f"{get_progress_bar(percent)} – Обработка фото нашей нейросетью...\n"
+        f"Это займет около 1 минуты. Пожалуйста, подождите 😊"
+    )
+    return escape_message_parts(progress_text, version=2)
 
-        await asyncio.sleep(5)
+def start_transform_progress(progress_message: Message) -> tuple:
+    """
+    Регистрирует прогресс-сообщение в сервисе прогресса. Возвращает ключ для отмены.
+    """
+    key = ('photo_transform', progress_message.chat.id, progress_message.message_id)
+    progress_service.start(
+        key, progress_message.bot, progress_message.chat.id, render_transform_progress,
+        message_id=progress_message.message_id,
+        parse_mode=ParseMode.MARKDOWN_V2,
+        interval=TRANSFORM_PROGRESS_INTERVAL,
+        expire_after=TRANSFORM_PROGRESS_TIMEOUT
+    )
+    return key
 
 # Обработчик callback для начала преображения
 @photo_transform_router.callback_query(F.data == "photo_transform")
@@ -319,8 +318,8 @@ async def handle_aspect_ratio_selection(callback: CallbackQuery, state: FSMConte
         await state.set_state(PhotoTransformStates.processing)
         await state.update_data(selected_style=style, selected_aspect_ratio=aspect_ratio, selected_resolution=resolution)
 
-        # Запускаем фоновую задачу прогресса
-        progress_task = asyncio.create_task(update_progress(progress_message, state))
+        # Регистрируем прогресс-сообщение в общем сервисе прогресса
+        progress_key = start_transform_progress(progress_message)
 
         start_time = time.time()
 
@@ -342,6 +341,7 @@ async def handle_aspect_ratio_selection(callback: CallbackQuery, state: FSMConte
 
             # Запускаем генерацию
             logger.info(f"Запуск генерации для пользователя {user_id} в стиле {style}")
+            await send_upload_photo_action(bot, user_id, TRANSFORM_EXPECTED_DURATION)
             result = await photo_generator.generate_image(
                 image_bytes=image_bytes,
                 style=style,
@@ -351,7 +351,7 @@ async def handle_aspect_ratio_selection(callback: CallbackQuery, state: FSMConte
             )
 
             # Останавливаем прогресс
-            progress_task.cancel()
+            progress_service.cancel(progress_key)
             elapsed_time = time.time() - start_time
             min_sec = f"{int(elapsed_time // 60)} мин {int(elapsed_time % 60)} сек"
 
@@ -450,11 +450,7 @@ async def handle_aspect_ratio_selection(callback: CallbackQuery, state: FSMConte
             logger.error(f"Критическая ошибка при генерации: {str(e)}")
 
             # Останавливаем прогресс
-            if progress_task:
-                try:
-                    progress_task.cancel()
-                except:
-                    pass
+            progress_service.cancel(progress_key)
 
             # Удаляем сообщение с прогрессом
             if progress_message:
@@ -494,11 +490,8 @@ async def handle_aspect_ratio_selection(callback: CallbackQuery, state: FSMConte
         logger.error(f"Общая ошибка в handle_aspect_ratio_selection: {str(e)}")
 
         # Останавливаем прогресс если есть
-        if 'progress_task' in locals() and progress_task:
-            try:
-                progress_task.cancel()
-            except:
-                pass
+        if 'progress_key' in locals():
+            progress_service.cancel(progress_key)
 
         # Удаляем сообщение прогресса если есть
         if 'progress_message' in locals() and progress_message:
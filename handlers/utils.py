@@ -8,13 +8,22 @@ import tenacity
 from aiogram.fsm.context import FSMContext
 import uuid
 import copy
-from typing import Optional, Union, Dict
+import time
+from typing import Optional, Union, Dict, Tuple
 
 from config import TARIFFS, YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, ADMIN_IDS
+from bot_identity import get_bot_id
+from markdown_escape import safe_escape_markdown, escape_message_parts, unescape_markdown
 
 from logger import get_logger
 logger = get_logger('main')
 
+# Chat action имеет смысл только для операций дольше секунды; Telegram показывает его ~5 с
+CHAT_ACTION_MIN_EXPECTED_SECONDS = 1.0
+CHAT_ACTION_DEBOUNCE_SECONDS = 4.5
+_CHAT_ACTION_MEMO_LIMIT = 10_000
+_last_chat_action: Dict[Tuple[int, str], float] = {}
+
 # Проверка наличия YooKassa
 try:
     from yookassa import Configuration as YooKassaConfiguration, Payment as YooKassaPayment
@@ -32,31 +41,6 @@ retry_telegram_call = tenacity.retry(
     reraise=True
 )
 
-def safe_escape_markdown(text: str, exclude_chars: Optional[list] = None, version: int = 2) -> str:
-    if not text:
-        return ""
-
-    text = str(text)
-
-    if version == 1:
-        # Экранирование для Markdown
-        special_chars = ['_', '*', '`', '[']
-    else:
-        # Экранирование для MarkdownV2
-        special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-
-    # Экранируем все специальные символы
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-
-    # Исключаем символы, которые не нужно экранировать
-    if exclude_chars:
-        for char in exclude_chars:
-            text = text.replace(f'\\{char}', char)
-
-    logger.debug(f"Escaped text (version={version}): {text[:200]}...")
-    return text
-
 def format_user_info_safe(name: str, username: str = None, user_id: int = None, email: str = None) -> str:
     """
     Безопасно форматирует информацию о пользователе для Markdown.
@@ -195,16 +179,11 @@ async def send_message_with_fallback(
     logger.debug(f"send_message_with_fallback: chat_id={chat_id}, text={text[:200]}..., parse_mode={parse_mode}")
 
     # Проверка, не является ли chat_id идентификатором самого бота
-    bot_info = await bot.get_me()
-    if chat_id == bot_info.id:
-        logger.error(f"Попытка отправить сообщение самому боту: chat_id={chat_id} совпадает с bot_id={bot_info.id}")
+    bot_id = get_bot_id(bot)
+    if chat_id == bot_id:
+        logger.error(f"Попытка отправить сообщение самому боту: chat_id={chat_id} совпадает с bot_id={bot_id}")
         return None
 
-    try:
-        await bot.send_chat_action(chat_id=chat_id, action="typing")
-    except Exception as e:
-        logger.debug(f"Не удалось отправить typing action: {e}")
-
     try:
         sent_message = await bot.send_message(
             chat_id=chat_id,
@@ -276,32 +255,48 @@ async def delete_message_safe(message: Message) -> None:
         except Exception as e:
             logger.debug(f"Не удалось удалить сообщение: {e}")
 
-async def send_typing_action(bot: Bot, chat_id: int) -> None:
+async def send_chat_action_if_slow(bot: Bot, chat_id: int, action: str, expected_seconds: float) -> bool:
     """
-    Отправляет действие 'печатает'.
+    Отправляет chat action только для долгих операций и не чаще раза в CHAT_ACTION_DEBOUNCE_SECONDS.
+
+    Telegram показывает действие ~5 секунд, поэтому для быстрых ответов оно лишь
+    тратит лимит запросов. Возвращает True, если запрос к API был сделан.
     """
+    if expected_seconds <= CHAT_ACTION_MIN_EXPECTED_SECONDS:
+        return False
+    now = time.monotonic()
+    key = (chat_id, action)
+    if now - _last_chat_action.get(key, 0.0) < CHAT_ACTION_DEBOUNCE_SECONDS:
+        return False
+    _last_chat_action[key] = now
+    if len(_last_chat_action) > _CHAT_ACTION_MEMO_LIMIT:
+        cutoff = now - CHAT_ACTION_DEBOUNCE_SECONDS
+        for stale in [k for k, sent_at in _last_chat_action.items() if sent_at < cutoff]:
+            del _last_chat_action[stale]
     try:
-        await bot.send_chat_action(chat_id=chat_id, action="typing")
+        await bot.send_chat_action(chat_id=chat_id, action=action)
+        return True
     except Exception as e:
-        logger.debug(f"Не удалось отправить typing action: {e}")
+        logger.debug(f"Не удалось отправить {action} action: {e}")
+        return False
 
-async def send_upload_photo_action(bot: Bot, chat_id: int) -> None:
+async def send_typing_action(bot: Bot, chat_id: int, expected_seconds: float) -> None:
     """
-    Отправляет действие 'загружает фото'.
+    Отправляет действие 'печатает' (если операция долгая).
     """
-    try:
-        await bot.send_chat_action(chat_id=chat_id, action="upload_photo")
-    except Exception as e:
-        logger.debug(f"Не удалось отправить upload_photo action: {e}")
+    await send_chat_action_if_slow(bot, chat_id, "typing", expected_seconds)
 
-async def send_upload_video_action(bot: Bot, chat_id: int) -> None:
+async def send_upload_photo_action(bot: Bot, chat_id: int, expected_seconds: float) -> None:
     """
-    Отправляет действие 'загружает видео'.
+    Отправляет действие 'загружает фото' (если операция долгая).
     """
-    try:
-        await bot.send_chat_action(chat_id=chat_id, action="upload_video")
-    except Exception as e:
-        logger.debug(f"Не удалось отправить upload_video action: {e}")
+    await send_chat_action_if_slow(bot, chat_id, "upload_photo", expected_seconds)
+
+async def send_upload_video_action(bot: Bot, chat_id: int, expected_seconds: float) -> None:
+    """
+    Отправляет действие 'загружает видео' (если операция долгая).
+    """
+    await send_chat_action_if_slow(bot, chat_id, "upload_video", expected_seconds)
 
 async def clean_admin_context(context: FSMContext) -> None:
 
@@ -660,24 +655,3 @@ def debug_markdown_text(text: str) -> str:
         logger.debug(f"Текст: {text[:200]}...")
 
     return text
-
-def escape_message_parts(*parts: str, version: int = 2) -> str:
-
-    if not parts:
-        return ""
-
-    escaped_parts = [safe_escape_markdown(str(part), version=version) for part in parts]
-    result = "".join(escaped_parts)
-    logger.debug(f"escape_message_parts: объединено {len(parts)} частей, результат: {result[:200]}...")
-    return result
-
-def unescape_markdown(text: str) -> str:
-
-    if not text:
-        return ""
-
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(f'\\{char}', char)
-    logger.debug(f"unescape_markdown: очищенный текст: {text[:200]}...")
-    return text
@@ -14,7 +14,7 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ParseMode
 from aiogram.filters import Command
-from database import get_payments_by_date, get_user_activity_metrics, get_generation_cost_log
+from database import get_payments_by_date, get_user_activity_metrics, get_generation_cost_log, get_registrations_per_day, day_range
 from config import ADMIN_IDS, DATABASE_PATH
 from generation_config import IMAGE_GENERATION_MODELS
 from handlers.utils import safe_escape_markdown as escape_md, send_message_with_fallback
@@ -67,7 +67,7 @@ async def visualize_payments(query: CallbackQuery, state: FSMContext) -> None:
     try:
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=30)
-        payments = await get_payments_by_period(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        payments = await get_payments_by_date(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
 
         logger.info(f"Найдено {len(payments)} платежей за период {start_date} - {end_date}")
 
@@ -84,7 +84,7 @@ async def visualize_payments(query: CallbackQuery, state: FSMContext) -> None:
                 logger.warning(f"Платеж {payment[3]} имеет пустую дату created_at")
                 continue
             try:
-                payment_date = datetime.strptime(payment[4], '%Y-%m-%d %H:%M:%S').date()
+                payment_date = payment[4].date()
                 if start_date <= payment_date <= end_date:
                     index = dates.index(payment_date)
                     amounts[index] += float(payment[2])
@@ -169,20 +169,7 @@ async def visualize_registrations(query: CallbackQuery, state: FSMContext) -> No
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30)
 
-        async with aiosqlite.connect(DATABASE_PATH) as conn:
-            conn.row_factory = aiosqlite.Row
-            c = await conn.cursor()
-            await c.execute(
-                """
-                SELECT DATE(created_at) as reg_date, COUNT(*) as count
-                FROM users
-                WHERE created_at BETWEEN ? AND ?
-                GROUP BY DATE(created_at)
-                ORDER BY reg_date
-                """,
-                (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-            )
-            registrations = await c.fetchall()
+        registrations = await get_registrations_per_day(*day_range(start_date, end_date))
 
         dates = []
         counts = []
@@ -192,10 +179,9 @@ async def visualize_registrations(query: CallbackQuery, state: FSMContext) -> No
             counts.append(0)
             current_date += timedelta(days=1)
 
-        for reg in registrations:
-            reg_date = reg['reg_date']
+        for reg_date, count in registrations:
             if reg_date in dates:
-                counts[dates.index(reg_date)] = reg['count']
+                counts[dates.index(reg_date)] = count
 
         plt.figure(figsize=(12, 6))
         sns.set_style("whitegrid")
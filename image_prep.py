@@ -0,0 +1,65 @@
+# image_prep.py
+"""Подготовка изображений в пуле процессов.
+
+Функции-воркеры зависят только от Pillow, чтобы дочерние процессы не тянули
+конфигурацию и хендлеры бота.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+IMAGE_PREP_WORKERS = int(os.getenv('IMAGE_PREP_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Общий пул процессов для декодирования/ресайза изображений."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_PREP_WORKERS)
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    """Останавливает пул при остановке бота; незапущенные задачи отменяются."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _normalize(data: bytes, max_side: int) -> Image.Image:
+    """Декодирует, поворачивает по EXIF, приводит к RGB и уменьшает до max_side."""
+    with Image.open(io.BytesIO(data)) as src:
+        img = ImageOps.exif_transpose(src)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        return img
+
+
+def normalize_to_file(data: bytes, dst_path: str, max_side: int, quality: int = 95) -> str:
+    """Нормализует изображение и сохраняет JPEG без EXIF в dst_path."""
+    img = _normalize(data, max_side)
+    img.save(dst_path, format='JPEG', quality=quality, optimize=True)
+    return dst_path
+
+
+def prepare_reference_image(data: bytes, max_side: int, quality: int = 92) -> bytes:
+    """Готовит референс для модели: нормализация, уменьшение до max_side, JPEG без EXIF."""
+    img = _normalize(data, max_side)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+async def run_in_image_pool(func, *args):
+    """Выполняет функцию подготовки изображения в пуле процессов, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(), func, *args)
@@ -0,0 +1,108 @@
+# job_scheduler.py
+"""Общий планировщик задач бота (APScheduler).
+
+Один AsyncIOScheduler на процесс с двумя хранилищами задач:
+- default - в памяти: периодические задачи (отчёты, проверки), их регистрирует main при каждом старте;
+- persistent - SQLite через SQLAlchemyJobStore: разовые задачи по пользователям
+  (приветствие онбординга). Они переживают перезапуск; при старте основной инстанс
+  только добирает приветствия, для которых задачи в хранилище нет
+  (handlers.onboarding.backfill_welcome_jobs).
+
+Вспомогательные инстансы запускают планировщик на паузе и только пишут задачи в общее
+хранилище. Планировщик основного инстанса спит до ближайшей известной ему задачи и
+о чужих записях не узнаёт, поэтому main регистрирует poll_persistent_jobs с интервалом
+SCHEDULER_POLL_SECONDS: при каждом пробуждении APScheduler перечитывает хранилище и
+запускает наступившие задачи. Задержка выполнения чужой задачи - не больше интервала.
+
+Задачи persistent-хранилища сериализуются, поэтому в них передаются ссылка
+на функцию строкой ("модуль:функция") и простые аргументы. Экземпляр Bot задача
+получает через get_scheduler_bot(). Повторное планирование с тем же id заменяет
+задачу, а не создаёт вторую.
+"""
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+import pytz
+from aiogram import Bot
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from config import SCHEDULER_DATABASE_PATH, SCHEDULER_POLL_SECONDS
+
+from logger import get_logger
+logger = get_logger('main')
+
+PERSISTENT_JOBSTORE = 'persistent'
+
+_scheduler: Optional[AsyncIOScheduler] = None
+_bot: Optional[Bot] = None
+
+
+def create_scheduler(bot: Bot, database_path: str = SCHEDULER_DATABASE_PATH) -> AsyncIOScheduler:
+    """Создаёт общий планировщик процесса. Запускает его вызывающий (scheduler.start())."""
+    global _scheduler, _bot
+    _bot = bot
+    _scheduler = AsyncIOScheduler(
+        jobstores={
+            'default': MemoryJobStore(),
+            PERSISTENT_JOBSTORE: SQLAlchemyJobStore(url=f"sqlite:///{database_path}"),
+        },
+        job_defaults={'coalesce': True},
+        timezone=pytz.timezone('Europe/Moscow')
+    )
+    logger.info(f"Планировщик создан, хранилище разовых задач: {database_path}")
+    return _scheduler
+
+
+def add_persistent_poll_job(scheduler: AsyncIOScheduler, seconds: int = SCHEDULER_POLL_SECONDS) -> None:
+    """Периодически будит планировщик основного инстанса, чтобы он увидел задачи вспомогательных."""
+    scheduler.add_job(
+        poll_persistent_jobs,
+        trigger='interval',
+        seconds=seconds,
+        misfire_grace_time=seconds,
+        id='persistent_jobs_poll'
+    )
+
+
+async def poll_persistent_jobs() -> None:
+    """Пустая задача: работу делает само пробуждение планировщика, перечитывающее хранилища."""
+
+
+def get_scheduler() -> Optional[AsyncIOScheduler]:
+    return _scheduler
+
+
+def get_scheduler_bot() -> Optional[Bot]:
+    return _bot
+
+
+def schedule_persistent_job(func_ref: str, job_id: str, run_date: datetime, args: Sequence[Any] = (),
+                            misfire_grace_time: Optional[int] = None) -> bool:
+    """Планирует разовую задачу в persistent-хранилище.
+
+    Задача с тем же job_id заменяется. misfire_grace_time=None - задача, пропущенная
+    во время простоя бота, выполнится сразу после старта.
+    """
+    if _scheduler is None:
+        logger.error(f"Планировщик не создан, задача {job_id} не запланирована")
+        return False
+    _scheduler.add_job(
+        func_ref,
+        trigger='date',
+        run_date=run_date,
+        args=list(args),
+        id=job_id,
+        jobstore=PERSISTENT_JOBSTORE,
+        replace_existing=True,
+        misfire_grace_time=misfire_grace_time
+    )
+    return True
+
+
+def persistent_job_exists(job_id: str) -> bool:
+    """Есть ли задача с таким id в persistent-хранилище."""
+    if _scheduler is None:
+        return False
+    return _scheduler.get_job(job_id, jobstore=PERSISTENT_JOBSTORE) is not None
@@ -3,7 +3,8 @@
 import os
 import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
 from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.enums import ParseMode
@@ -84,320 +85,242 @@ ASPECT_RATIOS = {
     }
 }
 
-async def create_style_selection_keyboard(generation_type: str = 'with_avatar') -> InlineKeyboardMarkup:
-
-    try:
-        prefix = 'admin_style' if generation_type == 'admin_with_user_avatar' else 'style'
-        keyboard = [
-            [
-                InlineKeyboardButton(text="👤 Портрет", callback_data=f"{prefix}_portrait"),
-                InlineKeyboardButton(text="😊 Повседневное", callback_data=f"{prefix}_casual")
-            ],
-            [
-                InlineKeyboardButton(text="🎨 Художественное", callback_data=f"{prefix}_artistic"),
-                InlineKeyboardButton(text="💼 Деловое", callback_data=f"{prefix}_business")
-            ],
-            [
-                InlineKeyboardButton(text="🌅 На природе", callback_data=f"{prefix}_outdoor"),
-                InlineKeyboardButton(text="🏠 В интерьере", callback_data=f"{prefix}_indoor")
-            ],
-            [
-                InlineKeyboardButton(text="✏️ Свой промпт", callback_data=f"{prefix}_custom")
-            ],
-            [
-                InlineKeyboardButton(
-                    text="🔙 Назад",
-                    callback_data="back_to_generation_menu" if generation_type != 'admin_with_user_avatar' else "admin_users_list"
-                )
-            ]
+# === ГОТОВЫЕ КЛАВИАТУРЫ ===
+# aiogram только сериализует разметку при отправке, поэтому один экземпляр
+# InlineKeyboardMarkup отдаётся всем вызывающим - возвращённые клавиатуры не изменяйте.
+# Статические меню собираются при импорте, страницы стилей - сразу все,
+# клавиатуры с параметрами - один раз на значение параметра (по роли, а не по пользователю).
+
+STYLES_PER_PAGE = 20
+
+@lru_cache(maxsize=None)
+def _build_style_selection_keyboard(for_admin: bool) -> InlineKeyboardMarkup:
+    prefix = 'admin_style' if for_admin else 'style'
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="👤 Портрет", callback_data=f"{prefix}_portrait"),
+            InlineKeyboardButton(text="😊 Повседневное", callback_data=f"{prefix}_casual")
+        ],
+        [
+            InlineKeyboardButton(text="🎨 Художественное", callback_data=f"{prefix}_artistic"),
+            InlineKeyboardButton(text="💼 Деловое", callback_data=f"{prefix}_business")
+        ],
+        [
+            InlineKeyboardButton(text="🌅 На природе", callback_data=f"{prefix}_outdoor"),
+            InlineKeyboardButton(text="🏠 В интерьере", callback_data=f"{prefix}_indoor")
+        ],
+        [
+            InlineKeyboardButton(text="✏️ Свой промпт", callback_data=f"{prefix}_custom")
+        ],
+        [
+            InlineKeyboardButton(
+                text="🔙 Назад",
+                callback_data="admin_users_list" if for_admin else "back_to_generation_menu"
+            )
         ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_style_selection_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    ])
 
-async def create_main_menu_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру главного меню для пользователя."""
-    try:
-        admin_panel_button_text = ADMIN_PANEL_BUTTON_NAMES.get(user_id, "Админ-панель")
-        logger.debug(f"Создание главного меню для user_id={user_id} с админ-кнопкой '{admin_panel_button_text}'")
+async def create_style_selection_keyboard(generation_type: str = 'with_avatar') -> InlineKeyboardMarkup:
+    return _build_style_selection_keyboard(generation_type == 'admin_with_user_avatar')
+
+@lru_cache(maxsize=None)
+def _build_main_menu_keyboard(admin_button_text: Optional[str]) -> InlineKeyboardMarkup:
+    """Главное меню; admin_button_text=None - вариант без админ-кнопки."""
+    keyboard = [
+        [InlineKeyboardButton(text="📸 Фотогенерация", callback_data="photo_generate_menu")],
+        [InlineKeyboardButton(text="🎬 Видеогенерация", callback_data="video_generate_menu")],
+        [InlineKeyboardButton(text="🎭 Фото Преображение", callback_data="photo_transform")],  # НОВАЯ КНОПКА
+        [InlineKeyboardButton(text="👥 Мои аватары", callback_data="my_avatars")],
+        [
+            InlineKeyboardButton(text="👤 Личный кабинет", callback_data="user_profile"),
+            InlineKeyboardButton(text="👥 Пригласить друзей", callback_data="referrals")
+        ],
+        [
+            InlineKeyboardButton(text="💳 Купить пакет", callback_data="subscribe"),
+            InlineKeyboardButton(text="💬 Поддержка", callback_data="support")
+        ],
+        [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")]
+    ]
+    if admin_button_text is not None:
+        keyboard.append([InlineKeyboardButton(text=admin_button_text, callback_data="admin_panel")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-        keyboard = [
-            [InlineKeyboardButton(text="📸 Фотогенерация", callback_data="photo_generate_menu")],
-            [InlineKeyboardButton(text="🎬 Видеогенерация", callback_data="video_generate_menu")],
-            [InlineKeyboardButton(text="🎭 Фото Преображение", callback_data="photo_transform")],  # НОВАЯ КНОПКА
-            [InlineKeyboardButton(text="👥 Мои аватары", callback_data="my_avatars")],
-            [
-                InlineKeyboardButton(text="👤 Личный кабинет", callback_data="user_profile"),
-                InlineKeyboardButton(text="👥 Пригласить друзей", callback_data="referrals")
-            ],
-            [
-                InlineKeyboardButton(text="💳 Купить пакет", callback_data="subscribe"),
-                InlineKeyboardButton(text="💬 Поддержка", callback_data="support")
-            ],
-            [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")]
-        ]
+async def create_main_menu_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура главного меню: один экземпляр на роль (пользователь / админ с подписью кнопки)."""
+    admin_button_text = ADMIN_PANEL_BUTTON_NAMES.get(user_id, "Админ-панель") if user_id in ADMIN_IDS else None
+    return _build_main_menu_keyboard(admin_button_text)
 
-        if user_id in ADMIN_IDS:
-            keyboard.append([InlineKeyboardButton(text=admin_panel_button_text, callback_data="admin_panel")])
-
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_main_menu_keyboard для user_id={user_id}: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+PHOTO_GENERATE_MENU_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📸 Фотосессия (с аватаром)", callback_data="generate_with_avatar")],
+    [InlineKeyboardButton(text="🖼 Фото по референсу", callback_data="photo_to_photo")],
+    [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
+])
 
 async def create_photo_generate_menu_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру меню фотогенерации."""
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="📸 Фотосессия (с аватаром)", callback_data="generate_with_avatar")],
-            [InlineKeyboardButton(text="🖼 Фото по референсу", callback_data="photo_to_photo")],
-            [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_photo_generate_menu_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    """Клавиатура меню фотогенерации."""
+    return PHOTO_GENERATE_MENU_KEYBOARD
+
+VIDEO_GENERATE_MENU_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🎬 AI-видео (Kling 2.1)", callback_data="ai_video_v2_1")],
+    [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
+])
 
 async def create_video_generate_menu_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру меню видеогенерации."""
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="🎬 AI-видео (Kling 2.1)", callback_data="ai_video_v2_1")],
-            [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_video_generate_menu_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    """Клавиатура меню видеогенерации."""
+    return VIDEO_GENERATE_MENU_KEYBOARD
+
+def _build_video_styles_keyboard() -> InlineKeyboardMarkup:
+    video_styles = [
+        ("dynamic_action", "🏃‍♂️ Динамичное действие"),
+        ("slow_motion", "🐢 Замедленное движение"),
+        ("cinematic_pan", "🎥 Кинематографический панорамный вид"),
+        ("facial_expression", "😊 Выразительная мимика"),
+        ("object_movement", "⏳ Движение объекта"),
+        ("dance_sequence", "💃 Танцевальная последовательность"),
+        ("nature_flow", "🌊 Естественное течение"),
+        ("urban_vibe", "🏙 Городская атмосфера"),
+        ("fantasy_motion", "✨ Фантастическое движение"),
+        ("retro_wave", "📼 Ретро-волна")
+    ]
+
+    keyboard = []
+    row = []
+    for style_key, style_name in video_styles:
+        row.append(InlineKeyboardButton(text=style_name, callback_data=f"video_style_{style_key}"))
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
 
-async def create_video_styles_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру выбора стилей для видеогенерации."""
-    try:
-        video_styles = [
-            ("dynamic_action", "🏃‍♂️ Динамичное действие"),
-            ("slow_motion", "🐢 Замедленное движение"),
-            ("cinematic_pan", "🎥 Кинематографический панорамный вид"),
-            ("facial_expression", "😊 Выразительная мимика"),
-            ("object_movement", "⏳ Движение объекта"),
-            ("dance_sequence", "💃 Танцевальная последовательность"),
-            ("nature_flow", "🌊 Естественное течение"),
-            ("urban_vibe", "🏙 Городская атмосфера"),
-            ("fantasy_motion", "✨ Фантастическое движение"),
-            ("retro_wave", "📼 Ретро-волна")
-        ]
+    keyboard.extend([
+        [InlineKeyboardButton(text="✍️ Свой промпт (вручную)", callback_data="enter_custom_prompt_manual")],
+        [InlineKeyboardButton(text="🤖 Свой промпт (Помощник AI)", callback_data="enter_custom_prompt_llama")],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data="video_generate_menu")]
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-        keyboard = []
-        row = []
-        for style_key, style_name in video_styles:
-            row.append(InlineKeyboardButton(text=style_name, callback_data=f"video_style_{style_key}"))
-            if len(row) == 2:
-                keyboard.append(row)
-                row = []
-        if row:
-            keyboard.append(row)
+VIDEO_STYLES_KEYBOARD = _build_video_styles_keyboard()
 
-        keyboard.extend([
-            [InlineKeyboardButton(text="✍️ Свой промпт (вручную)", callback_data="enter_custom_prompt_manual")],
-            [InlineKeyboardButton(text="🤖 Свой промпт (Помощник AI)", callback_data="enter_custom_prompt_llama")],
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="video_generate_menu")]
-        ])
+async def create_video_styles_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура выбора стилей для видеогенерации."""
+    return VIDEO_STYLES_KEYBOARD
 
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_video_styles_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+AVATAR_STYLE_CHOICE_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="👨 Мужчина", callback_data="select_new_male_avatar_styles"),
+        InlineKeyboardButton(text="👩 Женщина", callback_data="select_new_female_avatar_styles")
+    ],
+    [InlineKeyboardButton(text="🔙 В меню генерации", callback_data="generate_menu")]
+])
 
 async def create_avatar_style_choice_keyboard() -> InlineKeyboardMarkup:
-
-    try:
-        keyboard = [
-            [
-                InlineKeyboardButton(text="👨 Мужчина", callback_data="select_new_male_avatar_styles"),
-                InlineKeyboardButton(text="👩 Женщина", callback_data="select_new_female_avatar_styles")
-            ],
-            [InlineKeyboardButton(text="🔙 В меню генерации", callback_data="generate_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_avatar_style_choice_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    return AVATAR_STYLE_CHOICE_KEYBOARD
+
+def _build_style_page(styles_items: List[Tuple[str, str]], style_prefix: str, page_prefix: str,
+                      page: int, total_pages: int) -> InlineKeyboardMarkup:
+    """Одна страница выбора стилей аватара (по STYLES_PER_PAGE стилей, по 2 в строке)."""
+    keyboard = []
+    row = []
+    start_idx = (page - 1) * STYLES_PER_PAGE
+    for style_key, style_name in styles_items[start_idx:start_idx + STYLES_PER_PAGE]:
+        row.append(InlineKeyboardButton(text=style_name, callback_data=f"{style_prefix}{style_key}"))
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+
+    nav_row = []
+    if total_pages > 1:
+        if page > 1:
+            nav_row.append(InlineKeyboardButton(text="⏮ Первая", callback_data=f"{page_prefix}1"))
+            nav_row.append(InlineKeyboardButton(text="◀️", callback_data=f"{page_prefix}{page-1}"))
+
+        nav_row.append(InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="page_info"))
+
+        if page < total_pages:
+            nav_row.append(InlineKeyboardButton(text="▶️", callback_data=f"{page_prefix}{page+1}"))
+            nav_row.append(InlineKeyboardButton(text="⏭ Последняя", callback_data=f"{page_prefix}{total_pages}"))
+
+    if nav_row:
+        keyboard.append(nav_row)
+
+    keyboard.extend([
+        [InlineKeyboardButton(text="🤖 Свой промпт (Помощник AI)", callback_data="enter_custom_prompt_llama")],
+        [InlineKeyboardButton(text="✍️ Свой промпт (вручную)", callback_data="enter_custom_prompt_manual")],
+        [InlineKeyboardButton(text="🔙 Выбор категории", callback_data="generate_with_avatar")]
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def _build_style_pages(styles: Dict[str, str], style_prefix: str, page_prefix: str) -> List[InlineKeyboardMarkup]:
+    """Все страницы выбора стилей; страница N - элемент N-1."""
+    styles_items = list(styles.items())
+    total_pages = max(1, (len(styles_items) + STYLES_PER_PAGE - 1) // STYLES_PER_PAGE)
+    return [
+        _build_style_page(styles_items, style_prefix, page_prefix, page, total_pages)
+        for page in range(1, total_pages + 1)
+    ]
+
+MALE_STYLE_PAGES = _build_style_pages(NEW_MALE_AVATAR_STYLES, "style_new_male_", "male_styles_page_")
+FEMALE_STYLE_PAGES = _build_style_pages(NEW_FEMALE_AVATAR_STYLES, "style_new_female_", "female_styles_page_")
+
+def _style_page(pages: List[InlineKeyboardMarkup], page: int) -> InlineKeyboardMarkup:
+    return pages[max(1, min(page, len(pages))) - 1]
 
 async def create_new_male_avatar_styles_keyboard(page: int = 1) -> InlineKeyboardMarkup:
+    return _style_page(MALE_STYLE_PAGES, page)
 
-    try:
-        keyboard = []
-        row = []
-
-        styles_per_page = 20
-        total_styles = len(NEW_MALE_AVATAR_STYLES)
-        total_pages = (total_styles + styles_per_page - 1) // styles_per_page
-
-        page = max(1, min(page, total_pages))
-
-        start_idx = (page - 1) * styles_per_page
-        end_idx = min(start_idx + styles_per_page, total_styles)
-
-        styles_items = list(NEW_MALE_AVATAR_STYLES.items())
-        styles_to_show = styles_items[start_idx:end_idx]
-
-        for style_key, style_name in styles_to_show:
-            row.append(InlineKeyboardButton(text=style_name, callback_data=f"style_new_male_{style_key}"))
+async def create_new_female_avatar_styles_keyboard(page: int = 1) -> InlineKeyboardMarkup:
+    return _style_page(FEMALE_STYLE_PAGES, page)
+
+@lru_cache(maxsize=32)
+def _build_aspect_ratio_keyboard(back_callback: str) -> InlineKeyboardMarkup:
+    keyboard = []
+
+    square_ratios = ["1:1"]
+    landscape_ratios = ["16:9", "21:9", "4:3", "5:4"]
+    portrait_ratios = ["9:16", "9:21", "3:4", "4:5", "2:3"]
+
+    keyboard.append([InlineKeyboardButton(text="📐 КВАДРАТНЫЕ ФОРМАТЫ", callback_data="category_info")])
+    for ratio in square_ratios:
+        if ratio in ASPECT_RATIOS:
+            display = f"{ratio} 📱 {'Квадрат' if ratio == 'square' else 'Квадратный'}"
+            keyboard.append([InlineKeyboardButton(text=display, callback_data=f"aspect_{ratio}")])
+
+    keyboard.append([InlineKeyboardButton(text="🖥️ ГОРИЗОНТАЛЬНЫЕ ФОРМАТЫ", callback_data="category_info")])
+    row = []
+    for ratio in landscape_ratios:
+        if ratio in ASPECT_RATIOS:
+            display = f"{ratio} 🖥️ {'Альбом' if ratio == 'landscape' else 'Горизонтальный'}"
+            row.append(InlineKeyboardButton(text=display, callback_data=f"aspect_{ratio}"))
             if len(row) == 2:
                 keyboard.append(row)
                 row = []
-
-        if row:
-            keyboard.append(row)
-
-        nav_row = []
-        if total_pages > 1:
-            if page > 1:
-                nav_row.append(InlineKeyboardButton(text="⏮ Первая", callback_data="male_styles_page_1"))
-                nav_row.append(InlineKeyboardButton(text="◀️", callback_data=f"male_styles_page_{page-1}"))
-
-            nav_row.append(InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="page_info"))
-
-            if page < total_pages:
-                nav_row.append(InlineKeyboardButton(text="▶️", callback_data=f"male_styles_page_{page+1}"))
-                nav_row.append(InlineKeyboardButton(text="⏭ Последняя", callback_data=f"male_styles_page_{total_pages}"))
-
-        if nav_row:
-            keyboard.append(nav_row)
-
-        keyboard.extend([
-            [InlineKeyboardButton(text="🤖 Свой промпт (Помощник AI)", callback_data="enter_custom_prompt_llama")],
-            [InlineKeyboardButton(text="✍️ Свой промпт (вручную)", callback_data="enter_custom_prompt_manual")],
-            [InlineKeyboardButton(text="🔙 Выбор категории", callback_data="generate_with_avatar")]
-        ])
-
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_new_male_avatar_styles_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
-
-async def create_new_female_avatar_styles_keyboard(page: int = 1) -> InlineKeyboardMarkup:
-
-    try:
-        keyboard = []
-        row = []
-
-        styles_per_page = 20
-        total_styles = len(NEW_FEMALE_AVATAR_STYLES)
-        total_pages = (total_styles + styles_per_page - 1) // styles_per_page
-
-        page = max(1, min(page, total_pages))
-
-        start_idx = (page - 1) * styles_per_page
-        end_idx = min(start_idx + styles_per_page, total_styles)
-
-        styles_items = list(NEW_FEMALE_AVATAR_STYLES.items())
-        styles_to_show = styles_items[start_idx:end_idx]
-
-        for style_key, style_name in styles_to_show:
-            row.append(InlineKeyboardButton(text=style_name, callback_data=f"style_new_female_{style_key}"))
+    if row:
+        keyboard.append(row)
+
+    keyboard.append([InlineKeyboardButton(text="📱 ВЕРТИКАЛЬНЫЕ ФОРМАТЫ", callback_data="category_info")])
+    row = []
+    for ratio in portrait_ratios:
+        if ratio in ASPECT_RATIOS:
+            display = f"{ratio} 📲 {'Портрет' if ratio == 'portrait' else 'Вертикальный'}"
+            row.append(InlineKeyboardButton(text=display, callback_data=f"aspect_{ratio}"))
             if len(row) == 2:
                 keyboard.append(row)
                 row = []
+    if row:
+        keyboard.append(row)
 
-        if row:
-            keyboard.append(row)
-
-        nav_row = []
-        if total_pages > 1:
-            if page > 1:
-                nav_row.append(InlineKeyboardButton(text="⏮ Первая", callback_data="female_styles_page_1"))
-                nav_row.append(InlineKeyboardButton(text="◀️", callback_data=f"female_styles_page_{page-1}"))
-
-            nav_row.append(InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="page_info"))
-
-            if page < total_pages:
-                nav_row.append(InlineKeyboardButton(text="▶️", callback_data=f"female_styles_page_{page+1}"))
-                nav_row.append(InlineKeyboardButton(text="⏭ Последняя", callback_data=f"female_styles_page_{total_pages}"))
-
-        if nav_row:
-            keyboard.append(nav_row)
-
-        keyboard.extend([
-            [InlineKeyboardButton(text="🤖 Свой промпт (Помощник AI)", callback_data="enter_custom_prompt_llama")],
-            [InlineKeyboardButton(text="✍️ Свой промпт (вручную)", callback_data="enter_custom_prompt_manual")],
-            [InlineKeyboardButton(text="🔙 Выбор категории", callback_data="generate_with_avatar")]
-        ])
-
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_new_female_avatar_styles_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    keyboard.extend([
+        [InlineKeyboardButton(text="ℹ️ Информация о форматах", callback_data="aspect_ratio_info")],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data=back_callback)],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")]
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 async def create_aspect_ratio_keyboard(back_callback: str = "back_to_style_selection") -> InlineKeyboardMarkup:
-
-    try:
-        logger.debug(f"Создание клавиатуры соотношений сторон с back_callback={back_callback}")
-        keyboard = []
-
-        square_ratios = ["1:1"]
-        landscape_ratios = ["16:9", "21:9", "4:3", "5:4"]
-        portrait_ratios = ["9:16", "9:21", "3:4", "4:5", "2:3"]
-
-        keyboard.append([InlineKeyboardButton(text="📐 КВАДРАТНЫЕ ФОРМАТЫ", callback_data="category_info")])
-        for ratio in square_ratios:
-            if ratio in ASPECT_RATIOS:
-                display = f"{ratio} 📱 {'Квадрат' if ratio == 'square' else 'Квадратный'}"
-                keyboard.append([InlineKeyboardButton(text=display, callback_data=f"aspect_{ratio}")])
-
-        keyboard.append([InlineKeyboardButton(text="🖥️ ГОРИЗОНТАЛЬНЫЕ ФОРМАТЫ", callback_data="category_info")])
-        row = []
-        for ratio in landscape_ratios:
-            if ratio in ASPECT_RATIOS:
-                display = f"{ratio} 🖥️ {'Альбом' if ratio == 'landscape' else 'Горизонтальный'}"
-                row.append(InlineKeyboardButton(text=display, callback_data=f"aspect_{ratio}"))
-                if len(row) == 2:
-                    keyboard.append(row)
-                    row = []
-        if row:
-            keyboard.append(row)
-
-        keyboard.append([InlineKeyboardButton(text="📱 ВЕРТИКАЛЬНЫЕ ФОРМАТЫ", callback_data="category_info")])
-        row = []
-        for ratio in portrait_ratios:
-            if ratio in ASPECT_RATIOS:
-                display = f"{ratio} 📲 {'Портрет' if ratio == 'portrait' else 'Вертикальный'}"
-                row.append(InlineKeyboardButton(text=display, callback_data=f"aspect_{ratio}"))
-                if len(row) == 2:
-                    keyboard.append(row)
-                    row = []
-        if row:
-            keyboard.append(row)
-
-        keyboard.extend([
-            [InlineKeyboardButton(text="ℹ️ Информация о форматах", callback_data="aspect_ratio_info")],
-            [InlineKeyboardButton(text="🔙 Назад", callback_data=back_callback)],
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")]
-        ])
-
-        logger.debug(f"Клавиатура соотношений сторон создана успешно: {len(keyboard)} строк")
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_aspect_ratio_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    return _build_aspect_ratio_keyboard(back_callback)
 
 async def create_user_profile_keyboard(user_id: int, bot: Bot) -> InlineKeyboardMarkup:
 
@@ -512,47 +435,38 @@ async def create_training_keyboard(user_id: int, photo_count: int) -> InlineKeyb
             [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
         ])
 
-async def create_admin_keyboard(user_id: Optional[int] = None) -> InlineKeyboardMarkup:
-
-    try:
-        admin_panel_button_text = ADMIN_PANEL_BUTTON_NAMES.get(user_id, "Админ-панель")
-        logger.debug(f"Создание админ-клавиатуры для user_id={user_id}")
+ADMIN_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="📊 Отчет пользователей", callback_data="admin_stats"),
+        InlineKeyboardButton(text="🔍 Поиск пользователей", callback_data="admin_search_user")
+    ],
+    [
+        InlineKeyboardButton(text="📈 Отчет платежей", callback_data="admin_payments"),
+        InlineKeyboardButton(text="�� Отчет активности", callback_data="admin_activity_stats")
+    ],
+    [
+        InlineKeyboardButton(text="🔗 Отчет рефералов", callback_data="admin_referral_stats"),
+        InlineKeyboardButton(text="📉 Визуализация", callback_data="admin_visualization")
+    ],
+    [
+        InlineKeyboardButton(text="💰 Расходы Replicate", callback_data="admin_replicate_costs"),
+        InlineKeyboardButton(text="🧹 Проблемные аватары", callback_data="admin_failed_avatars")
+    ],
+    [
+        InlineKeyboardButton(text="📢 Рассылка всем", callback_data="broadcast_all"),
+        InlineKeyboardButton(text="📢 Оплатившим", callback_data="broadcast_paid")
+    ],
+    [
+        InlineKeyboardButton(text="📢 Не оплатившим", callback_data="broadcast_non_paid"),
+        InlineKeyboardButton(text="📢 Рассылка с оплатой", callback_data="broadcast_with_payment")
+    ],
+    [InlineKeyboardButton(text="🗂 Управление рассылками", callback_data="list_broadcasts")],
+    [InlineKeyboardButton(text="🔬 Профилирование", callback_data="admin_profiler")],
+    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")]
+])
 
-        keyboard = [
-            [
-                InlineKeyboardButton(text="📊 Отчет пользователей", callback_data="admin_stats"),
-                InlineKeyboardButton(text="🔍 Поиск пользователей", callback_data="admin_search_user")
-            ],
-            [
-                InlineKeyboardButton(text="📈 Отчет платежей", callback_data="admin_payments"),
-                InlineKeyboardButton(text="�� Отчет активности", callback_data="admin_activity_stats")
-            ],
-            [
-                InlineKeyboardButton(text="🔗 Отчет рефералов", callback_data="admin_referral_stats"),
-                InlineKeyboardButton(text="📉 Визуализация", callback_data="admin_visualization")
-            ],
-            [
-                InlineKeyboardButton(text="💰 Расходы Replicate", callback_data="admin_replicate_costs"),
-                InlineKeyboardButton(text="🧹 Проблемные аватары", callback_data="admin_failed_avatars")
-            ],
-            [
-                InlineKeyboardButton(text="📢 Рассылка всем", callback_data="broadcast_all"),
-                InlineKeyboardButton(text="📢 Оплатившим", callback_data="broadcast_paid")
-            ],
-            [
-                InlineKeyboardButton(text="📢 Не оплатившим", callback_data="broadcast_non_paid"),
-                InlineKeyboardButton(text="📢 Рассылка с оплатой", callback_data="broadcast_with_payment")
-            ],
-            [InlineKeyboardButton(text="🗂 Управление рассылками", callback_data="list_broadcasts")],
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")]
-        ]
-
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_admin_keyboard для user_id={user_id}: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+async def create_admin_keyboard(user_id: Optional[int] = None) -> InlineKeyboardMarkup:
+    return ADMIN_KEYBOARD
 
 async def create_admin_user_actions_keyboard(target_user_id: int, is_blocked: bool) -> InlineKeyboardMarkup:
 
@@ -590,42 +504,57 @@ async def create_admin_user_actions_keyboard(target_user_id: int, is_blocked: bo
             [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
         ])
 
-async def create_subscription_keyboard(hide_mini_tariff: bool = False) -> InlineKeyboardMarkup:
-
-    try:
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    text="💎 Выберите тариф",
-                    callback_data="ignore"
-                )
-            ]
+@lru_cache(maxsize=None)
+def _build_subscription_keyboard(hide_mini_tariff: bool) -> InlineKeyboardMarkup:
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                text="💎 Выберите тариф",
+                callback_data="ignore"
+            )
         ]
+    ]
 
-        # Определяем, какие тарифы показывать
-        available_tariffs = {k: v for k, v in TARIFFS.items() if k != "admin_premium"}
-        if hide_mini_tariff:
-            available_tariffs = {k: v for k, v in available_tariffs.items() if k != "мини"}
-
-        for plan_key, plan_details in available_tariffs.items():
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=plan_details["display"],
-                    callback_data=plan_details["callback"]
-                )
-            ])
+    # Определяем, какие тарифы показывать
+    available_tariffs = {k: v for k, v in TARIFFS.items() if k != "admin_premium"}
+    if hide_mini_tariff:
+        available_tariffs = {k: v for k, v in available_tariffs.items() if k != "мини"}
 
+    for plan_key, plan_details in available_tariffs.items():
         keyboard.append([
-            InlineKeyboardButton(text="🔙 В меню", callback_data="back_to_menu")
+            InlineKeyboardButton(
+                text=plan_details["display"],
+                callback_data=plan_details["callback"]
+            )
         ])
 
-        logger.debug(f"Клавиатура тарифов создана успешно: {len(keyboard)} строк, hide_mini_tariff={hide_mini_tariff}")
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_subscription_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    keyboard.append([
+        InlineKeyboardButton(text="🔙 В меню", callback_data="back_to_menu")
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+async def create_subscription_keyboard(hide_mini_tariff: bool = False) -> InlineKeyboardMarkup:
+    return _build_subscription_keyboard(hide_mini_tariff)
+
+@lru_cache(maxsize=None)
+def _build_rating_keyboard(with_top_up: bool) -> InlineKeyboardMarkup:
+    keyboard = [
+        [
+            InlineKeyboardButton(text="1⭐", callback_data="rate_1"),
+            InlineKeyboardButton(text="2⭐", callback_data="rate_2"),
+            InlineKeyboardButton(text="3⭐", callback_data="rate_3"),
+            InlineKeyboardButton(text="4⭐", callback_data="rate_4"),
+            InlineKeyboardButton(text="5⭐", callback_data="rate_5")
+        ],
+        [
+            InlineKeyboardButton(text="🔄 Повторить", callback_data="repeat_last_generation"),
+            InlineKeyboardButton(text="✨ Новая генерация", callback_data="generate_menu")
+        ]
+    ]
+    if with_top_up:
+        keyboard.append([InlineKeyboardButton(text="💳 Пополнить", callback_data="subscribe")])
+    keyboard.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 async def create_rating_keyboard(
     generation_type: Optional[str] = None,
@@ -634,40 +563,27 @@ async def create_rating_keyboard(
     bot: Optional[Bot] = None
 ) -> InlineKeyboardMarkup:
 
-    try:
-        keyboard = [
-            [
-                InlineKeyboardButton(text="1⭐", callback_data="rate_1"),
-                InlineKeyboardButton(text="2⭐", callback_data="rate_2"),
-                InlineKeyboardButton(text="3⭐", callback_data="rate_3"),
-                InlineKeyboardButton(text="4⭐", callback_data="rate_4"),
-                InlineKeyboardButton(text="5⭐", callback_data="rate_5")
-            ],
-            [
-                InlineKeyboardButton(text="🔄 Повторить", callback_data="repeat_last_generation"),
-                InlineKeyboardButton(text="✨ Новая генерация", callback_data="generate_menu")
-            ]
+    with_top_up = False
+    if user_id and bot:
+        try:
+            subscription_data = await check_user_resources(bot, user_id, required_photos=5)
+            if isinstance(subscription_data, tuple) and len(subscription_data) >= 2:
+                with_top_up = subscription_data[0] < 5
+            else:
+                logger.warning(f"Некорректные данные подписки для user_id={user_id}: {subscription_data}")
+        except Exception as e:
+            logger.error(f"Ошибка проверки баланса в create_rating_keyboard для user_id={user_id}: {e}", exc_info=True)
+    return _build_rating_keyboard(with_top_up)
+
+@lru_cache(maxsize=256)
+def _build_confirmation_keyboard(confirm_callback: str, cancel_callback: str,
+                                 confirm_text: str, cancel_text: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=confirm_text, callback_data=confirm_callback),
+            InlineKeyboardButton(text=cancel_text, callback_data=cancel_callback)
         ]
-
-        if user_id and bot:
-            try:
-                subscription_data = await check_user_resources(bot, user_id, required_photos=5)
-                if isinstance(subscription_data, tuple) and len(subscription_data) >= 2:
-                    generations_left = subscription_data[0]
-                    if generations_left < 5:
-                        keyboard.append([InlineKeyboardButton(text="💳 Пополнить", callback_data="subscribe")])
-                else:
-                    logger.warning(f"Некорректные данные подписки для user_id={user_id}: {subscription_data}")
-            except Exception as e:
-                logger.error(f"Ошибка проверки баланса в create_rating_keyboard для user_id={user_id}: {e}", exc_info=True)
-
-        keyboard.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")])
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_rating_keyboard для user_id={user_id}: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    ])
 
 async def create_confirmation_keyboard(
     confirm_callback: str = "confirm_action",
@@ -675,34 +591,19 @@ async def create_confirmation_keyboard(
     confirm_text: str = "✅ Да",
     cancel_text: str = "❌ Нет"
 ) -> InlineKeyboardMarkup:
+    return _build_confirmation_keyboard(confirm_callback, cancel_callback, confirm_text, cancel_text)
 
-    try:
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text=confirm_text, callback_data=confirm_callback),
-                InlineKeyboardButton(text=cancel_text, callback_data=cancel_callback)
-            ]
-        ])
-    except Exception as e:
-        logger.error(f"Ошибка в create_confirmation_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+@lru_cache(maxsize=256)
+def _build_back_keyboard(callback_data: str, text: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=callback_data)]
+    ])
 
 async def create_back_keyboard(
     callback_data: str = "back_to_menu",
     text: str = "🔙 Назад"
 ) -> InlineKeyboardMarkup:
-
-    try:
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=text, callback_data=callback_data)]
-        ])
-    except Exception as e:
-        logger.error(f"Ошибка в create_back_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    return _build_back_keyboard(callback_data, text)
 
 async def create_prompt_selection_keyboard(
     back_callback_data: str = "back_to_menu",
@@ -743,124 +644,76 @@ async def create_prompt_selection_keyboard(
             [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
         ])
 
+VIDEO_STATUS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📋 Мои видео", callback_data="my_videos")],
+    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")]
+])
+
 async def create_video_status_keyboard() -> InlineKeyboardMarkup:
+    return VIDEO_STATUS_KEYBOARD
 
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="📋 Мои видео", callback_data="my_videos")],
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_video_status_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+PAYMENT_SUCCESS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="➕ Создать аватар", callback_data="train_flux")],
+    [InlineKeyboardButton(text="✨ Сгенерировать фото", callback_data="generate_menu")],
+    [InlineKeyboardButton(text="🏠 В меню", callback_data="back_to_menu")]
+])
 
 async def create_payment_success_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    return PAYMENT_SUCCESS_KEYBOARD
 
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="➕ Создать аватар", callback_data="train_flux")],
-            [InlineKeyboardButton(text="✨ Сгенерировать фото", callback_data="generate_menu")],
-            [InlineKeyboardButton(text="🏠 В меню", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_payment_success_keyboard для user_id={user_id}: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+PHOTO_UPLOAD_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="❌ Отмена загрузки", callback_data="cancel_upload")],
+    [InlineKeyboardButton(text="❓ Помощь", callback_data="help_upload")]
+])
 
 async def create_photo_upload_keyboard() -> InlineKeyboardMarkup:
+    return PHOTO_UPLOAD_KEYBOARD
 
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="❌ Отмена загрузки", callback_data="cancel_upload")],
-            [InlineKeyboardButton(text="❓ Помощь", callback_data="help_upload")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_photo_upload_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+GENERATION_IN_PROGRESS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⏸ Отмена (в меню)", callback_data="back_to_menu")]
+])
 
 async def create_generation_in_progress_keyboard() -> InlineKeyboardMarkup:
+    return GENERATION_IN_PROGRESS_KEYBOARD
 
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="⏸ Отмена (в меню)", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_generation_in_progress_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+BROADCAST_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📤 Отправить без текста", callback_data="send_broadcast_no_text")],
+    [InlineKeyboardButton(text="🔙 Отмена", callback_data="admin_panel")]
+])
 
 async def create_broadcast_keyboard() -> InlineKeyboardMarkup:
-
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="📤 Отправить без текста", callback_data="send_broadcast_no_text")],
-            [InlineKeyboardButton(text="🔙 Отмена", callback_data="admin_panel")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_broadcast_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    return BROADCAST_KEYBOARD
+
+FAQ_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📸 Как создать фото?", callback_data="faq_photo")],
+    [InlineKeyboardButton(text="🎬 Как создать видео?", callback_data="faq_video")],
+    [InlineKeyboardButton(text="👤 Как создать аватар?", callback_data="faq_avatar")],
+    [InlineKeyboardButton(text="💡 Советы по промптам", callback_data="faq_prompts")],
+    [InlineKeyboardButton(text="❓ Частые проблемы", callback_data="faq_problems")],
+    [InlineKeyboardButton(text="💎 О подписке", callback_data="faq_subscription")],
+    [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
+])
 
 async def create_faq_keyboard() -> InlineKeyboardMarkup:
+    return FAQ_KEYBOARD
 
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="📸 Как создать фото?", callback_data="faq_photo")],
-            [InlineKeyboardButton(text="🎬 Как создать видео?", callback_data="faq_video")],
-            [InlineKeyboardButton(text="👤 Как создать аватар?", callback_data="faq_avatar")],
-            [InlineKeyboardButton(text="💡 Советы по промптам", callback_data="faq_prompts")],
-            [InlineKeyboardButton(text="❓ Частые проблемы", callback_data="faq_problems")],
-            [InlineKeyboardButton(text="💎 О подписке", callback_data="faq_subscription")],
-            [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_faq_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+SUPPORT_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💬 Написать в поддержку", url="https://t.me/AXIDI_Help")],
+    [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")],
+    [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
+])
 
 async def create_support_keyboard() -> InlineKeyboardMarkup:
+    return SUPPORT_KEYBOARD
 
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="💬 Написать в поддержку", url="https://t.me/AXIDI_Help")],
-            [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")],
-            [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_menu")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_support_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+ERROR_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💬 Поддержка", callback_data="support")],
+    [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="back_to_menu")],
+    [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")]
+])
 
 async def create_error_keyboard() -> InlineKeyboardMarkup:
-
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="💬 Поддержка", callback_data="support")],
-            [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="back_to_menu")],
-            [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")]
-        ]
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_error_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    return ERROR_KEYBOARD
 
 async def create_referral_keyboard(user_id: int, bot_username: str) -> InlineKeyboardMarkup:
 
@@ -1016,51 +869,52 @@ async def create_payment_only_keyboard(user_id: int, time_since_registration: fl
             [InlineKeyboardButton(text="❌ Ошибка", callback_data="error")]
         ])
 
+BROADCAST_WITH_PAYMENT_AUDIENCE_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="👥 Всем", callback_data="broadcast_with_payment_all")],
+    [InlineKeyboardButton(text="💳 Оплатившим", callback_data="broadcast_with_payment_paid")],
+    [InlineKeyboardButton(text="🆓 Не оплатившим", callback_data="broadcast_with_payment_non_paid")],
+    [InlineKeyboardButton(text="🔙 Отмена", callback_data="admin_panel")]
+])
+
 async def create_broadcast_with_payment_audience_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру выбора аудитории для рассылки с кнопкой оплаты."""
-    try:
-        keyboard = [
-            [InlineKeyboardButton(text="👥 Всем", callback_data="broadcast_with_payment_all")],
-            [InlineKeyboardButton(text="💳 Оплатившим", callback_data="broadcast_with_payment_paid")],
-            [InlineKeyboardButton(text="🆓 Не оплатившим", callback_data="broadcast_with_payment_non_paid")],
-            [InlineKeyboardButton(text="🔙 Отмена", callback_data="admin_panel")]
-        ]
-        logger.debug("Клавиатура выбора аудитории для рассылки с кнопкой оплаты создана успешно")
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    except Exception as e:
-        logger.error(f"Ошибка в create_broadcast_with_payment_audience_keyboard: {e}", exc_info=True)
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Ошибка, вернуться в меню", callback_data="back_to_menu")]
-        ])
+    """Клавиатура выбора аудитории для рассылки с кнопкой оплаты."""
+    return BROADCAST_WITH_PAYMENT_AUDIENCE_KEYBOARD
+
+@lru_cache(maxsize=64)
+def _build_broadcast_buttons_keyboard(buttons: Tuple[Tuple[str, str], ...], force_subscribe: bool) -> InlineKeyboardMarkup:
+    """Кнопки рассылки; force_subscribe - разрешённые callback'и заменяются на 'subscribe'."""
+    keyboard = []
+    row = []
+    for button_text, callback_data in buttons:
+        if force_subscribe and callback_data in ALLOWED_BROADCAST_CALLBACKS and callback_data != "subscribe":
+            callback_data = "subscribe"
+        row.append(InlineKeyboardButton(text=button_text, callback_data=callback_data))
+        if len(row) == 2:  # Максимум 2 кнопки в строке
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 async def create_dynamic_broadcast_keyboard(buttons: List[Dict[str, str]], user_id: int) -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру для рассылки на основе списка кнопок с учётом статуса оплаты пользователя."""
+    """Создаёт клавиатуру для рассылки на основе списка кнопок с учётом статуса оплаты пользователя.
+
+    Вариантов клавиатуры на рассылку два (с заменой на 'subscribe' и без), оба кэшируются.
+    """
     try:
-        keyboard = []
-        row = []
         # Проверяем статус оплаты и ресурсы пользователя
         subscription_data = await check_database_user(user_id)
         payments = await get_user_payments(user_id)
         is_paying_user = bool(payments) or (subscription_data and len(subscription_data) > 5 and not bool(subscription_data[5]))
         has_resources = subscription_data and len(subscription_data) > 1 and (subscription_data[0] > 0 or subscription_data[1] > 0)
         is_admin = user_id in ADMIN_IDS
+        # Заменяем все callback'и из ALLOWED_BROADCAST_CALLBACKS (кроме 'subscribe') на 'subscribe' для неоплативших без ресурсов
+        force_subscribe = not is_paying_user and not has_resources and not is_admin
 
-        for button in buttons[:3]:  # Ограничиваем до 3 кнопок
-            button_text = button["text"][:64]  # Ограничиваем длину текста кнопки
-            callback_data = button["callback_data"][:64]  # Ограничиваем длину callback
-            # Заменяем все callback'и из ALLOWED_BROADCAST_CALLBACKS (кроме 'subscribe') на 'subscribe' для неоплативших без ресурсов
-            if (not is_paying_user and not has_resources and not is_admin and
-                callback_data in ALLOWED_BROADCAST_CALLBACKS and callback_data != "subscribe"):
-                callback_data = "subscribe"
-                logger.debug(f"Заменён callback_data='{button['callback_data']}' на 'subscribe' для user_id={user_id}")
-            row.append(InlineKeyboardButton(text=button_text, callback_data=callback_data))
-            if len(row) == 2:  # Максимум 2 кнопки в строке
-                keyboard.append(row)
-                row = []
-        if row:
-            keyboard.append(row)
-        logger.debug(f"Создана динамическая клавиатура для user_id={user_id} с {len(buttons)} кнопками: {buttons}")
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
+        # Не больше 3 кнопок, текст и callback - до 64 символов
+        normalized = tuple((button["text"][:64], button["callback_data"][:64]) for button in buttons[:3])
+        return _build_broadcast_buttons_keyboard(normalized, bool(force_subscribe))
     except Exception as e:
         logger.error(f"Ошибка в create_dynamic_broadcast_keyboard для user_id={user_id}: {e}", exc_info=True)
         return InlineKeyboardMarkup(inline_keyboard=[])
+
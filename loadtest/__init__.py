@@ -0,0 +1,12 @@
+# loadtest/__init__.py
+"""Нагрузочный стенд: настоящий Dispatcher из main.py против фейковых Telegram и Replicate.
+
+Запуск из корня проекта:
+    python -m loadtest start_storm --users 2000 --concurrency 200
+    python -m loadtest generation_burst --users 200
+    python -m loadtest broadcast --users 100000
+    python -m loadtest payment_flood --users 1000 --concurrency 32
+
+База, планировщик и файлы создаются во временном каталоге; реальные Telegram,
+Replicate и YooKassa не вызываются. Параметры фейков - см. python -m loadtest --help.
+"""
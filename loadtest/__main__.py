@@ -0,0 +1,92 @@
+# loadtest/__main__.py
+"""Точка входа нагрузочного стенда: python -m loadtest <сценарий> [параметры]."""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+
+def _prepare_environment(workdir: str) -> None:
+    """Изолирует стенд до импорта модулей бота: временная база, без Redis и настоящих ключей."""
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '123456789:LOADTEST',
+        'REPLICATE_API_TOKEN': 'loadtest',
+        'REPLICATE_API_KEY': '',
+        'REPLICATE_POLL_INTERVAL': '0.2',
+        'YOOKASSA_SHOP_ID': 'loadtest',
+        'YOOKASSA_SECRET_KEY': 'loadtest',
+        'YOOKASSA_SECRET': '',
+        'REDIS_URL': '',
+        'DATABASE_PATH': os.path.join(workdir, 'users.db'),
+        'SCHEDULER_DATABASE_PATH': os.path.join(workdir, 'scheduler_jobs.db'),
+    })
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description="Нагрузочный стенд бота")
+    parser.add_argument('scenario', choices=('start_storm', 'generation_burst', 'broadcast', 'payment_flood', 'all'))
+    parser.add_argument('--users', type=int, default=1000, help="синтетических пользователей")
+    parser.add_argument('--concurrency', type=int, default=100, help="одновременных апдейтов / HTTP-запросов")
+    parser.add_argument('--timeout', type=float, default=120,
+                        help="ожидание фоновой работы, с (неуспешные генерации ждут его целиком)")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="ответ Bot API, с")
+    parser.add_argument('--blocked-rate', type=float, default=0.02, help="доля заблокировавших бота")
+    parser.add_argument('--replicate-latency', type=float, default=8.0, help="длительность предсказания, с")
+    parser.add_argument('--replicate-failure-rate', type=float, default=0.02, help="доля неуспешных предсказаний")
+    parser.add_argument('--replicate-http-error-rate', type=float, default=0.0, help="доля ответов 500 на создание")
+    parser.add_argument('--training-latency', type=float, default=30.0, help="длительность обучения, с")
+    parser.add_argument('--upload-latency', type=float, default=0.2, help="загрузка файла в Replicate, с")
+    parser.add_argument('--global-rate', type=float, default=None, help="OUTBOUND_GLOBAL_RATE для стенда")
+    parser.add_argument('--chat-rate', type=float, default=None, help="OUTBOUND_CHAT_RATE для стенда")
+    parser.add_argument('--chat-burst', type=int, default=None, help="OUTBOUND_CHAT_BURST для стенда")
+    parser.add_argument('--broadcast-share', type=float, default=None, help="OUTBOUND_BROADCAST_SHARE для стенда")
+    parser.add_argument('--quiet', action='store_true', help="отключить INFO-логи бота (меньше шума, но и нагрузки)")
+    parser.add_argument('--json', dest='json_path', help="сохранить отчёт в JSON")
+    return parser.parse_args()
+
+
+async def _run(args: argparse.Namespace) -> list:
+    from config import OUTBOUND_BROADCAST_SHARE, OUTBOUND_CHAT_BURST, OUTBOUND_CHAT_RATE, OUTBOUND_GLOBAL_RATE
+    from loadtest.scenarios import SCENARIOS, create_harness
+
+    # Без явных значений стенд работает с лимитами Telegram из config
+    for name, default in (('global_rate', OUTBOUND_GLOBAL_RATE), ('chat_rate', OUTBOUND_CHAT_RATE),
+                          ('chat_burst', OUTBOUND_CHAT_BURST), ('broadcast_share', OUTBOUND_BROADCAST_SHARE)):
+        if getattr(args, name) is None:
+            setattr(args, name, default)
+
+    harness = await create_harness(args)
+    rows = []
+    try:
+        names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+        for name in names:
+            print(f"▶ {name}: {args.users} пользователей, параллельно {args.concurrency}", file=sys.stderr)
+            rows.extend(await SCENARIOS[name](harness, args))
+    finally:
+        await harness.close()
+    return rows
+
+
+def main() -> None:
+    args = _parse_args()
+    workdir = tempfile.mkdtemp(prefix='loadtest_')
+    _prepare_environment(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import handlers  # noqa: F401  (порядок импорта: database <-> handlers)
+    if args.quiet:
+        logging.disable(logging.INFO)
+
+    from loadtest.stats import format_report
+    rows = asyncio.run(_run(args))
+    print(format_report(rows))
+    print(f"Рабочий каталог стенда: {workdir}", file=sys.stderr)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# loadtest/fake_replicate.py
+"""Локальная замена HTTP API Replicate для нагрузочного стенда.
+
+Клиент replicate направляется сюда переменной REPLICATE_BASE_URL. Поддержаны
+предсказания (по версии и по модели, с заголовком Prefer: wait и опросом),
+обучения, загрузка файлов и отдача результатов. Длительность предсказаний,
+доля неуспешных и доля ответов 500 на создание задаются в конструкторе.
+"""
+import asyncio
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+from loadtest.fake_telegram import PNG_BYTES
+
+_PREFER_WAIT = re.compile(r'wait(?:=(\d+))?')
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class FakeReplicate:
+    def __init__(self, latency: float = 8.0, failure_rate: float = 0.02, http_error_rate: float = 0.0,
+                 training_latency: float = 30.0, upload_latency: float = 0.2, seed: int = 2):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.http_error_rate = http_error_rate
+        self.training_latency = training_latency
+        self.upload_latency = upload_latency
+        self._random = random.Random(seed)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {'predictions': 0, 'trainings': 0, 'uploads': 0, 'http_errors': 0, 'failed': 0}
+        self.base_url = ''
+        self._runner: Optional[web.AppRunner] = None
+
+    # --- сервер ---
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/v1/predictions', self._create_prediction)
+        app.router.add_post('/v1/models/{owner}/{name}/predictions', self._create_prediction)
+        app.router.add_get('/v1/predictions/{id}', self._get_job)
+        app.router.add_post('/v1/predictions/{id}/cancel', self._cancel_job)
+        app.router.add_get('/v1/models/{owner}/{name}', self._get_model)
+        app.router.add_get('/v1/models/{owner}/{name}/versions/{version}', self._get_version)
+        app.router.add_post('/v1/models/{owner}/{name}/versions/{version}/trainings', self._create_training)
+        app.router.add_get('/v1/trainings/{id}', self._get_job)
+        app.router.add_post('/v1/trainings/{id}/cancel', self._cancel_job)
+        app.router.add_post('/v1/files', self._upload_file)
+        app.router.add_get('/files/{name}', self._download_file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- задачи ---
+
+    def _new_job(self, kind: str, duration: float, body: Dict[str, Any], model: str, version: Optional[str]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex[:20]
+        now = time.time()
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'model': model,
+            'version': version,
+            'input': body.get('input') or {},
+            'destination': body.get('destination'),
+            'created': now,
+            'done_at': now + duration * self._random.uniform(0.5, 1.5),
+            'fails': self._random.random() < self.failure_rate,
+            'canceled': False,
+        }
+        self._jobs[job_id] = job
+        return job
+
+    def _output(self, job: Dict[str, Any]) -> Any:
+        if job['kind'] == 'training':
+            destination = job['destination'] or 'loadtest/avatar'
+            return {'version': f"{destination}:{uuid.uuid4().hex}", 'weights': f"{self.base_url}/files/{job['id']}.tar"}
+        if 'video' in job['model'] or 'kling' in job['model']:
+            return f"{self.base_url}/files/{job['id']}.mp4"
+        count = int(job['input'].get('num_outputs') or 1)
+        return [f"{self.base_url}/files/{job['id']}_{index}.png" for index in range(count)]
+
+    def _job_json(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        finished = job['canceled'] or now >= job['done_at']
+        if job['canceled']:
+            status = 'canceled'
+        elif not finished:
+            status = 'processing'
+        elif job['fails']:
+            status = 'failed'
+        else:
+            status = 'succeeded'
+        prefix = 'trainings' if job['kind'] == 'training' else 'predictions'
+        return {
+            'id': job['id'],
+            'model': job['model'],
+            'version': job['version'] or '',
+            'destination': job['destination'],
+            'status': status,
+            'input': job['input'],
+            'output': self._output(job) if status == 'succeeded' else None,
+            'logs': '',
+            'error': 'Simulated failure' if status == 'failed' else None,
+            'metrics': {'predict_time': round(job['done_at'] - job['created'], 3)} if finished else {},
+            'created_at': _iso(job['created']),
+            'started_at': _iso(job['created']),
+            'completed_at': _iso(min(now, job['done_at'])) if finished else None,
+            'urls': {
+                'get': f"{self.base_url}/v1/{prefix}/{job['id']}",
+                'cancel': f"{self.base_url}/v1/{prefix}/{job['id']}/cancel",
+            },
+        }
+
+    def _http_error(self) -> Optional[web.Response]:
+        if self.http_error_rate and self._random.random() < self.http_error_rate:
+            self.counts['http_errors'] += 1
+            return web.json_response({'detail': 'Simulated server error', 'status': 500}, status=500)
+        return None
+
+    async def _create_prediction(self, request: web.Request) -> web.Response:
+        error = self._http_error()
+        if error is not None:
+            return error
+        body = await request.json()
+        owner, name = request.match_info.get('owner'), request.match_info.get('name')
+        model = f"{owner}/{name}" if owner else 'loadtest/version'
+        job = self._new_job('prediction', self.latency, body, model, body.get('version'))
+        self.counts['predictions'] += 1
+        if job['fails']:
+            self.counts['failed'] += 1
+        match = _PREFER_WAIT.search(request.headers.get('Prefer', ''))
+        if match:
+            wait_limit = int(match.group(1) or 60)
+            await asyncio.sleep(max(0.0, min(job['done_at'] - time.time(), wait_limit)))
+        return web.json_response(self._job_json(job), status=201)
+
+    async def _create_training(self, request: web.Request) -> web.Response:
+        error = self._http_error()
+        if error is not None:
+            return error
+        body = await request.json()
+        info = request.match_info
+        job = self._new_job('training', self.training_latency, body, f"{info['owner']}/{info['name']}", info['version'])
+        self.counts['trainings'] += 1
+        if job['fails']:
+            self.counts['failed'] += 1
+        return web.json_response(self._job_json(job), status=201)
+
+    async def _get_job(self, request: web.Request) -> web.Response:
+        job = self._jobs.get(request.match_info['id'])
+        if job is None:
+            return web.json_response({'detail': 'Not found', 'status': 404}, status=404)
+        return web.json_response(self._job_json(job))
+
+    async def _cancel_job(self, request: web.Request) -> web.Response:
+        job = self._jobs.get(request.match_info['id'])
+        if job is None:
+            return web.json_response({'detail': 'Not found', 'status': 404}, status=404)
+        job['canceled'] = True
+        return web.json_response(self._job_json(job))
+
+    async def _get_model(self, request: web.Request) -> web.Response:
+        info = request.match_info
+        return web.json_response({
+            'url': f"{self.base_url}/models/{info['owner']}/{info['name']}",
+            'owner': info['owner'], 'name': info['name'], 'description': None, 'visibility': 'private',
+            'github_url': None, 'paper_url': None, 'license_url': None, 'run_count': 0,
+            'cover_image_url': None, 'default_example': None, 'latest_version': None,
+        })
+
+    async def _get_version(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'id': request.match_info['version'], 'created_at': _iso(time.time()),
+            'cog_version': '0.9.0', 'openapi_schema': {},
+        })
+
+    async def _upload_file(self, request: web.Request) -> web.Response:
+        await request.read()
+        await asyncio.sleep(self.upload_latency)
+        self.counts['uploads'] += 1
+        file_id = uuid.uuid4().hex[:20]
+        now = time.time()
+        return web.json_response({
+            'id': file_id, 'name': f"{file_id}.jpg", 'content_type': 'image/jpeg', 'size': 0,
+            'etag': file_id, 'checksums': {}, 'metadata': {},
+            'created_at': _iso(now), 'expires_at': _iso(now + 24 * 3600),
+            'urls': {'get': f"{self.base_url}/files/{file_id}.jpg"},
+        }, status=201)
+
+    async def _download_file(self, request: web.Request) -> web.Response:
+        return web.Response(body=PNG_BYTES, content_type='image/png')
@@ -0,0 +1,137 @@
+# loadtest/fake_telegram.py
+"""Фейковая сессия aiogram: запросы к Bot API не уходят в сеть, а записываются.
+
+Ответ строится по типу, который возвращает метод (__returning__), и проходит
+обычную проверку BaseSession.check_response - так хендлеры получают настоящие
+Message/User/File. Задержка Telegram и доля заблокировавших бота пользователей настраиваются.
+"""
+import asyncio
+import json
+import random
+import time
+import typing
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import File, Message, MessageId, User
+
+# 1x1 PNG: ответ на скачивание файлов из Telegram
+PNG_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489'
+    '0000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082'
+)
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'LoadTestBot', 'username': 'loadtest_bot'}
+
+_MEDIA_METHODS = frozenset({'SendPhoto', 'SendMediaGroup', 'SendDocument', 'SendVideo', 'SendAnimation'})
+
+
+class FakeTelegramSession(BaseSession):
+    def __init__(self, latency: float = 0.03, jitter: float = 0.5, blocked_rate: float = 0.0, seed: int = 1):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.blocked_rate = blocked_rate
+        self._random = random.Random(seed)
+        self._blocked: Dict[int, bool] = {}
+        self._message_id = 0
+        self.counts: Counter = Counter()
+        # (время ответа, метод, chat_id)
+        self.calls: List[Tuple[float, str, Any]] = []
+        self._media_waiters: Dict[Any, asyncio.Future] = {}
+
+    async def close(self) -> None:
+        pass
+
+    def _is_blocked(self, chat_id: Any) -> bool:
+        if not self.blocked_rate or not isinstance(chat_id, int):
+            return False
+        if chat_id not in self._blocked:
+            self._blocked[chat_id] = self._random.random() < self.blocked_rate
+        return self._blocked[chat_id]
+
+    def _message(self, method: TelegramMethod, chat_id: Any) -> Dict[str, Any]:
+        self._message_id += 1
+        return {
+            'message_id': getattr(method, 'message_id', None) or self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id if isinstance(chat_id, int) else 0, 'type': 'private'},
+            'from': BOT_USER,
+            'text': getattr(method, 'text', None),
+            'caption': getattr(method, 'caption', None),
+        }
+
+    def _result(self, method: TelegramMethod, chat_id: Any) -> Any:
+        returning = method.__returning__
+        origin = typing.get_origin(returning)
+        options = typing.get_args(returning) if origin is typing.Union else (returning,)
+        if Message in options:
+            return self._message(method, chat_id)
+        if origin is list and typing.get_args(returning) == (Message,):
+            return [self._message(method, chat_id) for _ in getattr(method, 'media', None) or [None]]
+        if User in options:
+            return BOT_USER
+        if File in options:
+            return {'file_id': 'file', 'file_unique_id': 'file', 'file_size': len(PNG_BYTES), 'file_path': 'photos/file.png'}
+        if MessageId in options:
+            self._message_id += 1
+            return {'message_id': self._message_id}
+        return True
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        chat_id = getattr(method, 'chat_id', None)
+        if self.latency:
+            await asyncio.sleep(self.latency * (1 + self.jitter * (self._random.random() * 2 - 1)))
+        self.counts[name] += 1
+        self.calls.append((time.perf_counter(), name, chat_id))
+        if self._is_blocked(chat_id):
+            self.counts['blocked'] += 1
+            waiter = self._media_waiters.pop(chat_id, None)
+            if waiter is not None and not waiter.done():
+                # Фото уже не дойдёт - сценарий не ждёт его до таймаута
+                waiter.set_exception(RuntimeError(f"chat {chat_id} blocked"))
+            payload, status = {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}, 403
+        else:
+            payload, status = {'ok': True, 'result': self._result(method, chat_id)}, 200
+            if name in _MEDIA_METHODS:
+                waiter = self._media_waiters.pop(chat_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(time.perf_counter())
+        response = self.check_response(bot=bot, method=method, status_code=status, content=json.dumps(payload))
+        return response.result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield PNG_BYTES
+
+    def expect_media(self, chat_id: int) -> asyncio.Future:
+        """Future со временем (perf_counter) первой отправки медиа в чат - конец генерации для сценария.
+
+        Для заблокировавшего бота чата завершается исключением при первом же запросе.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._media_waiters[chat_id] = future
+        return future
+
+    def chats_with(self, methods: Set[str]) -> Set[Any]:
+        return {chat_id for _, name, chat_id in self.calls if name in methods}
+
+
+class RequestTimer:
+    """Middleware сессии: время каждого запроса с учётом очереди шлюза исходящих сообщений.
+
+    Регистрируется до install_outbound_gateway, чтобы быть внешним.
+    """
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = {}
+
+    async def __call__(self, make_request, bot: Bot, method: TelegramMethod):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.durations.setdefault(type(method).__name__, []).append(time.perf_counter() - started)
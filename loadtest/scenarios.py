@@ -0,0 +1,272 @@
+# loadtest/scenarios.py
+"""Сценарии нагрузки. Импортируется после настройки окружения в loadtest.__main__.
+
+Каждый сценарий возвращает список строк отчёта (loadtest.stats.summarize).
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+import aiosqlite
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import main
+from bot_identity import load_bot_identity
+from config import ADMIN_IDS, DATABASE_PATH, TARIFFS, TELEGRAM_BOT_TOKEN
+from database import init_db
+from handlers.broadcast import broadcast_message_admin
+from job_scheduler import create_scheduler
+from metrics import HANDLER_ERRORS
+from telegram_gateway import install_outbound_gateway
+
+from loadtest.fake_replicate import FakeReplicate
+from loadtest.fake_telegram import FakeTelegramSession, RequestTimer
+from loadtest.stats import summarize
+
+# Синтетические пользователи не пересекаются с настоящими id
+USER_ID_BASE = 7_000_000_000
+
+
+class Harness:
+    """Бот на фейковой сессии, диспетчер из main.py и фейковый Replicate."""
+
+    def __init__(self, bot: Bot, dp: Dispatcher, session: FakeTelegramSession, timer: RequestTimer,
+                 replicate: FakeReplicate, gateway):
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.timer = timer
+        self.replicate = replicate
+        self.gateway = gateway
+        self._update_id = 0
+
+    def next_update_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    async def close(self) -> None:
+        await self.gateway.close()
+        await self.replicate.close()
+
+
+async def create_harness(args) -> Harness:
+    replicate = FakeReplicate(
+        latency=args.replicate_latency, failure_rate=args.replicate_failure_rate,
+        http_error_rate=args.replicate_http_error_rate, training_latency=args.training_latency,
+        upload_latency=args.upload_latency
+    )
+    await replicate.start()
+    # Клиент replicate читает REPLICATE_BASE_URL при каждом создании Client
+    os.environ['REPLICATE_BASE_URL'] = replicate.base_url
+
+    await init_db()
+
+    session = FakeTelegramSession(latency=args.telegram_latency, blocked_rate=args.blocked_rate)
+    bot = Bot(token=TELEGRAM_BOT_TOKEN, session=session)
+    timer = RequestTimer()
+    bot.session.middleware(timer)
+    gateway = install_outbound_gateway(
+        bot, global_rate=args.global_rate, chat_rate=args.chat_rate,
+        chat_burst=args.chat_burst, broadcast_share=args.broadcast_share
+    )
+    await load_bot_identity(bot)
+    # Отложенные задачи онбординга пишутся в хранилище, но не выполняются
+    create_scheduler(bot).start(paused=True)
+
+    dp = main.build_dispatcher(MemoryStorage())
+    main.bot_instance = bot
+    main.dp = dp
+    main.bot_event_loop = asyncio.get_running_loop()
+    return Harness(bot, dp, session, timer, replicate, gateway)
+
+
+# --- данные ---
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"Load{user_id % 100000}", username=f"load{user_id}")
+
+
+def message_update(harness: Harness, user_id: int, text: str) -> Update:
+    return Update(update_id=harness.next_update_id(), message=Message(
+        message_id=harness.next_update_id(), date=datetime.now(),
+        chat=Chat(id=user_id, type='private'), from_user=_user(user_id), text=text
+    ))
+
+
+def callback_update(harness: Harness, user_id: int, data: str) -> Update:
+    message = Message(
+        message_id=harness.next_update_id(), date=datetime.now(),
+        chat=Chat(id=user_id, type='private'), from_user=_user(harness.bot.id), text='loadtest'
+    )
+    return Update(update_id=harness.next_update_id(), callback_query=CallbackQuery(
+        id=str(harness.next_update_id()), from_user=_user(user_id), chat_instance='loadtest',
+        message=message, data=data
+    ))
+
+
+async def seed_users(user_ids: List[int], generations: int = 0, with_avatar: bool = False) -> None:
+    async with aiosqlite.connect(DATABASE_PATH) as conn:
+        await conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, username, first_name, generations_left, avatar_left, "
+            "first_purchase, welcome_message_sent) VALUES (?, ?, ?, ?, 0, 0, 1)",
+            [(user_id, f"load{user_id}", f"Load{user_id % 100000}", generations) for user_id in user_ids]
+        )
+        if with_avatar:
+            await conn.executemany(
+                "INSERT OR IGNORE INTO user_trainedmodels (user_id, model_id, model_version, status, prediction_id, "
+                "trigger_word, avatar_name) VALUES (?, 'loadtest/avatar', 'loadtest/avatar:v1', 'success', ?, 'TOK', 'Аватар')",
+                [(user_id, f"train-{user_id}") for user_id in user_ids]
+            )
+            await conn.execute(
+                "UPDATE users SET has_trained_model = 1, active_avatar_id = "
+                "(SELECT avatar_id FROM user_trainedmodels t WHERE t.user_id = users.user_id) "
+                f"WHERE user_id >= {USER_ID_BASE}"
+            )
+        await conn.commit()
+
+
+def handler_errors() -> float:
+    return sum(value for _, _, value in HANDLER_ERRORS.samples())
+
+
+async def _feed_all(harness: Harness, updates: List[Update], concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def feed(update: Update) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await harness.dp.feed_update(harness.bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(feed(update) for update in updates))
+    return latencies
+
+
+# --- сценарии ---
+
+async def start_storm(harness: Harness, args) -> List[Dict[str, Any]]:
+    """Шквал /start от новых пользователей: регистрация, приветствие, планирование онбординга."""
+    user_ids = [USER_ID_BASE + index for index in range(args.users)]
+    updates = [message_update(harness, user_id, '/start') for user_id in user_ids]
+    errors_before = handler_errors()
+    started = time.perf_counter()
+    latencies = await _feed_all(harness, updates, args.concurrency)
+    wall = time.perf_counter() - started
+    return [summarize('start: обработка апдейта', latencies, wall, errors=int(handler_errors() - errors_before),
+                      outbound=sum(harness.session.counts.values()))]
+
+
+async def generation_burst(harness: Harness, args) -> List[Dict[str, Any]]:
+    """Одновременное подтверждение генерации с аватаром: очередь, Replicate, отправка фото."""
+    user_ids = [USER_ID_BASE + index for index in range(args.users)]
+    await seed_users(user_ids, generations=100, with_avatar=True)
+    for user_id in user_ids:
+        key = StorageKey(bot_id=harness.bot.id, chat_id=user_id, user_id=user_id)
+        await harness.dp.storage.set_data(key, {
+            'generation_type': 'with_avatar', 'model_key': 'flux-trained', 'prompt': 'portrait photo, studio light',
+            'aspect_ratio': '1:1', 'trigger_word': 'TOK', 'model_version': 'loadtest/avatar:v1',
+            'old_model_id': 'loadtest/avatar', 'old_model_version': 'v1', 'active_avatar_name': 'Аватар',
+            'style_name': 'Нагрузка', 'current_style_set': 'generic_avatar',
+        })
+
+    done = {user_id: harness.session.expect_media(user_id) for user_id in user_ids}
+    feed_started: Dict[int, float] = {}
+    updates = [callback_update(harness, user_id, 'confirm_generation') for user_id in user_ids]
+    errors_before = handler_errors()
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    feed_latencies: List[float] = []
+
+    async def feed(user_id: int, update: Update) -> None:
+        async with semaphore:
+            feed_started[user_id] = time.perf_counter()
+            await harness.dp.feed_update(harness.bot, update)
+            feed_latencies.append(time.perf_counter() - feed_started[user_id])
+
+    await asyncio.gather(*(feed(user_id, update) for user_id, update in zip(user_ids, updates)))
+    feed_wall = time.perf_counter() - started
+    finished, _ = await asyncio.wait(done.values(), timeout=args.timeout)
+    wall = time.perf_counter() - started
+    end_to_end = [done[user_id].result() - feed_started[user_id] for user_id in user_ids
+                  if done[user_id] in finished and done[user_id].exception() is None]
+    for future in done.values():
+        future.cancel()
+    return [
+        summarize('генерация: апдейт', feed_latencies, feed_wall, errors=int(handler_errors() - errors_before)),
+        summarize('генерация: до фото', end_to_end, wall, errors=len(user_ids) - len(end_to_end),
+                  replicate=dict(harness.replicate.counts)),
+    ]
+
+
+async def broadcast(harness: Harness, args) -> List[Dict[str, Any]]:
+    """Рассылка всем пользователям через шлюз исходящих сообщений."""
+    user_ids = [USER_ID_BASE + index for index in range(args.users)]
+    await seed_users(user_ids)
+    harness.timer.durations.clear()
+    started = time.perf_counter()
+    await broadcast_message_admin(harness.bot, "Нагрузочная рассылка: проверка *пропускной* способности", ADMIN_IDS[0])
+    wall = time.perf_counter() - started
+    sends = harness.timer.durations.get('SendMessage', [])
+    return [summarize('рассылка: отправка', sends, wall, errors=harness.session.counts['blocked'],
+                      gateway=harness.gateway.get_stats())]
+
+
+async def payment_flood(harness: Harness, args) -> List[Dict[str, Any]]:
+    """Поток вебхуков YooKassa в Flask-приложение main.py из пула потоков, как у сервера."""
+    user_ids = [USER_ID_BASE + index for index in range(args.users)]
+    await seed_users(user_ids)
+    amount = next(iter(TARIFFS.values()))['amount']
+    payloads = [{
+        'event': 'payment.succeeded',
+        'object': {
+            'id': f"loadtest-{user_id}",
+            'amount': {'value': f"{amount:.2f}", 'currency': 'RUB'},
+            'description': 'Нагрузочный платёж',
+            'metadata': {'user_id': str(user_id), 'description_for_user': 'Нагрузочный платёж'},
+        },
+    } for user_id in user_ids]
+
+    def post(payload: Dict[str, Any]) -> float:
+        client = main.app.test_client()
+        started = time.perf_counter()
+        response = client.post('/webhook', json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return time.perf_counter() - started
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = await asyncio.gather(*(loop.run_in_executor(pool, post, payload) for payload in payloads),
+                                       return_exceptions=True)
+    http_wall = time.perf_counter() - started
+    latencies = [result for result in results if isinstance(result, float)]
+
+    # Обработка платежа идёт в цикле событий после ответа YooKassa - ждём записи в payments
+    deadline = time.perf_counter() + args.timeout
+    processed = 0
+    while time.perf_counter() < deadline:
+        async with aiosqlite.connect(DATABASE_PATH) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM payments WHERE payment_id LIKE 'loadtest-%'")
+            processed = (await cursor.fetchone())[0]
+        if processed >= len(payloads):
+            break
+        await asyncio.sleep(0.2)
+    wall = time.perf_counter() - started
+    return [summarize('платежи: HTTP-ответ', latencies, http_wall, errors=len(results) - len(latencies),
+                      processed=processed, processed_per_s=round(processed / wall, 1))]
+
+
+SCENARIOS = {
+    'start_storm': start_storm,
+    'generation_burst': generation_burst,
+    'broadcast': broadcast,
+    'payment_flood': payment_flood,
+}
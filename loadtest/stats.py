@@ -0,0 +1,44 @@
+# loadtest/stats.py
+"""Перцентили задержки и пропускная способность для отчёта сценария."""
+import math
+from typing import Any, Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Перцентиль методом ближайшего ранга; sorted_values отсортированы по возрастанию."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(name: str, latencies: List[float], wall_seconds: float, errors: int = 0,
+              **extra: Any) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        'name': name,
+        'count': len(values),
+        'errors': errors,
+        'wall_s': round(wall_seconds, 3),
+        'throughput_per_s': round(len(values) / wall_seconds, 1) if wall_seconds else 0.0,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+        'max_ms': round(values[-1] * 1000, 1) if values else 0.0,
+        **extra,
+    }
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    header = f"{'замер':<28}{'кол-во':>9}{'ошибок':>8}{'в сек':>10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}"
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['name']:<28}{row['count']:>9}{row['errors']:>8}{row['throughput_per_s']:>10}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+    for row in rows:
+        extra = {key: value for key, value in row.items() if key not in (
+            'name', 'count', 'errors', 'wall_s', 'throughput_per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')}
+        lines.append(f"{row['name']}: {row['wall_s']} с" + (f", {extra}" if extra else ''))
+    return '\n'.join(lines)
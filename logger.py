@@ -1,38 +1,181 @@
+import atexit
+import copy
+import gzip
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import random
+import re
+import shutil
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 import sys
 
 # Создаем папку logs если её нет
 if not os.path.exists('logs'):
     os.makedirs('logs')
 
+# Логгеры только кладут записи в очередь; форматирование, фильтрация и запись
+# в файлы/консоль идут в фоновом потоке QueueListener, а не в цикле событий.
+
+# Фразы о блокировке бота пользователем (прежние шесть подстрок сводятся к трём)
+_BLOCKED_MESSAGE_PATTERN = re.compile(
+    r'bot was blocked|bot was stopped by the user|user blocked the bot',
+    re.IGNORECASE
+)
+
+# Настройки читаются здесь, а не в config.py: config сам импортирует logger.
+# LOG_FORMAT=json - файлы логов в JSON Lines (один объект на событие) с ротацией по размеру и gzip.
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').strip().lower()
+LOG_JSON_MAX_BYTES = int(os.getenv('LOG_JSON_MAX_BYTES', str(50 * 1024 * 1024)))
+LOG_JSON_BACKUP_COUNT = int(os.getenv('LOG_JSON_BACKUP_COUNT', '10'))
+# Доля записываемых событий по типу: "событие=доля,..."; WARNING и выше пишутся всегда
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'broadcast_sent=0.01,update_handled=0.1')
+
+# Поля событий, которые попадают в JSON (передаются через log_event или extra=)
+EVENT_FIELDS = ('event', 'user_id', 'update_id', 'handler', 'duration_ms', 'model')
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in value.split(','):
+        event, _, rate = item.partition('=')
+        if event.strip() and rate.strip():
+            try:
+                rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+            except ValueError:
+                print(f"Некорректная доля в LOG_SAMPLE_RATES: {item}", file=sys.stderr)
+    return rates
+
+_sample_rates = _parse_sample_rates(LOG_SAMPLE_RATES)
+
+_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener: Optional[logging.handlers.QueueListener] = None
+# Имя логгера -> его файловый handler (используется только потоком записи)
+_file_handlers: Dict[str, logging.Handler] = {}
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(_FORMATTER)
+if LOG_FORMAT == 'json':
+    # Полный поток событий - в файлах, в консоль только проблемы
+    _console_handler.setLevel(logging.WARNING)
+_stats = {'records': 0, 'enqueue_seconds': 0.0}
+
 class TelegramBlockedFilter(logging.Filter):
     """Фильтр для исключения логов о блокировке бота пользователем"""
 
     def filter(self, record):
-        # Исключаем логи о блокировке бота
-        blocked_keywords = [
-            'bot was blocked by the user',
-            'bot was stopped by the user',
-            'Forbidden: bot was blocked by the user',
-            'bot was blocked',
-            'user blocked the bot',
-            'Forbidden: bot was stopped by the user'
-        ]
-
-        message = record.getMessage().lower()
-        for keyword in blocked_keywords:
-            if keyword.lower() in message:
-                return False
-        return True
+        return _BLOCKED_MESSAGE_PATTERN.search(record.getMessage()) is None
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись: время, уровень, логгер, сообщение и поля события."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in EVENT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _gzip_namer(name: str) -> str:
+    return name + '.gz'
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def log_event(logger: logging.Logger, event: str, msg: str, *args, level: int = logging.INFO,
+              exc_info: bool = False, **fields) -> None:
+    """Событие с полями для JSON-логов (user_id, update_id, handler, duration_ms, model).
+
+    Для событий из LOG_SAMPLE_RATES пишется только заданная доля записей уровня ниже WARNING.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = _sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+    logger.log(level, msg, *args, exc_info=exc_info, extra={'event': event, **fields})
+
+class _LogQueueHandler(logging.handlers.QueueHandler):
+    """Handler логгера: кладёт запись в общую очередь с пометкой, в какой файл её писать."""
+
+    def __init__(self, route: str):
+        super().__init__(_log_queue)
+        self.route = route
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # %-аргументы подставляются сразу (объекты могут измениться до записи),
+        # трассировка исключения форматируется уже в потоке записи
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        record.log_route = self.route
+        return record
+
+    def emit(self, record):
+        started = time.perf_counter()
+        super().emit(record)
+        _stats['records'] += 1
+        _stats['enqueue_seconds'] += time.perf_counter() - started
+
+class _RouteHandler(logging.Handler):
+    """Handler потока записи: файл логгера-источника + консоль."""
+
+    def emit(self, record):
+        file_handler = _file_handlers.get(getattr(record, 'log_route', None))
+        if file_handler is not None:
+            file_handler.handle(record)
+        if record.levelno >= _console_handler.level:
+            _console_handler.handle(record)
+
+def _start_listener():
+    global _listener
+    if _listener is None:
+        route_handler = _RouteHandler()
+        route_handler.addFilter(TelegramBlockedFilter())
+        _listener = logging.handlers.QueueListener(_log_queue, route_handler)
+        _listener.start()
+
+def shutdown_logging():
+    """Дописывает накопленные записи и останавливает поток записи."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Записей через очередь, средняя цена вызова логгера для вызывающего и текущая длина очереди."""
+    records = _stats['records']
+    return {
+        'records': records,
+        'avg_enqueue_us': round(_stats['enqueue_seconds'] / records * 1e6, 2) if records else 0.0,
+        'queue_size': _log_queue.qsize(),
+    }
 
 def setup_logger(name: str, log_file: str, level: int = logging.INFO,
                 max_bytes: int = 10*1024*1024, backup_count: int = 12,
                 rotation: str = 'monthly') -> logging.Logger:
-    """Настройка логгера с ротацией файлов"""
+    """Настройка логгера с ротацией файлов (запись - через очередь в фоновом потоке)"""
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
@@ -40,19 +183,20 @@ def setup_logger(name: str, log_file: str, level: int = logging.INFO,
     # Очищаем существующие handlers
     logger.handlers.clear()
 
-    # Создаем formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
     # Убеждаемся что директория для файла существует
     log_dir = os.path.dirname(log_file)
     if log_dir and not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
     # Настраиваем ротацию
-    if rotation == 'weekly':
+    if LOG_FORMAT == 'json':
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.splitext(log_file)[0] + '.jsonl',
+            maxBytes=LOG_JSON_MAX_BYTES, backupCount=LOG_JSON_BACKUP_COUNT, encoding='utf-8'
+        )
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    elif rotation == 'weekly':
         handler = logging.handlers.TimedRotatingFileHandler(
             log_file, when='W0', interval=1, backupCount=backup_count
         )
@@ -65,16 +209,14 @@ def setup_logger(name: str, log_file: str, level: int = logging.INFO,
             log_file, maxBytes=max_bytes, backupCount=backup_count
         )
 
-    handler.setFormatter(formatter)
-    handler.addFilter(TelegramBlockedFilter())
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else _FORMATTER)
+    previous = _file_handlers.get(name)
+    _file_handlers[name] = handler
+    if previous is not None:
+        previous.close()
 
-    # Добавляем handler в консоль для отладки
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    console_handler.addFilter(TelegramBlockedFilter())
-
-    logger.addHandler(handler)
-    logger.addHandler(console_handler)
+    _start_listener()
+    logger.addHandler(_LogQueueHandler(name))
 
     return logger
 
@@ -111,6 +253,12 @@ def reset_loggers():
         logger = logging.getLogger(logger_name)
         logger.handlers.clear()
 
+    # Дописываем очередь и закрываем файлы
+    shutdown_logging()
+    for handler in _file_handlers.values():
+        handler.close()
+    _file_handlers.clear()
+
     # Сбрасываем глобальные переменные
     _main_logger = None
     _database_logger = None
@@ -210,10 +358,14 @@ def log_generation(generation_type: str, user_id: int, model: str = "",
     if duration:
         message += f" ({duration:.2f}s)"
 
+    fields = {
+        'event': 'generation', 'user_id': user_id, 'model': model or None,
+        'duration_ms': round(duration * 1000, 1) if duration else None
+    }
     if success:
-        logger.info(message)
+        logger.info(message, extra=fields)
     else:
-        logger.error(message)
+        logger.error(message, extra=fields)
 
 # Инициализация логгеров при импорте
 _initialize_loggers()
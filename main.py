@@ -1,5 +1,6 @@
 # main.py
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage
 import asyncio
 import logging
 import json
@@ -10,25 +11,29 @@ from typing import Dict, Optional, Any
 import pytz
 import aiosqlite
 from generation_config import GENERATION_TYPE_TO_MODEL_KEY
-from handlers.onboarding import setup_onboarding_handlers, onboarding_router, schedule_welcome_message, schedule_daily_reminders, send_onboarding_message, send_daily_reminders
+from handlers.onboarding import setup_onboarding_handlers, onboarding_router, schedule_daily_reminders, send_daily_reminders, backfill_welcome_jobs
 from aiogram import Bot, Dispatcher
 from aiogram.types import Update, InlineKeyboardMarkup, InlineKeyboardButton, Message, ContentType
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramAPIError
 from aiogram.filters import Command
 from flask import Flask, request, jsonify
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from bot_counter import bot_counter, cmd_bot_name
 from config import TELEGRAM_BOT_TOKEN as TOKEN, ADMIN_IDS, TARIFFS, DATABASE_PATH, METRICS_CONFIG, ERROR_LOG_ADMIN
+from config import (
+    REDIS, TELEGRAM_UPDATES_MODE, BOT_PRIMARY_INSTANCE,
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_BROADCAST_SHARE,
+    TRACE_SLOW_UPDATE_MS, TRACE_SLOW_QUERY_MS
+)
 from handlers.utils import safe_escape_markdown as escape_md, send_message_with_fallback, escape_message_parts, unescape_markdown
 from database import (
-    init_db, add_resources_on_payment, check_database_user, get_user_payments, is_old_user,
-    user_cache, is_user_blocked, get_user_actions_stats, check_referral_integrity,
-    update_user_balance, get_scheduled_broadcasts, get_users_for_welcome_message,
-    mark_welcome_message_sent, block_user_access, update_user_credits, retry_on_locked, get_broadcast_buttons
+    init_db, add_resources_on_payment, check_database_user, get_user_payments,
+    user_cache, get_user_actions_stats, check_referral_integrity,
+    update_user_balance, get_scheduled_broadcasts, block_user_access, update_user_credits, retry_on_locked, get_broadcast_buttons,
+    release_expired_credit_reservations
 )
-from handlers.commands import start, menu, help_command, check_training, debug_avatars
+from handlers.commands import start, menu, help_command, check_training, debug_avatars, slow_report
 from handlers.messages import (
     handle_photo, handle_admin_text, handle_video,
     award_referral_bonuses, handle_text
@@ -53,6 +58,7 @@ from handlers.callbacks_user import handle_user_callback, user_callbacks_router
 from handlers.callbacks_utils import utils_callback_handler, utils_callbacks_router
 from handlers.callbacks_referrals import referrals_callback_handler, referrals_callbacks_router
 from generation import check_pending_trainings, check_pending_video_tasks
+from image_prep import shutdown_image_pool
 from keyboards import create_main_menu_keyboard
 from fsm_handlers import setup_conversation_handler, fsm_router, BotStates
 from handlers.user_management import user_management_router, cancel
@@ -63,9 +69,19 @@ from handlers.photo_transform import photo_transform_router, init_photo_generato
 from bot_counter import bot_counter_router
 from generation.videos import video_router
 from generation.training import training_router
+from telegram_webhook import run_webhook
+from telegram_gateway import install_outbound_gateway
+from progress_service import progress_service
+from job_scheduler import create_scheduler, add_persistent_poll_job
+from handlers.callback_registry import get_callback_route_stats
+from fsm_storage import create_fsm_storage, FSMSnapshotMiddleware
+from update_log import install_update_log
+from tracing import install_tracing
 
 # Импорт централизованного логгера
-from logger import get_logger
+from bot_identity import load_bot_identity, get_bot_username
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from logger import get_logger, get_logging_stats
 logger = get_logger('main')
 
 # Заполняем METRICS_CONFIG['generation_types'] после импорта
@@ -421,7 +437,7 @@ async def _handle_successful_payment_async(
 
     logger.info(f"=== НАЧАЛО ОТПРАВКИ УВЕДОМЛЕНИЯ ПОЛЬЗОВАТЕЛЮ ===")
     try:
-        bot_username = (await bot.get_me()).username.lstrip('@') or "Bot"
+        bot_username = (await get_bot_username(bot)).lstrip('@') or "Bot"
         description_safe = description or "Пакет"
         username_safe = username or "Пользователь"
         first_name_safe = first_name or "Пользователь"
@@ -538,82 +554,6 @@ async def _handle_successful_payment_async(
 
     logger.info(f"=== ЗАВЕРШЕНИЕ ОБРАБОТКИ ПЛАТЕЖА для user_id={user_id} ===")
 
-async def check_and_schedule_onboarding(bot: Bot) -> None:
-    """Проверяет и планирует онбординговые сообщения для всех пользователей при запуске бота."""
-    logger.info("Начало проверки онбординговых сообщений при запуске бота...")
-    try:
-        # Получаем всех пользователей, которые ещё не получили приветственное сообщение
-        users = await get_users_for_welcome_message()
-        logger.info(f"Найдено {len(users)} пользователей для отправки приветственного сообщения")
-
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        current_time = datetime.now(moscow_tz)
-
-        for user in users:
-            user_id = user['user_id']
-            first_name = user['first_name']
-            username = user['username']
-            created_at = user['created_at']
-
-            # Проверяем, заблокирован ли пользователь
-            if await is_user_blocked(user_id):
-                logger.info(f"Пользователь user_id={user_id} заблокирован, пропускаем онбординг")
-                continue
-
-            # Проверяем, является ли пользователь старым
-            is_old_user_flag = await is_old_user(user_id, cutoff_date="2025-07-11")
-            if is_old_user_flag:
-                logger.info(f"Пользователь user_id={user_id} старый, пропускаем онбординг")
-                await mark_welcome_message_sent(user_id)  # Отмечаем, чтобы не отправлять повторно
-                continue
-
-            # Проверяем, есть ли у пользователя покупки
-            from onboarding_config import has_user_purchases
-            has_purchases = await has_user_purchases(user_id, DATABASE_PATH)
-            if has_purchases:
-                logger.info(f"Пользователь user_id={user_id} уже имеет покупки, пропускаем онбординг")
-                await mark_welcome_message_sent(user_id)
-                continue
-
-            # Получаем данные о последнем отправленном напоминании
-            subscription_data = await check_database_user(user_id)
-            if not subscription_data or len(subscription_data) < 14:
-                logger.error(f"Неполные данные подписки для user_id={user_id}, пропускаем")
-                continue
-
-            welcome_message_sent = subscription_data[11]
-
-            try:
-                registration_date = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=moscow_tz)
-            except ValueError as e:
-                logger.warning(f"Невалидный формат даты для user_id={user_id}: {created_at}. Используется текущая дата. Ошибка: {e}")
-                registration_date = current_time
-
-            time_since_registration = (current_time - registration_date).total_seconds()
-
-            # Отправляем приветственное сообщение, если оно ещё не отправлено и прошло больше часа
-            if not welcome_message_sent and time_since_registration >= 3600:  # 1 час
-                logger.info(f"Отправка приветственного сообщения для user_id={user_id}")
-                await send_onboarding_message(bot, user_id, "welcome", subscription_data)
-                await mark_welcome_message_sent(user_id)
-                # Планируем приветственное сообщение для новых пользователей
-                await schedule_welcome_message(bot_instance, user_id)
-                continue
-
-        logger.info("Проверка онбординговых сообщений завершена")
-
-    except Exception as e:
-        logger.error(f"Ошибка при проверке онбординговых сообщений: {e}", exc_info=True)
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot_instance.send_message(
-                    chat_id=admin_id,
-                    text=escape_md(f"🚨 Ошибка при проверке онбординговых сообщений: {str(e)}", version=2),
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-            except Exception as e_admin:
-                logger.error(f"Не удалось уведомить админа {admin_id}: {e_admin}")
-
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Обрабатывает вебхуки YooKassa."""
@@ -758,6 +698,11 @@ def health_check():
         'event_loop_ready': bot_event_loop is not None
     }), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Метрики процесса в формате Prometheus."""
+    return render_metrics(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
 async def process_scheduled_broadcasts(bot: Bot) -> None:
     """Обрабатывает запланированные рассылки."""
     try:
@@ -792,13 +737,10 @@ async def process_scheduled_broadcasts(bot: Bot) -> None:
                 continue
             logger.info(f"Выполняется рассылка ID {broadcast_id} для группы {target_group} на {scheduled_time}")
 
-            # Очищаем текст от возможного экранирования и экранируем заново
+            # Очищаем текст от возможного экранирования; экранирование и подпись добавляются
+            # один раз на рассылку: здесь для общей рассылки, в остальных - внутри broadcast_*
             raw_message = unescape_markdown(message_text)
             logger.debug(f"Очищенный текст сообщения для broadcast_id={broadcast_id}: {raw_message[:100]}...")
-            signature = "🍪 PixelPie"
-            caption = raw_message + ("\n\n" + signature if raw_message.strip() else "\n" + signature)
-            escaped_caption = escape_message_parts(caption, version=2)
-            logger.debug(f"Экранированный текст для отправки: {escaped_caption[:100]}...")
 
             reply_markup = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="Да, хочу! 💳", callback_data="subscribe")]
@@ -814,13 +756,16 @@ async def process_scheduled_broadcasts(bot: Bot) -> None:
                     await conn.commit()
                 logger.debug(f"Статус рассылки ID {broadcast_id} обновлен на completed")
                 if target_group == 'all':
+                    signature = "🍪 PixelPie"
+                    caption = raw_message + ("\n\n" + signature if raw_message.strip() else "\n" + signature)
+                    escaped_caption = escape_message_parts(caption, version=2)
                     await broadcast_message_admin(bot, escaped_caption, admin_user_id, media_type, media_id, buttons)
                 elif target_group == 'paid':
-                    await broadcast_to_paid_users(bot, escaped_caption, admin_user_id, media_type, media_id, buttons)
+                    await broadcast_to_paid_users(bot, raw_message, admin_user_id, media_type, media_id, buttons)
                 elif target_group == 'non_paid':
-                    await broadcast_to_non_paid_users(bot, escaped_caption, admin_user_id, media_type, media_id, buttons)
+                    await broadcast_to_non_paid_users(bot, raw_message, admin_user_id, media_type, media_id, buttons)
                 elif target_group.startswith('with_payment'):
-                    await broadcast_with_payment(bot, escaped_caption, admin_user_id, media_type, media_id, buttons)
+                    await broadcast_with_payment(bot, raw_message, admin_user_id, media_type, media_id, buttons)
                 else:
                     logger.warning(f"Неизвестная группа рассылки для ID {broadcast_id}: {target_group}")
                     continue
@@ -884,86 +829,130 @@ async def notify_startup() -> None:
     except Exception as e:
         logger.warning(f"Не удалось отправить уведомление Зойдбергу: {e}")
 
-async def init_payment_tables():
-    """Инициализирует таблицы для платежей и добавляет столбец last_reminder_type."""
-    try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            await db.execute("PRAGMA busy_timeout = 30000")
-            c = await db.cursor()
-            # Проверяем, существует ли столбец last_reminder_type
-            await c.execute("PRAGMA table_info(users)")
-            columns = await c.fetchall()
-            column_names = [col[1] for col in columns]
-            if 'last_reminder_type' not in column_names:
-                await db.execute("ALTER TABLE users ADD COLUMN last_reminder_type TEXT")
-                logger.info("Столбец last_reminder_type добавлен в таблицу users")
-            if 'last_reminder_sent' not in column_names:
-                await db.execute("ALTER TABLE users ADD COLUMN last_reminder_sent TEXT")
-                logger.info("Столбец last_reminder_sent добавлен в таблицу users")
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS payment_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    payment_id TEXT NOT NULL UNIQUE,
-                    amount REAL NOT NULL,
-                    payment_info TEXT,
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_payment_stats (
-                    user_id INTEGER PRIMARY KEY,
-                    total_payments INTEGER DEFAULT 0,
-                    total_amount REAL DEFAULT 0.0,
-                    first_payment_date TEXT,
-                    last_payment_date TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS referral_rewards (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    referrer_id INTEGER NOT NULL,
-                    referred_user_id INTEGER NOT NULL,
-                    reward_amount REAL NOT NULL,
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                    FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
-                )
-            """)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS referral_stats (
-                    user_id INTEGER PRIMARY KEY,
-                    total_referrals INTEGER DEFAULT 0,
-                    total_rewards REAL DEFAULT 0.0,
-                    updated_at TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_payment_logs_user_id ON payment_logs (user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_payment_logs_created_at ON payment_logs (created_at)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_payment_logs_payment_id ON payment_logs (payment_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_referral_rewards_referrer ON referral_rewards (referrer_id)")
-            await db.commit()
-            logger.info("Дополнительные таблицы для платежей инициализированы")
-    except Exception as e:
-        logger.error(f"Ошибка инициализации таблиц платежей: {e}")
+def build_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    """Диспетчер со всеми middleware, роутерами и обработчиками бота.
+
+    Роутеры - объекты модулей, поэтому в процессе собирается один диспетчер
+    (его же использует нагрузочный стенд loadtest).
+    """
+    dp = Dispatcher(storage=storage if storage is not None else create_fsm_storage())
+    install_tracing(dp, slow_update_ms=TRACE_SLOW_UPDATE_MS, slow_query_ms=TRACE_SLOW_QUERY_MS)
+    dp.update.outer_middleware(FSMSnapshotMiddleware())
+    install_update_log(dp)
+    from aiogram.filters import BaseFilter
+
+    # Универсальный фильтр для администраторов с проверкой состояния FSM
+    class AdminStateFilter(BaseFilter):
+        def __init__(self, state_key: str):
+            self.state_key = state_key
+
+        async def __call__(self, message: Message, state: FSMContext):
+            return (
+                message.from_user.id in ADMIN_IDS and
+                (await state.get_state()) == self.state_key
+            )
+
+    # Регистрация FSM-роутера
+    setup_onboarding_handlers()
+    setup_conversation_handler(dp)
+    logger.info("Обработчики FSM зарегистрированы")
+    dp.include_router(photo_transform_router)
+
+    # Регистрация дополнительных роутеров
+    dp.include_router(broadcast_router)
+    dp.include_router(admin_callbacks_router)
+    dp.include_router(onboarding_router)
+    dp.include_router(user_callbacks_router)
+    dp.include_router(referrals_callbacks_router)
+    dp.include_router(utils_callbacks_router)
+    dp.include_router(user_management_router)
+    dp.include_router(payments_router)
+    dp.include_router(visualization_router)
+    dp.include_router(bot_counter_router)
+    dp.include_router(video_router)
+    dp.include_router(training_router)
+
+
+    # Регистрация обработчиков команд
+    dp.message.register(cancel, Command("cancel"))
+    dp.message.register(start, Command("start"))
+    dp.message.register(menu, Command("menu"))
+    dp.message.register(help_command, Command("help"))
+    dp.message.register(check_training, Command("check_training"))
+    dp.message.register(debug_avatars, Command("debug_avatars"))
+    dp.message.register(list_scheduled_broadcasts, Command("manage_broadcasts"))
+    dp.message.register(cmd_bot_name, Command("botname"))
+    dp.message.register(slow_report, Command("slow"))
+
+    # Специфичные обработчики для текстовых сообщений
+    dp.message.register(
+        handle_broadcast_message,
+        AdminStateFilter(BotStates.AWAITING_BROADCAST_MESSAGE)
+    )
+    dp.message.register(
+        handle_broadcast_schedule_time,
+        AdminStateFilter(BotStates.AWAITING_BROADCAST_SCHEDULE)
+    )
+    dp.message.register(
+        handle_broadcast_button_input,
+        AdminStateFilter(BotStates.AWAITING_BROADCAST_BUTTON_INPUT)
+    )
+    dp.message.register(
+        handle_payments_date_input,
+        AdminStateFilter(BotStates.AWAITING_PAYMENT_DATES)
+    )
+    dp.message.register(
+        handle_balance_change_input,
+        AdminStateFilter(BotStates.AWAITING_BALANCE_CHANGE)
+    )
+    dp.message.register(
+        handle_block_reason_input,
+        AdminStateFilter(BotStates.AWAITING_BLOCK_REASON)
+    )
+    dp.message.register(
+        handle_activity_dates_input,
+        AdminStateFilter(BotStates.AWAITING_ACTIVITY_DATES)
+    )
+    dp.message.register(
+        handle_user_search_input,
+        AdminStateFilter(BotStates.AWAITING_USER_SEARCH)
+    )
+    dp.message.register(
+        handle_admin_custom_prompt,
+        AdminStateFilter(BotStates.AWAITING_ADMIN_PROMPT)
+    )
+
+    # Обработчики для фото и видео
+    dp.message.register(handle_photo, lambda message: message.content_type == ContentType.PHOTO)
+    dp.message.register(handle_video, lambda message: message.content_type == ContentType.VIDEO)
+
+    # Общий обработчик текста (должен быть последним)
+    dp.message.register(handle_text, lambda message: message.content_type == ContentType.TEXT)
+
+    dp.error.register(error_handler)
+    logger.info("Все обработчики зарегистрированы")
+    return dp
 
 async def main():
     """Основная функция запуска бота."""
     global bot_instance, dp, bot_event_loop
     try:
         logger.info("=== ЗАПУСК TELEGRAM БОТА ===")
-        logger.info("Инициализация дополнительных таблиц для платежей...")
-        await init_payment_tables()
         logger.info("Инициализация базы данных...")
         await init_db()
         logger.info("База данных инициализирована")
         logger.info("Создание экземпляра бота...")
         bot_instance = Bot(token=TOKEN)
-        dp = Dispatcher()
-        bot_info = await bot_instance.get_me()
+        outbound_gateway = install_outbound_gateway(
+            bot_instance,
+            global_rate=OUTBOUND_GLOBAL_RATE,
+            chat_rate=OUTBOUND_CHAT_RATE,
+            chat_burst=OUTBOUND_CHAT_BURST,
+            broadcast_share=OUTBOUND_BROADCAST_SHARE
+        )
+        if TELEGRAM_UPDATES_MODE == 'webhook' and not REDIS:
+            logger.warning("Режим webhook без REDIS_URL: FSM в памяти, запускайте только один инстанс")
+        bot_info = await load_bot_identity(bot_instance)
         logger.info(f"Экземпляр бота создан: @{bot_info.username}")
         # Инициализация модуля Фото Преображение
         REPLICATE_API_KEY = os.getenv("REPLICATE_API_KEY")
@@ -972,100 +961,21 @@ async def main():
             logger.info("✅ Модуль Фото Преображение инициализирован")
         else:
             logger.warning("❌ REPLICATE_API_KEY не найден! Функция Фото Преображение недоступна")
-        from aiogram.filters import BaseFilter
-
-        # Универсальный фильтр для администраторов с проверкой состояния FSM
-        class AdminStateFilter(BaseFilter):
-            def __init__(self, state_key: str):
-                self.state_key = state_key
-
-            async def __call__(self, message: Message, state: FSMContext):
-                return (
-                    message.from_user.id in ADMIN_IDS and
-                    (await state.get_state()) == self.state_key
-                )
-
-        # Регистрация FSM-роутера
-        setup_onboarding_handlers()
-        setup_conversation_handler(dp)
-        logger.info("Обработчики FSM зарегистрированы")
-        dp.include_router(photo_transform_router)
-
-        # Регистрация дополнительных роутеров
-        dp.include_router(broadcast_router)
-        dp.include_router(admin_callbacks_router)
-        dp.include_router(onboarding_router)
-        dp.include_router(user_callbacks_router)
-        dp.include_router(referrals_callbacks_router)
-        dp.include_router(utils_callbacks_router)
-        dp.include_router(user_management_router)
-        dp.include_router(payments_router)
-        dp.include_router(visualization_router)
-        dp.include_router(bot_counter_router)
-        dp.include_router(video_router)
-        dp.include_router(training_router)
-
-
-        # Регистрация обработчиков команд
-        dp.message.register(cancel, Command("cancel"))
-        dp.message.register(start, Command("start"))
-        dp.message.register(menu, Command("menu"))
-        dp.message.register(help_command, Command("help"))
-        dp.message.register(check_training, Command("check_training"))
-        dp.message.register(debug_avatars, Command("debug_avatars"))
-        dp.message.register(list_scheduled_broadcasts, Command("manage_broadcasts"))
-        dp.message.register(cmd_bot_name, Command("botname"))
-
-        # Специфичные обработчики для текстовых сообщений
-        dp.message.register(
-            handle_broadcast_message,
-            AdminStateFilter(BotStates.AWAITING_BROADCAST_MESSAGE)
-        )
-        dp.message.register(
-            handle_broadcast_schedule_time,
-            AdminStateFilter(BotStates.AWAITING_BROADCAST_SCHEDULE)
-        )
-        dp.message.register(
-            handle_broadcast_button_input,
-            AdminStateFilter(BotStates.AWAITING_BROADCAST_BUTTON_INPUT)
-        )
-        dp.message.register(
-            handle_payments_date_input,
-            AdminStateFilter(BotStates.AWAITING_PAYMENT_DATES)
-        )
-        dp.message.register(
-            handle_balance_change_input,
-            AdminStateFilter(BotStates.AWAITING_BALANCE_CHANGE)
-        )
-        dp.message.register(
-            handle_block_reason_input,
-            AdminStateFilter(BotStates.AWAITING_BLOCK_REASON)
-        )
-        dp.message.register(
-            handle_activity_dates_input,
-            AdminStateFilter(BotStates.AWAITING_ACTIVITY_DATES)
-        )
-        dp.message.register(
-            handle_user_search_input,
-            AdminStateFilter(BotStates.AWAITING_USER_SEARCH)
-        )
-        dp.message.register(
-            handle_admin_custom_prompt,
-            AdminStateFilter(BotStates.AWAITING_ADMIN_PROMPT)
-        )
-
-        # Обработчики для фото и видео
-        dp.message.register(handle_photo, lambda message: message.content_type == ContentType.PHOTO)
-        dp.message.register(handle_video, lambda message: message.content_type == ContentType.VIDEO)
+        dp = build_dispatcher()
 
-        # Общий обработчик текста (должен быть последним)
-        dp.message.register(handle_text, lambda message: message.content_type == ContentType.TEXT)
-
-        dp.error.register(error_handler)
-        logger.info("Все обработчики зарегистрированы")
+        bot_event_loop = asyncio.get_running_loop()
+        allowed_updates = ["message", "callback_query"]
+        if not BOT_PRIMARY_INSTANCE:
+            # Вспомогательный инстанс только обрабатывает обновления. Планировщик на паузе:
+            # разовые задачи онбординга пишутся в общее хранилище и выполняются основным инстансом
+            logger.info("Вспомогательный инстанс: планировщик на паузе, Flask не запускается")
+            scheduler = create_scheduler(bot_instance)
+            scheduler.start(paused=True)
+            await run_webhook(bot_instance, dp, allowed_updates=allowed_updates)
+            return
 
         # Настройка планировщика задач
-        scheduler = AsyncIOScheduler(timezone=pytz.timezone('Europe/Moscow'))
+        scheduler = create_scheduler(bot_instance)
         scheduler.add_job(
             send_daily_payments_report,
             trigger=CronTrigger(hour=10, minute=0, timezone=pytz.timezone('Europe/Moscow')),
@@ -1094,6 +1004,12 @@ async def main():
             misfire_grace_time=60,
             id='check_pending_trainings'
         )
+        scheduler.add_job(
+            release_expired_credit_reservations,
+            trigger=CronTrigger(minute='*/5', timezone=pytz.timezone('Europe/Moscow')),
+            misfire_grace_time=60,
+            id='release_expired_credit_reservations'
+        )
         scheduler.add_job(
             send_daily_reminders,
             trigger=CronTrigger(hour=11, minute=15, timezone=pytz.timezone('Europe/Moscow')),
@@ -1101,12 +1017,12 @@ async def main():
             misfire_grace_time=300,
             id='daily_reminders'
         )
+        add_persistent_poll_job(scheduler)
         scheduler.start()
         logger.info("Планировщик задач запущен")
 
-        # Запуск проверки онбординговых сообщений
-        logger.info("Запуск проверки онбординговых сообщений...")
-        asyncio.create_task(check_and_schedule_onboarding(bot_instance))
+        # Однократный добор приветствий, потерянных при переезде на хранилище задач (дальше по флагу в bot_config)
+        asyncio.create_task(backfill_welcome_jobs())
 
         # Запуск проверки задач при старте
         logger.info("Запуск проверки задач при старте...")
@@ -1119,13 +1035,17 @@ async def main():
         flask_thread.start()
         logger.info("Flask сервер запущен в потоке.")
 
-        # Запуск бота в режиме polling
-        logger.info("Запуск бота в режиме polling...")
-        bot_event_loop = asyncio.get_running_loop()
         await bot_counter.start(bot_instance)
         logger.info("Счетчик пользователей в имени бота запущен")
         await notify_startup()
-        await dp.start_polling(bot_instance, allowed_updates=["message", "callback_query"], drop_pending_updates=True)
+        if TELEGRAM_UPDATES_MODE == 'webhook':
+            logger.info("Запуск бота в режиме webhook...")
+            await run_webhook(bot_instance, dp, allowed_updates=allowed_updates)
+        else:
+            logger.info("Запуск бота в режиме polling...")
+            # Снимаем вебхук, если бот до этого работал в режиме webhook
+            await bot_instance.delete_webhook()
+            await dp.start_polling(bot_instance, allowed_updates=allowed_updates, drop_pending_updates=True)
         logger.info("✅ Бот успешно запущен и работает!")
 
     except (KeyboardInterrupt, SystemExit):
@@ -1137,10 +1057,20 @@ async def main():
         if 'scheduler' in locals():
             scheduler.shutdown(wait=True)
             logger.info("Планировщик остановлен")
+        shutdown_image_pool()
         if bot_instance:
             logger.info("Счетчик пользователей не имеет метода stop, пропускаем")
+            logger.info(f"Статистика прогресс-сообщений: {progress_service.get_stats()}")
+            logger.info(f"Статистика callback-маршрутов: {get_callback_route_stats()}")
+            await progress_service.close()
+            if 'outbound_gateway' in locals():
+                logger.info(f"Статистика исходящих сообщений: {outbound_gateway.get_stats()}")
+                await outbound_gateway.close()
             await bot_instance.session.close()
             logger.info("Сессия бота закрыта")
+        if dp:
+            await dp.storage.close()
+        logger.info(f"Статистика логирования: {get_logging_stats()}")
         logger.info("Бот полностью остановлен.")
 
 if __name__ == '__main__':
@@ -0,0 +1,91 @@
+# markdown_escape.py
+"""Экранирование текста для Markdown / MarkdownV2 Telegram.
+
+Результат совпадает с прежней реализацией (по проходу str.replace на каждый спецсимвол),
+но проходы выполняются только для символов, которые в тексте есть: проверка `in`
+дешевле холостого replace, а в обычном сообщении встречаются 2-3 спецсимвола из 18.
+str.translate и re.sub для замены символа на два измерены медленнее str.replace
+(см. benchmarks/bench_markdown_escape.py). Обратная косая черта, как и раньше,
+не экранируется.
+
+Модуль без зависимостей от конфигурации бота; handlers.utils реэкспортирует функции.
+"""
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+# Спецсимволы в порядке прежних проходов str.replace
+MARKDOWN_V1_SPECIAL_CHARS = '_*`['
+MARKDOWN_V2_SPECIAL_CHARS = '_*[]()~`>#+-=|{}.!'
+
+_SPECIAL_CHARS = {1: MARKDOWN_V1_SPECIAL_CHARS, 2: MARKDOWN_V2_SPECIAL_CHARS}
+# (символ, экранированный символ) - пары для проходов replace
+_ESCAPE_PAIRS = {
+    version: tuple((char, f'\\{char}') for char in chars)
+    for version, chars in _SPECIAL_CHARS.items()
+}
+
+
+@lru_cache(maxsize=128)
+def _escape_pairs_without(version: int, exclude_chars: Tuple[str, ...]) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """Пары без исключённых символов.
+
+    None - исключения так не сводятся (не спецсимвол, несколько символов, повтор):
+    нужен прежний проход replace, который снимает и '\\' из исходного текста.
+    """
+    chars = _SPECIAL_CHARS[version]
+    if len(set(exclude_chars)) != len(exclude_chars):
+        return None
+    for char in exclude_chars:
+        if not isinstance(char, str) or len(char) != 1 or char not in chars:
+            return None
+    return tuple(pair for pair in _ESCAPE_PAIRS[version] if pair[0] not in exclude_chars)
+
+
+def _escape(text: str, pairs: Tuple[Tuple[str, str], ...]) -> str:
+    for char, escaped in pairs:
+        if char in text:
+            text = text.replace(char, escaped)
+    return text
+
+
+def safe_escape_markdown(text: str, exclude_chars: Optional[Iterable[str]] = None, version: int = 2) -> str:
+    """Экранирует спецсимволы Markdown (version=1) или MarkdownV2 (по умолчанию).
+
+    exclude_chars - символы, которые остаются без экранирования.
+    """
+    if not text:
+        return ""
+
+    text = str(text)
+    version = 1 if version == 1 else 2
+    if not exclude_chars:
+        return _escape(text, _ESCAPE_PAIRS[version])
+
+    exclude = tuple(exclude_chars)
+    pairs = _escape_pairs_without(version, exclude)
+    if pairs is not None:
+        return _escape(text, pairs)
+
+    text = _escape(text, _ESCAPE_PAIRS[version])
+    for char in exclude:
+        text = text.replace(f'\\{char}', char)
+    return text
+
+
+def escape_message_parts(*parts: str, version: int = 2) -> str:
+    """Склеивает части сообщения, экранируя каждую (то же, что экранировать склейку)."""
+    if not parts:
+        return ""
+    return safe_escape_markdown("".join(str(part) for part in parts), version=version)
+
+
+def unescape_markdown(text: str) -> str:
+    """Снимает экранирование спецсимволов MarkdownV2."""
+    if not text:
+        return ""
+    if '\\' not in text:
+        return text
+    for char, escaped in _ESCAPE_PAIRS[2]:
+        if escaped in text:
+            text = text.replace(escaped, char)
+    return text
@@ -0,0 +1,158 @@
+# media_assets.py
+"""Реестр статических медиафайлов бота (видео приветствия и меню, примеры фото).
+
+Каждый файл загружается в Telegram один раз, дальше отправляется по file_id.
+file_id хранится в SQLite с ключом (путь, sha256 содержимого): если файл на диске
+поменялся или Telegram отклонил file_id, файл загружается заново.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from database import get_media_asset_file_id, save_media_asset_file_id, delete_media_asset_file_id
+
+from logger import get_logger
+logger = get_logger('main')
+
+WELCOME_VIDEO = "images/welcome.mp4"
+MENU_VIDEO = "images/welcome1.mp4"
+
+# Фрагменты ответов Bot API, означающие, что file_id больше не годится
+_REJECTED_FILE_ID_MARKERS = (
+    "file identifier", "file_id", "remote file", "file reference", "wrong file", "failed to get http url"
+)
+
+
+def _is_rejected_file_id(error: TelegramBadRequest) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in _REJECTED_FILE_ID_MARKERS)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaAssetRegistry:
+    """file_id статических файлов: память процесса + таблица media_assets."""
+    def __init__(self):
+        # path -> (mtime_ns, size, sha256); хэш пересчитывается только при изменении файла
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        # (path, sha256) -> file_id
+        self._file_ids: Dict[Tuple[str, str], str] = {}
+        self.stats = {'sent_by_file_id': 0, 'uploaded': 0, 'rejected': 0}
+
+    async def _content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        content_hash = await asyncio.to_thread(_hash_file, path)
+        self._hashes[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return content_hash
+
+    async def _get_file_id(self, path: str, content_hash: str) -> Optional[str]:
+        key = (path, content_hash)
+        file_id = self._file_ids.get(key)
+        if file_id is None:
+            file_id = await get_media_asset_file_id(path, content_hash)
+            if file_id:
+                self._file_ids[key] = file_id
+        return file_id
+
+    async def _remember(self, path: str, content_hash: str, file_id: Optional[str]) -> None:
+        if not file_id:
+            return
+        self.stats['uploaded'] += 1
+        self._file_ids[(path, content_hash)] = file_id
+        try:
+            await save_media_asset_file_id(path, content_hash, file_id)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить file_id для {path}: {e}", exc_info=True)
+        logger.info(f"Файл {path} загружен в Telegram, file_id сохранён")
+
+    async def _forget(self, path: str, content_hash: str) -> None:
+        self.stats['rejected'] += 1
+        self._file_ids.pop((path, content_hash), None)
+        await delete_media_asset_file_id(path)
+        logger.warning(f"Telegram отклонил file_id для {path}, файл будет загружен заново")
+
+    async def send_video(self, bot: Bot, chat_id: int, path: str, **kwargs) -> Message:
+        """Отправляет видео по file_id, при первой отправке или отказе Telegram - загружает файл."""
+        content_hash = await self._content_hash(path)
+        file_id = await self._get_file_id(path, content_hash)
+        if file_id:
+            try:
+                message = await bot.send_video(chat_id=chat_id, video=file_id, **kwargs)
+                self.stats['sent_by_file_id'] += 1
+                return message
+            except TelegramBadRequest as e:
+                if not _is_rejected_file_id(e):
+                    raise
+                await self._forget(path, content_hash)
+
+        message = await bot.send_video(chat_id=chat_id, video=FSInputFile(path=path), **kwargs)
+        media = message.video or message.animation or message.document
+        await self._remember(path, content_hash, media.file_id if media else None)
+        return message
+
+    async def send_photo_group(self, bot: Bot, chat_id: int, paths: List[str]) -> List[Message]:
+        """Отправляет медиагруппу фото; файлы без file_id загружаются и запоминаются."""
+        entries = []
+        for path in paths:
+            if not os.path.exists(path):
+                logger.warning(f"Изображение не найдено: {path}")
+                continue
+            content_hash = await self._content_hash(path)
+            entries.append((path, content_hash, await self._get_file_id(path, content_hash)))
+        if not entries:
+            return []
+
+        def build(use_file_ids: bool) -> List[InputMediaPhoto]:
+            return [
+                InputMediaPhoto(media=file_id if use_file_ids and file_id else FSInputFile(path=path))
+                for path, _, file_id in entries
+            ]
+
+        use_file_ids = any(file_id for _, _, file_id in entries)
+        try:
+            messages = await bot.send_media_group(chat_id=chat_id, media=build(use_file_ids))
+        except TelegramBadRequest as e:
+            if not use_file_ids or not _is_rejected_file_id(e):
+                raise
+            # Из ответа не понять, какой из file_id отклонён: сбрасываем все
+            for path, content_hash, file_id in entries:
+                if file_id:
+                    await self._forget(path, content_hash)
+            entries = [(path, content_hash, None) for path, content_hash, _ in entries]
+            use_file_ids = False
+            messages = await bot.send_media_group(chat_id=chat_id, media=build(False))
+
+        for (path, content_hash, file_id), message in zip(entries, messages):
+            if use_file_ids and file_id:
+                self.stats['sent_by_file_id'] += 1
+            elif message.photo:
+                await self._remember(path, content_hash, message.photo[-1].file_id)
+        return messages
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, 'cached_file_ids': len(self._file_ids)}
+
+
+media_assets = MediaAssetRegistry()
+
+
+async def send_video_asset(bot: Bot, chat_id: int, path: str, **kwargs) -> Message:
+    return await media_assets.send_video(bot, chat_id, path, **kwargs)
+
+
+async def send_photo_group_asset(bot: Bot, chat_id: int, paths: List[str]) -> List[Message]:
+    return await media_assets.send_photo_group(bot, chat_id, paths)
@@ -0,0 +1,281 @@
+# metrics.py
+"""Метрики процесса в текстовом формате Prometheus (exposition format 0.0.4).
+
+Счётчики, gauge и гистограммы без внешних зависимостей. Отдаются на /metrics:
+Flask-приложением основного инстанса и приложением приёма вебхуков Telegram
+(каждый процесс - свои значения). Серии с метками создаются при первом обращении.
+Обновления идут из цикла событий, чтение - из потока Flask, поэтому значения
+меняются под блокировкой метрики.
+
+Метрики бота объявлены в конце модуля, чтобы имена и метки были в одном месте.
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from tracing import record_span
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+REPLICATE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 3600.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(имя серии, метки в формате Prometheus, значение)."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Значение вычисляется при каждом чтении /metrics (только для метрики без меток)."""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                return [(self.name, '', float(self._function()))]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счётчики по корзинам (последняя - +Inf), сумма, количество]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._values.items()]
+        result = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                result.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, count))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def timed_coroutine(func: Callable, histogram: Histogram, errors: Counter, label: str,
+                    span_kind: Optional[str] = None) -> Callable:
+    """Оборачивает корутину: время вызова - в histogram, исключения - в errors (метка label=имя функции).
+
+    С span_kind вызов также записывается спаном в трассу текущего апдейта (tracing.record_span).
+    """
+    name = func.__name__
+    labels = {label: name}
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.inc(**labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            histogram.observe(elapsed, **labels)
+            if span_kind is not None:
+                record_span(span_kind, name, elapsed, started)
+    return wrapper
+
+
+def instrument_module_coroutines(namespace: Dict[str, Any], histogram: Histogram, errors: Counter, label: str,
+                                 span_kind: Optional[str] = None) -> int:
+    """Оборачивает timed_coroutine все публичные корутины, объявленные в модуле namespace.
+
+    Вызывается в конце модуля (instrument_module_coroutines(globals(), ...)), до того как
+    другие модули импортируют его функции. Возвращает число обёрнутых функций.
+    """
+    module_name = namespace['__name__']
+    count = 0
+    for name, value in list(namespace.items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(value):
+            continue
+        if getattr(value, '__module__', None) != module_name:
+            continue
+        namespace[name] = timed_coroutine(value, histogram, errors, label, span_kind)
+        count += 1
+    return count
+
+
+# === МЕТРИКИ БОТА ===
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'bot_handler_seconds', 'Время работы обработчика aiogram', ('handler',))
+HANDLER_ERRORS = REGISTRY.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках aiogram', ('handler',))
+UPDATE_LATENCY = REGISTRY.histogram(
+    'bot_update_processing_seconds', 'Полная обработка апдейта воркером вебхука (диспетчер и middleware)')
+UPDATE_QUEUE_DEPTH = REGISTRY.gauge(
+    'bot_update_queue_depth', 'Апдейты в очереди приёма вебхука')
+WEBHOOK_LATENCY = REGISTRY.histogram(
+    'bot_webhook_request_seconds', 'Обработка HTTP-запроса вебхука Telegram', ('status',))
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    'bot_db_query_seconds', 'Время функций database.py', ('function',), buckets=DB_BUCKETS)
+DB_QUERY_ERRORS = REGISTRY.counter(
+    'bot_db_query_errors_total', 'Исключения в функциях database.py', ('function',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'bot_redis_cache_requests_total', 'Чтения кэша Redis по префиксу ключа', ('prefix', 'result'))
+REPLICATE_LATENCY = REGISTRY.histogram(
+    'bot_replicate_prediction_seconds', 'Replicate: от создания предсказания до завершения',
+    ('model', 'status'), buckets=REPLICATE_BUCKETS)
+GENERATION_QUEUE_DEPTH = REGISTRY.gauge(
+    'bot_generation_queue_depth', 'Задачи в очереди генерации изображений')
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    'bot_outbound_requests_total', 'Запросы к Bot API через шлюз исходящих сообщений', ('lane', 'result'))
+BROADCAST_MESSAGES = REGISTRY.counter(
+    'bot_broadcast_messages_total', 'Сообщения рассылок по получателям', ('result',))
@@ -0,0 +1,20 @@
+# migrations/__init__.py
+"""Версионные миграции схемы базы данных.
+
+Новая миграция - файл mNNN_<имя>.py со следующим номером и корутиной
+upgrade(conn). Внутри upgrade не вызывать commit: транзакцией управляет runner.
+"""
+
+from .runner import (
+    Migration,
+    apply_migrations,
+    discover_migrations,
+    get_schema_version
+)
+
+__all__ = [
+    'Migration',
+    'apply_migrations',
+    'discover_migrations',
+    'get_schema_version',
+]
@@ -0,0 +1,286 @@
+# migrations/m001_baseline.py
+"""Базовая схема: все таблицы, индексы и триггеры бота.
+
+Собрана из прежних init_db, init_payment_tables, migrate_referral_stats_table
+и проверок столбцов в save_video_task/add_referral_reward. На существующей
+базе создаёт недостающее и добавляет отсутствующие столбцы, поэтому
+безопасна для баз, заведённых любой прежней версией бота.
+"""
+from typing import Set
+
+import aiosqlite
+
+from logger import get_logger
+logger = get_logger('database')
+
+
+async def _columns(conn: aiosqlite.Connection, table: str) -> Set[str]:
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in await cursor.fetchall()}
+
+
+async def _add_missing_columns(conn: aiosqlite.Connection, table: str, columns: dict) -> None:
+    existing = await _columns(conn, table)
+    for name, definition in columns.items():
+        if name not in existing:
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"Добавлен столбец {name} в таблицу {table}")
+
+
+async def _create_scheduled_broadcasts(conn: aiosqlite.Connection) -> None:
+    existing = await _columns(conn, 'scheduled_broadcasts')
+    if existing and 'scheduled_time' not in existing:
+        # Самые старые базы: таблица без scheduled_time, пересобираем с переносом данных
+        await conn.execute("ALTER TABLE scheduled_broadcasts RENAME TO scheduled_broadcasts_old")
+    await conn.execute('''CREATE TABLE IF NOT EXISTS scheduled_broadcasts (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            scheduled_time TEXT NOT NULL,
+                            broadcast_data TEXT NOT NULL,
+                            status TEXT DEFAULT 'pending',
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                         )''')
+    if existing and 'scheduled_time' not in existing:
+        await conn.execute('''INSERT INTO scheduled_broadcasts (id, scheduled_time, broadcast_data, status, created_at)
+                              SELECT id, COALESCE(created_at, CURRENT_TIMESTAMP), broadcast_data, status, created_at
+                              FROM scheduled_broadcasts_old''')
+        await conn.execute("DROP TABLE scheduled_broadcasts_old")
+        logger.info("Таблица scheduled_broadcasts пересобрана со столбцом scheduled_time")
+
+
+async def upgrade(conn: aiosqlite.Connection) -> None:
+    await conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                            user_id INTEGER PRIMARY KEY,
+                            username TEXT,
+                            first_name TEXT,
+                            generations_left INTEGER DEFAULT 0,
+                            avatar_left INTEGER DEFAULT 0,
+                            has_trained_model INTEGER DEFAULT 0,
+                            is_notified INTEGER DEFAULT 0,
+                            first_purchase INTEGER DEFAULT 1,
+                            email TEXT,
+                            active_avatar_id INTEGER DEFAULT NULL,
+                            referrer_id INTEGER DEFAULT NULL,
+                            is_blocked INTEGER DEFAULT 0,
+                            block_reason TEXT DEFAULT NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            welcome_message_sent INTEGER DEFAULT 0,
+                            last_reminder_type TEXT DEFAULT NULL,
+                            last_reminder_sent TEXT DEFAULT NULL,
+                            FOREIGN KEY (active_avatar_id) REFERENCES user_trainedmodels(avatar_id) ON DELETE SET NULL,
+                            FOREIGN KEY (referrer_id) REFERENCES users(user_id) ON DELETE SET NULL
+                         )''')
+    await _add_missing_columns(conn, 'users', {
+        'welcome_message_sent': 'INTEGER DEFAULT 0',
+        'block_reason': 'TEXT DEFAULT NULL',
+        'last_reminder_type': 'TEXT DEFAULT NULL',
+        'last_reminder_sent': 'TEXT DEFAULT NULL',
+    })
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS referrals (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            referrer_id INTEGER NOT NULL,
+                            referred_id INTEGER NOT NULL UNIQUE,
+                            status TEXT DEFAULT 'pending',
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            completed_at TIMESTAMP DEFAULT NULL,
+                            FOREIGN KEY (referrer_id) REFERENCES users(user_id) ON DELETE CASCADE,
+                            FOREIGN KEY (referred_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+    await _add_missing_columns(conn, 'referrals', {'completed_at': 'TIMESTAMP DEFAULT NULL'})
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS referral_rewards (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            referrer_id INTEGER NOT NULL,
+                            referred_user_id INTEGER NOT NULL,
+                            reward_photos INTEGER NOT NULL,
+                            created_at TEXT NOT NULL,
+                            FOREIGN KEY (referrer_id) REFERENCES users (user_id),
+                            FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
+                         )''')
+    await _add_missing_columns(conn, 'referral_rewards', {'reward_photos': 'INTEGER NOT NULL DEFAULT 0'})
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS referral_stats (
+                            user_id INTEGER PRIMARY KEY,
+                            total_referrals INTEGER DEFAULT 0,
+                            total_reward_photos INTEGER DEFAULT 0,
+                            updated_at TEXT,
+                            FOREIGN KEY (user_id) REFERENCES users (user_id)
+                         )''')
+    await _add_missing_columns(conn, 'referral_stats', {'total_reward_photos': 'INTEGER DEFAULT 0'})
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS user_trainedmodels (
+                            avatar_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER,
+                            model_id TEXT,
+                            model_version TEXT,
+                            status TEXT,
+                            prediction_id TEXT UNIQUE,
+                            trigger_word TEXT,
+                            photo_paths TEXT,
+                            training_step TEXT,
+                            avatar_name TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS user_ratings (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER,
+                            generation_type TEXT,
+                            model_key TEXT,
+                            rating INTEGER,
+                            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS video_tasks (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER,
+                            video_path TEXT,
+                            status TEXT DEFAULT 'pending',
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            prediction_id TEXT UNIQUE,
+                            model_key TEXT,
+                            style_name TEXT,
+                            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+    await _add_missing_columns(conn, 'video_tasks', {'style_name': 'TEXT'})
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS payments (
+                            payment_id TEXT PRIMARY KEY,
+                            user_id INTEGER,
+                            plan TEXT,
+                            amount REAL,
+                            status TEXT DEFAULT 'pending',
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS payment_logs (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER NOT NULL,
+                            payment_id TEXT NOT NULL UNIQUE,
+                            amount REAL NOT NULL,
+                            payment_info TEXT,
+                            created_at TEXT NOT NULL,
+                            FOREIGN KEY (user_id) REFERENCES users (user_id)
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS user_payment_stats (
+                            user_id INTEGER PRIMARY KEY,
+                            total_payments INTEGER DEFAULT 0,
+                            total_amount REAL DEFAULT 0.0,
+                            first_payment_date TEXT,
+                            last_payment_date TEXT,
+                            FOREIGN KEY (user_id) REFERENCES users (user_id)
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS generation_log (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER,
+                            generation_type TEXT,
+                            replicate_model_id TEXT,
+                            units_generated INTEGER,
+                            cost_per_unit REAL,
+                            total_cost REAL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS user_actions (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER,
+                            action TEXT,
+                            details TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+                         )''')
+
+    await _create_scheduled_broadcasts(conn)
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS broadcast_buttons (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            broadcast_id INTEGER NOT NULL,
+                            button_text TEXT NOT NULL,
+                            callback_data TEXT NOT NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY (broadcast_id) REFERENCES scheduled_broadcasts(id) ON DELETE CASCADE
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS fixes (
+                            fix_name TEXT PRIMARY KEY,
+                            applied INTEGER DEFAULT 0,
+                            applied_at TIMESTAMP
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS bot_config (
+                            key TEXT PRIMARY KEY,
+                            value TEXT,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS bot_counter_settings (
+                            key TEXT PRIMARY KEY,
+                            value TEXT
+                         )''')
+
+    await conn.execute('''CREATE TABLE IF NOT EXISTS media_assets (
+                            path TEXT NOT NULL,
+                            content_hash TEXT NOT NULL,
+                            file_id TEXT NOT NULL,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (path, content_hash)
+                         )''')
+
+    indices = [
+        ('idx_users_active_avatar', 'users(active_avatar_id)'),
+        ('idx_users_referrer', 'users(referrer_id)'),
+        ('idx_users_blocked', 'users(is_blocked)'),
+        ('idx_trainedmodels_user', 'user_trainedmodels(user_id)'),
+        ('idx_trainedmodels_status', 'user_trainedmodels(status)'),
+        ('idx_trainedmodels_prediction', 'user_trainedmodels(prediction_id)'),
+        ('idx_payments_user', 'payments(user_id)'),
+        ('idx_payments_created', 'payments(created_at)'),
+        ('idx_payment_logs_user_id', 'payment_logs(user_id)'),
+        ('idx_payment_logs_created_at', 'payment_logs(created_at)'),
+        ('idx_payment_logs_payment_id', 'payment_logs(payment_id)'),
+        ('idx_generation_log_user', 'generation_log(user_id)'),
+        ('idx_generation_log_created', 'generation_log(created_at)'),
+        ('idx_generation_log_type', 'generation_log(generation_type)'),
+        ('idx_video_tasks_user', 'video_tasks(user_id)'),
+        ('idx_video_tasks_status', 'video_tasks(status)'),
+        ('idx_referrals_referrer', 'referrals(referrer_id)'),
+        ('idx_referrals_referred', 'referrals(referred_id)'),
+        ('idx_referrals_status', 'referrals(status)'),
+        ('idx_user_actions_user', 'user_actions(user_id)'),
+        ('idx_user_actions_action', 'user_actions(action)'),
+        ('idx_user_actions_created', 'user_actions(created_at)'),
+        ('idx_scheduled_broadcasts_schedule', 'scheduled_broadcasts(scheduled_time)'),
+        ('idx_referral_rewards_referrer', 'referral_rewards(referrer_id)'),
+        ('idx_referral_rewards_referred', 'referral_rewards(referred_user_id)'),
+        ('idx_referral_stats_user', 'referral_stats(user_id)'),
+        ('idx_broadcast_buttons_broadcast', 'broadcast_buttons(broadcast_id)'),
+        ('idx_bot_config_key', 'bot_config(key)'),
+    ]
+    for index_name, index_def in indices:
+        await conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_def}')
+
+    await conn.execute('''CREATE TRIGGER IF NOT EXISTS update_users_updated_at
+                          AFTER UPDATE ON users
+                          FOR EACH ROW
+                          BEGIN
+                              UPDATE users
+                              SET updated_at = CURRENT_TIMESTAMP
+                              WHERE user_id = NEW.user_id;
+                          END;''')
+
+    await conn.execute('''CREATE TRIGGER IF NOT EXISTS update_trainedmodels_updated_at
+                          AFTER UPDATE ON user_trainedmodels
+                          FOR EACH ROW
+                          BEGIN
+                              UPDATE user_trainedmodels
+                              SET updated_at = CURRENT_TIMESTAMP
+                              WHERE avatar_id = NEW.avatar_id;
+                          END;''')
@@ -0,0 +1,86 @@
+# migrations/m002_scheduled_broadcasts_data.py
+"""Нормализация scheduled_broadcasts: формат времени и поля broadcast_data.
+
+Раньше эти исправления (migrate_* из handlers/broadcast.py) выполнялись при
+каждом планировании рассылки. Пересчёт scheduled_time из UTC в MSK сюда не
+перенесён: он не идемпотентен и на каждом вызове сдвигал ожидающие рассылки
+ещё на 3 часа, а новые рассылки и так сохраняются по московскому времени.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict
+
+import aiosqlite
+
+from markdown_escape import unescape_markdown
+from logger import get_logger
+logger = get_logger('database')
+
+REQUIRED_FIELDS = ('message', 'media', 'broadcast_type', 'admin_user_id', 'with_payment_button', 'buttons')
+
+
+def _default_admin_id() -> int:
+    # Конфиг нужен только если есть что чинить: модуль импортируется и без переменных окружения бота
+    from config import ADMIN_IDS
+    return ADMIN_IDS[0]
+
+
+def _default_field(field: str) -> Any:
+    defaults = {'message': '', 'media': None, 'broadcast_type': 'all', 'with_payment_button': False, 'buttons': []}
+    return defaults[field] if field in defaults else _default_admin_id()
+
+
+def _empty_broadcast_data() -> Dict[str, Any]:
+    data = {field: _default_field(field) for field in REQUIRED_FIELDS}
+    data['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return data
+
+
+def _normalize_broadcast_data(raw: Any, status: str) -> Any:
+    """Исправленный broadcast_data (dict) или None, если строка уже в порядке."""
+    if raw is None or not str(raw).strip() or str(raw).strip().lower() == 'null':
+        return _empty_broadcast_data()
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return _empty_broadcast_data()
+    if not isinstance(data, dict):
+        return _empty_broadcast_data()
+
+    changed = False
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            data[field] = _default_field(field)
+            changed = True
+    # Текст ожидающих рассылок хранится без экранирования MarkdownV2
+    if status == 'pending' and isinstance(data['message'], str):
+        raw_message = unescape_markdown(data['message'])
+        if raw_message != data['message']:
+            data['message'] = raw_message
+            changed = True
+    return data if changed else None
+
+
+async def upgrade(conn: aiosqlite.Connection) -> None:
+    cursor = await conn.execute("SELECT id, scheduled_time FROM scheduled_broadcasts WHERE scheduled_time LIKE '%T%'")
+    for broadcast_id, scheduled_time in await cursor.fetchall():
+        try:
+            new_time = datetime.fromisoformat(scheduled_time.replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError as e:
+            logger.warning(f"Некорректный формат scheduled_time для ID {broadcast_id}: {e}")
+            continue
+        await conn.execute("UPDATE scheduled_broadcasts SET scheduled_time = ? WHERE id = ?", (new_time, broadcast_id))
+
+    updated = 0
+    cursor = await conn.execute("SELECT id, broadcast_data, status FROM scheduled_broadcasts")
+    for broadcast_id, raw, status in await cursor.fetchall():
+        data = _normalize_broadcast_data(raw, status)
+        if data is None:
+            continue
+        await conn.execute(
+            "UPDATE scheduled_broadcasts SET broadcast_data = ? WHERE id = ?",
+            (json.dumps(data, ensure_ascii=False), broadcast_id)
+        )
+        updated += 1
+    if updated:
+        logger.info(f"Исправлено broadcast_data в {updated} рассылках")
@@ -0,0 +1,68 @@
+# migrations/m004_epoch_columns.py
+"""Целочисленные столбцы времени (секунды эпохи) рядом с TEXT-датами.
+
+Даты в базе хранятся строками разного вида ('%Y-%m-%d %H:%M:%S', с суффиксом
+' UTC', CURRENT_TIMESTAMP), поэтому выборки по периоду шли через DATE() и
+BETWEEN по строкам без индексов. *_ts хранит то же время стены, что и строка
+(без сдвига часового пояса), и заполняется триггерами при каждой записи.
+"""
+import aiosqlite
+
+from logger import get_logger
+logger = get_logger('database')
+
+# (таблица, TEXT-столбец, столбец эпохи)
+EPOCH_COLUMNS = [
+    ('users', 'created_at', 'created_ts'),
+    ('payments', 'created_at', 'created_ts'),
+    ('user_actions', 'created_at', 'created_ts'),
+    ('generation_log', 'created_at', 'created_ts'),
+    ('scheduled_broadcasts', 'scheduled_time', 'scheduled_ts'),
+]
+
+INDEXES = [
+    ('idx_users_created_ts', 'users(created_ts)'),
+    ('idx_payments_status_created_ts', 'payments(status, created_ts)'),
+    ('idx_user_actions_created_ts', 'user_actions(created_ts)'),
+    ('idx_generation_log_created_ts', 'generation_log(created_ts)'),
+    ('idx_scheduled_broadcasts_status_ts', 'scheduled_broadcasts(status, scheduled_ts)'),
+]
+
+
+def _to_epoch_sql(value: str) -> str:
+    # strftime('%s') понимает ISO-формат и CURRENT_TIMESTAMP; для нераспознанных строк даёт NULL
+    return f"CAST(strftime('%s', replace({value}, ' UTC', '')) AS INTEGER)"
+
+
+async def upgrade(conn: aiosqlite.Connection) -> None:
+    for table, source, target in EPOCH_COLUMNS:
+        cursor = await conn.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in await cursor.fetchall()}
+        if target not in columns:
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {target} INTEGER")
+        if source not in columns:
+            # Очень старые базы: столбца с датой нет, *_ts останется пустым
+            logger.warning(f"В таблице {table} нет столбца {source}, {target} не заполняется")
+            continue
+        await conn.execute(f"UPDATE {table} SET {target} = {_to_epoch_sql(source)}")
+
+        # AFTER-триггеры: SQLite не даёт менять NEW в BEFORE INSERT
+        await conn.execute(f'''CREATE TRIGGER IF NOT EXISTS sync_{table}_{target}_insert
+                               AFTER INSERT ON {table}
+                               FOR EACH ROW
+                               BEGIN
+                                   UPDATE {table}
+                                   SET {target} = {_to_epoch_sql(f'NEW.{source}')}
+                                   WHERE rowid = NEW.rowid;
+                               END;''')
+        await conn.execute(f'''CREATE TRIGGER IF NOT EXISTS sync_{table}_{target}_update
+                               AFTER UPDATE OF {source} ON {table}
+                               FOR EACH ROW
+                               BEGIN
+                                   UPDATE {table}
+                                   SET {target} = {_to_epoch_sql(f'NEW.{source}')}
+                                   WHERE rowid = NEW.rowid;
+                               END;''')
+
+    for index_name, index_def in INDEXES:
+        await conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_def}')
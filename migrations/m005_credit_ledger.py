@@ -0,0 +1,46 @@
+# migrations/m005_credit_ledger.py
+"""Журнал движения баланса (credit_ledger) и резервы ресурсов под задачи.
+
+credit_ledger только дополняется: каждое изменение generations_left/avatar_left
+записывается строкой с дельтой и остатком после неё. credit_reservations
+хранит списанные под задачу ресурсы до подтверждения или возврата.
+"""
+import aiosqlite
+
+
+async def upgrade(conn: aiosqlite.Connection) -> None:
+    await conn.execute('''CREATE TABLE IF NOT EXISTS credit_ledger (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id INTEGER NOT NULL,
+                            resource TEXT NOT NULL,
+                            delta INTEGER NOT NULL,
+                            balance_after INTEGER NOT NULL,
+                            reason TEXT NOT NULL,
+                            ref TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                         )''')
+    await conn.execute('''CREATE TABLE IF NOT EXISTS credit_reservations (
+                            job_id TEXT PRIMARY KEY,
+                            user_id INTEGER NOT NULL,
+                            resource TEXT NOT NULL,
+                            amount INTEGER NOT NULL,
+                            status TEXT NOT NULL DEFAULT 'held',
+                            expires_ts INTEGER NOT NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            settled_at TIMESTAMP
+                         )''')
+
+    indices = [
+        ('idx_credit_ledger_user', 'credit_ledger(user_id, id)'),
+        ('idx_credit_ledger_ref', 'credit_ledger(ref)'),
+        ('idx_credit_reservations_status_expires', 'credit_reservations(status, expires_ts)'),
+    ]
+    for index_name, index_def in indices:
+        await conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_def}')
+
+    for event in ('UPDATE', 'DELETE'):
+        await conn.execute(f'''CREATE TRIGGER IF NOT EXISTS credit_ledger_no_{event.lower()}
+                               BEFORE {event} ON credit_ledger
+                               BEGIN
+                                   SELECT RAISE(ABORT, 'credit_ledger только дополняется');
+                               END;''')
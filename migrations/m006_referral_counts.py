@@ -0,0 +1,46 @@
+# migrations/m006_referral_counts.py
+"""Счётчик приглашённых на реферера (referral_counts), ведётся триггерами referrals.
+
+referral_stats.total_referrals считает только начисленные бонусы, а лимит
+приглашений в /start раньше пересчитывался по всем действиям use_referral.
+Счётчик меняется в той же транзакции, что и запись в referrals.
+"""
+import aiosqlite
+
+
+async def upgrade(conn: aiosqlite.Connection) -> None:
+    await conn.execute('''CREATE TABLE IF NOT EXISTS referral_counts (
+                            referrer_id INTEGER PRIMARY KEY,
+                            referral_count INTEGER NOT NULL DEFAULT 0
+                         )''')
+    await conn.execute('''INSERT OR REPLACE INTO referral_counts (referrer_id, referral_count)
+                          SELECT referrer_id, COUNT(*) FROM referrals GROUP BY referrer_id''')
+
+    await conn.execute('''CREATE TRIGGER IF NOT EXISTS referral_counts_insert
+                          AFTER INSERT ON referrals
+                          FOR EACH ROW
+                          BEGIN
+                              INSERT INTO referral_counts (referrer_id, referral_count)
+                              VALUES (NEW.referrer_id, 1)
+                              ON CONFLICT(referrer_id) DO UPDATE SET referral_count = referral_count + 1;
+                          END;''')
+    await conn.execute('''CREATE TRIGGER IF NOT EXISTS referral_counts_delete
+                          AFTER DELETE ON referrals
+                          FOR EACH ROW
+                          BEGIN
+                              UPDATE referral_counts
+                              SET referral_count = referral_count - 1
+                              WHERE referrer_id = OLD.referrer_id;
+                          END;''')
+    await conn.execute('''CREATE TRIGGER IF NOT EXISTS referral_counts_update
+                          AFTER UPDATE OF referrer_id ON referrals
+                          FOR EACH ROW
+                          WHEN OLD.referrer_id != NEW.referrer_id
+                          BEGIN
+                              UPDATE referral_counts
+                              SET referral_count = referral_count - 1
+                              WHERE referrer_id = OLD.referrer_id;
+                              INSERT INTO referral_counts (referrer_id, referral_count)
+                              VALUES (NEW.referrer_id, 1)
+                              ON CONFLICT(referrer_id) DO UPDATE SET referral_count = referral_count + 1;
+                          END;''')
@@ -0,0 +1,93 @@
+# migrations/runner.py
+"""Версионные миграции схемы SQLite.
+
+Каждая миграция - модуль migrations/mNNN_<имя>.py с корутиной upgrade(conn).
+Номер берётся из имени файла, применённые версии записываются в таблицу
+schema_version. Миграция и запись её версии выполняются в одной транзакции:
+при ошибке база остаётся на предыдущей версии, а запуск бота прерывается.
+"""
+import importlib
+import pkgutil
+import re
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+import aiosqlite
+
+from logger import get_logger
+logger = get_logger('database')
+
+_MODULE_NAME = re.compile(r'^m(\d{3})_(\w+)$')
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    description: str
+    upgrade: Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+def discover_migrations(package: str = 'migrations') -> List[Migration]:
+    """Миграции пакета по возрастанию версии; повтор номера - ошибка разработки."""
+    module = importlib.import_module(package)
+    migrations = []
+    for info in pkgutil.iter_modules(module.__path__):
+        match = _MODULE_NAME.match(info.name)
+        if not match:
+            continue
+        migration_module = importlib.import_module(f"{package}.{info.name}")
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            description=(migration_module.__doc__ or '').strip().split('\n')[0],
+            upgrade=migration_module.upgrade,
+        ))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Повторяющиеся номера миграций в {package}: {versions}")
+    return migrations
+
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    await conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            name TEXT NOT NULL,
+                            applied_at TEXT NOT NULL
+                         )''')
+    cursor = await conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return (await cursor.fetchone())[0]
+
+
+async def apply_migrations(db_path: str, migrations: Optional[List[Migration]] = None) -> List[int]:
+    """Применяет недостающие миграции по порядку и возвращает их версии."""
+    migrations = discover_migrations() if migrations is None else migrations
+    applied = []
+    # isolation_level=None: транзакциями управляем сами, DDL миграции и запись версии коммитятся вместе
+    async with aiosqlite.connect(db_path, timeout=30, isolation_level=None) as conn:
+        await conn.execute("PRAGMA busy_timeout = 30000")
+        current = await get_schema_version(conn)
+        pending = [migration for migration in migrations if migration.version > current]
+        if not pending:
+            logger.info(f"Схема базы актуальна: версия {current}")
+            return applied
+
+        for migration in pending:
+            started = time.perf_counter()
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await migration.upgrade(conn)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (migration.version, migration.name, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                await conn.execute("COMMIT")
+            except Exception:
+                await conn.execute("ROLLBACK")
+                logger.error(f"Миграция {migration.version:03d}_{migration.name} не применена, откат", exc_info=True)
+                raise
+            applied.append(migration.version)
+            logger.info(f"Применена миграция {migration.version:03d}_{migration.name} "
+                        f"({migration.description}) за {(time.perf_counter() - started) * 1000:.0f} мс")
+    return applied
@@ -0,0 +1,159 @@
+# profiler.py
+"""Сэмплирующий профилировщик процесса, включаемый на время из админ-панели.
+
+Фоновый поток раз в interval секунд снимает стеки всех потоков через sys._current_frames.
+Стек потока цикла событий - это корутина, которая сейчас выполняется (await раскрывается
+в цепочку кадров), поэтому отдельного инструмента для asyncio не нужно. Ожидание в
+селекторе цикла и в очередях пулов считается простоем и в сводку функций не попадает.
+
+Результат - свёрнутые стеки (формат flamegraph.pl / speedscope / inferno: "кадр;кадр;... N")
+и текстовая сводка самых частых функций по собственному и полному времени.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from logger import get_logger
+logger = get_logger('main')
+
+DEFAULT_INTERVAL_SECONDS = 0.01
+MAX_PROFILE_SECONDS = 300
+# Кадры, на которых поток ничего не делает (ждёт ввода-вывода или задач)
+IDLE_FUNCTIONS = frozenset({
+    ('selectors.py', 'select'), ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'), ('thread.py', '_worker'), ('handlers.py', 'dequeue'),
+})
+
+_running_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FUNCTIONS
+
+
+class ProfileResult:
+    def __init__(self, stacks: Counter, samples: int, idle_samples: int, seconds: float, interval: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.idle_samples = idle_samples
+        self.seconds = seconds
+        self.interval = interval
+
+    def collapsed(self) -> str:
+        """Свёрнутые стеки: корень слева, через ';', в конце число сэмплов."""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 30) -> List[Tuple[str, int, int]]:
+        """(функция, собственные сэмплы, сэмплы с вложенными вызовами) по убыванию собственных."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        rows = [(label, own[label], total[label]) for label in total]
+        rows.sort(key=lambda row: (row[1], row[2]), reverse=True)
+        return rows[:limit]
+
+    def summary(self, limit: int = 30) -> str:
+        busy = self.samples - self.idle_samples
+        lines = [
+            f"Профиль за {self.seconds:.1f} с, интервал {self.interval * 1000:.0f} мс",
+            f"Сэмплов: {self.samples}, из них простой: {self.idle_samples}, работа: {busy}",
+            "",
+            f"{'собств.':>8} {'%':>6} {'всего':>8} {'%':>6}  функция",
+        ]
+        for label, own, total in self.top_functions(limit):
+            lines.append(
+                f"{own:>8} {own / busy * 100 if busy else 0:>5.1f}% "
+                f"{total:>8} {total / busy * 100 if busy else 0:>5.1f}%  {label}"
+            )
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Поток, который раз в interval секунд снимает стеки потоков процесса."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._thread_names: Dict[int, str] = {}
+
+    def _sample(self) -> None:
+        own_ident = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if _is_idle(frame):
+                self.idle_samples += 1
+                self.samples += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            name = self._thread_names.get(ident)
+            if name is None:
+                self._refresh_thread_names()
+                name = self._thread_names.get(ident, str(ident))
+            stack.append(name)
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def _refresh_thread_names(self) -> None:
+        self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+    def _run(self) -> None:
+        self._refresh_thread_names()
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return ProfileResult(self.stacks, self.samples, self.idle_samples,
+                             time.perf_counter() - self._started, self.interval)
+
+
+def is_profiling() -> bool:
+    return _running_lock.locked()
+
+
+async def profile_for(seconds: float, interval: float = DEFAULT_INTERVAL_SECONDS) -> ProfileResult:
+    """Профилирует процесс seconds секунд, не блокируя цикл событий. Одновременно - только один профиль."""
+    if not _running_lock.acquire(blocking=False):
+        raise RuntimeError("Профилирование уже идёт")
+    try:
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        profiler = SamplingProfiler(interval)
+        logger.info(f"Запущен сэмплирующий профилировщик на {seconds} с (интервал {interval * 1000:.0f} мс)")
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            result = profiler.stop()
+        logger.info(f"Профилирование завершено: {result.samples} сэмплов, {len(result.stacks)} уникальных стеков")
+        return result
+    finally:
+        _running_lock.release()
@@ -0,0 +1,248 @@
+# progress_service.py
+"""Единый сервис прогресс-сообщений долгих задач (фото-преображение, видео, обучение).
+
+Вместо цикла или четырёх спящих задач на каждую задачу - одно колесо таймеров
+с шагом TICK_SECONDS. Каждая задача хранит своё прогресс-сообщение: первый рендер
+отправляет его, следующие - редактируют. Одинаковый текст повторно не отправляется,
+за один тик рендерится не больше MAX_RENDERS_PER_TICK задач, остальные сдвигаются
+на следующий тик. Все правки идут в полосе PROGRESS шлюза исходящих сообщений.
+Завершение задачи снимает её за O(1).
+"""
+import asyncio
+import inspect
+import math
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from telegram_gateway import outbound_lane, Lane
+
+from logger import get_logger
+logger = get_logger('main')
+
+TICK_SECONDS = 1.0
+WHEEL_SIZE = 512
+MAX_RENDERS_PER_TICK = 25
+
+# render(elapsed_seconds) -> текст или None (ничего не показывать)
+Renderer = Callable[[float], Union[Optional[str], Awaitable[Optional[str]]]]
+
+
+class _ProgressJob:
+    __slots__ = ('key', 'bot', 'chat_id', 'render', 'message_id', 'parse_mode', 'offsets', 'interval',
+                 'expire_after', 'on_expire', 'started_tick', 'renders', 'due_tick', 'last_text')
+
+    def __init__(self, key: Hashable, bot: Bot, chat_id: int, render: Renderer, message_id: Optional[int],
+                 parse_mode: Optional[str], offsets: Optional[Sequence[float]], interval: Optional[float],
+                 expire_after: Optional[float], on_expire: Optional[Callable[[], Awaitable[Any]]], started_tick: int):
+        self.key = key
+        self.bot = bot
+        self.chat_id = chat_id
+        self.render = render
+        self.message_id = message_id
+        self.parse_mode = parse_mode
+        self.offsets = sorted(offsets) if offsets is not None else None
+        self.interval = interval
+        self.expire_after = expire_after
+        self.on_expire = on_expire
+        self.started_tick = started_tick
+        self.renders = 0
+        self.due_tick = started_tick
+        self.last_text: Optional[str] = None
+
+
+class ProgressService:
+    """Колесо таймеров для прогресс-сообщений."""
+    def __init__(self, tick: float = TICK_SECONDS, wheel_size: int = WHEEL_SIZE,
+                 max_renders_per_tick: int = MAX_RENDERS_PER_TICK):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.max_renders_per_tick = max_renders_per_tick
+        self._wheel: List[Set[Hashable]] = [set() for _ in range(wheel_size)]
+        self._jobs: Dict[Hashable, _ProgressJob] = {}
+        self._current_tick = 0
+        self._task: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        self.stats = {'rendered': 0, 'skipped_unchanged': 0, 'deferred': 0, 'expired': 0, 'cancelled': 0}
+
+    # --- публичный API ---
+
+    def start(self, key: Hashable, bot: Bot, chat_id: int, render: Renderer, *,
+              message_id: Optional[int] = None, parse_mode: Optional[str] = None,
+              offsets: Optional[Sequence[float]] = None, interval: Optional[float] = None,
+              expire_after: Optional[float] = None,
+              on_expire: Optional[Callable[[], Awaitable[Any]]] = None) -> None:
+        """Регистрирует задачу.
+
+        offsets - моменты рендера в секундах от старта, interval - период рендера.
+        message_id - существующее сообщение для правки; без него первый рендер отправит новое.
+        expire_after - через сколько секунд задача снимается (и вызывается on_expire).
+        """
+        self.cancel(key)
+        self._ensure_running()
+        job = _ProgressJob(key, bot, chat_id, render, message_id, parse_mode, offsets, interval,
+                           expire_after, on_expire, self._current_tick)
+        if not self._schedule_next(job):
+            return
+        self._jobs[key] = job
+
+    def cancel(self, key: Hashable) -> bool:
+        """Снимает задачу (например, по завершении генерации). O(1)."""
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return False
+        self._wheel[job.due_tick % self.wheel_size].discard(key)
+        self.stats['cancelled'] += 1
+        return True
+
+    def is_active(self, key: Hashable) -> bool:
+        return key in self._jobs
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, 'active_jobs': len(self._jobs)}
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # --- колесо ---
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="progress_service")
+
+    def _to_ticks(self, seconds: float) -> int:
+        return max(1, math.ceil(seconds / self.tick))
+
+    def _next_offset(self, job: _ProgressJob) -> Optional[float]:
+        """Следующий момент рендера (секунды от старта) или None, если рендеров больше нет."""
+        if job.offsets is not None:
+            return job.offsets[job.renders] if job.renders < len(job.offsets) else None
+        if job.interval:
+            candidate = job.renders * job.interval
+            if job.expire_after is None or candidate < job.expire_after:
+                return candidate
+        return None
+
+    def _schedule_next(self, job: _ProgressJob) -> bool:
+        offset = self._next_offset(job)
+        if offset is None:
+            if job.expire_after is None:
+                return False
+            offset = max(job.expire_after, (self._current_tick - job.started_tick) * self.tick)
+        due = job.started_tick + (self._to_ticks(offset) if offset > 0 else 0)
+        job.due_tick = max(due, self._current_tick + 1)
+        self._wheel[job.due_tick % self.wheel_size].add(job.key)
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while True:
+            next_at += self.tick
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            self._current_tick += 1
+            try:
+                self._advance()
+            except Exception as e:
+                logger.error(f"Ошибка колеса прогресса: {e}", exc_info=True)
+
+    def _advance(self) -> None:
+        slot = self._wheel[self._current_tick % self.wheel_size]
+        if not slot:
+            return
+        due: List[_ProgressJob] = []
+        for key in list(slot):
+            job = self._jobs.get(key)
+            if job is None:
+                slot.discard(key)
+                continue
+            if job.due_tick > self._current_tick:
+                continue  # следующий оборот колеса
+            slot.discard(key)
+            due.append(job)
+
+        for job in due[self.max_renders_per_tick:]:
+            # Бюджет тика исчерпан: сдвигаем на следующий тик
+            self.stats['deferred'] += 1
+            job.due_tick = self._current_tick + 1
+            self._wheel[job.due_tick % self.wheel_size].add(job.key)
+        batch = due[:self.max_renders_per_tick]
+        if batch:
+            # Рендер идёт отдельной задачей, чтобы медленная отправка не сбивала тики колеса
+            task = asyncio.create_task(self._process(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _process(self, batch: List[_ProgressJob]) -> None:
+        with outbound_lane(Lane.PROGRESS):
+            await asyncio.gather(*(self._process_job(job) for job in batch), return_exceptions=True)
+
+    async def _process_job(self, job: _ProgressJob) -> None:
+        if self._jobs.get(job.key) is not job:
+            return
+        if self._next_offset(job) is None:
+            self._jobs.pop(job.key, None)
+            self.stats['expired'] += 1
+            if job.on_expire is not None:
+                try:
+                    await job.on_expire()
+                except Exception as e:
+                    logger.error(f"Ошибка завершения прогресса {job.key}: {e}", exc_info=True)
+            return
+
+        elapsed = (self._current_tick - job.started_tick) * self.tick
+        alive = True
+        try:
+            text = job.render(elapsed)
+            if inspect.isawaitable(text):
+                text = await text
+            if text and text != job.last_text:
+                alive = await self._show(job, text)
+                job.last_text = text
+                self.stats['rendered'] += 1
+            else:
+                self.stats['skipped_unchanged'] += 1
+        except Exception as e:
+            logger.error(f"Ошибка рендера прогресса {job.key}: {e}", exc_info=True)
+        finally:
+            job.renders += 1
+
+        if self._jobs.get(job.key) is not job:
+            return
+        if not alive or not self._schedule_next(job):
+            self._jobs.pop(job.key, None)
+
+    async def _show(self, job: _ProgressJob, text: str) -> bool:
+        """Отправляет или редактирует прогресс-сообщение. False - сообщение больше недоступно."""
+        parse_mode = job.parse_mode
+        for _ in range(2):
+            try:
+                if job.message_id is None:
+                    message = await job.bot.send_message(job.chat_id, text, parse_mode=parse_mode)
+                    job.message_id = message.message_id
+                else:
+                    await job.bot.edit_message_text(
+                        text=text, chat_id=job.chat_id, message_id=job.message_id, parse_mode=parse_mode
+                    )
+                return True
+            except TelegramBadRequest as e:
+                error = str(e).lower()
+                if "message is not modified" in error:
+                    return True
+                if "can't parse entities" in error and parse_mode is not None:
+                    parse_mode = None
+                    continue
+                if "message to edit not found" in error or "message can't be edited" in error:
+                    return False
+                logger.debug(f"Не удалось обновить прогресс {job.key}: {e}")
+                return True
+            except TelegramForbiddenError:
+                return False
+        return True
+
+
+progress_service = ProgressService()
@@ -1,27 +1,58 @@
 import redis.asyncio as redis
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
+
+from metrics import CACHE_REQUESTS
+from tracing import span
+
+
+def create_redis_client(url: Optional[str]) -> Optional[redis.Redis]:
+    """Создаёт асинхронный клиент Redis по URL или возвращает None, если URL не задан."""
+    if not url:
+        return None
+    return redis.from_url(url)
+
+
+def _as_client(redis_client: Union[redis.Redis, str, None]) -> Optional[redis.Redis]:
+    """Принимает готовый клиент или URL (как REDIS из config)."""
+    if isinstance(redis_client, str) or redis_client is None:
+        return create_redis_client(redis_client)
+    return redis_client
+
 
 class RedisCacheBase:
-    """Базовый класс для всех кэшей с общими методами."""
-    def __init__(self, redis_client: redis.Redis, prefix: str, ttl: int = 300):
-        self.redis = redis_client
+    """Базовый класс для всех кэшей с общими методами.
+
+    Без Redis (REDIS_URL не задан) кэш работает как всегда пустой.
+    """
+    def __init__(self, redis_client: Union[redis.Redis, str, None], prefix: str, ttl: int = 300):
+        self.redis = _as_client(redis_client)
         self.prefix = prefix  # Например, "user", "model", "cooldown"
         self.ttl = ttl
 
-    async def get(self, entity_id: int) -> Optional[Dict[str, Any]]:
-        raw = await self.redis.get(f"{self.prefix}:{entity_id}")
+    async def get(self, entity_id: Union[int, str]) -> Optional[Dict[str, Any]]:
+        if self.redis is None:
+            return None
+        with span('redis', f"{self.prefix}.get"):
+            raw = await self.redis.get(f"{self.prefix}:{entity_id}")
+        CACHE_REQUESTS.inc(prefix=self.prefix, result='hit' if raw else 'miss')
         return json.loads(raw) if raw else None
 
-    async def set(self, entity_id: int, data: Dict[str, Any]):
-        await self.redis.set(
-            f"{self.prefix}:{entity_id}", 
-            json.dumps(data), 
-            ex=self.ttl
-        )
+    async def set(self, entity_id: Union[int, str], data: Dict[str, Any], ttl: Optional[int] = None):
+        if self.redis is None:
+            return
+        with span('redis', f"{self.prefix}.set"):
+            await self.redis.set(
+                f"{self.prefix}:{entity_id}",
+                json.dumps(data),
+                ex=ttl or self.ttl
+            )
 
-    async def delete(self, entity_id: int):
-        await self.redis.delete(f"{self.prefix}:{entity_id}")
+    async def delete(self, entity_id: Union[int, str]):
+        if self.redis is None:
+            return
+        with span('redis', f"{self.prefix}.delete"):
+            await self.redis.delete(f"{self.prefix}:{entity_id}")
 
 
 class RedisUserCache(RedisCacheBase):
@@ -38,18 +69,30 @@ class RedisActiveModelCache(RedisCacheBase):
 
 class RedisUserCooldown:
     """Кэш кулдаунов (можно было бы через RedisCacheBase, но тут логика особенная)."""
-    def __init__(self, redis_client: redis.Redis, cooldown_seconds: int):
-        self.redis = redis_client
+    def __init__(self, redis_client: Union[redis.Redis, str, None], cooldown_seconds: int):
+        self.redis = _as_client(redis_client)
         self.cooldown = cooldown_seconds
 
     async def is_on_cooldown(self, user_id: int) -> bool:
-        return await self.redis.exists(f"cooldown:{user_id}") == 1
+        if self.redis is None:
+            return False
+        with span('redis', 'cooldown.exists'):
+            return await self.redis.exists(f"cooldown:{user_id}") == 1
 
     async def set_cooldown(self, user_id: int):
-        await self.redis.set(f"cooldown:{user_id}", "1", ex=self.cooldown)
+        if self.redis is None:
+            return
+        with span('redis', 'cooldown.set'):
+            await self.redis.set(f"cooldown:{user_id}", "1", ex=self.cooldown)
 
 
 class RedisGenParamsCache(RedisCacheBase):
     """Кэш параметров генерации."""
     def __init__(self, redis_client: redis.Redis, ttl: int = 300):
-        super().__init__(redis_client, "params", ttl)
\ No newline at end of file
+        super().__init__(redis_client, "params", ttl)
+
+
+class RedisUploadCache(RedisCacheBase):
+    """Кэш загрузок в Replicate: sha256 содержимого -> URL и срок его жизни."""
+    def __init__(self, redis_client: Union[redis.Redis, str, None], ttl: int = 3600):
+        super().__init__(redis_client, "upload", ttl)
@@ -0,0 +1,343 @@
+# telegram_gateway.py
+"""Единый шлюз исходящих запросов к Telegram.
+
+Подключается как request-middleware сессии бота, поэтому через него проходят все
+отправки: send_message_with_fallback, send_photo_with_retry, рассылки, edit_text
+прогресса и прямые вызовы bot.send_*.
+
+- глобальный лимит (~30/с) и лимит на чат (~1/с с небольшим всплеском) - token bucket;
+- полосы приоритета: ответы пользователю > результаты генерации > правки прогресса > рассылки.
+  Рассылки к тому же ограничены долей глобального лимита и не вытесняют интерактив;
+- устаревшие правки прогресса одного сообщения схлопываются: уходит только последняя;
+- TelegramRetryAfter обрабатывается здесь: чат ставится на паузу, запрос повторяется.
+
+Полоса задаётся контекстом вызывающего кода: ``with outbound_lane(Lane.BROADCAST): ...``.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from functools import wraps
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from metrics import OUTBOUND_REQUESTS
+from tracing import span
+
+from logger import get_logger
+logger = get_logger('main')
+
+MAX_RETRY_AFTER_ATTEMPTS = 3
+# Сколько заявок полосы просматривается в поисках чата, который уже можно обслужить
+_SCAN_LIMIT = 64
+# Бакеты чатов, простаивающие дольше этого, удаляются
+_CHAT_IDLE_SECONDS = 60.0
+
+_THROTTLED_PREFIXES = ('Send', 'Edit', 'Copy', 'Forward')
+_EDIT_METHODS = ('EditMessageText', 'EditMessageCaption', 'EditMessageReplyMarkup', 'EditMessageMedia')
+
+
+class Lane(IntEnum):
+    """Полосы приоритета: меньше значение - выше приоритет."""
+    INTERACTIVE = 0
+    RESULTS = 1
+    PROGRESS = 2
+    BROADCAST = 3
+
+
+_current_lane: ContextVar[Lane] = ContextVar('outbound_lane', default=Lane.INTERACTIVE)
+
+
+@contextmanager
+def outbound_lane(lane: Lane):
+    """Отправки внутри блока (и в созданных из него задачах) идут в указанной полосе."""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def in_lane(lane: Lane):
+    """Декоратор: все отправки корутины идут в указанной полосе."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with outbound_lane(lane):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TokenBucket:
+    """Token bucket; take() может уйти в минус - долг отрабатывается ожиданием."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен хотя бы один токен."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float, cost: float = 1.0) -> None:
+        self._refill(now)
+        self.tokens -= cost
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _Pending:
+    __slots__ = ('lane', 'chat_key', 'edit_key', 'cost', 'ticket', 'result')
+
+    def __init__(self, lane: Lane, chat_key: Hashable, edit_key: Optional[Tuple], cost: float,
+                 ticket: asyncio.Future, result: asyncio.Future):
+        self.lane = lane
+        self.chat_key = chat_key
+        self.edit_key = edit_key
+        self.cost = cost
+        # None - можно отправлять, _Pending - правку вытеснила более новая
+        self.ticket = ticket
+        self.result = result
+
+
+def _is_throttled(method: TelegramMethod) -> bool:
+    return type(method).__name__.startswith(_THROTTLED_PREFIXES) and getattr(method, 'chat_id', None) is not None
+
+
+def _cost(method: TelegramMethod) -> float:
+    media = getattr(method, 'media', None)
+    if type(method).__name__ == 'SendMediaGroup' and media:
+        return float(len(media))
+    return 1.0
+
+
+class OutboundGateway(BaseRequestMiddleware):
+    """Планировщик исходящих запросов с лимитами и приоритетами (request-middleware aiogram)."""
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: int = 3,
+                 broadcast_share: float = 0.6):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.broadcast_bucket = TokenBucket(global_rate * broadcast_share, max(1.0, global_rate * broadcast_share))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._lanes: Dict[Lane, Deque[_Pending]] = {lane: deque() for lane in Lane}
+        self._edits: Dict[Tuple, _Pending] = {}
+        self._chat_buckets: Dict[Hashable, TokenBucket] = {}
+        self._chat_paused_until: Dict[Hashable, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = time.monotonic()
+        self.stats: Dict[str, Any] = {
+            'sent': {lane.name.lower(): 0 for lane in Lane},
+            'coalesced': 0,
+            'retry_after': 0,
+        }
+
+    # --- middleware ---
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        with span('telegram', type(method).__name__):
+            return await self._send(make_request, bot, method)
+
+    async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        if not _is_throttled(method):
+            return await make_request(bot, method)
+
+        self._ensure_running()
+        loop = asyncio.get_running_loop()
+        lane = _current_lane.get()
+        chat_key = method.chat_id
+        edit_key = None
+        if lane >= Lane.PROGRESS and type(method).__name__ in _EDIT_METHODS and getattr(method, 'message_id', None):
+            edit_key = (chat_key, method.message_id, type(method).__name__)
+        result: asyncio.Future = loop.create_future()
+
+        try:
+            for attempt in range(1, MAX_RETRY_AFTER_ATTEMPTS + 1):
+                pending = _Pending(lane, chat_key, edit_key, _cost(method), loop.create_future(), result)
+                self._enqueue(pending)
+                try:
+                    newer = await pending.ticket
+                except asyncio.CancelledError:
+                    if not pending.ticket.done():
+                        pending.ticket.cancel()
+                    raise
+                if newer is not None:
+                    self.stats['coalesced'] += 1
+                    # По цепочке: нашу правку может ждать ещё более старая
+                    response = await asyncio.shield(newer.result)
+                    result.set_result(response)
+                    return response
+
+                try:
+                    response = await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    self.stats['retry_after'] += 1
+                    self._pause_chat(chat_key, e.retry_after)
+                    if attempt == MAX_RETRY_AFTER_ATTEMPTS:
+                        raise
+                    logger.warning(f"Flood control для чата {chat_key}: пауза {e.retry_after} с "
+                                   f"(попытка {attempt}/{MAX_RETRY_AFTER_ATTEMPTS})")
+                    continue
+                except Exception:
+                    OUTBOUND_REQUESTS.inc(lane=lane.name.lower(), result='error')
+                    raise
+                self.stats['sent'][lane.name.lower()] += 1
+                OUTBOUND_REQUESTS.inc(lane=lane.name.lower(), result='sent')
+                result.set_result(response)
+                return response
+        except BaseException as e:
+            if not result.done():
+                if isinstance(e, Exception):
+                    result.set_exception(e)
+                    # Исключение уже получил вызывающий; схлопнутых ожидающих может не быть
+                    result.exception()
+                else:
+                    result.cancel()
+            raise
+
+    # --- очередь ---
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="outbound_gateway")
+
+    def _enqueue(self, pending: _Pending) -> None:
+        if pending.edit_key is not None:
+            older = self._edits.get(pending.edit_key)
+            if older is not None and not older.ticket.done():
+                # Старая правка ещё не ушла: её вызывающий получит результат новой
+                older.ticket.set_result(pending)
+            self._edits[pending.edit_key] = pending
+        self._lanes[pending.lane].append(pending)
+        self._wakeup.set()
+
+    def _pause_chat(self, chat_key: Hashable, seconds: float) -> None:
+        now = time.monotonic()
+        self._chat_paused_until[chat_key] = now + seconds
+        # Флуд-контроль обычно означает перегрев всего бота: притормаживаем и глобальный поток
+        self.global_bucket.drain(now)
+        self._wakeup.set()
+
+    def _chat_delay(self, chat_key: Hashable, now: float) -> float:
+        paused_until = self._chat_paused_until.get(chat_key)
+        if paused_until is not None:
+            if paused_until > now:
+                return paused_until - now
+            del self._chat_paused_until[chat_key]
+        bucket = self._chat_buckets.get(chat_key)
+        return bucket.delay(now) if bucket else 0.0
+
+    def _take_chat(self, chat_key: Hashable, now: float, cost: float) -> None:
+        bucket = self._chat_buckets.get(chat_key)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_key] = TokenBucket(self.chat_rate, self.chat_burst)
+        bucket.take(now, cost)
+
+    def _pick(self, now: float) -> Tuple[Optional[_Pending], Optional[float]]:
+        """Первая готовая к отправке заявка с учётом приоритета и минимальное ожидание, если таких нет."""
+        min_wait: Optional[float] = None
+        for lane, queue in self._lanes.items():
+            while queue and queue[0].ticket.done():
+                self._forget_edit(queue.popleft())
+            if not queue:
+                continue
+            lane_wait = self.broadcast_bucket.delay(now) if lane == Lane.BROADCAST else 0.0
+            if lane_wait > 0:
+                min_wait = lane_wait if min_wait is None else min(min_wait, lane_wait)
+                continue
+            for idx in range(min(len(queue), _SCAN_LIMIT)):
+                pending = queue[idx]
+                if pending.ticket.done():
+                    continue
+                wait = self._chat_delay(pending.chat_key, now)
+                if wait <= 0:
+                    del queue[idx]
+                    return pending, None
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    def _forget_edit(self, pending: _Pending) -> None:
+        if pending.edit_key is not None and self._edits.get(pending.edit_key) is pending:
+            del self._edits[pending.edit_key]
+
+    def _dispatch(self, now: float) -> Optional[float]:
+        """Выдаёт разрешения, пока позволяют лимиты. Возвращает, сколько ждать до следующей попытки."""
+        while any(self._lanes.values()):
+            global_wait = self.global_bucket.delay(now)
+            if global_wait > 0:
+                return global_wait
+            pending, wait = self._pick(now)
+            if pending is None:
+                return wait
+            self._forget_edit(pending)
+            self.global_bucket.take(now, pending.cost)
+            if pending.lane == Lane.BROADCAST:
+                self.broadcast_bucket.take(now, pending.cost)
+            self._take_chat(pending.chat_key, now, pending.cost)
+            pending.ticket.set_result(None)
+        return None
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < _CHAT_IDLE_SECONDS:
+            return
+        self._last_prune = now
+        for chat_key in [key for key, bucket in self._chat_buckets.items()
+                         if now - bucket.updated > _CHAT_IDLE_SECONDS]:
+            del self._chat_buckets[chat_key]
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            try:
+                wait = self._dispatch(now)
+                self._prune(now)
+            except Exception as e:
+                logger.error(f"Ошибка планировщика исходящих сообщений: {e}", exc_info=True)
+                wait = 0.1
+            self._wakeup.clear()
+            if wait is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'queued': {lane.name.lower(): len(queue) for lane, queue in self._lanes.items()},
+            'tracked_chats': len(self._chat_buckets),
+        }
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def install_outbound_gateway(bot: Bot, **kwargs) -> OutboundGateway:
+    """Подключает шлюз к сессии бота; все запросы бота начинают проходить через него."""
+    gateway = OutboundGateway(**kwargs)
+    bot.session.middleware(gateway)
+    return gateway
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from config import (
+    REDIS, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT, BOT_PRIMARY_INSTANCE,
+    UPDATE_QUEUE_MAXSIZE, UPDATE_WORKERS, UPDATE_DEDUP_TTL_SECONDS
+)
+from redis_caсhe import create_redis_client
+from metrics import CONTENT_TYPE, UPDATE_LATENCY, UPDATE_QUEUE_DEPTH, WEBHOOK_LATENCY, render_metrics
+
+from logger import get_logger
+logger = get_logger('main')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class UpdateDeduplicator:
+    """Отсекает повторные доставки обновлений Telegram по update_id.
+
+    Локальный LRU защищает отдельный процесс, Redis (SET NX EX) - все инстансы за одним ingress.
+    """
+    def __init__(self, redis_client=None, ttl: int = 3600, max_local: int = 100_000):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_local = max_local
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+    def _key(self, update_id: int) -> str:
+        return f"tg_update:{update_id}"
+
+    async def is_new(self, update_id: int) -> bool:
+        """Регистрирует update_id и возвращает True, если обновление пришло впервые."""
+        now = time.monotonic()
+        seen_at = self._seen.get(update_id)
+        if seen_at is not None and now - seen_at < self.ttl:
+            return False
+        self._seen[update_id] = now
+        self._seen.move_to_end(update_id)
+        while len(self._seen) > self.max_local:
+            self._seen.popitem(last=False)
+
+        if self.redis is None:
+            return True
+        try:
+            return bool(await self.redis.set(self._key(update_id), 1, nx=True, ex=self.ttl))
+        except Exception as e:
+            logger.warning(f"Redis недоступен для дедупликации update_id={update_id}: {e}")
+            return True
+
+    async def release(self, update_id: int) -> None:
+        """Снимает отметку, чтобы повторная доставка от Telegram была принята."""
+        self._seen.pop(update_id, None)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self._key(update_id))
+        except Exception as e:
+            logger.warning(f"Не удалось снять отметку update_id={update_id} в Redis: {e}")
+
+
+class UpdateIngestor:
+    """Ограниченная очередь обновлений с пулом воркеров, передающих их в Dispatcher."""
+    def __init__(self, bot: Bot, dp: Dispatcher, maxsize: int = 1000, workers: int = 32):
+        self.bot = bot
+        self.dp = dp
+        self.workers_count = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._workers: List[asyncio.Task] = []
+        self.stats = {'accepted': 0, 'duplicates': 0, 'rejected': 0, 'processed': 0, 'failed': 0}
+        UPDATE_QUEUE_DEPTH.set_function(self.queue.qsize)
+
+    async def start(self) -> None:
+        for idx in range(self.workers_count):
+            self._workers.append(asyncio.create_task(self._worker(idx), name=f"update_worker_{idx}"))
+        logger.info(f"Запущено {self.workers_count} воркеров обработки обновлений (очередь {self.queue.maxsize})")
+
+    def submit(self, update: Update) -> bool:
+        """Ставит обновление в очередь. False - очередь переполнена."""
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return False
+        self.stats['accepted'] += 1
+        return True
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            update = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Воркер {idx}: ошибка обработки update_id={update.update_id}: {e}", exc_info=True)
+            finally:
+                UPDATE_LATENCY.observe(time.perf_counter() - started)
+                self.queue.task_done()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Дожидается обработки очереди (не дольше drain_timeout) и останавливает воркеров."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не успели обработать {self.queue.qsize()} обновлений до остановки")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'queue_size': self.queue.qsize(), 'queue_maxsize': self.queue.maxsize,
+                'workers': self.workers_count}
+
+
+async def handle_telegram_update(request: web.Request) -> web.Response:
+    """Принимает обновление Telegram; время ответа - в метрике bot_webhook_request_seconds."""
+    started = time.perf_counter()
+    response = await _accept_telegram_update(request)
+    WEBHOOK_LATENCY.observe(time.perf_counter() - started, status=response.status)
+    return response
+
+
+async def _accept_telegram_update(request: web.Request) -> web.Response:
+    """Проверка секрета, дедупликация, постановка в очередь."""
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != TELEGRAM_WEBHOOK_SECRET:
+        logger.warning(f"Вебхук Telegram с неверным секретом от {request.remote}")
+        return web.Response(status=401)
+
+    ingestor: UpdateIngestor = request.app['ingestor']
+    deduplicator: UpdateDeduplicator = request.app['deduplicator']
+
+    try:
+        data = await request.json()
+        update = Update.model_validate(data, context={'bot': ingestor.bot})
+    except Exception as e:
+        logger.error(f"Некорректное обновление Telegram: {e}")
+        # 200, чтобы Telegram не повторял заведомо битое обновление
+        return web.Response(status=200)
+
+    if not await deduplicator.is_new(update.update_id):
+        ingestor.stats['duplicates'] += 1
+        logger.debug(f"Повторная доставка update_id={update.update_id} пропущена")
+        return web.Response(status=200)
+
+    if not ingestor.submit(update):
+        # Очередь переполнена: отдаём 503, Telegram повторит доставку позже
+        await deduplicator.release(update.update_id)
+        logger.warning(f"Очередь обновлений переполнена, update_id={update.update_id} отклонён")
+        return web.Response(status=503, headers={'Retry-After': '1'})
+
+    return web.Response(status=200)
+
+
+async def handle_ingest_health(request: web.Request) -> web.Response:
+    """Состояние очереди обновлений инстанса."""
+    return web.json_response({'status': 'ok', **request.app['ingestor'].get_stats()})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Метрики процесса в формате Prometheus."""
+    return web.Response(body=render_metrics().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+def create_webhook_app(ingestor: UpdateIngestor, deduplicator: UpdateDeduplicator) -> web.Application:
+    app = web.Application()
+    app['ingestor'] = ingestor
+    app['deduplicator'] = deduplicator
+    app.router.add_post(TELEGRAM_WEBHOOK_PATH, handle_telegram_update)
+    app.router.add_get(f"{TELEGRAM_WEBHOOK_PATH.rstrip('/')}/health", handle_ingest_health)
+    app.router.add_get('/metrics', handle_metrics)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates: Optional[List[str]] = None) -> None:
+    """Запускает приём обновлений через вебхук и блокируется до отмены.
+
+    Несколько процессов могут слушать один порт (SO_REUSEPORT) или стоять за общим ingress;
+    состояние FSM при этом должно храниться в Redis.
+    """
+    redis_client = create_redis_client(REDIS)
+    if redis_client is None:
+        logger.warning("REDIS_URL не задан: дедупликация обновлений работает только внутри процесса")
+
+    deduplicator = UpdateDeduplicator(redis_client, ttl=UPDATE_DEDUP_TTL_SECONDS)
+    ingestor = UpdateIngestor(bot, dp, maxsize=UPDATE_QUEUE_MAXSIZE, workers=UPDATE_WORKERS)
+    runner = web.AppRunner(create_webhook_app(ingestor, deduplicator))
+    await runner.setup()
+    site = web.TCPSite(runner, TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT, reuse_port=True)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await ingestor.start()
+    await site.start()
+    logger.info(f"Приём обновлений Telegram на {TELEGRAM_WEBHOOK_HOST}:{TELEGRAM_WEBHOOK_PORT}{TELEGRAM_WEBHOOK_PATH}")
+
+    if BOT_PRIMARY_INSTANCE:
+        if not TELEGRAM_WEBHOOK_URL:
+            raise RuntimeError("TELEGRAM_WEBHOOK_URL не задан для режима webhook")
+        await bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL,
+            secret_token=TELEGRAM_WEBHOOK_SECRET or None,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=False
+        )
+        logger.info(f"Вебхук Telegram зарегистрирован: {TELEGRAM_WEBHOOK_URL}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Вебхук не удаляем: обновления копятся у Telegram и будут доставлены после рестарта
+        await site.stop()
+        await ingestor.stop()
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        if redis_client is not None:
+            await redis_client.aclose()
+        logger.info(f"Приём обновлений остановлен: {ingestor.get_stats()}")
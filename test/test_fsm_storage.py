@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+for _name, _value in (('TELEGRAM_BOT_TOKEN', '123:abc'), ('REPLICATE_API_TOKEN', 'x'),
+                      ('YOOKASSA_SHOP_ID', 'x'), ('YOOKASSA_SECRET_KEY', 'x')):
+    os.environ.setdefault(_name, _value)
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm_storage import SnapshotFSMContext
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_concurrent_updates_keep_each_others_keys():
+    async def scenario():
+        storage = MemoryStorage()
+        await storage.set_data(key=KEY, data={'photos': 0})
+        first = SnapshotFSMContext(storage, KEY)
+        second = SnapshotFSMContext(storage, KEY)
+        await first.update_data(photo_1='a')
+        await second.update_data(photo_2='b', photos=2)
+        await first.flush()
+        await second.flush()
+        return await storage.get_data(key=KEY)
+
+    assert asyncio.run(scenario()) == {'photos': 2, 'photo_1': 'a', 'photo_2': 'b'}
+
+
+def test_set_data_replaces_stored_data():
+    async def scenario():
+        storage = MemoryStorage()
+        await storage.set_data(key=KEY, data={'stale': 1})
+        context = SnapshotFSMContext(storage, KEY)
+        await context.set_data({'fresh': 1})
+        await context.update_data(extra=2)
+        await context.flush()
+        return await storage.get_data(key=KEY)
+
+    assert asyncio.run(scenario()) == {'fresh': 1, 'extra': 2}
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from markdown_escape import (
+    safe_escape_markdown,
+    escape_message_parts,
+    unescape_markdown,
+    MARKDOWN_V1_SPECIAL_CHARS,
+    MARKDOWN_V2_SPECIAL_CHARS,
+)
+
+
+# Прежние реализации (последовательные str.replace) - эталон для сравнения
+def reference_escape(text, exclude_chars=None, version=2):
+    if not text:
+        return ""
+    text = str(text)
+    if version == 1:
+        special_chars = ['_', '*', '`', '[']
+    else:
+        special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in special_chars:
+        text = text.replace(char, f'\\{char}')
+    if exclude_chars:
+        for char in exclude_chars:
+            text = text.replace(f'\\{char}', char)
+    return text
+
+
+def reference_escape_parts(*parts, version=2):
+    if not parts:
+        return ""
+    return "".join(reference_escape(str(part), version=version) for part in parts)
+
+
+def reference_unescape(text):
+    if not text:
+        return ""
+    for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
+        text = text.replace(f'\\{char}', char)
+    return text
+
+
+# Алфавит с перекосом в сторону спецсимволов и обратной косой черты
+ALPHABET = MARKDOWN_V2_SPECIAL_CHARS + '\\\\\\' + 'ab Я1\n🍪'
+EXCLUDE_POOL = list(MARKDOWN_V2_SPECIAL_CHARS) + ['a', '\\', '_*', '']
+
+
+def random_text(rng, max_len=40):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_len)))
+
+
+@pytest.fixture
+def rng():
+    return random.Random(20240601)
+
+
+class TestMarkdownEscapeEquivalence:
+    """Свойство: функции markdown_escape совпадают с эталоном на случайных строках"""
+
+    @pytest.mark.parametrize("version", [1, 2, 3])
+    def test_escape_matches_reference(self, rng, version):
+        for _ in range(3000):
+            text = random_text(rng)
+            assert safe_escape_markdown(text, version=version) == reference_escape(text, version=version)
+
+    @pytest.mark.parametrize("version", [1, 2])
+    def test_escape_with_exclude_matches_reference(self, rng, version):
+        for _ in range(3000):
+            text = random_text(rng)
+            exclude = rng.sample(EXCLUDE_POOL, rng.randint(0, 4))
+            if rng.random() < 0.1 and exclude:
+                exclude.append(exclude[0])  # повтор символа
+            assert safe_escape_markdown(text, exclude, version) == reference_escape(text, exclude, version), (text, exclude)
+
+    def test_escape_message_parts_matches_reference(self, rng):
+        for _ in range(1000):
+            parts = [random_text(rng, 10) for _ in range(rng.randint(0, 5))]
+            if rng.random() < 0.2:
+                parts.append(rng.randint(-5, 500))
+            assert escape_message_parts(*parts) == reference_escape_parts(*parts)
+            assert escape_message_parts(*parts, version=1) == reference_escape_parts(*parts, version=1)
+
+    def test_unescape_matches_reference(self, rng):
+        for _ in range(3000):
+            text = random_text(rng)
+            assert unescape_markdown(text) == reference_unescape(text)
+            escaped = safe_escape_markdown(text)
+            assert unescape_markdown(escaped) == reference_unescape(escaped)
+
+    def test_falsy_and_non_string_input(self):
+        for value in ("", None, 0, 12.5, -3):
+            assert safe_escape_markdown(value) == reference_escape(value)
+        assert unescape_markdown("") == ""
+        assert escape_message_parts() == ""
+
+    def test_special_char_sets(self):
+        assert safe_escape_markdown(MARKDOWN_V1_SPECIAL_CHARS, version=1) == '\\_\\*\\`\\['
+        assert unescape_markdown(safe_escape_markdown(MARKDOWN_V2_SPECIAL_CHARS)) == MARKDOWN_V2_SPECIAL_CHARS
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from metrics import MetricsRegistry, instrument_module_coroutines
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('t_seconds', 'Тест', ('handler',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, handler='a')
+    histogram.observe(0.5, handler='a')
+    histogram.observe(5, handler='a')
+    text = registry.render()
+    assert '# TYPE t_seconds histogram' in text
+    assert 't_seconds_bucket{handler="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{handler="a",le="1"} 2' in text
+    assert 't_seconds_bucket{handler="a",le="+Inf"} 3' in text
+    assert 't_seconds_count{handler="a"} 3' in text
+    assert 't_seconds_sum{handler="a"} 5.55' in text
+
+
+def test_counter_labels_are_escaped_and_checked():
+    registry = MetricsRegistry()
+    counter = registry.counter('t_total', 'Тест', ('result',))
+    counter.inc(result='a"b')
+    assert 't_total{result="a\\"b"} 1' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_gauge_function_is_read_on_render():
+    registry = MetricsRegistry()
+    queue = asyncio.Queue()
+    registry.gauge('t_depth', 'Тест').set_function(queue.qsize)
+    queue.put_nowait(1)
+    assert 't_depth 1' in registry.render()
+
+
+def test_instrument_module_coroutines():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('t_db_seconds', 'Тест', ('function',))
+    errors = registry.counter('t_db_errors_total', 'Тест', ('function',))
+
+    async def fetch():
+        return 42
+
+    async def broken():
+        raise RuntimeError
+
+    async def _private():
+        return None
+
+    namespace = {'__name__': __name__, 'fetch': fetch, 'broken': broken, '_private': _private}
+    assert instrument_module_coroutines(namespace, histogram, errors, 'function') == 2
+    assert namespace['_private'] is _private
+    assert asyncio.run(namespace['fetch']()) == 42
+    with pytest.raises(RuntimeError):
+        asyncio.run(namespace['broken']())
+    text = registry.render()
+    assert 't_db_seconds_count{function="fetch"} 1' in text
+    assert 't_db_errors_total{function="broken"} 1' in text
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from migrations import Migration, apply_migrations, discover_migrations
+
+
+def _db_path() -> str:
+    return os.path.join(tempfile.mkdtemp(prefix='migrations_'), 'users.db')
+
+
+def _columns(path: str, table: str) -> set:
+    with sqlite3.connect(path) as conn:
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_fresh_database_is_migrated_once():
+    path = _db_path()
+    versions = [migration.version for migration in discover_migrations()]
+    assert asyncio.run(apply_migrations(path)) == versions
+    assert asyncio.run(apply_migrations(path)) == []
+    with sqlite3.connect(path) as conn:
+        assert [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")] == versions
+    assert {'style_name'} <= _columns(path, 'video_tasks')
+    assert {'total_reward_photos'} <= _columns(path, 'referral_stats')
+
+
+def test_legacy_database_gets_missing_columns_and_keeps_rows():
+    path = _db_path()
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, generations_left INTEGER, "
+                     "active_avatar_id INTEGER, referrer_id INTEGER, is_blocked INTEGER)")
+        conn.execute("INSERT INTO users VALUES (1, 'old', 5, NULL, NULL, 0)")
+        conn.execute("CREATE TABLE video_tasks (id INTEGER PRIMARY KEY, user_id INTEGER, status TEXT)")
+        conn.execute("CREATE TABLE scheduled_broadcasts (id INTEGER PRIMARY KEY, broadcast_data TEXT, "
+                     "status TEXT, created_at TIMESTAMP)")
+        conn.execute("INSERT INTO scheduled_broadcasts VALUES (7, '{\"message\": \"a\\\\.b\", \"media\": null, "
+                     "\"broadcast_type\": \"all\", \"admin_user_id\": 1, \"with_payment_button\": false, "
+                     "\"buttons\": []}', 'pending', '2025-01-01 10:00:00')")
+    asyncio.run(apply_migrations(path))
+    assert {'welcome_message_sent', 'last_reminder_type', 'block_reason'} <= _columns(path, 'users')
+    assert 'style_name' in _columns(path, 'video_tasks')
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT username, generations_left FROM users").fetchone() == ('old', 5)
+        scheduled_time, data = conn.execute(
+            "SELECT scheduled_time, broadcast_data FROM scheduled_broadcasts WHERE id = 7").fetchone()
+    assert scheduled_time == '2025-01-01 10:00:00'
+    assert '"a.b"' in data
+
+
+def test_failed_migration_rolls_back_with_its_version():
+    path = _db_path()
+
+    async def create(conn):
+        await conn.execute("CREATE TABLE t (id INTEGER)")
+
+    async def broken(conn):
+        await conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("boom")
+
+    migrations = [Migration(1, 'create', '', create), Migration(2, 'broken', '', broken)]
+    with pytest.raises(RuntimeError):
+        asyncio.run(apply_migrations(path, migrations))
+    with sqlite3.connect(path) as conn:
+        assert [row[0] for row in conn.execute("SELECT version FROM schema_version")] == [1]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 't' in tables and 'half_done' not in tables
+
+
+def test_epoch_columns_follow_text_dates():
+    path = _db_path()
+    asyncio.run(apply_migrations(path))
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO users (user_id, created_at) VALUES (1, '2025-07-11 00:00:30')")
+        conn.execute("INSERT INTO payments (payment_id, user_id, status, created_at) "
+                     "VALUES ('p1', 1, 'succeeded', '2025-07-11 10:00:00 UTC')")
+        conn.execute("INSERT INTO scheduled_broadcasts (scheduled_time, broadcast_data) VALUES ('not a date', '{}')")
+        conn.execute("UPDATE users SET created_at = '2025-07-12 00:00:00' WHERE user_id = 1")
+        assert conn.execute("SELECT created_ts FROM users").fetchone() == (1752278400,)
+        assert conn.execute("SELECT created_ts FROM payments").fetchone() == (1752228000,)
+        assert conn.execute("SELECT scheduled_ts FROM scheduled_broadcasts").fetchone() == (None,)
+
+
+def test_credit_ledger_is_append_only():
+    path = _db_path()
+    asyncio.run(apply_migrations(path))
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO credit_ledger (user_id, resource, delta, balance_after, reason) "
+                     "VALUES (1, 'photo', -2, 3, 'reserve')")
+        for statement in ("UPDATE credit_ledger SET delta = 0", "DELETE FROM credit_ledger"):
+            with pytest.raises(sqlite3.IntegrityError):
+                conn.execute(statement)
+        assert conn.execute("SELECT delta FROM credit_ledger").fetchall() == [(-2,)]
+
+
+def test_referral_counts_follow_referrals():
+    path = _db_path()
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE referrals (id INTEGER PRIMARY KEY AUTOINCREMENT, referrer_id INTEGER NOT NULL, "
+                     "referred_id INTEGER NOT NULL UNIQUE, status TEXT DEFAULT 'pending', created_at TIMESTAMP)")
+        conn.execute("INSERT INTO referrals (referrer_id, referred_id) VALUES (1, 10), (1, 11)")
+    asyncio.run(apply_migrations(path))
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO referrals (referrer_id, referred_id) VALUES (1, 12), (2, 13)")
+        conn.execute("INSERT INTO referrals (referrer_id, referred_id) VALUES (2, 12) ON CONFLICT(referred_id) DO NOTHING")
+        conn.execute("DELETE FROM referrals WHERE referred_id = 10")
+        counts = dict(conn.execute("SELECT referrer_id, referral_count FROM referral_counts"))
+    assert counts == {1: 2, 2: 1}
@@ -0,0 +1,79 @@
+import asyncio
+import importlib
+import os
+import sqlite3
+import sys
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+
+@pytest.fixture
+def onboarding(monkeypatch):
+    """Настоящий handlers.onboarding (test_onboarding_functions подменяет его в sys.modules)."""
+    path = os.path.join(tempfile.mkdtemp(prefix='onboarding_'), 'users.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, last_reminder_type TEXT, "
+                     "last_reminder_sent TEXT, welcome_message_sent INTEGER DEFAULT 0, is_blocked INTEGER DEFAULT 0, "
+                     "updated_at TIMESTAMP)")
+        conn.execute("INSERT INTO users (user_id) VALUES (1)")
+    for name, value in (('TELEGRAM_BOT_TOKEN', '123:abc'), ('REPLICATE_API_TOKEN', 'x'),
+                        ('YOOKASSA_SHOP_ID', 'x'), ('YOOKASSA_SECRET_KEY', 'x')):
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv('DATABASE_PATH', path)
+    # Подменяем в sys.modules только config и handlers: повторная загрузка numpy невозможна
+    def own(name):
+        return name == 'config' or name == 'handlers' or name.startswith('handlers.')
+
+    saved = {name: module for name, module in sys.modules.items() if own(name)}
+    for name in saved:
+        del sys.modules[name]
+    try:
+        module = importlib.import_module('handlers.onboarding')
+        monkeypatch.setattr(module, 'DATABASE_PATH', path)
+        yield module, path
+    finally:
+        for name in [name for name in sys.modules if own(name)]:
+            del sys.modules[name]
+        sys.modules.update(saved)
+
+
+def test_welcome_sends_examples_and_marks_user(onboarding):
+    module, path = onboarding
+    bot = AsyncMock()
+    with patch.object(module, 'is_old_user', AsyncMock(return_value=False)), \
+         patch.object(module, 'has_user_purchases', AsyncMock(return_value=False)), \
+         patch.object(module, 'send_photo_group_asset', AsyncMock(return_value=[MagicMock()] * 3)) as send_group:
+        asyncio.run(module.send_onboarding_message(bot, 1, 'welcome'))
+
+    send_group.assert_awaited_once_with(bot, 1, module.EXAMPLE_IMAGES)
+    bot.send_message.assert_awaited_once()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT welcome_message_sent FROM users WHERE user_id = 1").fetchone() == (1,)
+
+
+def test_backfill_runs_once(onboarding):
+    module, _ = onboarding
+    get_users = AsyncMock(return_value=[])
+    with patch.object(module, 'get_users_for_welcome_message', get_users), \
+         patch.object(module, 'get_bot_config_value', AsyncMock(return_value='2025-08-03 12:00:00')):
+        assert asyncio.run(module.backfill_welcome_jobs()) == 0
+    get_users.assert_not_awaited()
+
+
+def test_failed_welcome_is_not_retried(onboarding):
+    module, path = onboarding
+    bot = AsyncMock()
+    bot.send_message.side_effect = Exception("Forbidden: bot was blocked by the user")
+    with patch.object(module, 'get_scheduler_bot', MagicMock(return_value=bot)), \
+         patch.object(module, 'is_user_blocked', AsyncMock(return_value=False)), \
+         patch.object(module, 'check_database_user', AsyncMock(return_value=None)), \
+         patch.object(module, 'is_old_user', AsyncMock(return_value=False)), \
+         patch.object(module, 'has_user_purchases', AsyncMock(return_value=False)), \
+         patch.object(module, 'send_photo_group_asset', AsyncMock(return_value=[])), \
+         patch('database.DATABASE_PATH', path):
+        asyncio.run(module.deliver_welcome_message(1))
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT welcome_message_sent FROM users WHERE user_id = 1").fetchone() == (1,)
@@ -0,0 +1,26 @@
+from collections import Counter
+
+from profiler import ProfileResult
+
+
+def make_result():
+    stacks = Counter({
+        ('MainThread', 'main.py:main:1', 'db.py:query:10'): 3,
+        ('MainThread', 'main.py:main:1', 'img.py:resize:5'): 1,
+        ('MainThread', 'main.py:main:1'): 1,
+    })
+    return ProfileResult(stacks, samples=10, idle_samples=5, seconds=1.0, interval=0.01)
+
+
+def test_collapsed_stacks_format():
+    lines = make_result().collapsed().splitlines()
+    assert lines[0] == 'MainThread;main.py:main:1;db.py:query:10 3'
+    assert len(lines) == 3
+
+
+def test_top_functions_own_and_total():
+    rows = make_result().top_functions()
+    assert rows[0] == ('db.py:query:10', 3, 3)
+    assert ('main.py:main:1', 1, 5) in rows
+    assert all(label != 'MainThread' for label, _, _ in rows)
+    assert 'работа: 5' in make_result().summary()
@@ -0,0 +1,29 @@
+from tracing import SlowStats, Trace, MAX_SPANS_PER_TRACE
+
+
+def test_slow_stats_top_merges_minutes_and_drops_old():
+    stats = SlowStats(window_seconds=3600)
+    now = 1_000_000.0
+    stats.add('db', 'old_query', 9.0, now=now - 7200)
+    stats.add('db', 'get_user', 0.1, now=now - 120)
+    stats.add('db', 'get_user', 0.3, now=now)
+    stats.add('db', 'is_user_blocked', 0.2, now=now)
+    stats.add('handler', 'start', 1.0, now=now)
+    rows = stats.top('db', now=now)
+    assert [row['name'] for row in rows] == ['get_user', 'is_user_blocked']
+    assert rows[0]['count'] == 2
+    assert round(rows[0]['avg_ms']) == 200
+    assert round(rows[0]['max_ms']) == 300
+    assert stats.top('db', limit=1, now=now)[0]['name'] == 'get_user'
+
+
+def test_trace_caps_spans_and_ignores_late_ones():
+    trace = Trace(update_id=1, user_id=2)
+    for _ in range(MAX_SPANS_PER_TRACE + 5):
+        trace.add('telegram', 'SendMessage', trace.started, 0.01)
+    assert len(trace.spans) == MAX_SPANS_PER_TRACE
+    assert trace.dropped == 5
+    trace.finished = True
+    trace.add('db', 'late', trace.started, 0.01)
+    assert trace.dropped == 5
+    assert 'telegram' in trace.breakdown()
@@ -0,0 +1,187 @@
+# tracing.py
+"""Трассировка апдейтов: на что ушло время обработки.
+
+TracingMiddleware (outer на dp.update) открывает трассу на апдейт и кладёт её в contextvar.
+Запросы к БД, Redis, FSM, Replicate и Telegram записываются в неё как дочерние спаны
+(record_span / span). Апдейт дольше порога пишется в лог с разбивкой по спанам.
+
+Длительности обработчиков и запросов также копятся в поминутных корзинах за последний час
+(SLOW_STATS) - по ним админ-команда /slow показывает самые медленные.
+Трассировка не зависит от config: пороги передаются в install_tracing.
+"""
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+from logger import get_logger
+logger = get_logger('main')
+
+# Спанов в одной трассе не больше этого (рассылка из обработчика делает тысячи отправок)
+MAX_SPANS_PER_TRACE = 200
+STATS_WINDOW_SECONDS = 3600
+
+_slow_update_seconds = 2.0
+_slow_query_seconds = 0.5
+
+
+class Trace:
+    __slots__ = ('update_id', 'user_id', 'handler', 'started', 'spans', 'dropped', 'finished')
+
+    def __init__(self, update_id: Optional[int], user_id: Optional[int]):
+        self.update_id = update_id
+        self.user_id = user_id
+        self.handler: Optional[str] = None
+        self.started = time.perf_counter()
+        # (вид, имя, начало от старта трассы, длительность) в секундах
+        self.spans: List[Tuple[str, str, float, float]] = []
+        self.dropped = 0
+        self.finished = False
+
+    def add(self, kind: str, name: str, started: float, seconds: float) -> None:
+        if self.finished:
+            return
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return
+        self.spans.append((kind, name, started - self.started, seconds))
+
+    def breakdown(self) -> str:
+        """Спаны по порядку и итог по видам - для лога медленного апдейта."""
+        totals: Dict[str, float] = defaultdict(float)
+        lines = []
+        for kind, name, offset, seconds in self.spans:
+            totals[kind] += seconds
+            lines.append(f"  +{offset * 1000:7.1f} мс {kind:<9} {name} {seconds * 1000:.1f} мс")
+        summary = ', '.join(f"{kind} {seconds * 1000:.1f} мс" for kind, seconds in
+                            sorted(totals.items(), key=lambda item: -item[1]))
+        if self.dropped:
+            lines.append(f"  ... ещё {self.dropped} спанов не записано")
+        return f"по видам: {summary or 'нет спанов'}\n" + '\n'.join(lines)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+
+
+class SlowStats:
+    """Число вызовов, сумма и максимум длительности по (вид, имя) в поминутных корзинах."""
+
+    def __init__(self, window_seconds: int = STATS_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        # (минута, {(вид, имя): [count, total, max]})
+        self._buckets: Deque[Tuple[int, Dict[Tuple[str, str], list]]] = deque()
+
+    def _prune(self, minute: int) -> None:
+        oldest = minute - self.window_seconds // 60
+        while self._buckets and self._buckets[0][0] <= oldest:
+            self._buckets.popleft()
+
+    def add(self, kind: str, name: str, seconds: float, now: Optional[float] = None) -> None:
+        minute = int((time.time() if now is None else now) // 60)
+        if not self._buckets or self._buckets[-1][0] != minute:
+            self._prune(minute)
+            self._buckets.append((minute, {}))
+        entry = self._buckets[-1][1].get((kind, name))
+        if entry is None:
+            self._buckets[-1][1][(kind, name)] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+    def top(self, kind: str, limit: int = 10, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Самые медленные (по максимуму) за окно: name, count, avg_ms, max_ms."""
+        self._prune(int((time.time() if now is None else now) // 60))
+        merged: Dict[str, list] = {}
+        for _, entries in self._buckets:
+            for (entry_kind, name), (count, total, maximum) in entries.items():
+                if entry_kind != kind:
+                    continue
+                current = merged.setdefault(name, [0, 0.0, 0.0])
+                current[0] += count
+                current[1] += total
+                current[2] = max(current[2], maximum)
+        rows = [
+            {'name': name, 'count': count, 'avg_ms': total / count * 1000, 'max_ms': maximum * 1000}
+            for name, (count, total, maximum) in merged.items()
+        ]
+        rows.sort(key=lambda row: row['max_ms'], reverse=True)
+        return rows[:limit]
+
+
+SLOW_STATS = SlowStats()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_span(kind: str, name: str, seconds: float, started: Optional[float] = None) -> None:
+    """Записывает завершённый спан в текущую трассу (если есть) и в SLOW_STATS.
+
+    started - значение time.perf_counter() в начале спана; по умолчанию считается по seconds.
+    """
+    SLOW_STATS.add(kind, name, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, time.perf_counter() - seconds if started is None else started, seconds)
+    if kind == 'db' and seconds >= _slow_query_seconds:
+        logger.warning("Медленный запрос %s: %.1f мс (update_id=%s)", name, seconds * 1000,
+                       trace.update_id if trace is not None else None)
+
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(kind, name, time.perf_counter() - started, started)
+
+
+def set_trace_handler(name: str) -> None:
+    """Имя выбранного обработчика (вызывается из UpdateLogMiddleware)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.handler = name
+
+
+class TracingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        trace = Trace(getattr(event, 'update_id', None), getattr(user, 'id', None))
+        token = _current_trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            _current_trace.reset(token)
+            trace.finished = True
+            elapsed = time.perf_counter() - trace.started
+            if trace.handler is not None:
+                SLOW_STATS.add('handler', trace.handler, elapsed)
+            if elapsed >= _slow_update_seconds:
+                logger.warning(
+                    "Медленный апдейт %s (user_id=%s, %s): %.1f мс\n%s",
+                    trace.update_id, trace.user_id, trace.handler or 'без обработчика',
+                    elapsed * 1000, trace.breakdown()
+                )
+
+
+def install_tracing(dp: Dispatcher, slow_update_ms: float, slow_query_ms: float) -> TracingMiddleware:
+    """Регистрирует трассировку первой outer-middleware на dp.update и задаёт пороги."""
+    global _slow_update_seconds, _slow_query_seconds
+    _slow_update_seconds = slow_update_ms / 1000
+    _slow_query_seconds = slow_query_ms / 1000
+    middleware = TracingMiddleware()
+    dp.update.outer_middleware(middleware)
+    return middleware
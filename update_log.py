@@ -0,0 +1,70 @@
+# update_log.py
+"""Событие update_handled и метрика bot_handler_seconds на каждый обработанный апдейт.
+
+Middleware регистрируется на наблюдателях диспетчера (message, callback_query, ...)
+и поэтому видит выбранный обработчик. В событии - user_id, update_id, имя обработчика
+и duration_ms; успешные апдейты пишутся с долей из LOG_SAMPLE_RATES, упавшие - всегда.
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+from metrics import HANDLER_LATENCY, HANDLER_ERRORS
+from tracing import set_trace_handler
+
+from logger import get_logger, log_event
+logger = get_logger('main')
+
+# Наблюдатели диспетчера, на которые вешается middleware
+LOGGED_OBSERVERS = ('message', 'callback_query', 'pre_checkout_query')
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Имя функции-обработчика апдейта (для логов и метрик)."""
+    handler_object = data.get('handler')
+    callback = getattr(handler_object, 'callback', None)
+    return getattr(callback, '__qualname__', None) or 'unknown'
+
+
+class UpdateLogMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        set_trace_handler(handler_name(data))
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            duration_ms = round(elapsed * 1000, 1)
+            update = data.get('event_update')
+            user = data.get('event_from_user')
+            name = handler_name(data)
+            HANDLER_LATENCY.observe(elapsed, handler=name)
+            if failed:
+                HANDLER_ERRORS.inc(handler=name)
+            log_event(
+                logger, 'update_failed' if failed else 'update_handled',
+                "Апдейт %s: %s за %.1f мс%s", getattr(update, 'update_id', None), name, duration_ms,
+                " (ошибка)" if failed else "",
+                level=logging.WARNING if failed else logging.INFO,
+                user_id=getattr(user, 'id', None), update_id=getattr(update, 'update_id', None),
+                handler=name, duration_ms=duration_ms
+            )
+
+
+def install_update_log(dp: Dispatcher) -> UpdateLogMiddleware:
+    middleware = UpdateLogMiddleware()
+    for observer_name in LOGGED_OBSERVERS:
+        dp.observers[observer_name].middleware(middleware)
+    return middleware